@@ -0,0 +1,4 @@
+"""
+Hardware-free camera simulators for benchmarking the video drivers:
+a Dahua/Hikvision HTTP camera, an RTSP H.264 source and a rosbridge publisher.
+"""
@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import threading
+
+from .frames import FramePump
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.camsim", description="Hardware-free camera simulator")
+    parser.add_argument("mode", choices=["http", "rtsp", "rosbridge", "all"])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--http-port", type=int, default=8081)
+    parser.add_argument("--rtsp-port", type=int, default=8554)
+    parser.add_argument("--rosbridge-port", type=int, default=9090)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--scene", choices=["moving", "static"], default="moving",
+                        help="static keeps everything but the timestamp stripe still")
+    parser.add_argument("--gop", type=int, default=None, help="H.264 keyframe interval in frames")
+    parser.add_argument("--h264-file", default=None, help="loop an Annex-B file instead of encoding with ffmpeg")
+    parser.add_argument("--disconnect-every", type=float, default=0.0,
+                        help="drop HTTP streams after this many seconds to exercise reconnects")
+    args = parser.parse_args()
+
+    pump = FramePump(args.width, args.height, args.fps, args.quality, args.scene)
+
+    def start_http():
+        from .httpcam import serve_http
+        threading.Thread(target=serve_http, args=(pump, args.host, args.http_port, args.disconnect_every),
+                         daemon=True).start()
+
+    def start_rtsp():
+        from .rtsp import H264Source, serve_rtsp
+        source = H264Source(pump, gop=args.gop, h264_file=args.h264_file)
+        threading.Thread(target=serve_rtsp, args=(source, args.host, args.rtsp_port), daemon=True).start()
+
+    if args.mode in ("http", "all"):
+        start_http()
+    if args.mode in ("rtsp", "all"):
+        start_rtsp()
+    pump.start()
+
+    try:
+        if args.mode in ("rosbridge", "all"):
+            from .rosbridge import serve_rosbridge
+            asyncio.run(serve_rosbridge(pump, args.host, args.rosbridge_port))
+        else:
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
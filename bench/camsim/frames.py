@@ -0,0 +1,137 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Capture time is stamped into every frame as a row of black/white blocks so it
+# survives JPEG/H.264 re-encoding by the drivers and can be read back by viewers.
+STAMP_BITS = 32
+
+
+def now_ms():
+    return int(time.time() * 1000) & 0xFFFFFFFF
+
+
+def latency_ms(stamp):
+    return (now_ms() - stamp) & 0xFFFFFFFF
+
+
+def draw_stamp(img, ms):
+    block = img.shape[1] // (STAMP_BITS + 2)
+    img[:block, :] = 0
+    # Leading white guard block, trailing black guard block
+    img[:block, :block] = 255
+    for i in range(STAMP_BITS):
+        if (ms >> (STAMP_BITS - 1 - i)) & 1:
+            x = (i + 1) * block
+            img[:block, x:x + block] = 255
+
+
+def read_stamp(gray):
+    """
+    Recover the capture timestamp from a grayscale frame, or None if it has no stamp.
+    """
+    height, width = gray.shape[:2]
+    block = width // (STAMP_BITS + 2)
+    if block < 2 or height < block:
+        return None
+    centers = np.arange(STAMP_BITS + 2) * block + block // 2
+    bits = gray[block // 2, centers] > 128
+    if not bits[0] or bits[-1]:
+        return None
+    value = 0
+    for bit in bits[1:-1]:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def read_jpeg_stamp(jpeg):
+    gray = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    if gray is None:
+        return None
+    return read_stamp(gray)
+
+
+class FramePump:
+    """
+    Renders synthetic camera frames at a fixed rate and shares the latest one with
+    every consumer, like a real camera sensor would. In the "static" scene the
+    square and the caption stay put and the timestamp stripe only ticks once a
+    second, like a fixed camera over an empty room with its clock overlay; its
+    stamps are whole seconds, so they are no use for measuring latency. A few
+    levels of sensor noise keep its frames from being byte-identical.
+    """
+    def __init__(self, width=640, height=360, fps=15, quality=80, scene="moving"):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.quality = quality
+        self.scene = scene
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.jpeg = None
+        self.listeners = []
+        self.thread = None
+        ramp = np.linspace(40, 200, width, dtype=np.uint8)
+        self.background = np.dstack([
+            np.tile(ramp, (height, 1)),
+            np.tile(ramp[::-1], (height, 1)),
+            np.full((height, width), 90, dtype=np.uint8),
+        ])
+        self.backgrounds = [self.background]
+        if scene == "static":
+            rng = np.random.default_rng(0)
+            self.backgrounds = [
+                cv2.add(self.background, rng.integers(0, 4, self.background.shape, dtype=np.uint8))
+                for _ in range(4)
+            ]
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def add_listener(self, callback):
+        """Receive every raw BGR frame, e.g. to feed a video encoder."""
+        self.listeners.append(callback)
+
+    def render(self, index):
+        img = self.backgrounds[index % len(self.backgrounds)].copy()
+        if self.scene == "static":
+            index = 0
+        size = self.height // 4
+        x = (index * 4) % max(1, self.width - size)
+        y = self.height // 2 - size // 2
+        cv2.rectangle(img, (x, y), (x + size, y + size), (255, 255, 255), -1)
+        cv2.putText(img, f"camsim #{index}", (10, self.height - 12),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        ms = now_ms()
+        draw_stamp(img, ms - ms % 1000 if self.scene == "static" else ms)
+        return img
+
+    def wait_next(self, last_seq, timeout=1.0):
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != last_seq and self.jpeg is not None, timeout)
+            return self.seq, self.jpeg
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        next_at = time.monotonic()
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        while True:
+            img = self.render(self.seq)
+            ok, buf = cv2.imencode(".jpg", img, params)
+            if ok:
+                with self.cond:
+                    self.jpeg = buf.tobytes()
+                    self.seq += 1
+                    self.cond.notify_all()
+            for callback in self.listeners:
+                callback(img)
+            next_at += interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_at = time.monotonic()
@@ -0,0 +1,119 @@
+import re
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+DAHUA_MJPEG_PATH = "/cgi-bin/mjpg/video.cgi"
+ISAPI_CHANNEL = re.compile(r"^/ISAPI/Streaming/channels/(\d+)/(picture|httpPreview)$")
+
+DEVICE_INFO_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<DeviceInfo version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">
+<deviceName>camsim</deviceName>
+<deviceID>00000000-0000-0000-0000-000000000000</deviceID>
+<model>CAMSIM-1</model>
+<serialNumber>CAMSIM0000000001</serialNumber>
+<firmwareVersion>V0.0.1</firmwareVersion>
+<deviceType>IPCamera</deviceType>
+</DeviceInfo>
+"""
+
+RESPONSE_STATUS_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<ResponseStatus version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">
+<requestURL>%s</requestURL>
+<statusCode>1</statusCode>
+<statusString>OK</statusString>
+</ResponseStatus>
+"""
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def make_handler(pump, disconnect_every=0.0):
+    """
+    Build a handler serving a Dahua-style MJPEG CGI and the Hikvision ISAPI
+    picture/httpPreview/deviceInfo/record endpoints from one frame pump.
+    disconnect_every drops each stream after that many seconds to exercise
+    driver reconnect logic.
+    """
+    class CameraSimHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.0"
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == DAHUA_MJPEG_PATH:
+                self._serve_mjpeg("myboundary")
+                return
+            if path == "/ISAPI/System/deviceInfo":
+                self._send_body(200, "application/xml", DEVICE_INFO_XML)
+                return
+            match = ISAPI_CHANNEL.match(path)
+            if match and match.group(2) == "picture":
+                # Right after start-up the pump may not have encoded its first frame yet
+                _, jpeg = pump.wait_next(0, timeout=5.0)
+                if jpeg is None:
+                    self._send_body(503, "text/plain", b"No frame yet")
+                else:
+                    self._send_body(200, "image/jpeg", jpeg)
+            elif match:
+                self._serve_mjpeg("boundary")
+            else:
+                self._send_body(404, "text/plain", b"Not Found")
+
+        def do_PUT(self):
+            self._handle_control()
+
+        def do_POST(self):
+            self._handle_control()
+
+        def _handle_control(self):
+            length = int(self.headers.get("Content-Length", 0) or 0)
+            if length:
+                self.rfile.read(length)
+            if self.path.startswith("/ISAPI/ContentMgmt/record/control/"):
+                self._send_body(200, "application/xml", RESPONSE_STATUS_XML % self.path.encode())
+            else:
+                self._send_body(404, "text/plain", b"Not Found")
+
+        def _send_body(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _serve_mjpeg(self, boundary):
+            self.send_response(200)
+            self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={boundary}")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            started = time.monotonic()
+            seq = 0
+            try:
+                while True:
+                    if disconnect_every and time.monotonic() - started > disconnect_every:
+                        return
+                    seq, jpeg = pump.wait_next(seq)
+                    if jpeg is None:
+                        continue
+                    self.wfile.write(
+                        f"--{boundary}\r\nContent-Type: image/jpeg\r\n"
+                        f"Content-Length: {len(jpeg)}\r\n\r\n".encode() + jpeg + b"\r\n"
+                    )
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            return
+
+    return CameraSimHandler
+
+
+def serve_http(pump, host, port, disconnect_every=0.0):
+    server = ThreadedHTTPServer((host, port), make_handler(pump, disconnect_every))
+    print(f"camsim HTTP camera on http://{host}:{port}{DAHUA_MJPEG_PATH} "
+          f"and http://{host}:{port}/ISAPI/Streaming/channels/101/httpPreview")
+    server.serve_forever()
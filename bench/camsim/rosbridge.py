@@ -0,0 +1,83 @@
+import asyncio
+import base64
+import json
+import time
+
+
+class RosbridgeSim:
+    """
+    Minimal rosbridge v2 websocket server: every `subscribe` receives the frame
+    pump as sensor_msgs/CompressedImage messages. Each frame is JSON-encoded once
+    per topic and the same string is sent to all subscribers.
+    """
+    def __init__(self, pump):
+        self.pump = pump
+        self.subscriptions = {}
+        self.published = 0
+
+    async def handler(self, ws, path=None):
+        topics = set()
+        try:
+            async for raw in ws:
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    continue
+                op = message.get("op")
+                topic = message.get("topic")
+                if op == "subscribe" and topic:
+                    topics.add(topic)
+                    self.subscriptions.setdefault(topic, set()).add(ws)
+                elif op == "unsubscribe" and topic:
+                    topics.discard(topic)
+                    self.subscriptions.get(topic, set()).discard(ws)
+                elif op == "publish":
+                    self.published += 1
+        except Exception:
+            pass
+        finally:
+            for topic in topics:
+                self.subscriptions.get(topic, set()).discard(ws)
+
+    async def broadcast_loop(self):
+        loop = asyncio.get_running_loop()
+        seq = 0
+        while True:
+            seq, jpeg = await loop.run_in_executor(None, self.pump.wait_next, seq, 1.0)
+            if jpeg is None:
+                continue
+            now = time.time()
+            data = base64.b64encode(jpeg).decode()
+            for topic, clients in list(self.subscriptions.items()):
+                if not clients:
+                    continue
+                payload = json.dumps({
+                    "op": "publish",
+                    "topic": topic,
+                    "msg": {
+                        "header": {
+                            "seq": seq,
+                            "stamp": {"secs": int(now), "nsecs": int((now % 1) * 1e9)},
+                            "frame_id": "camsim",
+                        },
+                        "format": "jpeg",
+                        "data": data,
+                    },
+                })
+                await asyncio.gather(*(self._send(ws, payload) for ws in list(clients)))
+
+    async def _send(self, ws, payload):
+        try:
+            await ws.send(payload)
+        except Exception:
+            for clients in self.subscriptions.values():
+                clients.discard(ws)
+
+
+async def serve_rosbridge(pump, host, port):
+    import websockets
+
+    sim = RosbridgeSim(pump)
+    async with websockets.serve(sim.handler, host, port, max_size=None):
+        print(f"camsim rosbridge on ws://{host}:{port} (sensor_msgs/CompressedImage)")
+        await sim.broadcast_loop()
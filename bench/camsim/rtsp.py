@@ -0,0 +1,363 @@
+import base64
+import os
+import queue
+import random
+import re
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+RTP_MTU = 1400
+RTP_PAYLOAD_TYPE = 96
+NAL_IDR = 5
+NAL_SPS = 7
+NAL_PPS = 8
+NAL_AUD = 9
+
+
+class AnnexBParser:
+    """
+    Incremental splitter for an H.264 Annex-B byte stream into NAL units.
+    """
+    def __init__(self):
+        self.buf = bytearray()
+
+    def feed(self, data):
+        self.buf += data
+        nals = []
+        pos = self.buf.find(b"\x00\x00\x01")
+        if pos < 0:
+            del self.buf[:max(0, len(self.buf) - 3)]
+            return nals
+        while True:
+            nxt = self.buf.find(b"\x00\x00\x01", pos + 3)
+            if nxt < 0:
+                break
+            nal = bytes(self.buf[pos + 3:nxt]).rstrip(b"\x00")
+            if nal:
+                nals.append(nal)
+            pos = nxt
+        del self.buf[:pos]
+        return nals
+
+
+class AccessUnitSplitter:
+    """
+    Groups NAL units into access units (one coded picture plus its parameter sets).
+    """
+    def __init__(self):
+        self.pending = []
+        self.has_vcl = False
+
+    def push(self, nal):
+        nal_type = nal[0] & 0x1F
+        vcl = 1 <= nal_type <= 5
+        done = None
+        if self.has_vcl:
+            # A non-VCL unit after a picture, or a slice with first_mb_in_slice == 0, starts a new AU
+            if (not vcl and nal_type in (6, NAL_SPS, NAL_PPS, NAL_AUD)) or (vcl and len(nal) > 1 and nal[1] & 0x80):
+                done = self.pending
+                self.pending = []
+                self.has_vcl = False
+        self.pending.append(nal)
+        if vcl:
+            self.has_vcl = True
+        return done
+
+
+def is_keyframe(au):
+    return any((nal[0] & 0x1F) == NAL_IDR for nal in au)
+
+
+def rtp_payloads(au, mtu=RTP_MTU):
+    """
+    Packetize an access unit per RFC 6184 (single NAL or FU-A). Yields (payload, marker).
+    """
+    nals = [nal for nal in au if (nal[0] & 0x1F) != NAL_AUD]
+    for i, nal in enumerate(nals):
+        last = i == len(nals) - 1
+        if len(nal) <= mtu:
+            yield nal, last
+            continue
+        fu_indicator = (nal[0] & 0xE0) | 28
+        nal_type = nal[0] & 0x1F
+        offset = 1
+        while offset < len(nal):
+            chunk = nal[offset:offset + mtu]
+            start = offset == 1
+            offset += len(chunk)
+            end = offset >= len(nal)
+            fu_header = (0x80 if start else 0) | (0x40 if end else 0) | nal_type
+            yield bytes((fu_indicator, fu_header)) + chunk, last and end
+
+
+class H264Source:
+    """
+    Produces H.264 access units either by piping the frame pump through an
+    ffmpeg/libx264 encoder or by looping an Annex-B file, and fans them out to
+    RTSP sessions.
+    """
+    def __init__(self, pump, gop=None, h264_file=None):
+        self.pump = pump
+        self.gop = gop or pump.fps * 2
+        self.h264_file = h264_file
+        self.sps = None
+        self.pps = None
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.proc = None
+
+    def start(self):
+        if self.h264_file:
+            threading.Thread(target=self._file_loop, daemon=True).start()
+            return
+        self.proc = subprocess.Popen(
+            [
+                "ffmpeg", "-loglevel", "error",
+                "-f", "rawvideo", "-pix_fmt", "bgr24",
+                "-s", f"{self.pump.width}x{self.pump.height}", "-r", str(self.pump.fps), "-i", "-",
+                "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency",
+                "-g", str(self.gop), "-bf", "0", "-pix_fmt", "yuv420p",
+                "-f", "h264", "-",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self.pump.add_listener(self._feed)
+        threading.Thread(target=self._encoder_loop, daemon=True).start()
+
+    def _feed(self, img):
+        try:
+            self.proc.stdin.write(img.tobytes())
+            self.proc.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            pass
+
+    def _encoder_loop(self):
+        parser = AnnexBParser()
+        splitter = AccessUnitSplitter()
+        fd = self.proc.stdout.fileno()
+        while True:
+            data = os.read(fd, 65536)
+            if not data:
+                return
+            for nal in parser.feed(data):
+                self._handle_nal(nal, splitter)
+
+    def _file_loop(self):
+        with open(self.h264_file, "rb") as f:
+            data = f.read()
+        interval = 1.0 / self.pump.fps
+        while True:
+            parser = AnnexBParser()
+            splitter = AccessUnitSplitter()
+            # Trailing start code flushes the final NAL of the file
+            for nal in parser.feed(data + b"\x00\x00\x01"):
+                if self._handle_nal(nal, splitter):
+                    time.sleep(interval)
+
+    def _handle_nal(self, nal, splitter):
+        nal_type = nal[0] & 0x1F
+        if nal_type == NAL_SPS:
+            self.sps = nal
+        elif nal_type == NAL_PPS:
+            self.pps = nal
+        if self.sps and self.pps:
+            self.ready.set()
+        au = splitter.push(nal)
+        if au:
+            self._publish(au)
+            return True
+        return False
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=max(2, self.pump.fps * 2))
+        with self.lock:
+            self.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def _publish(self, au):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(au)
+            except queue.Full:
+                # Slow session: drop the backlog and make it resync on the next keyframe
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait(None)
+
+    def sdp(self, host):
+        sprop = ",".join(base64.b64encode(nal).decode() for nal in (self.sps, self.pps))
+        profile = self.sps[1:4].hex()
+        return (
+            "v=0\r\n"
+            f"o=- 0 0 IN IP4 {host}\r\n"
+            "s=camsim\r\n"
+            "t=0 0\r\n"
+            "c=IN IP4 0.0.0.0\r\n"
+            f"m=video 0 RTP/AVP {RTP_PAYLOAD_TYPE}\r\n"
+            f"a=rtpmap:{RTP_PAYLOAD_TYPE} H264/90000\r\n"
+            f"a=fmtp:{RTP_PAYLOAD_TYPE} packetization-mode=1;profile-level-id={profile};"
+            f"sprop-parameter-sets={sprop}\r\n"
+            "a=control:trackID=0\r\n"
+        ).encode()
+
+
+class RtspSession(threading.Thread):
+    """
+    One RTSP client connection. Only RTP-over-RTSP (interleaved TCP) is offered;
+    UDP SETUP gets 461 so FFmpeg/OpenCV falls back to TCP on its own.
+    """
+    def __init__(self, sock, source):
+        super().__init__(daemon=True)
+        self.sock = sock
+        self.source = source
+        self.write_lock = threading.Lock()
+        self.session_id = f"{random.getrandbits(32):08X}"
+        self.channel = 0
+        self.stop_event = threading.Event()
+        self.sender = None
+
+    def run(self):
+        rfile = self.sock.makefile("rb")
+        try:
+            while not self.stop_event.is_set():
+                first = rfile.read(1)
+                if not first:
+                    break
+                if first == b"$":
+                    # Interleaved RTCP receiver report from the client
+                    header = rfile.read(3)
+                    if len(header) < 3:
+                        break
+                    rfile.read(struct.unpack("!H", header[1:3])[0])
+                    continue
+                request_line = (first + rfile.readline()).decode("latin-1").strip()
+                headers = {}
+                while True:
+                    line = rfile.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0) or 0)
+                if length:
+                    rfile.read(length)
+                parts = request_line.split()
+                if len(parts) < 2:
+                    break
+                self._handle(parts[0].upper(), parts[1], headers)
+        except OSError:
+            pass
+        finally:
+            self.stop_event.set()
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+
+    def _reply(self, status, reason, cseq, headers=None, body=b""):
+        lines = [f"RTSP/1.0 {status} {reason}", f"CSeq: {cseq}", "Server: camsim"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        if body:
+            lines.append(f"Content-Length: {len(body)}")
+        data = ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+        with self.write_lock:
+            self.sock.sendall(data)
+
+    def _handle(self, method, uri, headers):
+        cseq = headers.get("cseq", "0")
+        session = {"Session": f"{self.session_id};timeout=60"}
+        if method == "OPTIONS":
+            self._reply(200, "OK", cseq, {"Public": "OPTIONS, DESCRIBE, SETUP, PLAY, TEARDOWN, GET_PARAMETER"})
+        elif method == "DESCRIBE":
+            if not self.source.ready.wait(10):
+                self._reply(503, "Service Unavailable", cseq)
+                return
+            host = self.sock.getsockname()[0]
+            self._reply(200, "OK", cseq, {
+                "Content-Base": uri.rstrip("/") + "/",
+                "Content-Type": "application/sdp",
+            }, self.source.sdp(host))
+        elif method == "SETUP":
+            transport = headers.get("transport", "")
+            if "TCP" not in transport.upper():
+                self._reply(461, "Unsupported Transport", cseq)
+                return
+            match = re.search(r"interleaved=(\d+)", transport)
+            self.channel = int(match.group(1)) if match else 0
+            session["Transport"] = f"RTP/AVP/TCP;unicast;interleaved={self.channel}-{self.channel + 1}"
+            self._reply(200, "OK", cseq, session)
+        elif method == "PLAY":
+            self._reply(200, "OK", cseq, dict(session, Range="npt=0.000-"))
+            if self.sender is None:
+                self.sender = threading.Thread(target=self._send_loop, daemon=True)
+                self.sender.start()
+        elif method in ("GET_PARAMETER", "SET_PARAMETER"):
+            self._reply(200, "OK", cseq, session)
+        elif method == "TEARDOWN":
+            self._reply(200, "OK", cseq, session)
+            self.stop_event.set()
+        else:
+            self._reply(405, "Method Not Allowed", cseq)
+
+    def _send_loop(self):
+        q = self.source.subscribe()
+        ssrc = random.getrandbits(32)
+        seq = random.getrandbits(16)
+        synced = False
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    au = q.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                if au is None:
+                    synced = False
+                    continue
+                if not synced:
+                    if not is_keyframe(au):
+                        continue
+                    synced = True
+                    types = {nal[0] & 0x1F for nal in au}
+                    if NAL_SPS not in types:
+                        au = [self.source.sps, self.source.pps] + au
+                timestamp = int(time.monotonic() * 90000) & 0xFFFFFFFF
+                out = bytearray()
+                for payload, marker in rtp_payloads(au):
+                    header = struct.pack(
+                        "!BBHII", 0x80, (0x80 if marker else 0) | RTP_PAYLOAD_TYPE,
+                        seq & 0xFFFF, timestamp, ssrc,
+                    )
+                    seq += 1
+                    out += b"$" + bytes((self.channel,)) + struct.pack("!H", len(header) + len(payload))
+                    out += header + payload
+                with self.write_lock:
+                    self.sock.sendall(out)
+        except OSError:
+            self.stop_event.set()
+        finally:
+            self.source.unsubscribe(q)
+
+
+def serve_rtsp(source, host, port):
+    source.start()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(64)
+    print(f"camsim RTSP H.264 source on rtsp://{host}:{port}/Streaming/Channels/101")
+    while True:
+        sock, _ = listener.accept()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        RtspSession(sock, source).start()
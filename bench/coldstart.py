@@ -0,0 +1,175 @@
+"""
+Cold-start benchmark for the camera and ROS drivers.
+
+For every driver it runs the module once under `python -X importtime` and
+reports the total import time and the slowest top-level imports, then starts
+the driver --runs times and measures how long it takes until the listener
+accepts a TCP connection and until GET /readyz answers 200 (heavy
+dependencies loaded). The accept time is checked against --target-ms:
+
+    python -m bench.coldstart --runs 5
+    python -m bench.coldstart --drivers hikvision-opencv --top 15
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from .common import percentile, write_report
+from .proxybench import REPO_ROOT, stop
+
+DRIVER_DIR = os.path.join(REPO_ROOT, "iot_driver_copilot")
+
+# name -> (driver path, extra environment); {port} is substituted at launch
+DRIVERS = {
+    "hikvision-opencv": (
+        os.path.join(DRIVER_DIR, "Hikvision IP camera", "driver.py"),
+        {"DEVICE_IP": "127.0.0.1", "SERVER_HOST": "127.0.0.1", "SERVER_PORT": "{port}"},
+    ),
+    "ros-car": (
+        os.path.join(DRIVER_DIR, "ROS Car", "driver.py"),
+        {"HTTP_SERVER_HOST": "127.0.0.1", "HTTP_SERVER_PORT": "{port}"},
+    ),
+    "roslibpy": (
+        os.path.join(DRIVER_DIR, "roslibpy Publisher", "driver.py"),
+        {"HTTP_SERVER_HOST": "127.0.0.1", "HTTP_SERVER_PORT": "{port}"},
+    ),
+}
+
+TARGET_MS = 200.0
+
+# Imports the module without running its __main__ block
+IMPORT_SNIPPET = "import runpy, sys; runpy.run_path(sys.argv[1], run_name='coldstart')"
+
+
+def import_profile(path, top=10):
+    """
+    Total and slowest top-level imports of a driver module, from -X importtime.
+    Each stderr line is "import time: self [us] | cumulative | name", nested
+    imports are indented by two spaces per level.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SNIPPET, path],
+        cwd=os.path.dirname(path), capture_output=True, text=True, timeout=120,
+    )
+    packages = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if name.startswith("   "):
+            continue  # nested, already counted in its parent's cumulative time
+        packages.append((name.strip(), int(cumulative_us), int(self_us)))
+    packages.sort(key=lambda item: item[1], reverse=True)
+    errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+    return {
+        "total_ms": round(sum(cumulative for _, cumulative, _ in packages) / 1000.0, 1),
+        "top": [{"module": name, "cumulative_ms": round(cumulative / 1000.0, 1), "self_ms": round(own / 1000.0, 1)}
+                for name, cumulative, own in packages[:top]],
+        "error": errors[-1] if result.returncode != 0 and errors else None,
+    }
+
+
+def wait_accept(port, proc, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and proc.poll() is None:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.002)
+    return False
+
+
+def wait_ready(port, proc, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and proc.poll() is None:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except urllib.error.HTTPError as e:
+            if json.loads(e.read() or b"{}").get("state") == "failed":
+                return False
+        except (urllib.error.URLError, OSError, ValueError):
+            pass
+        time.sleep(0.01)
+    return False
+
+
+def time_to_listen(path, env_overrides, port, timeout):
+    env = dict(os.environ)
+    for name, value in env_overrides.items():
+        env[name] = value.format(port=port)
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, path], env=env, cwd=os.path.dirname(path),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_accept(port, proc, timeout):
+            return None, None
+        accept_ms = (time.perf_counter() - started) * 1000.0
+        ready_ms = None
+        if wait_ready(port, proc, timeout):
+            ready_ms = (time.perf_counter() - started) * 1000.0
+        return accept_ms, ready_ms
+    finally:
+        stop(proc)
+
+
+def bench_driver(name, args):
+    path, env = DRIVERS[name]
+    profile = import_profile(path, args.top)
+    accepts = []
+    readies = []
+    for _ in range(args.runs):
+        accept_ms, ready_ms = time_to_listen(path, env, args.port, args.timeout)
+        if accept_ms is not None:
+            accepts.append(accept_ms)
+        if ready_ms is not None:
+            readies.append(ready_ms)
+    accept_p50 = percentile(accepts, 50)
+    result = {
+        "imports": profile,
+        "runs": args.runs,
+        "failed_runs": args.runs - len(accepts),
+        "accept_ms_p50": round(accept_p50, 1) if accept_p50 is not None else None,
+        "accept_ms_max": round(max(accepts), 1) if accepts else None,
+        "ready_ms_p50": round(percentile(readies, 50), 1) if readies else None,
+        "within_target": accept_p50 is not None and accept_p50 <= args.target_ms,
+    }
+    print(f"{name}: imports {profile['total_ms']} ms, accept p50 {result['accept_ms_p50']} ms, "
+          f"ready p50 {result['ready_ms_p50']} ms", file=sys.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Driver cold-start benchmark")
+    parser.add_argument("--drivers", default=",".join(DRIVERS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to report")
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for accept and for /readyz")
+    parser.add_argument("--target-ms", type=float, default=TARGET_MS, help="time to first accepted connection")
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+
+    results = {name: bench_driver(name, args) for name in args.drivers.split(",")}
+    write_report({
+        "config": {
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "runs": args.runs,
+            "target_ms": args.target_ms,
+        },
+        "results": results,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import json
+import os
+import resource
+import threading
+import time
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def read_proc(pid):
+    """
+    Return (cpu_seconds, rss_bytes) for a process from /proc, including its
+    reaped children so pre-forked worker pools are accounted for.
+    """
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime, stime, cutime, cstime are fields 14-17 (1-based); index from after the comm field
+    cpu = sum(int(v) for v in fields[11:15]) / CLOCK_TICKS
+    rss = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1]) * 1024
+                break
+    return cpu, rss
+
+
+def process_tree(pid):
+    """Return pid plus all live descendants, so multi-worker servers are measured as a whole."""
+    pids = [pid]
+    index = 0
+    while index < len(pids):
+        current = pids[index]
+        index += 1
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+class ProcSampler:
+    """
+    Samples CPU and RSS of a server process tree once per interval in a background thread.
+    """
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _total(self):
+        cpu = 0.0
+        rss = 0
+        for pid in process_tree(self.pid):
+            try:
+                c, r = read_proc(pid)
+            except OSError:
+                continue
+            cpu += c
+            rss += r
+        return cpu, rss
+
+    def start(self):
+        if self.pid:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def _run(self):
+        last_cpu, _ = self._total()
+        last_at = time.monotonic()
+        while not self.stop_event.wait(self.interval):
+            cpu, rss = self._total()
+            now = time.monotonic()
+            self.samples.append(((cpu - last_cpu) / (now - last_at) * 100.0, rss))
+            last_cpu, last_at = cpu, now
+
+    def report(self):
+        if not self.samples:
+            return None
+        cpu = [c for c, _ in self.samples]
+        rss = [r for _, r in self.samples]
+        return {
+            "cpu_percent_avg": sum(cpu) / len(cpu),
+            "cpu_percent_max": max(cpu),
+            "rss_mb_max": max(rss) / (1024 * 1024),
+            "rss_mb_last": rss[-1] / (1024 * 1024),
+        }
+
+
+def raise_fd_limit():
+    """Lift the soft open-file limit to the hard limit for many-connection tests."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard and hard != resource.RLIM_INFINITY:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def write_report(report, path=None):
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    print(text)
@@ -0,0 +1,125 @@
+"""
+Fake serial GPS receiver on a pseudo-terminal.
+
+Opens a pty pair and writes a realistic NMEA 0183 stream to the master side at
+--rate epochs per second: each epoch is GGA, GLL, GSA, three GSV, RMC and VTG,
+like a u-blox receiver's default output, along a slow circular track. The
+slave path (printed, and optionally symlinked to --link) behaves like
+/dev/ttyACM0 for the USB GPS driver:
+
+    python -m bench.fakegps --rate 10 --link /tmp/ttyGPS
+    SERIAL_PORT=/tmp/ttyGPS python "iot_driver_copilot/USB GPS Device/driver.py"
+
+--garbage adds that fraction of corrupted sentences (bad checksums and
+truncated lines) to exercise the parser's error path.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+import tty
+from datetime import datetime, timezone
+
+# Centre of the simulated track
+ORIGIN_LAT = 37.7749
+ORIGIN_LON = -122.4194
+TRACK_RADIUS_DEG = 0.001
+
+
+def checksum(body):
+    value = 0
+    for byte in body.encode():
+        value ^= byte
+    return f"{value:02X}"
+
+
+def sentence(body):
+    return f"${body}*{checksum(body)}\r\n".encode()
+
+
+def nmea_coord(value, positive, negative, degree_digits):
+    hemisphere = positive if value >= 0 else negative
+    value = abs(value)
+    degrees = int(value)
+    minutes = (value - degrees) * 60.0
+    return f"{degrees:0{degree_digits}d}{minutes:07.4f}", hemisphere
+
+
+def epoch_sentences(when, lat, lon, speed_knots=5.4, course=87.3, altitude=12.5):
+    """One receiver epoch: the sentences a receiver emits for one position solution."""
+    hhmmss = when.strftime("%H%M%S") + f".{when.microsecond // 10000:02d}"
+    ddmmyy = when.strftime("%d%m%y")
+    lat_s, ns = nmea_coord(lat, "N", "S", 2)
+    lon_s, ew = nmea_coord(lon, "E", "W", 3)
+    sats = [(i + 1, 20 + 5 * i, 45 * i % 360, 30 + i) for i in range(10)]
+    gsv = []
+    for page in range(3):
+        chunk = sats[page * 4:page * 4 + 4]
+        fields = ",".join(f"{prn:02d},{elev:02d},{az:03d},{snr:02d}" for prn, elev, az, snr in chunk)
+        gsv.append(sentence(f"GPGSV,3,{page + 1},{len(sats):02d},{fields}"))
+    return [
+        sentence(f"GPGGA,{hhmmss},{lat_s},{ns},{lon_s},{ew},1,{len(sats):02d},0.9,{altitude:.1f},M,-25.0,M,,"),
+        sentence(f"GPGLL,{lat_s},{ns},{lon_s},{ew},{hhmmss},A,A"),
+        sentence("GPGSA,A,3," + ",".join(f"{prn:02d}" for prn, _, _, _ in sats) + ",,,1.6,0.9,1.3"),
+        *gsv,
+        sentence(f"GPRMC,{hhmmss},A,{lat_s},{ns},{lon_s},{ew},{speed_knots:.2f},{course:.1f},{ddmmyy},,,A"),
+        sentence(f"GPVTG,{course:.1f},T,,M,{speed_knots:.2f},N,{speed_knots * 1.852:.2f},K,A"),
+    ]
+
+
+def track_position(t):
+    angle = t / 60.0 * 2 * math.pi
+    return ORIGIN_LAT + TRACK_RADIUS_DEG * math.sin(angle), ORIGIN_LON + TRACK_RADIUS_DEG * math.cos(angle)
+
+
+def corrupt(data, rng):
+    if rng.random() < 0.5:
+        return data[:-5] + b"00\r\n"  # wrong checksum
+    return data[:rng.randrange(5, len(data) - 2)]  # line cut short, runs into the next one
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake serial GPS on a pty")
+    parser.add_argument("--rate", type=float, default=10.0, help="position epochs per second")
+    parser.add_argument("--link", default=None, help="symlink this path to the pty slave")
+    parser.add_argument("--garbage", type=float, default=0.0, help="fraction of sentences to corrupt")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+    slave_path = os.ttyname(slave)
+    if args.link:
+        if os.path.lexists(args.link):
+            os.unlink(args.link)
+        os.symlink(slave_path, args.link)
+    print(f"NMEA on {args.link or slave_path} ({slave_path}) at {args.rate:g} Hz", file=sys.stderr)
+
+    rng = random.Random(args.seed)
+    interval = 1.0 / args.rate
+    started = time.monotonic()
+    next_at = started
+    try:
+        while True:
+            lat, lon = track_position(time.monotonic() - started)
+            chunks = epoch_sentences(datetime.now(timezone.utc), lat, lon)
+            if args.garbage:
+                chunks = [corrupt(c, rng) if rng.random() < args.garbage else c for c in chunks]
+            try:
+                os.write(master, b"".join(chunks))
+            except BlockingIOError:
+                pass  # Nobody reading and the pty buffer is full; a real receiver drops output too
+            next_at += interval
+            time.sleep(max(0.0, next_at - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.link and os.path.islink(args.link):
+            os.unlink(args.link)
+
+
+if __name__ == "__main__":
+    main()
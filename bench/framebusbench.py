@@ -0,0 +1,95 @@
+"""
+Viewer capacity of the OpenCV Hikvision driver across HTTP worker processes.
+
+Starts the camsim RTSP source, then runs the driver at each --workers count
+(WORKERS=1 is the single-process driver; above that the capture process hands
+frames to the workers over the shared memory frame bus). At every count it
+POSTs /stream and attaches --viewers MJPEG readers for --duration seconds, and
+reports the frames per second each viewer received, the share of viewers that
+kept up with the capture rate, and the CPU of the driver's process tree:
+
+    python -m bench.framebusbench --workers 1,2,4 --viewers 200 --duration 15
+
+Viewer capacity scales with workers only while there are idle cores for them;
+run the load generator on other cores than the driver where possible. Needs
+ffmpeg on PATH for camsim and OpenCV for the driver.
+"""
+import argparse
+import asyncio
+import os
+import platform
+import sys
+
+from .common import ProcSampler, raise_fd_limit, write_report
+from .motionbench import activate, run_viewers
+from .proxybench import REPO_ROOT, launch, stop
+
+DRIVER = os.path.join(REPO_ROOT, "iot_driver_copilot", "Hikvision IP camera", "driver.py")
+
+
+def bench_workers(args, workers):
+    env = {"DEVICE_IP": "127.0.0.1", "RTSP_PORT": "{backend_port}", "SERVER_HOST": "127.0.0.1",
+           "SERVER_PORT": "{port}", "WORKERS": str(workers)}
+    proc = launch([sys.executable, DRIVER], env, args.port, args.rtsp_port)
+    try:
+        activate(args.port)
+        sampler = ProcSampler(proc.pid, interval=0.5).start()
+        totals = asyncio.run(run_viewers(args.port, "/stream", args.viewers, args.duration))
+        sampler.stop()
+    finally:
+        stop(proc)
+    fps = sorted(frames / args.duration for _, frames in totals)
+    return {
+        "workers": workers,
+        "viewers": args.viewers,
+        "driver": sampler.report(),
+        "fps_per_viewer_avg": sum(fps) / len(fps),
+        "fps_per_viewer_min": fps[0],
+        # Viewers that got at least 90% of the frames the camera produced
+        "viewers_keeping_up": sum(1 for f in fps if f >= 0.9 * args.fps),
+        "mb_per_s_total": sum(size for size, _ in totals) / args.duration / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame bus worker scaling benchmark")
+    parser.add_argument("--workers", default="1,2,4", type=lambda s: [int(v) for v in s.split(",") if v])
+    parser.add_argument("--viewers", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--rtsp-port", type=int, default=18554)
+    parser.add_argument("--port", type=int, default=8330)
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+    raise_fd_limit()
+
+    camsim = launch([sys.executable, "-m", "bench.camsim", "rtsp", "--host", "127.0.0.1", "--rtsp-port", "{port}",
+                     "--fps", str(args.fps), "--width", str(args.width), "--height", str(args.height)],
+                    {}, args.rtsp_port, args.rtsp_port)
+    results = []
+    try:
+        for workers in args.workers:
+            result = bench_workers(args, workers)
+            results.append(result)
+            print(f"workers={workers:<2} viewers={args.viewers:<4} cpu={result['driver']['cpu_percent_avg']:6.1f}%  "
+                  f"fps/viewer avg={result['fps_per_viewer_avg']:5.1f} min={result['fps_per_viewer_min']:5.1f}  "
+                  f"keeping up={result['viewers_keeping_up']}  {result['mb_per_s_total']:.1f} MB/s", file=sys.stderr)
+    finally:
+        stop(camsim)
+
+    write_report({
+        "config": {
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "fps": args.fps,
+            "resolution": f"{args.width}x{args.height}",
+            "duration_s": args.duration,
+        },
+        "results": results,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main()
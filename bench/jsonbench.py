@@ -0,0 +1,152 @@
+"""
+JSON serialization benchmark on a realistic 1 MB chat history.
+
+Part one times every installed codec (stdlib json, orjson, msgspec) decoding
+and encoding the history to bytes, the way the drivers' json_loads/json_dumps
+layer uses them. With --endpoints it also starts the stub backend with
+1 MB pages and drives each proxy implementation's endpoints one at a time,
+reporting req/s, latency, throughput and proxy CPU per endpoint:
+
+    python -m bench.jsonbench --iterations 50
+    python -m bench.jsonbench --endpoints --implementations flask,fastapi,aiohttp --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+
+from .common import ProcSampler, summarize, write_report
+from .proxybench import IMPLEMENTATIONS, launch, login, run_level, stop
+from .stub_backend import make_message
+
+HISTORY_BYTES = 1024 * 1024
+
+
+def chat_history(target_bytes=HISTORY_BYTES):
+    messages = []
+    size = 0
+    while size < target_bytes:
+        message = make_message(len(messages))
+        messages.append(message)
+        size += len(json.dumps(message, ensure_ascii=False).encode()) + 1
+    return {"items": messages, "next_cursor": None}
+
+
+def codecs():
+    """name -> (loads, dumps-to-bytes) for every codec importable here."""
+    available = {
+        "json": (json.loads, lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()),
+    }
+    try:
+        import orjson
+        available["orjson"] = (orjson.loads, lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS))
+    except ImportError:
+        pass
+    try:
+        import msgspec
+        available["msgspec"] = (msgspec.json.Decoder().decode, msgspec.json.Encoder().encode)
+    except ImportError:
+        pass
+    return available
+
+
+def time_call(fn, arg, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return summarize(samples)
+
+
+def bench_codecs(history, iterations):
+    payload = json.dumps(history, ensure_ascii=False).encode()
+    results = {}
+    for name, (loads, dumps) in codecs().items():
+        loads(payload)
+        dumps(history)
+        results[name] = {
+            "loads_ms": time_call(loads, payload, iterations),
+            "dumps_ms": time_call(dumps, history, iterations),
+            "encoded_bytes": len(dumps(history)),
+        }
+        mb = len(payload) / (1024 * 1024)
+        print(f"{name:>8}  loads p50={results[name]['loads_ms']['p50']:.2f}ms "
+              f"({mb / (results[name]['loads_ms']['p50'] / 1000.0):.0f} MB/s)  "
+              f"dumps p50={results[name]['dumps_ms']['p50']:.2f}ms", file=sys.stderr)
+    return {"payload_bytes": len(payload), "messages": len(history["items"]), "codecs": results}
+
+
+def endpoint_mix(history):
+    # (label, method, path, json body): reads return a 1 MB page, writes send the history as a bulk body
+    return [
+        ("GET /chats/{id}/messages", "GET", "/chats/42/messages", None),
+        ("GET /posts", "GET", "/posts", None),
+        ("GET /search", "GET", "/search?q=bench", None),
+        ("GET /schedules", "GET", "/schedules", None),
+        ("POST /chats/{id}/messages", "POST", "/chats/42/messages", {"messages": history["items"]}),
+        ("POST /posts", "POST", "/posts", {"title": "import", "body": history["items"]}),
+    ]
+
+
+def bench_endpoints(args, history):
+    backend = launch(
+        [sys.executable, "-m", "bench.stub_backend", "--port", "{backend_port}",
+         "--payload-bytes", str(HISTORY_BYTES)],
+        {}, args.backend_port, args.backend_port,
+    )
+    results = {}
+    try:
+        for name in args.implementations.split(","):
+            command, env = IMPLEMENTATIONS[name]
+            proc = launch(command, env, args.port, args.backend_port)
+            results[name] = {}
+            try:
+                token = asyncio.run(login(args.port))
+                for label, method, path, body in endpoint_mix(history):
+                    sampler = ProcSampler(proc.pid, interval=0.25).start()
+                    level = asyncio.run(run_level(args.port, token, args.concurrency, args.warmup, args.duration,
+                                                  args.seed, mix=[(method, path, body, 1)]))
+                    sampler.stop()
+                    level["server"] = sampler.report()
+                    results[name][label] = level
+                    print(f"{name:>8} {label:<28} {level['rps']:>8.1f} req/s  "
+                          f"p50={level['p50_ms'] or 0:.1f}ms p99={level['p99_ms'] or 0:.1f}ms "
+                          f"errors={level['errors']}", file=sys.stderr)
+            finally:
+                stop(proc)
+    finally:
+        stop(backend)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON codec and per-endpoint serialization benchmark")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--endpoints", action="store_true", help="also benchmark every proxy endpoint end to end")
+    parser.add_argument("--implementations", default=",".join(IMPLEMENTATIONS))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--backend-port", type=int, default=9000)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+
+    history = chat_history()
+    report = {
+        "config": {"python": platform.python_version(), "cpus": os.cpu_count(), "iterations": args.iterations},
+        "codecs": bench_codecs(history, args.iterations),
+    }
+    if args.endpoints:
+        report["config"].update(concurrency=args.concurrency, duration_s=args.duration, warmup_s=args.warmup)
+        report["endpoints"] = bench_endpoints(args, history)
+    write_report(report, args.json)
+
+
+if __name__ == "__main__":
+    main()
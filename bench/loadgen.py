@@ -0,0 +1,165 @@
+"""
+Viewer load generator for the MJPEG endpoints of the video drivers.
+
+Opens N concurrent viewers against a stream URL (LLP /stream, Hikvision /feed
+or /stream, ROS Car /cam), counts delivered frames, reads the camsim timestamp
+stripe for glass-to-glass latency and samples the server's CPU/RSS.
+
+    python -m bench.loadgen http://127.0.0.1:8080/cam -n 50 --duration 30 --server-pid 1234
+"""
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from .common import ProcSampler, summarize, write_report
+
+try:
+    from .camsim.frames import latency_ms, read_jpeg_stamp
+except ImportError:
+    # cv2/numpy missing: frame rates and server load are still measured
+    read_jpeg_stamp = None
+
+
+class Viewer:
+    def __init__(self, index, measure_latency):
+        self.index = index
+        self.measure_latency = measure_latency
+        self.frames = 0
+        self.bytes = 0
+        self.first_frame_s = None
+        self.latencies = []
+        self.error = None
+
+
+def split_jpegs(buf):
+    frames = []
+    while True:
+        start = buf.find(b"\xff\xd8")
+        if start < 0:
+            del buf[:max(0, len(buf) - 1)]
+            return frames
+        end = buf.find(b"\xff\xd9", start + 2)
+        if end < 0:
+            if start:
+                del buf[:start]
+            return frames
+        frames.append(bytes(buf[start:end + 2]))
+        del buf[:end + 2]
+
+
+async def open_stream(url, method="GET"):
+    parts = urlsplit(url)
+    port = parts.port or 80
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    reader, writer = await asyncio.open_connection(parts.hostname, port)
+    # HTTP/1.0 keeps servers from switching to chunked transfer encoding
+    writer.write(
+        f"{method} {path} HTTP/1.0\r\nHost: {parts.hostname}:{port}\r\n"
+        "Content-Length: 0\r\nConnection: close\r\n\r\n".encode()
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass
+    status = int(status_line.split()[1]) if status_line else 0
+    return status, reader, writer
+
+
+async def run_viewer(viewer, url, deadline, started):
+    try:
+        status, reader, writer = await open_stream(url)
+    except OSError as e:
+        viewer.error = str(e)
+        return
+    if status != 200:
+        viewer.error = f"HTTP {status}"
+        writer.close()
+        return
+    buf = bytearray()
+    try:
+        while time.monotonic() < deadline:
+            try:
+                chunk = await asyncio.wait_for(reader.read(65536), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                viewer.error = "server closed stream"
+                break
+            viewer.bytes += len(chunk)
+            buf += chunk
+            for jpeg in split_jpegs(buf):
+                viewer.frames += 1
+                if viewer.first_frame_s is None:
+                    viewer.first_frame_s = time.monotonic() - started
+                if viewer.measure_latency:
+                    stamp = read_jpeg_stamp(jpeg)
+                    if stamp is not None:
+                        viewer.latencies.append(latency_ms(stamp))
+    finally:
+        writer.close()
+
+
+async def activate(url):
+    status, _, writer = await open_stream(url, method="POST")
+    writer.close()
+    return status
+
+
+async def run(args):
+    if args.activate:
+        await activate(args.activate)
+        await asyncio.sleep(1.0)
+    measure = read_jpeg_stamp is not None
+    viewers = [Viewer(i, measure and i < args.latency_viewers) for i in range(args.viewers)]
+    sampler = ProcSampler(args.server_pid).start()
+    started = time.monotonic()
+    tasks = []
+    for viewer in viewers:
+        deadline = started + args.ramp + args.duration
+        tasks.append(asyncio.create_task(run_viewer(viewer, args.url, deadline, started)))
+        if args.ramp:
+            await asyncio.sleep(args.ramp / args.viewers)
+    await asyncio.gather(*tasks)
+    sampler.stop()
+
+    window = args.duration + args.ramp
+    fps = [v.frames / window for v in viewers]
+    latencies = [ms for v in viewers for ms in v.latencies]
+    return {
+        "url": args.url,
+        "viewers": args.viewers,
+        "duration_s": args.duration,
+        "viewers_failed": sum(1 for v in viewers if v.error and not v.frames),
+        "errors": sorted({v.error for v in viewers if v.error}),
+        "delivered_fps": {
+            "total": sum(fps),
+            "per_viewer_mean": sum(fps) / len(fps) if fps else 0,
+            "per_viewer_min": min(fps) if fps else 0,
+        },
+        "mbit_per_s_total": sum(v.bytes for v in viewers) * 8 / window / 1e6,
+        "time_to_first_frame_s": summarize([v.first_frame_s for v in viewers if v.first_frame_s is not None]),
+        "glass_to_glass_ms": summarize(latencies) if measure else None,
+        "server": sampler.report(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MJPEG viewer load generator")
+    parser.add_argument("url")
+    parser.add_argument("-n", "--viewers", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which viewers are opened")
+    parser.add_argument("--activate", default=None, help="POST this URL first (OpenCV Hikvision /stream)")
+    parser.add_argument("--server-pid", type=int, default=None)
+    parser.add_argument("--latency-viewers", type=int, default=2,
+                        help="viewers that decode frames for latency (decoding is costly)")
+    parser.add_argument("--json", default=None, help="also write the report to this file")
+    args = parser.parse_args()
+    write_report(asyncio.run(run(args)), args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Server-side /mosaic grid vs one MJPEG connection per camera for a video wall.
+
+Starts camsim (RTSP and its Dahua-style MJPEG CGI), then the OpenCV Hikvision
+driver with --tiles - 1 MOSAIC_CAMERAS entries pointing at camsim's MJPEG
+stream, plus its own "local" capture. It first reads one camera's /stream to
+get what a wall pays per tile when it opens a connection per camera. Then, for
+each --clients count, it attaches that many wall clients to the same
+/mosaic?layout=...&fps=... grid for --duration seconds and reports the driver's
+CPU, the grids encoded per second (from /metrics), and the frames and bytes
+each client received per second:
+
+    python -m bench.mosaicbench --tiles 16 --layout 4x4 --fps 5 --clients 1,10,50 --duration 15
+
+Needs ffmpeg on PATH for camsim and OpenCV and numpy for the driver.
+"""
+import argparse
+import asyncio
+import os
+import platform
+import re
+import sys
+import urllib.request
+
+from .common import ProcSampler, raise_fd_limit, write_report
+from .motionbench import activate, run_viewers
+from .proxybench import REPO_ROOT, launch, stop
+
+DRIVER = os.path.join(REPO_ROOT, "iot_driver_copilot", "Hikvision IP camera", "driver.py")
+
+
+def mosaic_frames(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=10) as response:
+        text = response.read().decode()
+    match = re.search(r'^driver_frames_total\{stage="mosaic"\} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def per_client(totals, duration):
+    return {
+        "fps_per_client": sum(frames for _, frames in totals) / len(totals) / duration,
+        "bytes_per_s_per_client": sum(size for size, _ in totals) / len(totals) / duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-camera mosaic benchmark")
+    parser.add_argument("--tiles", type=int, default=16, help="cameras in the grid, including the local one")
+    parser.add_argument("--layout", default="4x4")
+    parser.add_argument("--fps", type=float, default=5.0, help="mosaic updates a second")
+    parser.add_argument("--clients", default="1,10,50", type=lambda s: [int(v) for v in s.split(",") if v])
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--camera-fps", type=int, default=15)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--rtsp-port", type=int, default=18554)
+    parser.add_argument("--rosbridge-port", type=int, default=19090)
+    parser.add_argument("--http-port", type=int, default=18081)
+    parser.add_argument("--port", type=int, default=8340)
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+    raise_fd_limit()
+
+    camsim = launch([sys.executable, "-m", "bench.camsim", "all", "--host", "127.0.0.1", "--scene", "moving",
+                     "--rtsp-port", str(args.rtsp_port), "--rosbridge-port", str(args.rosbridge_port),
+                     "--http-port", "{port}", "--fps", str(args.camera_fps),
+                     "--width", str(args.width), "--height", str(args.height)],
+                    {}, args.http_port, args.http_port)
+    cameras = ["local"] + [f"cam{i}" for i in range(1, args.tiles)]
+    remotes = ",".join(f"{name}=http://127.0.0.1:{args.http_port}/cgi-bin/mjpg/video.cgi" for name in cameras[1:])
+    env = {"DEVICE_IP": "127.0.0.1", "RTSP_PORT": "{backend_port}", "SERVER_HOST": "127.0.0.1",
+           "SERVER_PORT": "{port}", "MOSAIC_CAMERAS": remotes, "MOSAIC_MAX_FPS": str(args.fps)}
+    path = f"/mosaic?cameras={','.join(cameras)}&layout={args.layout}&fps={args.fps}"
+    results = []
+    try:
+        proc = launch([sys.executable, DRIVER], env, args.port, args.rtsp_port)
+        try:
+            activate(args.port)
+            # What a wall opening one /stream per camera receives for each tile
+            single = per_client(asyncio.run(run_viewers(args.port, "/stream", 1, args.duration)), args.duration)
+            for count in args.clients:
+                before = mosaic_frames(args.port)
+                sampler = ProcSampler(proc.pid, interval=0.5).start()
+                totals = asyncio.run(run_viewers(args.port, path, count, args.duration))
+                sampler.stop()
+                result = dict(per_client(totals, args.duration), clients=count, driver=sampler.report(),
+                              grids_encoded_per_s=(mosaic_frames(args.port) - before) / args.duration)
+                results.append(result)
+                print(f"clients={count:<4} cpu={result['driver']['cpu_percent_avg']:6.1f}%  "
+                      f"encoded={result['grids_encoded_per_s']:4.1f}/s  {result['fps_per_client']:4.1f} fps  "
+                      f"{result['bytes_per_s_per_client'] / 1e3:7.1f} kB/s per client", file=sys.stderr)
+        finally:
+            stop(proc)
+    finally:
+        stop(camsim)
+
+    write_report({
+        "config": {
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "tiles": args.tiles,
+            "layout": args.layout,
+            "mosaic_fps": args.fps,
+            "camera_fps": args.camera_fps,
+            "resolution": f"{args.width}x{args.height}",
+            "duration_s": args.duration,
+        },
+        # A wall with one connection per camera: tiles connections, each carrying one of these
+        "per_camera_stream": dict(single, connections_per_wall=args.tiles,
+                                  bytes_per_s_per_wall=single["bytes_per_s_per_client"] * args.tiles),
+        "mosaic": results,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Motion gate savings on the ROS Car /cam and OpenCV Hikvision /stream endpoints.
+
+For each --scenes entry it starts camsim (RTSP and rosbridge) with that scene,
+then runs each driver with MOTION_GATE=false and =true and attaches --viewers
+MJPEG readers for --duration seconds. Per run it reports the driver's CPU, the
+frames and bytes each viewer received per second, and the suppression ratio
+from /metrics. "static" keeps everything still but sensor noise and a clock
+stripe that ticks once a second, "moving" slides a square across the frame:
+
+    python -m bench.motionbench --scenes static,moving --viewers 5 --duration 15
+
+Needs ffmpeg on PATH for camsim's RTSP source, OpenCV and numpy for the
+Hikvision driver and the gate, and aiohttp and websockets for the ROS Car driver.
+"""
+import argparse
+import asyncio
+import http.client
+import os
+import platform
+import re
+import sys
+import time
+import urllib.request
+
+from .common import ProcSampler, write_report
+from .proxybench import REPO_ROOT, launch, stop
+
+DRIVERS = {
+    "hikvision": {
+        "path": os.path.join(REPO_ROOT, "iot_driver_copilot", "Hikvision IP camera", "driver.py"),
+        "env": {"DEVICE_IP": "127.0.0.1", "RTSP_PORT": "{backend_port}", "SERVER_HOST": "127.0.0.1",
+                "SERVER_PORT": "{port}"},
+        "stream": "/stream",
+    },
+    "roscar": {
+        "path": os.path.join(REPO_ROOT, "iot_driver_copilot", "ROS Car", "driver.py"),
+        "env": {"ROSBRIDGE_WS_URL": "ws://127.0.0.1:{backend_port}", "HTTP_SERVER_HOST": "127.0.0.1",
+                "HTTP_SERVER_PORT": "{port}", "CONFIG_RELOAD": "false"},
+        "stream": "/cam",
+    },
+}
+PART_MARKER = b"Content-Type: image/jpeg"
+
+
+def activate(port):
+    # The Hikvision driver answers POST /stream without a Content-Length, so read the status line only
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        conn.request("POST", "/stream")
+        status = conn.getresponse().status
+    finally:
+        conn.close()
+    if status != 200:
+        raise RuntimeError(f"POST /stream answered {status}")
+
+
+def suppressed_ratio(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=10) as response:
+        text = response.read().decode()
+    match = re.search(r"^driver_motion_suppressed_ratio\{[^}]*\} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+async def viewer(port, path, deadline, totals):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+    tail = b""
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                data = await asyncio.wait_for(reader.read(65536), remaining)
+            except asyncio.TimeoutError:
+                return
+            if not data:
+                return
+            totals[0] += len(data)
+            # Keep the end of the last read so a marker split across two reads is still counted
+            window = tail + data
+            totals[1] += window.count(PART_MARKER) - tail.count(PART_MARKER)
+            tail = window[-len(PART_MARKER):]
+    finally:
+        writer.close()
+
+
+async def run_viewers(port, path, count, duration):
+    totals = [[0, 0] for _ in range(count)]
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(viewer(port, path, deadline, received) for received in totals))
+    return totals
+
+
+def bench_driver(args, name, gate):
+    spec = DRIVERS[name]
+    backend_port = args.rtsp_port if name == "hikvision" else args.rosbridge_port
+    env = dict(spec["env"], MOTION_GATE=gate, MOTION_THRESHOLD=str(args.threshold))
+    proc = launch([sys.executable, spec["path"]], env, args.port, backend_port)
+    try:
+        if name == "hikvision":
+            activate(args.port)
+        sampler = ProcSampler(proc.pid, interval=0.5).start()
+        totals = asyncio.run(run_viewers(args.port, spec["stream"], args.viewers, args.duration))
+        sampler.stop()
+        ratio = suppressed_ratio(args.port)
+    finally:
+        stop(proc)
+    return {
+        "motion_gate": gate == "true",
+        "driver": sampler.report(),
+        "fps_per_viewer": sum(frames for _, frames in totals) / len(totals) / args.duration,
+        "bytes_per_s_per_viewer": sum(size for size, _ in totals) / len(totals) / args.duration,
+        "suppressed_ratio": ratio,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Motion gate benchmark")
+    parser.add_argument("--scenes", default="static,moving", type=lambda s: [v for v in s.split(",") if v])
+    parser.add_argument("--drivers", default="hikvision,roscar", type=lambda s: [v for v in s.split(",") if v])
+    parser.add_argument("--viewers", type=int, default=5)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--threshold", type=float, default=0.002, help="drivers' MOTION_THRESHOLD")
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--rtsp-port", type=int, default=18554)
+    parser.add_argument("--rosbridge-port", type=int, default=19090)
+    parser.add_argument("--http-port", type=int, default=18081)
+    parser.add_argument("--port", type=int, default=8320)
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+
+    results = []
+    for scene in args.scenes:
+        camsim = launch([sys.executable, "-m", "bench.camsim", "all", "--host", "127.0.0.1", "--scene", scene,
+                         "--rtsp-port", str(args.rtsp_port), "--rosbridge-port", "{port}",
+                         "--http-port", str(args.http_port), "--fps", str(args.fps),
+                         "--width", str(args.width), "--height", str(args.height)],
+                        {}, args.rosbridge_port, args.rosbridge_port)
+        try:
+            for name in args.drivers:
+                for gate in ("false", "true"):
+                    result = dict(bench_driver(args, name, gate), scene=scene, endpoint=name)
+                    results.append(result)
+                    print(f"{scene:>7} {name:>9} gate={gate:<5} cpu={result['driver']['cpu_percent_avg']:6.1f}%  "
+                          f"{result['fps_per_viewer']:5.1f} fps  {result['bytes_per_s_per_viewer'] / 1e3:8.1f} kB/s "
+                          f"per viewer  suppressed={result['suppressed_ratio']}", file=sys.stderr)
+        finally:
+            stop(camsim)
+
+    write_report({
+        "config": {
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "fps": args.fps,
+            "resolution": f"{args.width}x{args.height}",
+            "viewers": args.viewers,
+            "duration_s": args.duration,
+            "threshold": args.threshold,
+        },
+        "results": results,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Local MQTT 3.1.1 broker stand-in for the Robot Dog MQTT driver.
+
+Handles CONNECT, PUBLISH (QoS 0/1/2 in, delivered at QoS 0), SUBSCRIBE with
+`+`/`#` wildcards, UNSUBSCRIBE, retained messages, PINGREQ and DISCONNECT;
+enough for paho/aiomqtt clients. It also plays the robot: every --state-hz it
+publishes retained state (battery, pose, mode) under --state-prefix, and it
+counts the commands published under every topic:
+
+    python -m bench.mqtt_sim --port 1883 --state-hz 10 --report 5
+
+The packet helpers below are reused by bench.mqttbench's subscriber.
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from collections import defaultdict
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def encode_length(length):
+    out = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        out.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(out)
+
+
+def encode_str(value):
+    data = value.encode() if isinstance(value, str) else value
+    return len(data).to_bytes(2, "big") + data
+
+
+def packet(kind, flags, body=b""):
+    return bytes([kind << 4 | flags]) + encode_length(len(body)) + body
+
+
+def publish_packet(topic, payload, retain=False):
+    return packet(PUBLISH, 1 if retain else 0, encode_str(topic) + payload)
+
+
+async def read_packet(reader):
+    """(type, flags, body) of the next control packet."""
+    first = (await reader.readexactly(1))[0]
+    length = 0
+    multiplier = 1
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+    return first >> 4, first & 0x0F, await reader.readexactly(length)
+
+
+def parse_publish(flags, body):
+    """(topic, payload, qos, packet id or None) of a PUBLISH body."""
+    size = int.from_bytes(body[:2], "big")
+    topic = body[2:2 + size].decode()
+    qos = (flags >> 1) & 0x03
+    offset = 2 + size
+    packet_id = None
+    if qos:
+        packet_id = body[offset:offset + 2]
+        offset += 2
+    return topic, body[offset:], qos, packet_id
+
+
+def topic_matches(pattern, topic):
+    pattern_levels = pattern.split("/")
+    levels = topic.split("/")
+    for index, level in enumerate(pattern_levels):
+        if level == "#":
+            return True
+        if index >= len(levels) or (level != "+" and level != levels[index]):
+            return False
+    return len(levels) == len(pattern_levels)
+
+
+async def client_connect(reader, writer, client_id, keepalive=60):
+    """CONNECT as a clean-session MQTT 3.1.1 client and wait for CONNACK."""
+    variable = encode_str("MQTT") + bytes([4, 0x02]) + keepalive.to_bytes(2, "big")
+    writer.write(packet(CONNECT, 0, variable + encode_str(client_id)))
+    kind, _, body = await read_packet(reader)
+    if kind != CONNACK or body[1] != 0:
+        raise ConnectionError(f"broker refused the connection: {body!r}")
+
+
+def subscribe_packet(packet_id, topics):
+    body = packet_id.to_bytes(2, "big") + b"".join(encode_str(t) + b"\x00" for t in topics)
+    return packet(SUBSCRIBE, 0x02, body)
+
+
+class Broker:
+    def __init__(self):
+        self.subscriptions = {}  # writer -> set of filters
+        self.retained = {}
+        self.published = defaultdict(int)
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            kind, _, body = await read_packet(reader)
+            if kind != CONNECT or body[6] != 4:
+                writer.write(packet(CONNACK, 0, b"\x00\x01"))  # unacceptable protocol version
+                return
+            writer.write(packet(CONNACK, 0, b"\x00\x00"))
+            self.subscriptions[writer] = set()
+            while True:
+                kind, flags, body = await read_packet(reader)
+                if kind == PUBLISH:
+                    topic, payload, qos, packet_id = parse_publish(flags, body)
+                    if qos == 1:
+                        writer.write(packet(PUBACK, 0, packet_id))
+                    elif qos == 2:
+                        writer.write(packet(PUBREC, 0, packet_id))
+                    self.route(topic, payload, bool(flags & 0x01))
+                elif kind == PUBREL:
+                    writer.write(packet(PUBCOMP, 0, body[:2]))
+                elif kind == SUBSCRIBE:
+                    filters, granted, offset = [], bytearray(), 2
+                    while offset < len(body):
+                        size = int.from_bytes(body[offset:offset + 2], "big")
+                        filters.append(body[offset + 2:offset + 2 + size].decode())
+                        granted.append(0)
+                        offset += size + 3
+                    self.subscriptions[writer].update(filters)
+                    writer.write(packet(SUBACK, 0, body[:2] + bytes(granted)))
+                    for topic, payload in self.retained.items():
+                        if any(topic_matches(f, topic) for f in filters):
+                            writer.write(publish_packet(topic, payload, retain=True))
+                elif kind == UNSUBSCRIBE:
+                    offset = 2
+                    while offset < len(body):
+                        size = int.from_bytes(body[offset:offset + 2], "big")
+                        self.subscriptions[writer].discard(body[offset + 2:offset + 2 + size].decode())
+                        offset += size + 2
+                    writer.write(packet(UNSUBACK, 0, body[:2]))
+                elif kind == PINGREQ:
+                    writer.write(packet(PINGRESP, 0))
+                elif kind == DISCONNECT:
+                    return
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, IndexError):
+            pass
+        finally:
+            self.subscriptions.pop(writer, None)
+            writer.close()
+
+    def route(self, topic, payload, retain=False):
+        self.published[topic] += 1
+        if retain:
+            self.retained[topic] = payload
+        data = publish_packet(topic, payload)
+        for writer, filters in list(self.subscriptions.items()):
+            if any(topic_matches(f, topic) for f in filters):
+                writer.write(data)
+
+
+async def play_robot(broker, prefix, hz):
+    """Publishes retained robot state like the device would."""
+    started = time.monotonic()
+    while True:
+        t = time.monotonic() - started
+        state = {
+            "battery": {"percent": round(100 - (t / 60.0) % 100, 1), "charging": False},
+            "pose": {"x": round(math.cos(t / 10), 3), "y": round(math.sin(t / 10), 3), "yaw": round(t / 10 % 6.283, 3)},
+            "mode": {"mode": "walk", "ts": time.time()},
+        }
+        for name, value in state.items():
+            broker.route(f"{prefix}/{name}", json.dumps(value).encode(), retain=True)
+        await asyncio.sleep(1.0 / hz)
+
+
+async def run(args):
+    broker = Broker()
+    server = await asyncio.start_server(broker.handle, args.host, args.port)
+    print(f"MQTT stand-in on {args.host}:{args.port}", file=sys.stderr)
+    if args.state_hz:
+        asyncio.create_task(play_robot(broker, args.state_prefix, args.state_hz))
+    async with server:
+        while True:
+            await asyncio.sleep(args.report or 3600)
+            if args.report:
+                print(json.dumps({"connections": broker.connections,
+                                  "published": dict(sorted(broker.published.items()))}), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT broker stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--state-prefix", default="robotdog/state")
+    parser.add_argument("--state-hz", type=float, default=10.0, help="0 disables the simulated robot state")
+    parser.add_argument("--report", type=float, default=5.0, help="seconds between per-topic counts")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
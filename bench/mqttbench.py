@@ -0,0 +1,165 @@
+"""
+Command-to-publish latency of the Robot Dog MQTT driver.
+
+Starts bench.mqtt_sim and the driver, then for each --rates level opens one /ws
+joystick per --channels entry. Each joystick sends numbered commands at that
+rate while a subscriber on the broker records when each one is published. Per
+level it reports commands/s in, publishes/s out, the share that was coalesced
+away, whether each channel's final command was published (latest-wins must
+never lose it), and latency from websocket send to broker delivery for the
+commands that went out. Sender and subscriber share one process and clock:
+
+    python -m bench.mqttbench --rates 5,50,200,1000 --channels velocity,body --publish-hz 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import urllib.request
+
+from . import wsproto
+from .common import ProcSampler, summarize, write_report
+from .mqtt_sim import PUBLISH, client_connect, parse_publish, read_packet, subscribe_packet
+from .proxybench import REPO_ROOT, launch, stop
+
+DRIVER = os.path.join(REPO_ROOT, "iot_driver_copilot", "Robot Dog MQTT Device", "driver.py")
+COMMAND_PREFIX = "robotdog/cmd"
+
+
+def wait_connected(port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as response:
+            if json.loads(response.read())["broker"]["connected"]:
+                return
+        time.sleep(0.1)
+    raise RuntimeError("driver did not connect to the broker")
+
+
+async def subscriber(broker_port, received, subscribed):
+    reader, writer = await asyncio.open_connection("127.0.0.1", broker_port)
+    await client_connect(reader, writer, "mqttbench", keepalive=0)
+    writer.write(subscribe_packet(1, [f"{COMMAND_PREFIX}/#"]))
+    await writer.drain()
+    subscribed.set()
+    try:
+        while True:
+            kind, flags, body = await read_packet(reader)
+            if kind == PUBLISH:
+                topic, payload, _, _ = parse_publish(flags, body)
+                received.append((topic.rsplit("/", 1)[-1], json.loads(payload)["seq"], time.monotonic()))
+    finally:
+        writer.close()
+
+
+async def discard(reader):
+    # State pushes from the driver; read so the socket never backs up
+    while True:
+        await wsproto.read_frame(reader)
+
+
+async def joystick(port, channel, rate, duration, sent):
+    reader, writer = await wsproto.connect("127.0.0.1", port, "/ws")
+    drain = asyncio.create_task(discard(reader))
+    interval = 1.0 / rate
+    next_at = time.monotonic()
+    deadline = next_at + duration
+    seq = 0
+    try:
+        while next_at < deadline:
+            seq += 1
+            message = {"channel": channel, "command": {"seq": seq, "vx": 0.4, "vy": 0.0, "wz": 0.1}}
+            sent[(channel, seq)] = time.monotonic()
+            writer.write(wsproto.encode_frame(wsproto.OP_TEXT, json.dumps(message), mask=True))
+            await writer.drain()
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+    finally:
+        drain.cancel()
+        writer.close()
+    return seq
+
+
+async def run_level(port, broker_port, channels, rate, duration):
+    received, sent, subscribed = [], {}, asyncio.Event()
+    listener = asyncio.create_task(subscriber(broker_port, received, subscribed))
+    await subscribed.wait()
+    started = time.monotonic()
+    last = await asyncio.gather(*(joystick(port, channel, rate, duration, sent) for channel in channels))
+    elapsed = time.monotonic() - started
+    await asyncio.sleep(0.5)  # let the final publish slots run out
+    listener.cancel()
+    delivered = {(channel, seq) for channel, seq, _ in received}
+    latencies = [(at - sent[(channel, seq)]) * 1000.0 for channel, seq, at in received if (channel, seq) in sent]
+    return {
+        "rate_hz_per_channel": rate,
+        "channels": len(channels),
+        "commands": len(sent),
+        "commands_per_s": len(sent) / elapsed,
+        "publishes": len(received),
+        "publishes_per_s": len(received) / elapsed,
+        "coalesced_percent": 100.0 * (1 - len(received) / len(sent)) if sent else 0.0,
+        "final_command_published": all((channel, seq) in delivered for channel, seq in zip(channels, last)),
+        "latency_ms": summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT command coalescing benchmark")
+    parser.add_argument("--rates", default="5,50,200,1000", type=lambda s: [float(r) for r in s.split(",") if r],
+                        help="commands per second per joystick")
+    parser.add_argument("--channels", default="velocity,body", type=lambda s: [c for c in s.split(",") if c])
+    parser.add_argument("--publish-hz", type=float, default=20.0, help="driver MQTT_COMMAND_RATE_HZ")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--broker-port", type=int, default=18830)
+    parser.add_argument("--port", type=int, default=8210)
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+
+    broker = launch([sys.executable, "-m", "bench.mqtt_sim", "--port", "{port}", "--state-hz", "10", "--report", "0"],
+                    {}, args.broker_port, args.broker_port)
+    levels = []
+    try:
+        driver = launch(
+            [sys.executable, DRIVER],
+            {"MQTT_BROKER_ADDRESS": "127.0.0.1:{backend_port}", "MQTT_COMMAND_RATE_HZ": str(args.publish_hz),
+             "MQTT_COMMAND_TOPIC_PREFIX": COMMAND_PREFIX, "MQTT_COALESCED_CHANNELS": ",".join(args.channels),
+             "HTTP_SERVER_HOST": "127.0.0.1", "HTTP_SERVER_PORT": "{port}"},
+            args.port, args.broker_port,
+        )
+        try:
+            wait_connected(args.port)
+            for rate in args.rates:
+                sampler = ProcSampler(driver.pid, interval=0.25).start()
+                result = asyncio.run(run_level(args.port, args.broker_port, args.channels, rate, args.duration))
+                sampler.stop()
+                result["driver"] = sampler.report()
+                levels.append(result)
+                print(f"{rate:>7g} Hz x{len(args.channels)}  in {result['commands_per_s']:>8.1f}/s  "
+                      f"out {result['publishes_per_s']:>6.1f}/s  p50={result['latency_ms']['p50'] or 0:.2f}ms "
+                      f"p99={result['latency_ms']['p99'] or 0:.2f}ms  final={result['final_command_published']}",
+                      file=sys.stderr)
+        finally:
+            stop(driver)
+    finally:
+        stop(broker)
+
+    write_report({
+        "config": {
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "channels": args.channels,
+            "publish_hz": args.publish_hz,
+            # Ceiling on publishes/s once joysticks outrun the publish rate
+            "expected_max_publishes_per_s": args.publish_hz * len(args.channels),
+            "duration_s": args.duration,
+        },
+        "results": levels,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Local NATS stand-in for the USB GPS driver.
+
+Speaks enough of the NATS client protocol for nats-py and the `nats` CLI:
+INFO/CONNECT, PING/PONG, PUB/HPUB, SUB/UNSUB and MSG delivery with `*` and `>`
+wildcards. It counts messages and bytes per subject and prints them every
+--report seconds. --outage-every drops every connection and refuses new ones
+for --outage-seconds, to exercise the publisher's reconnect and offline buffer:
+
+    python -m bench.nats_sim --port 4222 --report 5
+    python -m bench.nats_sim --outage-every 30 --outage-seconds 10
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import defaultdict
+
+
+def subject_matches(pattern, subject):
+    pattern_tokens = pattern.split(".")
+    tokens = subject.split(".")
+    for index, token in enumerate(pattern_tokens):
+        if token == ">":
+            return len(tokens) > index
+        if index >= len(tokens) or (token != "*" and token != tokens[index]):
+            return False
+    return len(tokens) == len(pattern_tokens)
+
+
+class NatsStandIn:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.clients = set()
+        self.subscriptions = {}  # (writer, sid) -> subject pattern
+        self.messages = defaultdict(int)
+        self.payload_bytes = defaultdict(int)
+        self.connections = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+
+    async def stop(self):
+        self.server.close()
+        for writer in list(self.clients):
+            writer.close()
+        await self.server.wait_closed()
+
+    def info(self):
+        return {"server_id": "bench-nats-sim", "server_name": "bench-nats-sim", "version": "2.10.0",
+                "proto": 1, "go": "go1.21", "host": self.host, "port": self.port,
+                "headers": True, "max_payload": 1024 * 1024}
+
+    async def handle(self, reader, writer):
+        self.clients.add(writer)
+        self.connections += 1
+        writer.write(b"INFO " + json.dumps(self.info()).encode() + b"\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                op, _, rest = line.rstrip(b"\r\n").partition(b" ")
+                op = op.upper()
+                if op == b"PING":
+                    writer.write(b"PONG\r\n")
+                elif op in (b"PUB", b"HPUB"):
+                    args = rest.split()
+                    size = int(args[-1])
+                    payload = await reader.readexactly(size + 2)
+                    self.publish(args, payload[:-2], op == b"HPUB")
+                elif op == b"SUB":
+                    args = rest.split()
+                    self.subscriptions[(writer, args[-1])] = args[0].decode()
+                elif op == b"UNSUB":
+                    self.subscriptions.pop((writer, rest.split()[0]), None)
+                # CONNECT and PONG need no answer with verbose off
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            for key in [key for key in self.subscriptions if key[0] is writer]:
+                del self.subscriptions[key]
+            writer.close()
+
+    def publish(self, args, payload, with_headers):
+        subject = args[0].decode()
+        reply = args[1] if len(args) == (4 if with_headers else 3) else None
+        self.messages[subject] += 1
+        self.payload_bytes[subject] += len(payload)
+        for (writer, sid), pattern in list(self.subscriptions.items()):
+            if not subject_matches(pattern, subject):
+                continue
+            head = [b"HMSG" if with_headers else b"MSG", args[0], sid]
+            if reply is not None:
+                head.append(reply)
+            head.extend(args[-2:] if with_headers else args[-1:])
+            writer.write(b" ".join(head) + b"\r\n" + payload + b"\r\n")
+
+    def report(self):
+        return {subject: {"messages": count, "payload_bytes": self.payload_bytes[subject]}
+                for subject, count in sorted(self.messages.items())}
+
+
+async def run(args):
+    nats = NatsStandIn(args.host, args.port)
+    await nats.start()
+    print(f"NATS stand-in on nats://{args.host}:{args.port}", file=sys.stderr)
+    next_report = time.monotonic() + args.report
+    next_outage = time.monotonic() + args.outage_every if args.outage_every else None
+    while True:
+        await asyncio.sleep(0.1)
+        now = time.monotonic()
+        if next_outage is not None and now >= next_outage:
+            print(f"outage: dropping {len(nats.clients)} connections for {args.outage_seconds:g}s", file=sys.stderr)
+            await nats.stop()
+            await asyncio.sleep(args.outage_seconds)
+            await nats.start()
+            next_outage = time.monotonic() + args.outage_every
+        if args.report and now >= next_report:
+            print(json.dumps({"connections": nats.connections, "subjects": nats.report()}), file=sys.stderr)
+            next_report = now + args.report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NATS protocol stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4222)
+    parser.add_argument("--report", type=float, default=5.0, help="seconds between per-subject counts")
+    parser.add_argument("--outage-every", type=float, default=0.0)
+    parser.add_argument("--outage-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+NMEA parse throughput of the USB GPS driver.
+
+Generates --seconds of receiver output at each --rates epoch rate (8 sentences
+per epoch, see bench.fakegps), feeds it to the driver's NmeaParser and
+FixAssembler in --chunk-bytes reads, and reports sentences/s, MB/s and the
+share of one core the parser needs to keep up with that receiver in real
+time. A naive parser that checksums and splits every sentence before
+filtering is timed on the same input for comparison. The driver module is
+loaded from its file, so its dependencies (aiohttp, nats-py) must be importable:
+
+    python -m bench.nmeabench --rates 1,10,20,50 --seconds 600
+"""
+import argparse
+import functools
+import importlib.util
+import operator
+import os
+import platform
+import time
+from datetime import datetime, timedelta, timezone
+
+from .common import write_report
+from .fakegps import ORIGIN_LAT, ORIGIN_LON, epoch_sentences
+from .proxybench import REPO_ROOT
+
+DRIVER = os.path.join(REPO_ROOT, "iot_driver_copilot", "USB GPS Device", "driver.py")
+
+
+def load_driver():
+    spec = importlib.util.spec_from_file_location("usb_gps_driver", DRIVER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def receiver_output(rate, seconds):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    epochs = int(rate * seconds)
+    return b"".join(
+        b"".join(epoch_sentences(start + timedelta(seconds=i / rate), ORIGIN_LAT + i * 1e-6, ORIGIN_LON))
+        for i in range(epochs)
+    ), epochs
+
+
+def time_naive(driver, data):
+    """
+    The straightforward parser on the same input: checksum and split every line,
+    then keep GGA/RMC and run the driver's own field parsers and assembler on them.
+    """
+    assembler = driver.FixAssembler()
+    parsers = {b"GGA": driver.parse_gga, b"RMC": driver.parse_rmc}
+    started = time.perf_counter()
+    for line in data.split(b"\n"):
+        line = line.strip()
+        if not line.startswith(b"$") or b"*" not in line:
+            continue
+        body, _, checksum = line[1:].partition(b"*")
+        if functools.reduce(operator.xor, body, 0) != int(checksum[:2], 16):
+            continue
+        fields = body.split(b",")
+        parse = parsers.get(fields[0][2:])
+        if parse is not None:
+            assembler.add(parse(fields[1:]))
+    return time.perf_counter() - started
+
+
+def time_driver(driver, data, chunk):
+    parser = driver.NmeaParser(["GGA", "RMC"])
+    assembler = driver.FixAssembler()
+    started = time.perf_counter()
+    for offset in range(0, len(data), chunk):
+        for _, fields in parser.feed(data[offset:offset + chunk]):
+            assembler.add(fields)
+    return time.perf_counter() - started, parser.kept + parser.skipped + parser.bad, assembler.fixes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NMEA parser throughput")
+    parser.add_argument("--rates", default="1,10,20,50", type=lambda s: [float(r) for r in s.split(",") if r])
+    parser.add_argument("--seconds", type=float, default=300.0, help="receiver time simulated per rate")
+    parser.add_argument("--chunk-bytes", type=int, default=256, help="bytes per serial read")
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+
+    driver = load_driver()
+    results = []
+    for rate in args.rates:
+        data, epochs = receiver_output(rate, args.seconds)
+        elapsed, sentences, fixes = time_driver(driver, data, args.chunk_bytes)
+        naive_elapsed = time_naive(driver, data)
+        results.append({
+            "rate_hz": rate,
+            "epochs": epochs,
+            "bytes": len(data),
+            "sentences": sentences,
+            "fixes": fixes,
+            "sentences_per_s": sentences / elapsed,
+            "mb_per_s": len(data) / elapsed / 1e6,
+            # Fraction of one core spent parsing while keeping up with the receiver in real time
+            "realtime_cpu_percent": elapsed / args.seconds * 100.0,
+            "naive_sentences_per_s": sentences / naive_elapsed,
+            "speedup_vs_naive": naive_elapsed / elapsed,
+        })
+    write_report({
+        "config": {
+            "python": platform.python_version(),
+            "seconds_per_rate": args.seconds,
+            "chunk_bytes": args.chunk_bytes,
+            "kept_types": ["GGA", "RMC"],
+        },
+        "results": results,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+OPC UA stand-in for the telemetry driver (iot_driver_copilot/OPC UA LED Light).
+
+Serves one variable per --nodes entry in namespace 1 (the defaults match the
+OPC UA LED Light manifest: ns=1;s=number and ns=1;s=light) and changes every
+value each --update-ms. It counts Read service calls and nodes read, so a
+benchmark can check that device load follows the telemetry schedule and not
+HTTP client polling. The counts are served as JSON on --stats-port:
+
+    python -m bench.opcua_sim --port 4840 --nodes number,light --stats-port 4841
+    curl localhost:4841/
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from asyncua import Server, ua
+
+
+class ReadCounter:
+    """Wraps the server's attribute service so every Read request is counted before it is served."""
+    def __init__(self, server):
+        self.reads = 0
+        self.nodes_read = 0
+        self.started = time.monotonic()
+        service = server.iserver.attribute_service
+        original = service.read
+
+        def counting_read(params):
+            self.reads += 1
+            self.nodes_read += len(params.NodesToRead)
+            return original(params)
+
+        service.read = counting_read
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "reads": self.reads,
+            "nodes_read": self.nodes_read,
+            "uptime_s": round(elapsed, 3),
+            "reads_per_s": round(self.reads / elapsed, 3) if elapsed else 0.0,
+        }
+
+
+async def serve_stats(counter, port):
+    async def handle(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = json.dumps(counter.report()).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", port)
+
+
+async def run(args):
+    server = Server()
+    await server.init()
+    server.set_endpoint(f"opc.tcp://{args.host}:{args.port}")
+    server.set_server_name("OPC UA LED Light stand-in")
+    objects = server.nodes.objects
+    variables = []
+    for index, name in enumerate(args.nodes):
+        variable = await objects.add_variable(ua.NodeId(name, 1), ua.QualifiedName(name, 1), float(index))
+        await variable.set_writable()
+        variables.append(variable)
+    counter = ReadCounter(server)
+    stats = await serve_stats(counter, args.stats_port) if args.stats_port else None
+    try:
+        async with server:
+            tick = 0
+            while True:
+                await asyncio.sleep(args.update_ms / 1000.0)
+                tick += 1
+                for index, variable in enumerate(variables):
+                    await variable.write_value(float(tick + index))
+    finally:
+        if stats is not None:
+            stats.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OPC UA device stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4840)
+    parser.add_argument("--nodes", default="number,light", type=lambda s: [n for n in s.split(",") if n],
+                        help="string node ids created as ns=1;s=<name>")
+    parser.add_argument("--update-ms", type=float, default=100.0)
+    parser.add_argument("--stats-port", type=int, default=0, help="serve read counts as JSON on this port")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
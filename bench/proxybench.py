@@ -0,0 +1,251 @@
+"""
+Benchmark the GoSchedule/ChatToChat/Bustub proxy implementations side by side.
+
+Starts the stub backend, then each proxy implementation against it, and drives
+a fixed, seeded request mix at increasing concurrency. Reports throughput,
+p50/p99 latency, error counts and the proxy's CPU/RSS for every level.
+
+    python -m bench.proxybench --concurrency 1,8,32,128 --duration 15 --latency-ms 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from .common import ProcSampler, percentile, write_report
+from .httpclient import HttpConnection
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOSCHEDULE_DIR = os.path.join(REPO_ROOT, "iot_driver_copilot", "GoSchedule, ChatToChat, Bustub")
+
+# name -> (command, extra environment); {port}/{backend_port} are substituted at launch
+IMPLEMENTATIONS = {
+    "flask": (
+        [sys.executable, os.path.join(REPO_ROOT, "driver.py")],
+        {"DEVICE_API_HOST": "127.0.0.1", "DEVICE_API_PORT": "{backend_port}",
+         "SERVER_HOST": "127.0.0.1", "SERVER_PORT": "{port}"},
+    ),
+    "fastapi": (
+        [sys.executable, "-m", "uvicorn", "driver:app", "--app-dir", os.path.join(REPO_ROOT, "iot_driver_copilot"),
+         "--host", "127.0.0.1", "--port", "{port}", "--log-level", "warning"],
+        {"DEVICE_HOST": "127.0.0.1", "DEVICE_PORT": "{backend_port}"},
+    ),
+    "aiohttp": (
+        [sys.executable, os.path.join(GOSCHEDULE_DIR, "driver.py")],
+        {"DEVICE_HOST": "127.0.0.1", "DEVICE_PORT": "{backend_port}",
+         "SERVER_HOST": "127.0.0.1", "SERVER_PORT": "{port}"},
+    ),
+}
+
+# (method, path, json body, weight): read-heavy mix typical of the dashboards
+REQUEST_MIX = [
+    ("GET", "/schedules", None, 3),
+    ("GET", "/posts?limit=100", None, 3),
+    ("GET", "/search?q=bench", None, 2),
+    ("GET", "/chats/42/messages", None, 3),
+    ("POST", "/posts", {"title": "bench", "body": "x" * 200}, 1),
+    ("POST", "/chats/42/messages", {"text": "hello from bench"}, 1),
+    ("POST", "/schedules", {"title": "standup", "start": "2024-01-01T09:00:00Z"}, 1),
+]
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def launch(command, env_overrides, port, backend_port):
+    env = dict(os.environ)
+    for name, value in env_overrides.items():
+        env[name] = value.format(port=port, backend_port=backend_port)
+    args = [part.format(port=port, backend_port=backend_port) for part in command]
+    proc = subprocess.Popen(args, env=env, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not wait_for_port(port):
+        proc.kill()
+        raise RuntimeError(f"{' '.join(args)} did not start listening on port {port}")
+    return proc
+
+
+def stop(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+async def login(port):
+    conn = HttpConnection("127.0.0.1", port)
+    try:
+        status, _, body = await conn.request(
+            "POST", "/session/login", {"Content-Type": "application/json"},
+            json.dumps({"username": "bench", "password": "bench"}).encode(),
+        )
+    finally:
+        conn.close()
+    if status != 200:
+        raise RuntimeError(f"login through proxy failed with HTTP {status}")
+    return json.loads(body)["token"]
+
+
+async def worker(index, port, token, seed, warmup_until, deadline, latencies, counters, mix=REQUEST_MIX):
+    rng = random.Random(seed * 1000 + index)
+    requests = [(m, p, json.dumps(b).encode() if b is not None else b"") for m, p, b, _ in mix]
+    weights = [w for _, _, _, w in mix]
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    conn = HttpConnection("127.0.0.1", port)
+    try:
+        while True:
+            method, path, body = rng.choices(requests, weights)[0]
+            started = time.monotonic()
+            if started >= deadline:
+                return
+            try:
+                status, _, _ = await conn.request(method, path, headers, body)
+                ok = status < 400
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                conn.close()
+                ok = False
+            finished = time.monotonic()
+            if started < warmup_until:
+                continue
+            if ok:
+                counters["ok"] += 1
+                latencies.append((finished - started) * 1000.0)
+            else:
+                counters["errors"] += 1
+    finally:
+        conn.close()
+
+
+async def drive(port, token, concurrency, warmup, duration, seed, first_worker=0, mix=REQUEST_MIX):
+    """Run concurrency workers for warmup + duration; returns (latencies_ms, counters)."""
+    latencies = []
+    counters = {"ok": 0, "errors": 0}
+    warmup_until = time.monotonic() + warmup
+    deadline = warmup_until + duration
+    await asyncio.gather(*(
+        worker(first_worker + i, port, token, seed, warmup_until, deadline, latencies, counters, mix)
+        for i in range(concurrency)
+    ))
+    return latencies, counters
+
+
+async def run_level(port, token, concurrency, warmup, duration, seed, mix=REQUEST_MIX):
+    latencies, counters = await drive(port, token, concurrency, warmup, duration, seed, mix=mix)
+    return {
+        "concurrency": concurrency,
+        "requests": counters["ok"],
+        "errors": counters["errors"],
+        "rps": counters["ok"] / duration,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def bench_implementation(name, args, backend_port, port):
+    command, env = IMPLEMENTATIONS[name]
+    proc = launch(command, dict(env, **args.env), port, backend_port)
+    levels = []
+    try:
+        token = asyncio.run(login(port))
+        for concurrency in args.concurrency:
+            sampler = ProcSampler(proc.pid, interval=0.25).start()
+            result = asyncio.run(run_level(port, token, concurrency, args.warmup, args.duration, args.seed))
+            sampler.stop()
+            result["server"] = sampler.report()
+            levels.append(result)
+            print(f"{name:>10} c={concurrency:<5} {result['rps']:>9.1f} req/s  "
+                  f"p50={result['p50_ms'] or 0:.2f}ms p99={result['p99_ms'] or 0:.2f}ms "
+                  f"errors={result['errors']}", file=sys.stderr)
+    finally:
+        stop(proc)
+    return levels
+
+
+def markdown_table(results):
+    lines = [
+        "| implementation | concurrency | req/s | p50 ms | p99 ms | errors | CPU % | RSS MB |",
+        "|---|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    for name, levels in results.items():
+        for level in levels:
+            server = level["server"] or {}
+            lines.append(
+                f"| {name} | {level['concurrency']} | {level['rps']:.1f} | {level['p50_ms'] or 0:.2f} | "
+                f"{level['p99_ms'] or 0:.2f} | {level['errors']} | {server.get('cpu_percent_avg', 0):.0f} | "
+                f"{server.get('rss_mb_max', 0):.1f} |"
+            )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proxy implementation benchmark")
+    parser.add_argument("--implementations", default=",".join(IMPLEMENTATIONS))
+    parser.add_argument("--concurrency", default="1,8,32,128",
+                        type=lambda s: [int(c) for c in s.split(",") if c])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="stub backend latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--payload-bytes", type=int, default=20000, help="stub backend list page size")
+    parser.add_argument("--backend-port", type=int, default=9000)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra environment for every implementation, e.g. METRICS_ENABLED=false")
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    parser.add_argument("--markdown", default=None, help="write the comparison table to this file")
+    args = parser.parse_args()
+    args.env = dict(item.split("=", 1) for item in args.env)
+
+    backend = launch(
+        [sys.executable, "-m", "bench.stub_backend", "--port", "{backend_port}",
+         "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+         "--payload-bytes", str(args.payload_bytes)],
+        {}, args.backend_port, args.backend_port,
+    )
+    results = {}
+    try:
+        for name in args.implementations.split(","):
+            results[name] = bench_implementation(name, args, args.backend_port, args.port)
+    finally:
+        stop(backend)
+
+    table = markdown_table(results)
+    if args.markdown:
+        with open(args.markdown, "w") as f:
+            f.write(table + "\n")
+    print(table, file=sys.stderr)
+    write_report({
+        "config": {
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "backend_latency_ms": args.latency_ms,
+            "backend_jitter_ms": args.jitter_ms,
+            "payload_bytes": args.payload_bytes,
+            "seed": args.seed,
+            "env": args.env,
+            "mix": [{"method": m, "path": p, "weight": w} for m, p, _, w in REQUEST_MIX],
+        },
+        "results": results,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Decode and re-encode vs remux for the OpenCV Hikvision driver.
+
+Starts the camsim RTSP source, then runs the driver twice against it: with
+STREAM_MODE=mjpeg, where every frame is decoded by OpenCV and re-encoded as
+JPEG for /stream, and with STREAM_MODE=passthrough, where the camera's H.264
+is remuxed into fMP4 parts for /stream.mp4 without decoding. For each mode it
+POSTs /stream, attaches --viewers readers for --duration seconds, and reports
+the driver's CPU, the bytes each viewer received per second and the frames
+the capture delivered. The passthrough run also checks the LL-HLS playlist and
+times a blocking playlist reload. Only the driver's process is sampled; the
+simulator's ffmpeg encoder stands in for the camera:
+
+    python -m bench.remuxbench --viewers 1,10 --duration 20 --fps 25 --width 1280 --height 720
+
+Needs ffmpeg on PATH for camsim, and OpenCV for the mjpeg run.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import platform
+import re
+import sys
+import time
+import urllib.request
+
+from .common import ProcSampler, write_report
+from .proxybench import REPO_ROOT, launch, stop
+
+DRIVER = os.path.join(REPO_ROOT, "iot_driver_copilot", "Hikvision IP camera", "driver.py")
+VIEWER_PATHS = {"mjpeg": "/stream", "passthrough": "/stream.mp4"}
+
+
+def fetch_json(port, path):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=10) as response:
+        return json.loads(response.read())
+
+
+def activate(port):
+    # The driver answers POST /stream without a Content-Length, so read the status line only
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        conn.request("POST", "/stream")
+        status = conn.getresponse().status
+    finally:
+        conn.close()
+    if status != 200:
+        raise RuntimeError(f"POST /stream answered {status}")
+
+
+async def viewer(port, path, deadline, received):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                data = await asyncio.wait_for(reader.read(65536), remaining)
+            except asyncio.TimeoutError:
+                return
+            if not data:
+                return
+            received.append(len(data))
+    finally:
+        writer.close()
+
+
+async def run_viewers(port, path, count, duration):
+    counts = [[] for _ in range(count)]
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(viewer(port, path, deadline, received) for received in counts))
+    return [sum(received) / duration for received in counts]
+
+
+def check_hls(port):
+    playlist = urllib.request.urlopen(f"http://127.0.0.1:{port}/hls/stream.m3u8", timeout=10).read().decode()
+    hint = re.search(r'PRELOAD-HINT:TYPE=PART,URI="part(\d+)\.(\d+)\.m4s"', playlist)
+    msn = int(hint.group(1)) + 1
+    started = time.monotonic()
+    # Blocks until the first part of the next segment is out, like an LL-HLS player's reload
+    reloaded = urllib.request.urlopen(f"http://127.0.0.1:{port}/hls/stream.m3u8?_HLS_msn={msn}&_HLS_part=0",
+                                      timeout=30).read().decode()
+    return {
+        "parts_listed": playlist.count("#EXT-X-PART:"),
+        "segments_listed": playlist.count("#EXTINF:"),
+        "blocking_reload_s": time.monotonic() - started,
+        "blocking_reload_ok": f'URI="part{msn}.0.m4s"' in reloaded,
+    }
+
+
+def bench_mode(args, mode, levels):
+    env = {"DEVICE_IP": "127.0.0.1", "RTSP_PORT": "{backend_port}", "SERVER_HOST": "127.0.0.1",
+           "SERVER_PORT": "{port}", "STREAM_MODE": mode, "STALL_TIMEOUT": "10"}
+    proc = launch([sys.executable, DRIVER], env, args.port, args.rtsp_port)
+    results = []
+    try:
+        activate(args.port)
+        time.sleep(args.warmup)
+        for count in [0] + levels:
+            before = fetch_json(args.port, "/stream/stats")
+            sampler = ProcSampler(proc.pid, interval=0.5).start()
+            if count:
+                rates = asyncio.run(run_viewers(args.port, VIEWER_PATHS[mode], count, args.duration))
+            else:
+                time.sleep(args.duration)
+                rates = []
+            sampler.stop()
+            after = fetch_json(args.port, "/stream/stats")
+            result = {"viewers": count, "driver": sampler.report()}
+            if rates:
+                result["bytes_per_s_per_viewer"] = sum(rates) / len(rates)
+                result["min_bytes_per_s_per_viewer"] = min(rates)
+            if mode == "passthrough":
+                remuxed = after["passthrough"]["remuxed_frames"] - before["passthrough"]["remuxed_frames"]
+                result["remuxed_fps"] = remuxed / args.duration
+            results.append(result)
+            print(f"{mode:>12} viewers={count:<3} cpu={result['driver']['cpu_percent_avg']:6.1f}%  "
+                  f"per viewer={result.get('bytes_per_s_per_viewer', 0) / 1e3:8.1f} kB/s", file=sys.stderr)
+        hls = check_hls(args.port) if mode == "passthrough" else None
+    finally:
+        stop(proc)
+    return {"levels": results, "hls": hls}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MJPEG re-encode vs H.264 remux benchmark")
+    parser.add_argument("--viewers", default="1,10", type=lambda s: [int(v) for v in s.split(",") if v])
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds between POST /stream and sampling")
+    parser.add_argument("--fps", type=int, default=25)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--gop", type=int, default=None, help="camsim keyframe interval in frames")
+    parser.add_argument("--modes", default="mjpeg,passthrough", type=lambda s: [m for m in s.split(",") if m])
+    parser.add_argument("--rtsp-port", type=int, default=18554)
+    parser.add_argument("--port", type=int, default=8310)
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+
+    command = [sys.executable, "-m", "bench.camsim", "rtsp", "--host", "127.0.0.1", "--rtsp-port", "{port}",
+               "--fps", str(args.fps), "--width", str(args.width), "--height", str(args.height)]
+    if args.gop:
+        command += ["--gop", str(args.gop)]
+    camsim = launch(command, {}, args.rtsp_port, args.rtsp_port)
+    results = {}
+    try:
+        for mode in args.modes:
+            results[mode] = bench_mode(args, mode, args.viewers)
+    finally:
+        stop(camsim)
+
+    summary = {}
+    if {"mjpeg", "passthrough"} <= results.keys():
+        for mjpeg, remux in zip(results["mjpeg"]["levels"], results["passthrough"]["levels"]):
+            remux_cpu = remux["driver"]["cpu_percent_avg"]
+            summary[str(mjpeg["viewers"])] = {
+                "cpu_ratio": mjpeg["driver"]["cpu_percent_avg"] / remux_cpu if remux_cpu else None,
+                "bandwidth_ratio": (mjpeg["bytes_per_s_per_viewer"] / remux["bytes_per_s_per_viewer"]
+                                    if remux.get("bytes_per_s_per_viewer") else None),
+            }
+    write_report({
+        "config": {
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "fps": args.fps,
+            "resolution": f"{args.width}x{args.height}",
+            "duration_s": args.duration,
+        },
+        "results": results,
+        # mjpeg over passthrough, per viewer count
+        "ratios": summary,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main()
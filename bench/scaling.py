@@ -0,0 +1,146 @@
+"""
+Multi-worker scaling benchmark for the FastAPI proxy (iot_driver_copilot/driver.py).
+
+Runs the driver with WORKERS=1, 2, 4, ... up to the host core count against a
+multi-process stub backend, drives the proxybench request mix from several
+load-generator processes and reports throughput per worker count together with
+the scaling efficiency relative to one worker:
+
+    python -m bench.scaling --workers 1,2,4,8 --concurrency-per-worker 16 --duration 15
+
+Near-linear scaling shows as efficiency close to 1.0. The stub backend and the
+load generators need cores too, so efficiency at the host's full core count is
+bounded by what is left over for the proxy.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import platform
+import sys
+
+from .common import ProcSampler, percentile, raise_fd_limit, write_report
+from .proxybench import REPO_ROOT, REQUEST_MIX, drive, launch, login, stop
+
+FASTAPI_DRIVER = os.path.join(REPO_ROOT, "iot_driver_copilot", "driver.py")
+
+
+def default_worker_counts():
+    counts = []
+    count = 1
+    while count < (os.cpu_count() or 1):
+        counts.append(count)
+        count *= 2
+    counts.append(os.cpu_count() or 1)
+    return counts
+
+
+def load_process(job):
+    port, token, concurrency, warmup, duration, seed, first_worker = job
+    raise_fd_limit()
+    return asyncio.run(drive(port, token, concurrency, warmup, duration, seed, first_worker))
+
+
+def run_workers(workers, args):
+    env = {
+        "WORKERS": str(workers),
+        "DEVICE_HOST": "127.0.0.1",
+        "DEVICE_PORT": "{backend_port}",
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": "{port}",
+    }
+    if args.rate_limit_rps:
+        env["RATE_LIMIT_RPS"] = str(args.rate_limit_rps)
+    proc = launch([sys.executable, FASTAPI_DRIVER], env, args.port, args.backend_port)
+    try:
+        token = asyncio.run(login(args.port))
+        concurrency = workers * args.concurrency_per_worker
+        procs = max(1, min(args.load_procs, concurrency))
+        share, extra = divmod(concurrency, procs)
+        jobs = []
+        first = 0
+        for i in range(procs):
+            count = share + (1 if i < extra else 0)
+            jobs.append((args.port, token, count, args.warmup, args.duration, args.seed, first))
+            first += count
+        sampler = ProcSampler(proc.pid, interval=0.25).start()
+        with multiprocessing.get_context("spawn").Pool(procs) as pool:
+            parts = pool.map(load_process, jobs)
+        sampler.stop()
+    finally:
+        stop(proc)
+    latencies = [value for part, _ in parts for value in part]
+    ok = sum(counters["ok"] for _, counters in parts)
+    return {
+        "workers": workers,
+        "concurrency": concurrency,
+        "requests": ok,
+        "errors": sum(counters["errors"] for _, counters in parts),
+        "rps": ok / args.duration,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "server": sampler.report(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FastAPI proxy multi-worker scaling benchmark")
+    parser.add_argument("--workers", default=None, type=lambda s: [int(c) for c in s.split(",") if c],
+                        help="worker counts to test (default: powers of two up to the core count)")
+    parser.add_argument("--concurrency-per-worker", type=int, default=16)
+    parser.add_argument("--load-procs", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="load generator processes")
+    parser.add_argument("--backend-procs", type=int, default=max(1, (os.cpu_count() or 4) // 4))
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stub backend latency")
+    parser.add_argument("--payload-bytes", type=int, default=20000)
+    parser.add_argument("--rate-limit-rps", type=float, default=0.0,
+                        help="enable the shared rate limiter so its cost is part of the measurement")
+    parser.add_argument("--backend-port", type=int, default=9000)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+    raise_fd_limit()
+
+    backend = launch(
+        [sys.executable, "-m", "bench.stub_backend", "--port", "{backend_port}",
+         "--latency-ms", str(args.latency_ms), "--payload-bytes", str(args.payload_bytes),
+         "--procs", str(args.backend_procs)],
+        {}, args.backend_port, args.backend_port,
+    )
+    results = []
+    try:
+        for workers in args.workers or default_worker_counts():
+            result = run_workers(workers, args)
+            base = results[0]["rps"] / results[0]["workers"] if results else result["rps"] / workers
+            result["efficiency"] = result["rps"] / (workers * base) if base else None
+            results.append(result)
+            print(f"workers={workers:<3} {result['rps']:>9.1f} req/s  efficiency={result['efficiency'] or 0:.2f}  "
+                  f"p50={result['p50_ms'] or 0:.2f}ms p99={result['p99_ms'] or 0:.2f}ms "
+                  f"errors={result['errors']}", file=sys.stderr)
+    finally:
+        stop(backend)
+
+    write_report({
+        "config": {
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "concurrency_per_worker": args.concurrency_per_worker,
+            "load_procs": args.load_procs,
+            "backend_procs": args.backend_procs,
+            "backend_latency_ms": args.latency_ms,
+            "payload_bytes": args.payload_bytes,
+            "rate_limit_rps": args.rate_limit_rps,
+            "seed": args.seed,
+            "mix": [{"method": m, "path": p, "weight": w} for m, p, _, w in REQUEST_MIX],
+        },
+        "results": results,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Stub GoSchedule/ChatToChat/Bustub backend for proxy benchmarks.
+
+Implements /session/login, /session/logout, /schedules, /posts, /search,
+/chats/{id}/messages and an echoing /ws websocket with a configurable response
+latency and page size, using only the standard library so the backend is never
+the thing being measured. With --ws-broadcast-interval the /ws endpoint also
+pushes chat traffic to every connected socket; /ws/stats reports how many
+device-side sockets are open.
+
+    python -m bench.stub_backend --port 9000 --latency-ms 5 --payload-bytes 20000
+
+--procs N forks N backend processes on one SO_REUSEPORT port so multi-worker
+proxies can be driven past what one stub process can serve. Tokens embed the
+issuing pid and any unrevoked stub token is accepted, so a login served by one
+process is honoured by the others.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import signal
+import sys
+from urllib.parse import parse_qs, urlsplit
+
+from . import wsproto
+from .common import raise_fd_limit
+
+ITEM_TEMPLATE_BYTES = 200
+# Average encoded size of make_message(), so --payload-bytes sizes chat history pages too
+CHAT_MESSAGE_BYTES = 276
+
+
+CHAT_WORDS = ("ok", "sure", "meeting", "tomorrow", "deploy", "the", "build", "is", "green", "again", "thanks",
+              "lunch?", "pushed", "a", "fix", "for", "review", "see", "ticket", "looks", "good", "to", "me", "🚀")
+
+
+def make_item(kind, index):
+    # Deterministic filler so runs are byte-for-byte reproducible
+    if kind == "chats":
+        return make_message(index)
+    text = ("lorem ipsum dolor sit amet " * 8)[:ITEM_TEMPLATE_BYTES - 80]
+    return {"id": index, "kind": kind, "author": f"user{index % 97}", "ts": 1700000000 + index, "text": text}
+
+
+def make_message(index):
+    """A chat message shaped like real history: nested sender, varied text, sparse reactions and replies."""
+    words = [CHAT_WORDS[(index * 7 + i * 13) % len(CHAT_WORDS)] for i in range(3 + index % 17)]
+    message = {
+        "id": f"msg-{index:08d}",
+        "chat_id": "42",
+        "sender": {"id": index % 23, "name": f"user{index % 23}", "avatar": f"https://cdn.example/a/{index % 23}.png"},
+        "ts": 1700000000.0 + index * 1.5,
+        "text": " ".join(words),
+        "edited": index % 11 == 0,
+        "reactions": {"👍": index % 5, "🎉": index % 3} if index % 4 == 0 else {},
+        "attachments": [],
+    }
+    if index % 9 == 0:
+        message["reply_to"] = f"msg-{max(0, index - 3):08d}"
+    if index % 25 == 0:
+        message["attachments"].append({"type": "image", "url": f"https://cdn.example/i/{index}.jpg",
+                                       "width": 1280, "height": 720, "size": 183211})
+    return message
+
+
+class StubBackend:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, payload_bytes=20000, total_items=None, seed=1):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.page_size = max(1, payload_bytes // ITEM_TEMPLATE_BYTES)
+        self.chat_page_size = max(1, payload_bytes // CHAT_MESSAGE_BYTES)
+        self.total_items = total_items or self.page_size
+        self.random = random.Random(seed)
+        self.revoked = set()
+        self.token_ids = itertools.count(1)
+        self.created_ids = itertools.count(1)
+        self.page_cache = {}
+        self.requests = 0
+        self.websockets = set()
+
+    def page(self, kind, cursor, limit):
+        key = (kind, cursor, limit)
+        body = self.page_cache.get(key)
+        if body is None:
+            end = min(self.total_items, cursor + limit)
+            items = [make_item(kind, i) for i in range(cursor, end)]
+            next_cursor = str(end) if end < self.total_items else None
+            body = json.dumps({"items": items, "next_cursor": next_cursor}, ensure_ascii=False).encode()
+            self.page_cache[key] = body
+        return body
+
+    def authorized(self, headers):
+        token = headers.get("authorization", "").replace("Bearer ", "", 1)
+        return token.startswith("stub-token-") and token not in self.revoked
+
+    def route(self, method, target, headers, body):
+        parts = urlsplit(target)
+        path = parts.path.rstrip("/") or "/"
+        query = parse_qs(parts.query)
+        if path == "/ws/stats":
+            return 200, {"connections": len(self.websockets)}
+        if path == "/session/login" and method == "POST":
+            token = f"stub-token-{os.getpid()}-{next(self.token_ids)}"
+            return 200, {"token": token, "expires_in": 3600}
+        if not self.authorized(headers):
+            return 401, {"error": "invalid token"}
+        if path == "/session/logout" and method == "POST":
+            self.revoked.add(headers.get("authorization", "").replace("Bearer ", "", 1))
+            return 200, {"ok": True}
+        segments = path.strip("/").split("/")
+        if path in ("/schedules", "/posts", "/search") or (
+            len(segments) == 3 and segments[0] == "chats" and segments[2] == "messages"
+        ):
+            if method == "GET":
+                cursor = int((query.get("cursor") or ["0"])[0] or 0)
+                page_size = self.chat_page_size if segments[0] == "chats" else self.page_size
+                limit = min(page_size, int((query.get("limit") or [page_size])[0]))
+                return 200, self.page(segments[0], cursor, limit)
+            if method == "POST" and path != "/search":
+                try:
+                    payload = json.loads(body or b"{}")
+                except ValueError:
+                    return 400, {"error": "invalid json"}
+                return 201, {"id": next(self.created_ids), "data": payload}
+            return 405, {"error": "method not allowed"}
+        return 404, {"error": "not found"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if headers.get("upgrade", "").lower() == "websocket" and target.split("?", 1)[0] == "/ws":
+                    await self.handle_websocket(reader, writer, headers)
+                    break
+                length = int(headers.get("content-length", 0) or 0)
+                body = await reader.readexactly(length) if length else b""
+                self.requests += 1
+                if self.latency or self.jitter:
+                    await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+                status, payload = self.route(method.upper(), target, headers, body)
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_websocket(self, reader, writer, headers):
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {wsproto.accept_key(headers.get('sec-websocket-key', ''))}\r\n\r\n".encode()
+        )
+        await writer.drain()
+        self.websockets.add(writer)
+        try:
+            while True:
+                opcode, payload = await wsproto.read_frame(reader)
+                if opcode == wsproto.OP_CLOSE:
+                    writer.write(wsproto.encode_frame(wsproto.OP_CLOSE, payload[:2]))
+                    break
+                if opcode == wsproto.OP_PING:
+                    writer.write(wsproto.encode_frame(wsproto.OP_PONG, payload))
+                elif opcode in (wsproto.OP_TEXT, wsproto.OP_BINARY):
+                    writer.write(wsproto.encode_frame(opcode, payload))
+                await writer.drain()
+        finally:
+            self.websockets.discard(writer)
+
+
+    async def broadcast_loop(self, interval, chats):
+        """Push the same chat frame to every device-side socket, as a chat backend would."""
+        for seq in itertools.count():
+            await asyncio.sleep(interval)
+            frame = wsproto.encode_frame(wsproto.OP_TEXT, json.dumps({
+                "chat_id": str(seq % chats),
+                "seq": seq,
+                "text": "broadcast message from stub backend",
+            }))
+            for writer in list(self.websockets):
+                writer.write(frame)
+
+
+async def serve(backend, host, port, broadcast_interval=0.0, broadcast_chats=10, reuse_port=False):
+    server = await asyncio.start_server(backend.handle, host, port, backlog=1024, reuse_port=reuse_port)
+    if broadcast_interval:
+        asyncio.create_task(backend.broadcast_loop(broadcast_interval, broadcast_chats))
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub backend for proxy benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--payload-bytes", type=int, default=20000, help="approximate size of one list page")
+    parser.add_argument("--total-items", type=int, default=None, help="items reachable by cursor paging")
+    parser.add_argument("--ws-broadcast-interval", type=float, default=0.0, help="seconds between /ws broadcasts")
+    parser.add_argument("--ws-broadcast-chats", type=int, default=10, help="chat ids the broadcasts rotate over")
+    parser.add_argument("--procs", type=int, default=1, help="backend processes sharing the port")
+    args = parser.parse_args()
+    raise_fd_limit()
+    children = []
+    for _ in range(args.procs - 1):
+        pid = os.fork()
+        if pid == 0:
+            children = None
+            break
+        children.append(pid)
+    if children:
+        # Turn SIGTERM into SystemExit so the parent takes its children down with it
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    backend = StubBackend(args.latency_ms, args.jitter_ms, args.payload_bytes, args.total_items)
+    try:
+        asyncio.run(serve(backend, args.host, args.port, args.ws_broadcast_interval, args.ws_broadcast_chats,
+                          reuse_port=args.procs > 1))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children or ():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Telemetry polling benchmark for the OPC UA driver.
+
+Writes a deviceshifu-style config (instructions + telemetries) for --telemetries
+nodes to a temporary directory, starts the OPC UA stand-in and the driver with
+CONFIG_MOUNT_PATH pointing at it, then drives GET /telemetry at increasing
+concurrency. For every level it reports client req/s and latency next to the
+Read calls per second the device actually served. The device rate should stay
+at one Read per interval group per tick, whatever the client concurrency:
+
+    python -m bench.telemetrybench --telemetries 50 --intervals-ms 100,1000 --concurrency 1,16,64
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import urllib.request
+
+from .common import ProcSampler, write_report
+from .proxybench import REPO_ROOT, launch, run_level, stop
+
+DRIVER = os.path.join(REPO_ROOT, "iot_driver_copilot", "OPC UA LED Light", "driver.py")
+
+
+def write_config(directory, count, intervals_ms):
+    """instructions/telemetries ConfigMap keys for count nodes, spread round-robin over the intervals."""
+    instructions = {f"t{i}": {"protocolPropertyList": {"OPCUANodeID": f"ns=1;s=t{i}"}} for i in range(count)}
+    telemetries = {
+        f"t{i}": {"properties": {"instruction": f"t{i}", "intervalMs": intervals_ms[i % len(intervals_ms)]}}
+        for i in range(count)
+    }
+    # JSON is valid YAML, which keeps this free of a yaml dependency
+    with open(os.path.join(directory, "instructions"), "w") as f:
+        json.dump({"instructions": instructions}, f)
+    with open(os.path.join(directory, "telemetries"), "w") as f:
+        json.dump({"telemetries": telemetries}, f)
+
+
+def device_reads(stats_port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{stats_port}/", timeout=5) as response:
+        return json.loads(response.read())["reads"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telemetry polling benchmark")
+    parser.add_argument("--telemetries", type=int, default=20)
+    parser.add_argument("--intervals-ms", default="100,1000", type=lambda s: [int(i) for i in s.split(",") if i])
+    parser.add_argument("--concurrency", default="1,16,64", type=lambda s: [int(c) for c in s.split(",") if c])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--opcua-port", type=int, default=4840)
+    parser.add_argument("--stats-port", type=int, default=4841)
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+
+    config_dir = tempfile.mkdtemp(prefix="telemetry-config-")
+    write_config(config_dir, args.telemetries, args.intervals_ms)
+    device = launch(
+        [sys.executable, "-m", "bench.opcua_sim", "--port", "{port}", "--stats-port", str(args.stats_port),
+         "--nodes", ",".join(f"t{i}" for i in range(args.telemetries))],
+        {}, args.opcua_port, args.opcua_port,
+    )
+    levels = []
+    try:
+        driver = launch(
+            [sys.executable, DRIVER],
+            {"CONFIG_MOUNT_PATH": config_dir, "OPCUA_ENDPOINT": f"opc.tcp://127.0.0.1:{args.opcua_port}",
+             "HTTP_SERVER_HOST": "127.0.0.1", "HTTP_SERVER_PORT": "{port}"},
+            args.port, args.opcua_port,
+        )
+        try:
+            mix = [("GET", "/telemetry", None, 1)]
+            for concurrency in args.concurrency:
+                sampler = ProcSampler(driver.pid, interval=0.25).start()
+                reads_before, started = device_reads(args.stats_port), time.monotonic()
+                result = asyncio.run(run_level(args.port, "", concurrency, args.warmup, args.duration, args.seed, mix))
+                elapsed = time.monotonic() - started
+                result["device_reads_per_s"] = (device_reads(args.stats_port) - reads_before) / elapsed
+                sampler.stop()
+                result["server"] = sampler.report()
+                levels.append(result)
+                print(f"c={concurrency:<5} {result['rps']:>9.1f} req/s  p99={result['p99_ms'] or 0:.2f}ms "
+                      f"device {result['device_reads_per_s']:.1f} reads/s", file=sys.stderr)
+        finally:
+            stop(driver)
+    finally:
+        stop(device)
+
+    write_report({
+        "config": {
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "telemetries": args.telemetries,
+            "intervals_ms": args.intervals_ms,
+            # One Read per interval group per tick
+            "expected_device_reads_per_s": sum(1000.0 / interval for interval in set(args.intervals_ms)),
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+        },
+        "results": levels,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main()
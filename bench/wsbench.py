@@ -0,0 +1,141 @@
+"""
+Connection capacity and fan-out test for the GoSchedule driver's /wsproxy.
+
+Opens N websockets through the proxy (each bridged to the stub backend's /ws),
+holds them while counting delivered messages, then checks a sample still
+echoes and reports the proxy's memory per connection and how many device-side
+sockets the stub backend saw.
+
+    python -m bench.wsbench --proxy-port 8080 -n 10000 --server-pid <driver pid>
+    python -m bench.wsbench -n 500 --channels 10   # with WS_MULTIPLEX=true and stub broadcasts
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from . import wsproto
+from .common import raise_fd_limit, read_proc, summarize, write_report
+from .httpclient import HttpConnection
+
+
+async def device_socket_count(host, port):
+    conn = HttpConnection(host, port)
+    try:
+        status, _, body = await conn.request("GET", "/ws/stats")
+        return json.loads(body)["connections"] if status == 200 else None
+    except (OSError, ValueError, KeyError):
+        return None
+    finally:
+        conn.close()
+
+
+async def count_messages(reader, counter):
+    try:
+        while True:
+            opcode, _ = await wsproto.read_frame(reader)
+            if opcode in (wsproto.OP_TEXT, wsproto.OP_BINARY):
+                counter[0] += 1
+            elif opcode == wsproto.OP_CLOSE:
+                return
+    except (OSError, asyncio.IncompleteReadError):
+        return
+
+
+async def open_socket(host, port, path, sockets, failures):
+    try:
+        sockets.append(await wsproto.connect(host, port, path))
+    except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+        failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+
+
+async def echo(reader, writer):
+    started = time.monotonic()
+    writer.write(wsproto.encode_frame(wsproto.OP_TEXT, b"ping", mask=True))
+    await writer.drain()
+    while True:
+        opcode, _ = await wsproto.read_frame(reader)
+        if opcode == wsproto.OP_TEXT:
+            return (time.monotonic() - started) * 1000.0
+        if opcode == wsproto.OP_PING:
+            writer.write(wsproto.encode_frame(wsproto.OP_PONG, b"", mask=True))
+
+
+async def run(args):
+    fd_limit = raise_fd_limit()
+    baseline_rss = read_proc(args.server_pid)[1] if args.server_pid else None
+    sockets = []
+    failures = {}
+    started = time.monotonic()
+    for offset in range(0, args.connections, args.batch):
+        count = min(args.batch, args.connections - offset)
+        paths = [
+            f"{args.path}?channels={(offset + i) % args.channels}" if args.channels else args.path
+            for i in range(count)
+        ]
+        await asyncio.gather(*(
+            open_socket(args.host, args.proxy_port, path, sockets, failures) for path in paths
+        ))
+    open_seconds = time.monotonic() - started
+    received = [0]
+    readers = [asyncio.create_task(count_messages(reader, received)) for reader, _ in sockets]
+    await asyncio.sleep(args.hold)
+    for task in readers:
+        task.cancel()
+    await asyncio.gather(*readers, return_exceptions=True)
+    loaded_rss = read_proc(args.server_pid)[1] if args.server_pid else None
+    device_sockets = await device_socket_count(args.host, args.backend_port)
+
+    sample = random.Random(1).sample(sockets, min(args.echo_sample, len(sockets)))
+    rtts = []
+    echo_failures = 0
+    for reader, writer in sample:
+        try:
+            rtts.append(await asyncio.wait_for(echo(reader, writer), 5.0))
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            echo_failures += 1
+    for _, writer in sockets:
+        writer.close()
+
+    per_connection_kb = None
+    if baseline_rss is not None and sockets:
+        per_connection_kb = (loaded_rss - baseline_rss) / len(sockets) / 1024
+    return {
+        "requested": args.connections,
+        "established": len(sockets),
+        "failures": failures,
+        "client_fd_limit": fd_limit,
+        "open_seconds": open_seconds,
+        "held_seconds": args.hold,
+        "delivered_msgs_per_s": received[0] / args.hold if args.hold else None,
+        "device_side_sockets": device_sockets,
+        "echo_rtt_ms": summarize(rtts),
+        "echo_failures": echo_failures,
+        "server_rss_mb": {
+            "baseline": baseline_rss / 1048576 if baseline_rss is not None else None,
+            "loaded": loaded_rss / 1048576 if loaded_rss is not None else None,
+        },
+        "server_kb_per_connection": per_connection_kb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Idle websocket capacity test for /wsproxy")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--proxy-port", type=int, default=8080)
+    parser.add_argument("--path", default="/wsproxy")
+    parser.add_argument("--backend-port", type=int, default=9000, help="stub backend, for /ws/stats")
+    parser.add_argument("--channels", type=int, default=0, help="spread sockets over this many ?channels= ids")
+    parser.add_argument("-n", "--connections", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=500, help="connections opened concurrently")
+    parser.add_argument("--hold", type=float, default=30.0, help="seconds to hold sockets idle")
+    parser.add_argument("--echo-sample", type=int, default=100)
+    parser.add_argument("--server-pid", type=int, default=None)
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+    write_report(asyncio.run(run(args)), args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,26 @@
 import os
-import json
+import sys
+import re
+import time
+import zlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from urllib.parse import urlencode
 
-from flask import Flask, request, jsonify, Response, stream_with_context
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+from flask.json.provider import DefaultJSONProvider
 import requests
+from requests.adapters import HTTPAdapter
+
+# Helpers shared by every driver live in iot_driver_copilot/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "iot_driver_copilot"))
+from common.jsoncodec import json_dumps, json_loads
+from common.tokens import SharedTokenCache, TokenCache
+from common.resilience import AdmissionControl, BreakerOpen, CircuitBreaker, retry_after_header
+from common.metrics import METRICS_CONTENT_TYPE, Metrics
+from common.debug import SamplingProfiler, StackWatch, debug_denied, poll_threads, profile_seconds
 
 # Environment variables for configuration
 DEVICE_API_HOST = os.environ.get("DEVICE_API_HOST", "localhost")
@@ -13,9 +29,86 @@ DEVICE_API_PROTOCOL = os.environ.get("DEVICE_API_PROTOCOL", "http")
 SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
 SERVER_PORT = int(os.environ.get("SERVER_PORT", "8000"))
 
+# Edge token validation: tokens seen in /session/login responses, dropped on logout or expiry
+TOKEN_CACHE_ENABLED = os.environ.get("TOKEN_CACHE_ENABLED", "true").lower() == "true"
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_TTL = float(os.environ.get("TOKEN_TTL", "3600"))
+# Name of a shared memory segment to share the cache between worker processes on this host
+TOKEN_CACHE_SHM = os.environ.get("TOKEN_CACHE_SHM", "")
+
+# /batch: sub-requests per call, how many run at once per batch, and the shared worker pool size
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "100"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "32"))
+BATCH_ITEM_TIMEOUT = float(os.environ.get("BATCH_ITEM_TIMEOUT", "30"))
+
+# Response compression: codings in server preference order and the smallest body worth compressing
+COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_ALGORITHMS = [c.strip() for c in os.environ.get("COMPRESSION_ALGORITHMS", "zstd,br,gzip").split(",") if c.strip()]
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL = int(os.environ.get("COMPRESSION_ZSTD_LEVEL", "3"))
+
+# ?stream=ndjson listings: the backend's cursor paging fields and a cap on pages walked per request
+PAGE_ITEMS_FIELD = os.environ.get("PAGE_ITEMS_FIELD", "items")
+PAGE_CURSOR_FIELD = os.environ.get("PAGE_CURSOR_FIELD", "next_cursor")
+PAGE_CURSOR_PARAM = os.environ.get("PAGE_CURSOR_PARAM", "cursor")
+STREAM_MAX_PAGES = int(os.environ.get("STREAM_MAX_PAGES", "10000"))
+STREAM_PAGE_TIMEOUT = float(os.environ.get("STREAM_PAGE_TIMEOUT", "30"))
+
+# Upstream protection: per-upstream circuit breaker (error rate and slow calls) and an in-flight cap
+UPSTREAM_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", "10"))
+BREAKER_ENABLED = os.environ.get("BREAKER_ENABLED", "true").lower() == "true"
+BREAKER_WINDOW = int(os.environ.get("BREAKER_WINDOW", "10"))
+BREAKER_MIN_REQUESTS = int(os.environ.get("BREAKER_MIN_REQUESTS", "20"))
+BREAKER_ERROR_RATE = float(os.environ.get("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_MS = float(os.environ.get("BREAKER_SLOW_MS", "2000"))
+BREAKER_OPEN_SECONDS = float(os.environ.get("BREAKER_OPEN_SECONDS", "5"))
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get("BREAKER_HALF_OPEN_PROBES", "3"))
+MAX_INFLIGHT = int(os.environ.get("MAX_INFLIGHT", "256"))
+
+# Prometheus /metrics; per-client byte counters stop adding new client labels past METRICS_MAX_CLIENTS
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MAX_CLIENTS = int(os.environ.get("METRICS_MAX_CLIENTS", "100"))
+
+# /debug/profile and /debug/tasks are compiled in but answer 404 unless DEBUG_ENDPOINTS=true;
+# with DEBUG_TOKEN set, callers must also send it in the X-Debug-Token header
+DEBUG_ENDPOINTS = os.environ.get("DEBUG_ENDPOINTS", "false").lower() == "true"
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+DEBUG_PROFILE_MAX_SECONDS = float(os.environ.get("DEBUG_PROFILE_MAX_SECONDS", "60"))
+DEBUG_PROFILE_HZ = float(os.environ.get("DEBUG_PROFILE_HZ", "100"))
+DEBUG_STUCK_SECONDS = float(os.environ.get("DEBUG_STUCK_SECONDS", "10"))
+
 API_BASE = f"{DEVICE_API_PROTOCOL}://{DEVICE_API_HOST}:{DEVICE_API_PORT}"
 
+# --- JSON Codec ---
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Routes jsonify() and request.get_json() through the fast codec."""
+    def dumps(self, obj, **kwargs):
+        return json_dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return json_loads(s)
+
+    def response(self, *args, **kwargs):
+        return self._app.response_class(json_dumps(self._prepare_response_obj(args, kwargs)), mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+
+if not TOKEN_CACHE_ENABLED:
+    token_cache = None
+elif TOKEN_CACHE_SHM:
+    token_cache = SharedTokenCache(TOKEN_CACHE_SHM, TOKEN_CACHE_SIZE, TOKEN_TTL)
+else:
+    token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_TTL)
+
+def bearer_token(auth_header):
+    if auth_header.lower().startswith("bearer "):
+        return auth_header[7:].strip()
+    return auth_header.strip()
 
 def require_auth(f):
     @wraps(f)
@@ -23,45 +116,391 @@ def require_auth(f):
         auth_header = request.headers.get("Authorization")
         if not auth_header:
             return jsonify({"error": "Unauthorized"}), 401
+        # Unknown or expired tokens are rejected here without a backend round trip
+        if token_cache is not None and not token_cache.valid(bearer_token(auth_header)):
+            return jsonify({"error": "Invalid or expired token"}), 401
         return f(*args, **kwargs)
     return decorated
 
-def proxy_request(method, target_path, auth_forward=False, stream=False, **kwargs):
+def remember_login(body):
+    try:
+        data = json_loads(body)
+    except ValueError:
+        return
+    if not isinstance(data, dict):
+        return
+    token = data.get("token") or data.get("session_token")
+    if token:
+        ttl = data.get("expires_in")
+        token_cache.add(token, float(ttl) if isinstance(ttl, (int, float)) and ttl > 0 else None)
+
+# --- Metrics ---
+
+METRIC_HELP = {
+    "driver_http_request_duration_seconds": "Time from request arrival until the response headers were ready.",
+    "driver_upstream_request_duration_seconds": "Backend call latency to response headers, by outcome.",
+    "driver_client_bytes_sent_total": "Response body bytes sent, by client address.",
+    "driver_inflight_requests": "Requests currently admitted.",
+}
+
+metrics = Metrics(METRICS_MAX_CLIENTS, METRIC_HELP, enabled=METRICS_ENABLED)
+
+# Sampled lazily: admission is created further down
+metrics.gauge("driver_inflight_requests", lambda: admission.inflight)
+
+def count_bytes(chunks, client):
+    """Wraps a streamed body so bytes sent are counted as they leave, not when the stream ends."""
+    try:
+        for chunk in chunks:
+            metrics.inc("driver_client_bytes_sent_total", len(chunk), client=client)
+            yield chunk
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+# Registered ahead of compress_response, so it runs after it and sees the bytes actually sent
+@app.after_request
+def record_request(response):
+    started = g.pop("request_started", None)
+    if started is None or not METRICS_ENABLED:
+        return response
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.observe("driver_http_request_duration_seconds", time.perf_counter() - started,
+                    route=route, method=request.method, status=str(response.status_code))
+    client = metrics.client_label(request.remote_addr or "unknown")
+    if response.is_streamed:
+        response.response = count_bytes(response.response, client)
+    else:
+        metrics.inc("driver_client_bytes_sent_total", response.content_length or 0, client=client)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics_view():
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+# --- Debug Endpoints ---
+
+profiler = SamplingProfiler(DEBUG_PROFILE_HZ)
+stack_watch = StackWatch(DEBUG_STUCK_SECONDS)
+
+def debug_watchdog():
+    while True:
+        stack_watch.update(poll_threads())
+        time.sleep(1.0)
+
+if DEBUG_ENDPOINTS:
+    threading.Thread(target=debug_watchdog, name="debug-watchdog", daemon=True).start()
+
+@app.route("/debug/profile", methods=["GET"])
+def debug_profile():
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return jsonify({"error": denied[1]}), denied[0]
+    try:
+        seconds = profile_seconds(request.args.get("seconds"), DEBUG_PROFILE_MAX_SECONDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    stacks = profiler.profile(seconds, cpu_only=request.args.get("mode", "cpu") != "wall")
+    if stacks is None:
+        return jsonify({"error": "A profile is already running"}), 409
+    return Response(stacks, content_type="text/plain; charset=utf-8",
+                    headers={"Content-Disposition": "attachment; filename=profile.collapsed"})
+
+@app.route("/debug/tasks", methods=["GET"])
+def debug_tasks():
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return jsonify({"error": denied[1]}), denied[0]
+    return jsonify({"stuck_after_seconds": DEBUG_STUCK_SECONDS, "threads": stack_watch.snapshot()})
+
+# --- Response Compression ---
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODINGS = [c for c in COMPRESSION_ALGORITHMS
+           if c == "gzip" or (c == "br" and brotli is not None) or (c == "zstd" and zstandard is not None)]
+
+def parse_accept_encoding(header):
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+def accepts_encoding(header, coding):
+    accepted = parse_accept_encoding(header)
+    return accepted.get(coding, accepted.get("*", 0.0)) > 0
+
+def negotiate_encoding(header):
+    # Highest client q-value wins; server preference order breaks ties
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for coding in CODINGS:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+def is_compressible(content_type):
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    return (content_type.startswith("text/") or content_type.endswith(("+json", "+xml"))
+            or content_type in ("application/json", "application/x-ndjson", "application/javascript", "application/xml"))
+
+class StreamCompressor:
+    """Incremental encoder for one response body; flush=True emits everything fed so far."""
+    def __init__(self, coding):
+        self.coding = coding
+        if coding == "gzip":
+            self.obj = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif coding == "br":
+            self.obj = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self.obj = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data, flush=False):
+        if self.coding == "gzip":
+            out = self.obj.compress(data)
+            return out + self.obj.flush(zlib.Z_SYNC_FLUSH) if flush else out
+        if self.coding == "br":
+            out = self.obj.process(data)
+            return out + self.obj.flush() if flush else out
+        out = self.obj.compress(data)
+        return out + self.obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else out
+
+    def finish(self):
+        if self.coding == "br":
+            return self.obj.finish()
+        return self.obj.flush()
+
+class CompressionStats:
+    """Per-route response counters, bytes before/after compression and CPU spent compressing."""
+    FIELDS = ("responses", "compressed", "passthrough", "below_threshold", "bytes_in", "bytes_out", "cpu_seconds")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def add(self, route, **counts):
+        with self.lock:
+            entry = self.routes.get(route)
+            if entry is None:
+                entry = self.routes[route] = dict.fromkeys(self.FIELDS, 0)
+            for name, value in counts.items():
+                entry[name] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                route: dict(entry, bytes_saved=entry["bytes_in"] - entry["bytes_out"])
+                for route, entry in self.routes.items()
+            }
+
+compression_stats = CompressionStats()
+
+def compress_body(route, data, coding):
+    started = time.thread_time()
+    compressor = StreamCompressor(coding)
+    out = compressor.compress(data) + compressor.finish()
+    compression_stats.add(route, responses=1, compressed=1, bytes_in=len(data), bytes_out=len(out),
+                          cpu_seconds=time.thread_time() - started)
+    return out
+
+def compress_stream(route, chunks, coding):
+    # Each chunk is flushed so streamed items reach the client as soon as they are produced
+    compressor = StreamCompressor(coding)
+    bytes_in = bytes_out = 0
+    cpu = 0.0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            started = time.thread_time()
+            out = compressor.compress(chunk, flush=True)
+            cpu += time.thread_time() - started
+            bytes_in += len(chunk)
+            bytes_out += len(out)
+            if out:
+                yield out
+        out = compressor.finish()
+        bytes_out += len(out)
+        yield out
+    finally:
+        compression_stats.add(route, responses=1, compressed=1, bytes_in=bytes_in, bytes_out=bytes_out, cpu_seconds=cpu)
+
+# --- Circuit Breaker and Admission Control ---
+
+backend_breaker = CircuitBreaker(
+    "backend", window=BREAKER_WINDOW, min_requests=BREAKER_MIN_REQUESTS, error_rate=BREAKER_ERROR_RATE,
+    slow_ms=BREAKER_SLOW_MS, open_seconds=BREAKER_OPEN_SECONDS, half_open_probes=BREAKER_HALF_OPEN_PROBES,
+    enabled=BREAKER_ENABLED)
+admission = AdmissionControl(MAX_INFLIGHT)
+# Operator endpoints stay reachable while the driver is shedding load
+ADMISSION_EXEMPT = ("/upstream/status", "/compression/stats", "/metrics", "/debug/profile", "/debug/tasks")
+
+def backend_request(method, url, session=None, **kwargs):
+    """requests.request() behind the backend breaker; raises BreakerOpen instead of calling a failing backend."""
+    allowed, probe, retry_after = backend_breaker.admit()
+    if not allowed:
+        raise BreakerOpen(backend_breaker.name, retry_after)
+    kwargs.setdefault("timeout", UPSTREAM_TIMEOUT)
+    started = time.monotonic()
+    try:
+        resp = (session or requests).request(method, url, **kwargs)
+    except requests.RequestException:
+        elapsed = time.monotonic() - started
+        backend_breaker.record(False, elapsed, probe)
+        metrics.observe("driver_upstream_request_duration_seconds", elapsed, upstream=backend_breaker.name, outcome="error")
+        raise
+    elapsed = time.monotonic() - started
+    backend_breaker.record(resp.status_code < 500, elapsed, probe)
+    metrics.observe("driver_upstream_request_duration_seconds", elapsed, upstream=backend_breaker.name,
+                    outcome="ok" if resp.status_code < 500 else "5xx")
+    return resp
+
+@app.before_request
+def admit_request():
+    g.admitted = False
+    if request.path in ADMISSION_EXEMPT:
+        return None
+    if not admission.try_enter():
+        return jsonify({"error": "Server overloaded"}), 503, {"Retry-After": "1"}
+    g.admitted = True
+    return None
+
+@app.after_request
+def hold_streamed_slot(response):
+    # A streamed body is still being produced after teardown, so its slot is freed when the server closes it
+    if response.is_streamed and g.pop("admitted", False):
+        response.call_on_close(admission.leave)
+    return response
+
+@app.teardown_request
+def release_request(exc):
+    if g.pop("admitted", False):
+        admission.leave()
+
+@app.errorhandler(BreakerOpen)
+def breaker_open(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": retry_after_header(e.retry_after)}
+
+@app.errorhandler(requests.RequestException)
+def backend_unreachable(e):
+    return jsonify({"error": f"Backend request failed: {e}"}), 502
+
+@app.route("/upstream/status", methods=["GET"])
+def upstream_status():
+    return jsonify({"admission": admission.snapshot(), "breakers": {backend_breaker.name: backend_breaker.snapshot()}})
+
+def proxy_request(method, target_path, auth_forward=False, stream=False, passthrough=True, **kwargs):
     url = f"{API_BASE}{target_path}"
     headers = {}
     if auth_forward:
         auth_header = request.headers.get("Authorization")
         if auth_header:
             headers["Authorization"] = auth_header
+    client_encoding = request.headers.get("Accept-Encoding", "")
+    if passthrough:
+        # Let the backend compress for the client; an accepted coding is relayed without recompressing
+        headers["Accept-Encoding"] = client_encoding or "identity"
+    if request.data:
+        # The body is relayed as received rather than parsed and re-encoded
+        headers["Content-Type"] = request.headers.get("Content-Type", "application/json")
     if "headers" in kwargs:
         headers.update(kwargs["headers"])
         del kwargs["headers"]
-    resp = requests.request(
+    resp = backend_request(
         method,
         url,
         headers=headers,
         params=request.args,
         data=request.data if request.data else None,
-        json=request.get_json(silent=True),
-        stream=stream
+        stream=True
     )
-    excluded_headers = ["content-encoding", "content-length", "transfer-encoding", "connection"]
+    upstream_encoding = resp.headers.get("Content-Encoding", "identity").lower()
+    relay_encoded = passthrough and upstream_encoding != "identity" and accepts_encoding(client_encoding, upstream_encoding)
+    excluded_headers = ["content-length", "transfer-encoding", "connection"]
+    if not relay_encoded:
+        excluded_headers.append("content-encoding")
     response_headers = [(name, value) for (name, value) in resp.raw.headers.items()
                         if name.lower() not in excluded_headers]
     if stream:
-        return Response(stream_with_context(resp.iter_content(chunk_size=4096)), status=resp.status_code, headers=response_headers)
+        body = resp.raw.stream(4096, decode_content=not relay_encoded)
+        return Response(stream_with_context(body), status=resp.status_code, headers=response_headers)
     else:
-        return (resp.content, resp.status_code, response_headers)
+        content = resp.raw.read(decode_content=False) if relay_encoded else resp.content
+        return (content, resp.status_code, response_headers)
+
+@app.after_request
+def compress_response(response):
+    if not COMPRESSION_ENABLED:
+        return response
+    route = request.url_rule.rule if request.url_rule else request.path
+    if response.headers.get("Content-Encoding"):
+        compression_stats.add(route, responses=1, passthrough=1, bytes_out=response.content_length or 0)
+        response.vary.add("Accept-Encoding")
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304) or not is_compressible(response.mimetype):
+        return response
+    coding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+    if coding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(route, response.response, coding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_BYTES:
+            compression_stats.add(route, responses=1, below_threshold=1, bytes_in=len(data), bytes_out=len(data))
+            return response
+        response.set_data(compress_body(route, data, coding))
+    response.headers["Content-Encoding"] = coding
+    response.vary.add("Accept-Encoding")
+    return response
+
+@app.route("/compression/stats", methods=["GET"])
+def compression_stats_view():
+    return jsonify({"enabled": COMPRESSION_ENABLED, "codings": CODINGS, "min_bytes": COMPRESSION_MIN_BYTES,
+                    "routes": compression_stats.snapshot()})
 
 @app.route("/session/login", methods=["POST"])
 def session_login():
     # Forward JSON body to device backend
-    return proxy_request("POST", "/session/login")
+    body, status, headers = proxy_request("POST", "/session/login", passthrough=False)
+    if token_cache is not None and status == 200:
+        remember_login(body)
+    return body, status, headers
 
 @app.route("/session/logout", methods=["POST"])
 @require_auth
 def session_logout():
-    return proxy_request("POST", "/session/logout", auth_forward=True)
+    response = proxy_request("POST", "/session/logout", auth_forward=True)
+    if token_cache is not None:
+        token_cache.discard(bearer_token(request.headers["Authorization"]))
+    return response
 
 @app.route("/schedules", methods=["GET", "POST"])
 @require_auth
@@ -75,6 +514,8 @@ def schedules():
 @require_auth
 def posts():
     if request.method == "GET":
+        if request.args.get("stream") == "ndjson":
+            return stream_listing("/posts")
         return proxy_request("GET", "/posts", auth_forward=True)
     elif request.method == "POST":
         return proxy_request("POST", "/posts", auth_forward=True)
@@ -82,6 +523,8 @@ def posts():
 @app.route("/search", methods=["GET"])
 @require_auth
 def search():
+    if request.args.get("stream") == "ndjson":
+        return stream_listing("/search")
     return proxy_request("GET", "/search", auth_forward=True)
 
 @app.route("/chats/<chat_id>/messages", methods=["GET", "POST"])
@@ -93,5 +536,117 @@ def chat_messages(chat_id):
     elif request.method == "POST":
         return proxy_request("POST", path, auth_forward=True)
 
+# --- Request Batching ---
+
+# Sub-request targets /batch accepts: the proxied REST API and nothing else
+BATCH_PATH = re.compile(r"^/(schedules|posts|search|chats/[\w-]+/messages)(\?[^#]*)?$")
+
+# Keep-alive connections to the backend shared by /batch and streamed listings
+batch_session = requests.Session()
+batch_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=BATCH_WORKERS))
+batch_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=BATCH_WORKERS))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+
+def batch_items(payload):
+    items = payload.get("requests") if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError("Expected a list of {method, path, body} objects")
+    return items
+
+def run_batch_item(item, auth_header):
+    method = str(item.get("method", "GET")).upper()
+    path = item.get("path")
+    if method not in ("GET", "POST") or not isinstance(path, str) or not BATCH_PATH.match(path):
+        return 400, {"error": "Unsupported sub-request"}
+    try:
+        resp = backend_request(
+            method,
+            f"{API_BASE}{path}",
+            session=batch_session,
+            headers={"Authorization": auth_header, "Content-Type": "application/json"},
+            data=json_dumps(item.get("body")) if method == "POST" else None,
+            timeout=BATCH_ITEM_TIMEOUT,
+        )
+    except BreakerOpen as e:
+        return 503, {"error": str(e)}
+    except requests.RequestException as e:
+        return 502, {"error": str(e)}
+    try:
+        return resp.status_code, json_loads(resp.content)
+    except ValueError:
+        return resp.status_code, resp.text
+
+def stream_batch(items, auth_header):
+    # At most BATCH_CONCURRENCY items of this batch in flight; results leave in request order
+    pending = deque()
+    next_index = 0
+    while pending or next_index < len(items):
+        while next_index < len(items) and len(pending) < BATCH_CONCURRENCY:
+            pending.append(batch_executor.submit(run_batch_item, items[next_index], auth_header))
+            next_index += 1
+        index = next_index - len(pending)
+        status, body = pending.popleft().result()
+        yield json_dumps({"index": index, "status": status, "body": body}) + b"\n"
+
+@app.route("/batch", methods=["POST"])
+@require_auth
+def batch():
+    try:
+        items = batch_items(request.get_json(force=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} sub-requests per batch"}), 413
+    return Response(stream_with_context(stream_batch(items, request.headers["Authorization"])),
+                    mimetype="application/x-ndjson")
+
+# --- NDJSON Streaming Pagination ---
+
+def fetch_page(path, params, auth_header):
+    """GET one backend page; returns (status, items, next_cursor), or (status, error_body, None) on failure."""
+    try:
+        resp = backend_request("GET", f"{API_BASE}{path}", session=batch_session, params=params,
+                               headers={"Authorization": auth_header}, timeout=STREAM_PAGE_TIMEOUT)
+    except BreakerOpen as e:
+        return 503, json_dumps({"error": str(e)}), None
+    except requests.RequestException as e:
+        return 502, json_dumps({"error": str(e)}), None
+    if resp.status_code != 200:
+        return resp.status_code, resp.content, None
+    try:
+        page = json_loads(resp.content)
+    except ValueError:
+        page = None
+    if not isinstance(page, dict) or not isinstance(page.get(PAGE_ITEMS_FIELD), list):
+        return 502, json_dumps({"error": f"Backend page has no '{PAGE_ITEMS_FIELD}' list"}), None
+    return 200, page[PAGE_ITEMS_FIELD], page.get(PAGE_CURSOR_FIELD)
+
+def stream_pages(path, params, auth_header, items, cursor):
+    # Page N+1 is fetched on the pool while page N's items are written out, so at most two pages are held
+    pages = 1
+    while True:
+        future = None
+        if cursor is not None and pages < STREAM_MAX_PAGES:
+            future = batch_executor.submit(fetch_page, path, dict(params, **{PAGE_CURSOR_PARAM: cursor}), auth_header)
+        if items:
+            yield b"".join(json_dumps(item) + b"\n" for item in items)
+        if future is None:
+            return
+        status, items, cursor = future.result()
+        pages += 1
+        if status != 200:
+            # Headers are long gone; report the failure in-band as the last line
+            yield json_dumps({"error": "Backend page request failed", "status": status}) + b"\n"
+            return
+
+def stream_listing(path):
+    params = {name: value for name, value in request.args.items() if name != "stream"}
+    auth_header = request.headers.get("Authorization")
+    status, items, cursor = fetch_page(path, params, auth_header)
+    if status != 200:
+        return items, status, {"Content-Type": "application/json"}
+    return Response(stream_with_context(stream_pages(path, params, auth_header, items, cursor)),
+                    mimetype="application/x-ndjson")
+
 if __name__ == "__main__":
     app.run(host=SERVER_HOST, port=SERVER_PORT)
\ No newline at end of file
@@ -1,9 +1,25 @@
 import os
-import json
+import sys
+import re
+import time
 import asyncio
+import contextlib
+import itertools
+import resource
+import threading
+import zlib
+from collections import deque
 from urllib.parse import urlencode
 
-from aiohttp import web, ClientSession, WSMsgType
+from aiohttp import web, ClientSession, ClientError, ClientTimeout, TCPConnector, WSMsgType
+
+# Helpers shared by every driver live in iot_driver_copilot/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.jsoncodec import json_dumps, json_loads
+from common.tokens import SharedTokenCache, TokenCache
+from common.resilience import AdmissionControl, BreakerOpen, CircuitBreaker, retry_after_header
+from common.metrics import METRICS_CONTENT_TYPE, Metrics
+from common.debug import SamplingProfiler, StackWatch, debug_denied, poll_tasks, profile_seconds
 
 # Load configuration from environment variables
 DEVICE_HOST = os.environ.get("DEVICE_HOST")
@@ -12,6 +28,72 @@ DEVICE_PROTOCOL = os.environ.get("DEVICE_PROTOCOL", "http").lower()
 SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
 SERVER_PORT = int(os.environ.get("SERVER_PORT", "8080"))
 
+# WebSocket proxy flow control
+WS_SEND_QUEUE_MESSAGES = int(os.environ.get("WS_SEND_QUEUE_MESSAGES", "256"))
+WS_SEND_QUEUE_BYTES = int(os.environ.get("WS_SEND_QUEUE_BYTES", str(1024 * 1024)))
+WS_SLOW_CONSUMER_POLICY = os.environ.get("WS_SLOW_CONSUMER_POLICY", "drop").lower()
+WS_HEARTBEAT = float(os.environ.get("WS_HEARTBEAT", "30"))
+WS_MAX_MSG_SIZE = int(os.environ.get("WS_MAX_MSG_SIZE", str(4 * 1024 * 1024)))
+WS_DRAIN_TIMEOUT = float(os.environ.get("WS_DRAIN_TIMEOUT", "1"))
+
+# Opt-in multiplexed mode: a few shared device websockets, messages routed by channel id
+WS_MULTIPLEX = os.environ.get("WS_MULTIPLEX", "false").lower() == "true"
+WS_UPSTREAM_POOL_SIZE = int(os.environ.get("WS_UPSTREAM_POOL_SIZE", "2"))
+WS_CHANNEL_FIELDS = [f for f in os.environ.get("WS_CHANNEL_FIELDS", "chat_id,chatId,channel").split(",") if f]
+
+# Edge token validation: tokens seen in /session/login responses, dropped on logout or expiry
+TOKEN_CACHE_ENABLED = os.environ.get("TOKEN_CACHE_ENABLED", "true").lower() == "true"
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_TTL = float(os.environ.get("TOKEN_TTL", "3600"))
+# Name of a shared memory segment to share the cache between worker processes on this host
+TOKEN_CACHE_SHM = os.environ.get("TOKEN_CACHE_SHM", "")
+
+# ?stream=ndjson listings: the backend's cursor paging fields and a cap on pages walked per request
+PAGE_ITEMS_FIELD = os.environ.get("PAGE_ITEMS_FIELD", "items")
+PAGE_CURSOR_FIELD = os.environ.get("PAGE_CURSOR_FIELD", "next_cursor")
+PAGE_CURSOR_PARAM = os.environ.get("PAGE_CURSOR_PARAM", "cursor")
+STREAM_MAX_PAGES = int(os.environ.get("STREAM_MAX_PAGES", "10000"))
+STREAM_PAGE_TIMEOUT = float(os.environ.get("STREAM_PAGE_TIMEOUT", "30"))
+
+# Upstream protection: per-upstream circuit breaker (error rate and slow calls) and an in-flight cap
+UPSTREAM_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", "10"))
+BREAKER_ENABLED = os.environ.get("BREAKER_ENABLED", "true").lower() == "true"
+BREAKER_WINDOW = int(os.environ.get("BREAKER_WINDOW", "10"))
+BREAKER_MIN_REQUESTS = int(os.environ.get("BREAKER_MIN_REQUESTS", "20"))
+BREAKER_ERROR_RATE = float(os.environ.get("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_MS = float(os.environ.get("BREAKER_SLOW_MS", "2000"))
+BREAKER_OPEN_SECONDS = float(os.environ.get("BREAKER_OPEN_SECONDS", "5"))
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get("BREAKER_HALF_OPEN_PROBES", "3"))
+MAX_INFLIGHT = int(os.environ.get("MAX_INFLIGHT", "256"))
+
+# Prometheus /metrics; per-client byte counters stop adding new client labels past METRICS_MAX_CLIENTS
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MAX_CLIENTS = int(os.environ.get("METRICS_MAX_CLIENTS", "100"))
+
+# /debug/profile and /debug/tasks are compiled in but answer 404 unless DEBUG_ENDPOINTS=true;
+# with DEBUG_TOKEN set, callers must also send it in the X-Debug-Token header
+DEBUG_ENDPOINTS = os.environ.get("DEBUG_ENDPOINTS", "false").lower() == "true"
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+DEBUG_PROFILE_MAX_SECONDS = float(os.environ.get("DEBUG_PROFILE_MAX_SECONDS", "60"))
+DEBUG_PROFILE_HZ = float(os.environ.get("DEBUG_PROFILE_HZ", "100"))
+DEBUG_STUCK_SECONDS = float(os.environ.get("DEBUG_STUCK_SECONDS", "10"))
+
+# /batch: sub-requests per call and how many of them run at once per batch
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "100"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+BATCH_ITEM_TIMEOUT = float(os.environ.get("BATCH_ITEM_TIMEOUT", "30"))
+
+# Response compression: codings in server preference order and the smallest body worth compressing
+COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_ALGORITHMS = [c.strip() for c in os.environ.get("COMPRESSION_ALGORITHMS", "zstd,br,gzip").split(",") if c.strip()]
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL = int(os.environ.get("COMPRESSION_ZSTD_LEVEL", "3"))
+
+if WS_SLOW_CONSUMER_POLICY not in ("drop", "coalesce", "disconnect"):
+    raise RuntimeError("WS_SLOW_CONSUMER_POLICY must be one of drop, coalesce, disconnect.")
+
 # Compose base URL for backend device
 if DEVICE_PROTOCOL == "https":
     BASE_URL = f"https://{DEVICE_HOST}:{DEVICE_PORT}"
@@ -20,8 +102,39 @@ else:
 
 routes = web.RouteTableDef()
 
-# Session store for tokens (in-memory, for demo purposes)
-SESSION_TOKENS = {}
+# --- JSON Codec ---
+
+def json_response(data, status=200):
+    return web.Response(body=json_dumps(data), status=status, content_type="application/json")
+
+# --- Token Cache ---
+
+# Bounded, TTL-evicting store of tokens issued by the backend
+if not TOKEN_CACHE_ENABLED:
+    SESSION_TOKENS = None
+elif TOKEN_CACHE_SHM:
+    SESSION_TOKENS = SharedTokenCache(TOKEN_CACHE_SHM, TOKEN_CACHE_SIZE, TOKEN_TTL)
+else:
+    SESSION_TOKENS = TokenCache(TOKEN_CACHE_SIZE, TOKEN_TTL)
+
+# Routes that need a token the proxy has seen issued
+PROTECTED_PATHS = ("/session/logout", "/schedules", "/posts", "/search", "/chats/", "/batch")
+
+def bearer_token(auth_header):
+    if auth_header.lower().startswith("bearer "):
+        return auth_header[7:].strip()
+    return auth_header.strip()
+
+@web.middleware
+async def token_auth_middleware(request, handler):
+    if SESSION_TOKENS is not None and request.path.startswith(PROTECTED_PATHS):
+        auth = request.headers.get("Authorization")
+        if not auth:
+            return json_response({"error": "Unauthorized"}, status=401)
+        # Unknown or expired tokens are rejected here without a backend round trip
+        if not SESSION_TOKENS.valid(bearer_token(auth)):
+            return json_response({"error": "Invalid or expired token"}, status=401)
+    return await handler(request)
 
 def get_auth_header(request):
     auth = request.headers.get("Authorization")
@@ -29,137 +142,998 @@ def get_auth_header(request):
         return {}
     return {"Authorization": auth}
 
+# --- Response Compression ---
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODINGS = [c for c in COMPRESSION_ALGORITHMS
+           if c == "gzip" or (c == "br" and brotli is not None) or (c == "zstd" and zstandard is not None)]
+
+def parse_accept_encoding(header):
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+def accepts_encoding(header, coding):
+    accepted = parse_accept_encoding(header)
+    return accepted.get(coding, accepted.get("*", 0.0)) > 0
+
+def negotiate_encoding(header):
+    # Highest client q-value wins; server preference order breaks ties
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for coding in CODINGS:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+def is_compressible(content_type):
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    return (content_type.startswith("text/") or content_type.endswith(("+json", "+xml"))
+            or content_type in ("application/json", "application/x-ndjson", "application/javascript", "application/xml"))
+
+def decode_body(data, coding):
+    """Undo an upstream content coding the client did not accept."""
+    if coding in ("gzip", "x-gzip", "deflate"):
+        try:
+            # wbits 47 auto-detects gzip and zlib headers; fall back to raw deflate
+            return zlib.decompress(data, 47)
+        except zlib.error:
+            return zlib.decompress(data, -15)
+    if coding == "br" and brotli is not None:
+        return brotli.decompress(data)
+    if coding == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError(f"Unsupported content coding {coding}")
+
+class StreamCompressor:
+    """Incremental encoder for one response body; flush=True emits everything fed so far."""
+    def __init__(self, coding):
+        self.coding = coding
+        if coding == "gzip":
+            self.obj = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif coding == "br":
+            self.obj = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self.obj = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data, flush=False):
+        if self.coding == "gzip":
+            out = self.obj.compress(data)
+            return out + self.obj.flush(zlib.Z_SYNC_FLUSH) if flush else out
+        if self.coding == "br":
+            out = self.obj.process(data)
+            return out + self.obj.flush() if flush else out
+        out = self.obj.compress(data)
+        return out + self.obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else out
+
+    def finish(self):
+        if self.coding == "br":
+            return self.obj.finish()
+        return self.obj.flush()
+
+class CompressionStats:
+    """Per-route response counters, bytes before/after compression and CPU spent compressing."""
+    FIELDS = ("responses", "compressed", "passthrough", "below_threshold", "bytes_in", "bytes_out", "cpu_seconds")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def add(self, route, **counts):
+        with self.lock:
+            entry = self.routes.get(route)
+            if entry is None:
+                entry = self.routes[route] = dict.fromkeys(self.FIELDS, 0)
+            for name, value in counts.items():
+                entry[name] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                route: dict(entry, bytes_saved=entry["bytes_in"] - entry["bytes_out"])
+                for route, entry in self.routes.items()
+            }
+
+compression_stats = CompressionStats()
+
+def compress_body(route, data, coding):
+    started = time.thread_time()
+    compressor = StreamCompressor(coding)
+    out = compressor.compress(data) + compressor.finish()
+    compression_stats.add(route, responses=1, compressed=1, bytes_in=len(data), bytes_out=len(out),
+                          cpu_seconds=time.thread_time() - started)
+    return out
+
+def compress_stream(route, chunks, coding):
+    # Each chunk is flushed so streamed items reach the client as soon as they are produced
+    compressor = StreamCompressor(coding)
+    bytes_in = bytes_out = 0
+    cpu = 0.0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            started = time.thread_time()
+            out = compressor.compress(chunk, flush=True)
+            cpu += time.thread_time() - started
+            bytes_in += len(chunk)
+            bytes_out += len(out)
+            if out:
+                yield out
+        out = compressor.finish()
+        bytes_out += len(out)
+        yield out
+    finally:
+        compression_stats.add(route, responses=1, compressed=1, bytes_in=bytes_in, bytes_out=bytes_out, cpu_seconds=cpu)
+
+def route_name(request):
+    resource = request.match_info.route.resource
+    return resource.canonical if resource is not None else request.path
+
+@web.middleware
+async def compression_middleware(request, handler):
+    response = await handler(request)
+    if not COMPRESSION_ENABLED or not isinstance(response, web.Response) or not isinstance(response.body, bytes):
+        return response
+    route = route_name(request)
+    if response.headers.get("Content-Encoding"):
+        compression_stats.add(route, responses=1, passthrough=1, bytes_out=len(response.body))
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+    if response.status < 200 or response.status in (204, 304) or not is_compressible(response.content_type):
+        return response
+    coding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+    if coding is None:
+        return response
+    data = response.body
+    if len(data) < COMPRESSION_MIN_BYTES:
+        compression_stats.add(route, responses=1, below_threshold=1, bytes_in=len(data), bytes_out=len(data))
+        return response
+    response.body = compress_body(route, data, coding)
+    response.headers["Content-Encoding"] = coding
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+class EncodedStream:
+    """StreamResponse writer that compresses on the fly when the client negotiated a coding."""
+    def __init__(self, request, content_type):
+        self.request = request
+        self.route = route_name(request)
+        coding = None
+        if COMPRESSION_ENABLED and is_compressible(content_type):
+            coding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+        self.compressor = StreamCompressor(coding) if coding else None
+        self.response = web.StreamResponse(headers={"Content-Type": content_type})
+        if coding:
+            self.response.headers["Content-Encoding"] = coding
+            self.response.headers["Vary"] = "Accept-Encoding"
+        self.bytes_in = self.bytes_out = 0
+        self.cpu = 0.0
+
+    async def prepare(self):
+        await self.response.prepare(self.request)
+
+    def _encode(self, data, final=False):
+        if self.compressor is None:
+            return data
+        started = time.thread_time()
+        out = self.compressor.compress(data, flush=True)
+        if final:
+            out += self.compressor.finish()
+        self.cpu += time.thread_time() - started
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        return out
+
+    async def write(self, data):
+        # Flushed per write so streamed items reach the client as soon as they are produced
+        out = self._encode(data)
+        if out:
+            await self.response.write(out)
+
+    async def close(self):
+        if self.compressor is not None:
+            await self.response.write(self._encode(b"", final=True))
+            compression_stats.add(self.route, responses=1, compressed=1, bytes_in=self.bytes_in,
+                                  bytes_out=self.bytes_out, cpu_seconds=self.cpu)
+        await self.response.write_eof()
+
+@routes.get("/compression/stats")
+async def compression_stats_view(request):
+    return json_response({"enabled": COMPRESSION_ENABLED, "codings": CODINGS, "min_bytes": COMPRESSION_MIN_BYTES,
+                              "routes": compression_stats.snapshot()})
+
+# --- Circuit Breaker and Admission Control ---
+
+backend_breaker = CircuitBreaker(
+    "backend", window=BREAKER_WINDOW, min_requests=BREAKER_MIN_REQUESTS, error_rate=BREAKER_ERROR_RATE,
+    slow_ms=BREAKER_SLOW_MS, open_seconds=BREAKER_OPEN_SECONDS, half_open_probes=BREAKER_HALF_OPEN_PROBES,
+    enabled=BREAKER_ENABLED)
+admission = AdmissionControl(MAX_INFLIGHT)
+# Operator endpoints and long-lived websockets are not counted against MAX_INFLIGHT
+ADMISSION_EXEMPT = ("/upstream/status", "/compression/stats", "/metrics", "/debug/", "/wsproxy")
+
+@contextlib.asynccontextmanager
+async def backend_call(session, method, url, **kwargs):
+    """session.request() behind the backend breaker; raises BreakerOpen instead of calling a failing backend."""
+    allowed, probe, retry_after = backend_breaker.admit()
+    if not allowed:
+        raise BreakerOpen(backend_breaker.name, retry_after)
+    kwargs.setdefault("timeout", ClientTimeout(total=UPSTREAM_TIMEOUT))
+    started = time.monotonic()
+    ok = False
+    outcome = "error"
+    try:
+        async with session.request(method, url, **kwargs) as resp:
+            ok = resp.status < 500
+            outcome = "ok" if ok else "5xx"
+            metrics.observe("driver_upstream_request_duration_seconds", time.monotonic() - started,
+                            upstream=backend_breaker.name, outcome=outcome)
+            yield resp
+    finally:
+        backend_breaker.record(ok, time.monotonic() - started, probe)
+        if outcome == "error":
+            metrics.observe("driver_upstream_request_duration_seconds", time.monotonic() - started,
+                            upstream=backend_breaker.name, outcome=outcome)
+
+@web.middleware
+async def admission_middleware(request, handler):
+    if request.path.startswith(ADMISSION_EXEMPT):
+        return await handler(request)
+    if not admission.try_enter():
+        response = json_response({"error": "Server overloaded"}, status=503)
+        response.headers["Retry-After"] = "1"
+        return response
+    try:
+        return await handler(request)
+    except BreakerOpen as e:
+        response = json_response({"error": str(e)}, status=503)
+        response.headers["Retry-After"] = retry_after_header(e.retry_after)
+        return response
+    except (ClientError, asyncio.TimeoutError) as e:
+        return json_response({"error": f"Backend request failed: {str(e) or type(e).__name__}"}, status=502)
+    finally:
+        admission.leave()
+
+@routes.get("/upstream/status")
+async def upstream_status(request):
+    return json_response({"admission": admission.snapshot(), "breakers": {backend_breaker.name: backend_breaker.snapshot()}})
+
+# --- Metrics ---
+
+METRIC_HELP = {
+    "driver_http_request_duration_seconds": "Time from request arrival until the response headers were sent.",
+    "driver_upstream_request_duration_seconds": "Backend call latency to response headers, by outcome.",
+    "driver_client_bytes_sent_total": "Response body bytes sent, by client address.",
+    "driver_inflight_requests": "Requests currently admitted.",
+}
+
+metrics = Metrics(METRICS_MAX_CLIENTS, METRIC_HELP, enabled=METRICS_ENABLED)
+metrics.gauge("driver_inflight_requests", lambda: admission.inflight)
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    # Outermost middleware; latency is taken when the response is prepared (see record_latency)
+    request["metrics_started"] = time.perf_counter()
+    response = await handler(request)
+    if METRICS_ENABLED:
+        sent = response.body_length if response.prepared else (response.content_length or 0)
+        metrics.inc("driver_client_bytes_sent_total", sent, client=metrics.client_label(request.remote or "unknown"))
+    return response
+
+async def record_latency(request, response):
+    # on_response_prepare: fires as headers go out, so streamed responses are timed to their first byte
+    started = request.get("metrics_started")
+    if started is None or not METRICS_ENABLED:
+        return
+    resource = request.match_info.route.resource
+    metrics.observe("driver_http_request_duration_seconds", time.perf_counter() - started,
+                    route=resource.canonical if resource is not None else "unmatched",
+                    method=request.method, status=str(response.status))
+
+@routes.get("/metrics")
+async def metrics_view(request):
+    if not METRICS_ENABLED:
+        return json_response({"error": "Metrics are disabled"}, status=404)
+    return web.Response(body=metrics.render().encode(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+# --- Debug Endpoints ---
+
+profiler = SamplingProfiler(DEBUG_PROFILE_HZ)
+stack_watch = StackWatch(DEBUG_STUCK_SECONDS)
+
+# Event loop lag seen by the watchdog: how late its one-second sleep woke up
+loop_lag = {"last_seconds": 0.0, "max_seconds": 0.0}
+
+async def debug_watchdog():
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(1.0)
+        lag = time.monotonic() - started - 1.0
+        loop_lag["last_seconds"] = round(lag, 4)
+        loop_lag["max_seconds"] = round(max(loop_lag["max_seconds"], lag), 4)
+        stack_watch.update(poll_tasks())
+
+async def debug_watchdog_ctx(app):
+    task = asyncio.create_task(debug_watchdog()) if DEBUG_ENDPOINTS else None
+    yield
+    if task is not None:
+        task.cancel()
+
+@routes.get("/debug/profile")
+async def debug_profile(request):
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return json_response({"error": denied[1]}, status=denied[0])
+    try:
+        seconds = profile_seconds(request.query.get("seconds"), DEBUG_PROFILE_MAX_SECONDS)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    # Sampled from an executor thread so the event loop keeps serving (and shows up in the profile)
+    stacks = await asyncio.get_running_loop().run_in_executor(
+        None, profiler.profile, seconds, request.query.get("mode", "cpu") != "wall")
+    if stacks is None:
+        return json_response({"error": "A profile is already running"}, status=409)
+    return web.Response(text=stacks, content_type="text/plain",
+                        headers={"Content-Disposition": "attachment; filename=profile.collapsed"})
+
+@routes.get("/debug/tasks")
+async def debug_tasks(request):
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return json_response({"error": denied[1]}, status=denied[0])
+    return json_response({"stuck_after_seconds": DEBUG_STUCK_SECONDS, "loop_lag": loop_lag, "tasks": stack_watch.snapshot()})
+
 # --- REST API Proxy Endpoints ---
 
 @routes.post("/session/login")
 async def session_login(request):
-    data = await request.json()
-    async with ClientSession() as session:
-        async with session.post(f"{BASE_URL}/session/login", json=data) as resp:
-            res_data = await resp.json()
-            token = res_data.get("token")
-            if token:
-                SESSION_TOKENS[token] = True
-            return web.json_response(res_data, status=resp.status)
+    data = await request.json(loads=json_loads)
+    async with backend_call(request.app["client_session"], "POST", f"{BASE_URL}/session/login",
+                            data=json_dumps(data), headers={"Content-Type": "application/json"}) as resp:
+        res_data = await resp.json(loads=json_loads)
+        token = res_data.get("token") or res_data.get("session_token") if isinstance(res_data, dict) else None
+        if token and SESSION_TOKENS is not None and resp.status == 200:
+            ttl = res_data.get("expires_in")
+            # A shared cache takes a file lock, so the write runs off the event loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, SESSION_TOKENS.add, token, float(ttl) if isinstance(ttl, (int, float)) and ttl > 0 else None)
+        return json_response(res_data, status=resp.status)
 
 @routes.post("/session/logout")
 async def session_logout(request):
     headers = get_auth_header(request)
-    async with ClientSession() as session:
-        async with session.post(f"{BASE_URL}/session/logout", headers=headers) as resp:
-            res_data = await resp.json()
-            token = request.headers.get("Authorization", "").replace("Bearer ", "")
-            if token in SESSION_TOKENS:
-                del SESSION_TOKENS[token]
-            return web.json_response(res_data, status=resp.status)
+    async with backend_call(request.app["client_session"], "POST", f"{BASE_URL}/session/logout", headers=headers) as resp:
+        res_data = await resp.json(loads=json_loads)
+        if SESSION_TOKENS is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, SESSION_TOKENS.discard, bearer_token(request.headers.get("Authorization", "")))
+        return json_response(res_data, status=resp.status)
+
+async def relay(request, method, path, body=None):
+    """
+    Forward to the backend over the pooled relay session and return its body bytes
+    as-is. A compressed body the client accepts passes through untouched; other
+    codings are decoded here and left to the compression middleware.
+    """
+    url = f"{BASE_URL}{path}"
+    params = request.rel_url.query
+    if params:
+        url += f"?{urlencode(params)}"
+    headers = get_auth_header(request)
+    client_encoding = request.headers.get("Accept-Encoding", "")
+    headers["Accept-Encoding"] = client_encoding or "identity"
+    if body is not None:
+        # Request bodies are relayed as received rather than parsed and re-encoded
+        headers["Content-Type"] = request.headers.get("Content-Type", "application/json")
+    async with backend_call(request.app["relay_session"], method, url, headers=headers, data=body) as resp:
+        body = await resp.read()
+        status = resp.status
+        content_type = resp.headers.get("Content-Type", "application/json")
+        encoding = resp.headers.get("Content-Encoding", "identity").lower()
+    response = web.Response(body=body, status=status, headers={"Content-Type": content_type})
+    if encoding != "identity":
+        if accepts_encoding(client_encoding, encoding):
+            response.headers["Content-Encoding"] = encoding
+        else:
+            try:
+                response.body = decode_body(body, encoding)
+            except (ValueError, zlib.error):
+                response.headers["Content-Encoding"] = encoding
+    return response
 
 @routes.get("/schedules")
 async def get_schedules(request):
-    headers = get_auth_header(request)
-    async with ClientSession() as session:
-        async with session.get(f"{BASE_URL}/schedules", headers=headers) as resp:
-            res_data = await resp.json()
-            return web.json_response(res_data, status=resp.status)
+    return await relay(request, "GET", "/schedules")
 
 @routes.post("/schedules")
 async def post_schedules(request):
-    headers = get_auth_header(request)
-    data = await request.json()
-    async with ClientSession() as session:
-        async with session.post(f"{BASE_URL}/schedules", headers=headers, json=data) as resp:
-            res_data = await resp.json()
-            return web.json_response(res_data, status=resp.status)
+    return await relay(request, "POST", "/schedules", await request.read())
 
 @routes.get("/posts")
 async def get_posts(request):
-    headers = get_auth_header(request)
-    params = request.rel_url.query
-    url = f"{BASE_URL}/posts"
-    if params:
-        url += f"?{urlencode(params)}"
-    async with ClientSession() as session:
-        async with session.get(url, headers=headers) as resp:
-            res_data = await resp.json()
-            return web.json_response(res_data, status=resp.status)
+    if request.rel_url.query.get("stream") == "ndjson":
+        return await stream_listing(request, "/posts")
+    return await relay(request, "GET", "/posts")
 
 @routes.post("/posts")
 async def post_posts(request):
-    headers = get_auth_header(request)
-    data = await request.json()
-    async with ClientSession() as session:
-        async with session.post(f"{BASE_URL}/posts", headers=headers, json=data) as resp:
-            res_data = await resp.json()
-            return web.json_response(res_data, status=resp.status)
+    return await relay(request, "POST", "/posts", await request.read())
 
 @routes.get("/search")
 async def get_search(request):
-    headers = get_auth_header(request)
-    params = request.rel_url.query
-    url = f"{BASE_URL}/search"
-    if params:
-        url += f"?{urlencode(params)}"
-    async with ClientSession() as session:
-        async with session.get(url, headers=headers) as resp:
-            res_data = await resp.json()
-            return web.json_response(res_data, status=resp.status)
+    if request.rel_url.query.get("stream") == "ndjson":
+        return await stream_listing(request, "/search")
+    return await relay(request, "GET", "/search")
 
 @routes.get("/chats/{chatId}/messages")
 async def get_chat_messages(request):
-    headers = get_auth_header(request)
-    chat_id = request.match_info["chatId"]
-    url = f"{BASE_URL}/chats/{chat_id}/messages"
-    async with ClientSession() as session:
-        async with session.get(url, headers=headers) as resp:
-            res_data = await resp.json()
-            return web.json_response(res_data, status=resp.status)
+    return await relay(request, "GET", f"/chats/{request.match_info['chatId']}/messages")
 
 @routes.post("/chats/{chatId}/messages")
 async def post_chat_messages(request):
+    return await relay(request, "POST", f"/chats/{request.match_info['chatId']}/messages", await request.read())
+
+# --- Request Batching ---
+
+# Sub-request targets /batch accepts: the proxied REST API and nothing else
+BATCH_PATH = re.compile(r"^/(schedules|posts|search|chats/[\w-]+/messages)(\?[^#]*)?$")
+
+def batch_items(payload):
+    items = payload.get("requests") if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError("Expected a list of {method, path, body} objects")
+    return items
+
+async def run_batch_item(session, semaphore, item, headers):
+    method = str(item.get("method", "GET")).upper()
+    path = item.get("path")
+    if method not in ("GET", "POST") or not isinstance(path, str) or not BATCH_PATH.match(path):
+        return 400, {"error": "Unsupported sub-request"}
+    async with semaphore:
+        try:
+            async with backend_call(
+                session,
+                method,
+                f"{BASE_URL}{path}",
+                headers=dict(headers, **{"Content-Type": "application/json"}),
+                data=json_dumps(item.get("body")) if method == "POST" else None,
+                timeout=ClientTimeout(total=BATCH_ITEM_TIMEOUT),
+            ) as resp:
+                raw = await resp.read()
+                status = resp.status
+        except BreakerOpen as e:
+            return 503, {"error": str(e)}
+        except (ClientError, asyncio.TimeoutError) as e:
+            return 502, {"error": str(e) or type(e).__name__}
+    try:
+        return status, json_loads(raw)
+    except ValueError:
+        return status, raw.decode("utf-8", "replace")
+
+@routes.post("/batch")
+async def batch(request):
+    try:
+        items = batch_items(await request.json(loads=json_loads))
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return json_response({"error": f"At most {BATCH_MAX_ITEMS} sub-requests per batch"}, status=413)
+    # Sub-requests share the app's pooled client; the semaphore caps this batch's share of it
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    session = request.app["client_session"]
     headers = get_auth_header(request)
-    chat_id = request.match_info["chatId"]
-    data = await request.json()
-    url = f"{BASE_URL}/chats/{chat_id}/messages"
-    async with ClientSession() as session:
-        async with session.post(url, headers=headers, json=data) as resp:
-            res_data = await resp.json()
-            return web.json_response(res_data, status=resp.status)
-
-# --- WebSocket Proxy Example (if device supports WS at /ws) ---
+    tasks = [asyncio.ensure_future(run_batch_item(session, semaphore, item, headers)) for item in items]
+    stream = EncodedStream(request, "application/x-ndjson")
+    try:
+        await stream.prepare()
+        for index, task in enumerate(tasks):
+            status, body = await task
+            await stream.write(json_dumps({"index": index, "status": status, "body": body}) + b"\n")
+        await stream.close()
+    finally:
+        # Client went away mid-stream: don't leave sub-requests running for nobody
+        for task in tasks:
+            task.cancel()
+    return stream.response
+
+# --- NDJSON Streaming Pagination ---
+
+async def fetch_page(session, path, params, headers):
+    """GET one backend page; returns (status, items, next_cursor), or (status, error_body, None) on failure."""
+    try:
+        async with backend_call(session, "GET", f"{BASE_URL}{path}", params=params, headers=headers,
+                                timeout=ClientTimeout(total=STREAM_PAGE_TIMEOUT)) as resp:
+            status = resp.status
+            raw = await resp.read()
+    except BreakerOpen as e:
+        return 503, {"error": str(e)}, None
+    except (ClientError, asyncio.TimeoutError) as e:
+        return 502, {"error": str(e) or type(e).__name__}, None
+    try:
+        page = json_loads(raw)
+    except ValueError:
+        page = raw.decode("utf-8", "replace")
+    if status != 200:
+        return status, page, None
+    if not isinstance(page, dict) or not isinstance(page.get(PAGE_ITEMS_FIELD), list):
+        return 502, {"error": f"Backend page has no '{PAGE_ITEMS_FIELD}' list"}, None
+    return 200, page[PAGE_ITEMS_FIELD], page.get(PAGE_CURSOR_FIELD)
+
+async def stream_listing(request, path):
+    session = request.app["client_session"]
+    params = {name: value for name, value in request.rel_url.query.items() if name != "stream"}
+    headers = get_auth_header(request)
+    status, items, cursor = await fetch_page(session, path, params, headers)
+    if status != 200:
+        return json_response(items, status=status)
+    stream = EncodedStream(request, "application/x-ndjson")
+    await stream.prepare()
+    pages = 1
+    next_page = None
+    try:
+        while True:
+            # Page N+1 is in flight while page N's items are written out, so at most two pages are held
+            next_page = None
+            if cursor is not None and pages < STREAM_MAX_PAGES:
+                next_page = asyncio.ensure_future(
+                    fetch_page(session, path, dict(params, **{PAGE_CURSOR_PARAM: cursor}), headers))
+            if items:
+                await stream.write(b"".join(json_dumps(item) + b"\n" for item in items))
+            if next_page is None:
+                break
+            status, items, cursor = await next_page
+            pages += 1
+            if status != 200:
+                # Headers are long gone; report the failure in-band as the last line
+                await stream.write(json_dumps({"error": "Backend page request failed", "status": status}) + b"\n")
+                break
+        await stream.close()
+    finally:
+        if next_page is not None:
+            next_page.cancel()
+    return stream.response
+
+# --- WebSocket Proxy (if device supports WS at /ws) ---
+
+class DirectionStats:
+    __slots__ = ("msgs_in", "bytes_in", "msgs_out", "bytes_out", "dropped", "coalesced", "queue_high_water")
+
+    def __init__(self):
+        self.msgs_in = 0
+        self.bytes_in = 0
+        self.msgs_out = 0
+        self.bytes_out = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.queue_high_water = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class BoundedSender:
+    """
+    Bounded outbound queue for one websocket. A slow peer fills the queue instead of
+    aiohttp's write buffer, and WS_SLOW_CONSUMER_POLICY decides what happens then:
+    drop the new message, coalesce the backlog down to the newest message, or
+    disconnect. The drain task only exists while there is a backlog, so idle
+    connections cost no extra task.
+    """
+    def __init__(self, ws, stats):
+        self.ws = ws
+        self.stats = stats
+        self.queue = deque()
+        self.queued_bytes = 0
+        self.task = None
+        self.empty = asyncio.Event()
+        self.empty.set()
+
+    def offer(self, msg_type, data):
+        # The byte budget counts what goes on the wire, so text is measured encoded
+        size = len(data.encode()) if isinstance(data, str) else len(data)
+        # An empty queue always takes the message, however large: the budget bounds
+        # the backlog, and WS_MAX_MSG_SIZE already bounds a single message
+        if self.queue and (len(self.queue) >= WS_SEND_QUEUE_MESSAGES
+                           or self.queued_bytes + size > WS_SEND_QUEUE_BYTES):
+            if WS_SLOW_CONSUMER_POLICY == "disconnect":
+                return False
+            if WS_SLOW_CONSUMER_POLICY == "coalesce":
+                self.stats.coalesced += len(self.queue)
+                self.queue.clear()
+                self.queued_bytes = 0
+            else:
+                self.stats.dropped += 1
+                return True
+        self.queue.append((msg_type, data, size))
+        self.queued_bytes += size
+        self.stats.queue_high_water = max(self.stats.queue_high_water, len(self.queue))
+        self.empty.clear()
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._drain())
+        return True
+
+    async def _drain(self):
+        try:
+            while self.queue:
+                msg_type, data, size = self.queue.popleft()
+                self.queued_bytes -= size
+                if msg_type == WSMsgType.TEXT and isinstance(data, bytes):
+                    # Pre-encoded fan-out payload: frame the shared bytes without re-encoding
+                    if hasattr(self.ws, "send_frame"):
+                        await self.ws.send_frame(data, WSMsgType.TEXT)
+                    else:
+                        await self.ws.send_str(data.decode())
+                elif msg_type == WSMsgType.TEXT:
+                    await self.ws.send_str(data)
+                else:
+                    await self.ws.send_bytes(data)
+                self.stats.msgs_out += 1
+                self.stats.bytes_out += size
+        except Exception:
+            # Peer is gone; closing it ends the relay reading from it and tears down the bridge
+            self.queue.clear()
+            await self.ws.close()
+        finally:
+            self.empty.set()
+
+    async def flush(self, timeout):
+        try:
+            await asyncio.wait_for(self.empty.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def cancel(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+class WsBridge:
+    """Relays one browser websocket to one device websocket with bounded memory."""
+    ids = itertools.count(1)
+
+    def __init__(self, client_ws, device_ws, peer):
+        self.id = next(self.ids)
+        self.peer = peer
+        self.started = time.time()
+        self.client_ws = client_ws
+        self.device_ws = device_ws
+        self.upstream = DirectionStats()
+        self.downstream = DirectionStats()
+        self.to_device = BoundedSender(device_ws, self.upstream)
+        self.to_client = BoundedSender(client_ws, self.downstream)
+        self.close_reason = None
+
+    async def _relay(self, source, sender, stats, name):
+        async for msg in source:
+            if msg.type not in (WSMsgType.TEXT, WSMsgType.BINARY):
+                break
+            stats.msgs_in += 1
+            stats.bytes_in += len(msg.data)
+            if not sender.offer(msg.type, msg.data):
+                self.close_reason = f"slow consumer ({name})"
+                return
+        await sender.flush(WS_DRAIN_TIMEOUT)
+
+    async def run(self):
+        tasks = [
+            asyncio.create_task(self._relay(self.client_ws, self.to_device, self.upstream, "device")),
+            asyncio.create_task(self._relay(self.device_ws, self.to_client, self.downstream, "client")),
+        ]
+        try:
+            # Whichever side finishes first ends the bridge; the other direction is cancelled
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.to_device.cancel()
+            self.to_client.cancel()
+            code = 1013 if self.close_reason else 1000
+            message = (self.close_reason or "").encode()
+            await self.device_ws.close(code=code, message=message)
+            await self.client_ws.close(code=code, message=message)
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "peer": self.peer,
+            "age_seconds": time.time() - self.started,
+            "client_to_device": self.upstream.as_dict(),
+            "device_to_client": self.downstream.as_dict(),
+        }
+
+class MuxClient:
+    """A browser websocket attached to the multiplexed upstream pool."""
+    def __init__(self, ws, peer, channels):
+        self.id = next(WsBridge.ids)
+        self.peer = peer
+        self.started = time.time()
+        self.ws = ws
+        self.channels = set(channels)
+        self.upstream = DirectionStats()
+        self.downstream = DirectionStats()
+        self.sender = BoundedSender(ws, self.downstream)
+        self.close_reason = None
+
+    def deliver(self, msg_type, payload):
+        if self.close_reason:
+            return
+        self.downstream.msgs_in += 1
+        self.downstream.bytes_in += len(payload)
+        if not self.sender.offer(msg_type, payload):
+            self.close_reason = "slow consumer (client)"
+            asyncio.create_task(self.ws.close(code=1013, message=self.close_reason.encode()))
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "peer": self.peer,
+            "age_seconds": time.time() - self.started,
+            "channels": sorted(self.channels),
+            "client_to_device": self.upstream.as_dict(),
+            "device_to_client": self.downstream.as_dict(),
+        }
+
+class UpstreamPool:
+    """
+    WS_UPSTREAM_POOL_SIZE shared websockets to the device's /ws. Each channel is
+    owned by one upstream (stable hash), so client messages for a channel go out
+    on that upstream and only that upstream's copy of channel traffic is
+    delivered, which keeps fan-out duplicate-free whether the device broadcasts
+    to every socket or only to subscribed ones. Messages without a channel id
+    are delivered to every client from upstream 0. Each upstream message is
+    parsed and UTF-8 encoded once and the same bytes are queued for all
+    subscribers.
+    """
+    def __init__(self, session, url, size):
+        self.session = session
+        self.url = url
+        self.size = max(1, size)
+        self.senders = [None] * self.size
+        self.tasks = []
+        self.clients = set()
+        self.channels = {}
+        self.stats = {"upstream_msgs": 0, "deliveries": 0, "unrouted_sends": 0, "reconnects": 0, "duplicates_skipped": 0}
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self._run_upstream(i)) for i in range(self.size)]
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def owner(self, channel):
+        return zlib.crc32(str(channel).encode()) % self.size
+
+    @staticmethod
+    def channel_of(text):
+        if not any(field in text for field in WS_CHANNEL_FIELDS):
+            return None
+        try:
+            message = json_loads(text)
+        except ValueError:
+            return None
+        if not isinstance(message, dict):
+            return None
+        for field in WS_CHANNEL_FIELDS:
+            if message.get(field) is not None:
+                return str(message[field])
+        return None
+
+    def attach(self, client):
+        self.clients.add(client)
+        for channel in client.channels:
+            self.channels.setdefault(channel, set()).add(client)
+
+    def subscribe(self, client, channel):
+        client.channels.add(channel)
+        self.channels.setdefault(channel, set()).add(client)
+
+    def detach(self, client):
+        self.clients.discard(client)
+        for channel in client.channels:
+            subscribers = self.channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.channels[channel]
+
+    def send(self, client, msg_type, data, channel):
+        if channel is None and client.channels:
+            channel = next(iter(client.channels))
+        sender = self.senders[self.owner(channel) if channel is not None else 0]
+        if sender is None or not sender.offer(msg_type, data):
+            self.stats["unrouted_sends"] += 1
+            return
+        client.upstream.msgs_out += 1
+        client.upstream.bytes_out += len(data)
+
+    def _route(self, index, msg_type, data):
+        self.stats["upstream_msgs"] += 1
+        channel = self.channel_of(data) if msg_type == WSMsgType.TEXT else None
+        if channel is None:
+            if index != 0:
+                self.stats["duplicates_skipped"] += 1
+                return
+            targets = self.clients
+        else:
+            if self.owner(channel) != index:
+                self.stats["duplicates_skipped"] += 1
+                return
+            targets = self.channels.get(channel)
+            if not targets:
+                return
+        payload = data.encode() if msg_type == WSMsgType.TEXT else data
+        for client in list(targets):
+            client.deliver(msg_type, payload)
+        self.stats["deliveries"] += len(targets)
+
+    async def _run_upstream(self, index):
+        delay = 0.5
+        while True:
+            try:
+                async with self.session.ws_connect(
+                    self.url, heartbeat=WS_HEARTBEAT, max_msg_size=WS_MAX_MSG_SIZE, compress=0
+                ) as ws:
+                    delay = 0.5
+                    self.senders[index] = BoundedSender(ws, DirectionStats())
+                    async for msg in ws:
+                        if msg.type in (WSMsgType.TEXT, WSMsgType.BINARY):
+                            self._route(index, msg.type, msg.data)
+                        else:
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            finally:
+                if self.senders[index] is not None:
+                    self.senders[index].cancel()
+                    self.senders[index] = None
+            # Clients stay attached while the upstream reconnects
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def as_dict(self):
+        return dict(self.stats, upstreams_connected=sum(1 for s in self.senders if s is not None),
+                    channels=len(self.channels), clients=len(self.clients))
+
+async def ws_proxy_multiplexed(request, ws_from_client):
+    pool = request.app["ws_pool"]
+    pool.start()
+    channels = [c for c in request.rel_url.query.get("channels", "").split(",") if c]
+    client = MuxClient(ws_from_client, request.remote, channels)
+    pool.attach(client)
+    ACTIVE_BRIDGES[client.id] = client
+    WS_TOTALS["opened"] += 1
+    try:
+        async for msg in ws_from_client:
+            if msg.type not in (WSMsgType.TEXT, WSMsgType.BINARY):
+                break
+            client.upstream.msgs_in += 1
+            client.upstream.bytes_in += len(msg.data)
+            channel = pool.channel_of(msg.data) if msg.type == WSMsgType.TEXT else None
+            if channel is not None and channel not in client.channels:
+                # Sending on a channel implicitly subscribes to its replies
+                pool.subscribe(client, channel)
+            pool.send(client, msg.type, msg.data, channel)
+    finally:
+        pool.detach(client)
+        client.sender.cancel()
+        del ACTIVE_BRIDGES[client.id]
+        WS_TOTALS["closed"] += 1
+        if client.close_reason:
+            WS_TOTALS["slow_consumer_disconnects"] += 1
+        await ws_from_client.close()
+    return ws_from_client
+
+ACTIVE_BRIDGES = {}
+WS_TOTALS = {"opened": 0, "closed": 0, "slow_consumer_disconnects": 0, "upstream_failures": 0}
+
 @routes.get("/wsproxy")
 async def ws_proxy(request):
     # Proxies between client and device WebSocket endpoint
-    ws_from_client = web.WebSocketResponse()
+    ws_from_client = web.WebSocketResponse(heartbeat=WS_HEARTBEAT, max_msg_size=WS_MAX_MSG_SIZE, compress=False)
     await ws_from_client.prepare(request)
+    if WS_MULTIPLEX:
+        return await ws_proxy_multiplexed(request, ws_from_client)
 
     device_ws_url = f"{DEVICE_PROTOCOL}://{DEVICE_HOST}:{DEVICE_PORT}/ws"
-    async with ClientSession() as session:
-        async with session.ws_connect(device_ws_url) as ws_to_device:
-
-            async def client_to_device():
-                async for msg in ws_from_client:
-                    if msg.type == WSMsgType.TEXT:
-                        await ws_to_device.send_str(msg.data)
-                    elif msg.type == WSMsgType.BINARY:
-                        await ws_to_device.send_bytes(msg.data)
-                    elif msg.type == WSMsgType.CLOSE:
-                        await ws_to_device.close()
-
-            async def device_to_client():
-                async for msg in ws_to_device:
-                    if msg.type == WSMsgType.TEXT:
-                        await ws_from_client.send_str(msg.data)
-                    elif msg.type == WSMsgType.BINARY:
-                        await ws_from_client.send_bytes(msg.data)
-                    elif msg.type == WSMsgType.CLOSE:
-                        await ws_from_client.close()
-
-            await asyncio.gather(client_to_device(), device_to_client())
+    try:
+        ws_to_device = await request.app["client_session"].ws_connect(
+            device_ws_url, heartbeat=WS_HEARTBEAT, max_msg_size=WS_MAX_MSG_SIZE, compress=0
+        )
+    except Exception:
+        WS_TOTALS["upstream_failures"] += 1
+        await ws_from_client.close(code=1011, message=b"device websocket unavailable")
+        return ws_from_client
+
+    bridge = WsBridge(ws_from_client, ws_to_device, request.remote)
+    ACTIVE_BRIDGES[bridge.id] = bridge
+    WS_TOTALS["opened"] += 1
+    try:
+        await bridge.run()
+    finally:
+        del ACTIVE_BRIDGES[bridge.id]
+        WS_TOTALS["closed"] += 1
+        if bridge.close_reason:
+            WS_TOTALS["slow_consumer_disconnects"] += 1
     return ws_from_client
 
+@routes.get("/wsproxy/stats")
+async def ws_proxy_stats(request):
+    limit = int(request.rel_url.query.get("limit", "50"))
+    bridges = sorted(
+        ACTIVE_BRIDGES.values(),
+        key=lambda b: b.upstream.bytes_in + b.downstream.bytes_in,
+        reverse=True,
+    )
+    return json_response({
+        "policy": WS_SLOW_CONSUMER_POLICY,
+        "active": len(ACTIVE_BRIDGES),
+        "totals": WS_TOTALS,
+        "multiplex": request.app["ws_pool"].as_dict() if WS_MULTIPLEX else None,
+        "connections": [b.as_dict() for b in bridges[:limit]],
+    })
+
 # --- App Setup ---
 
-app = web.Application()
+async def client_session_ctx(app):
+    # One pooled client for all websocket upstreams; limit=0 so idle proxied sockets are not capped at 100
+    app["client_session"] = ClientSession(connector=TCPConnector(limit=0))
+    # REST relay keeps upstream bodies encoded so compressed responses can pass straight through
+    app["relay_session"] = ClientSession(connector=TCPConnector(limit=0), auto_decompress=False)
+    if WS_MULTIPLEX:
+        app["ws_pool"] = UpstreamPool(
+            app["client_session"],
+            f"{DEVICE_PROTOCOL}://{DEVICE_HOST}:{DEVICE_PORT}/ws",
+            WS_UPSTREAM_POOL_SIZE,
+        )
+    yield
+    if WS_MULTIPLEX:
+        await app["ws_pool"].close()
+    await app["relay_session"].close()
+    await app["client_session"].close()
+
+def raise_fd_limit():
+    # Each proxied websocket holds two sockets; lift the soft fd limit to the hard limit
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard and hard != resource.RLIM_INFINITY:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+app = web.Application(middlewares=[metrics_middleware, admission_middleware, compression_middleware, token_auth_middleware])
+app.on_response_prepare.append(record_latency)
 app.add_routes(routes)
+app.cleanup_ctx.append(client_session_ctx)
+app.cleanup_ctx.append(debug_watchdog_ctx)
 
 if __name__ == "__main__":
+    raise_fd_limit()
     web.run_app(app, host=SERVER_HOST, port=SERVER_PORT)
\ No newline at end of file
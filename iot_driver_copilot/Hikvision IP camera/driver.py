@@ -1,14 +1,33 @@
 import os
+import re
+import math
+import socket
+import struct
+import hashlib
+import importlib
 import threading
 import io
 import time
+import signal
+import multiprocessing
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
 import base64
 import sys
+import json
+import random
+import weakref
+from collections import deque
+from urllib.parse import urlparse, parse_qs
 
-import cv2
-import numpy as np
+# Helpers shared by every driver live in iot_driver_copilot/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import METRICS_CONTENT_TYPE, Metrics
+from common.debug import SamplingProfiler, StackWatch, debug_denied, poll_threads, profile_seconds
+from common.config import ConfigWatcher, apply_settings
+from common.resilience import Backoff, RecoveryStats
+from common.motion import MotionGate, motion_thumbnail
+from common.mosaic import MosaicHub, MosaicSettings, RemoteCamera, parse_cameras
 
 # Configuration from environment variables
 DEVICE_IP = os.environ.get("DEVICE_IP")
@@ -17,22 +36,186 @@ RTSP_USER = os.environ.get("RTSP_USER", "admin")
 RTSP_PASSWORD = os.environ.get("RTSP_PASSWORD", "")
 RTSP_PATH = os.environ.get("RTSP_PATH", "Streaming/Channels/101")
 
+# Keys of the mounted ConfigMap named like the RTSP settings above override them while running:
+# the capture reconnects to the new camera and viewers stay attached; CONFIG_POLL_INTERVAL is the
+# rescan period behind inotify
+CONFIG_MOUNT_PATH = os.environ.get("CONFIG_MOUNT_PATH", "/etc/edgedevice/config")
+CONFIG_RELOAD = os.environ.get("CONFIG_RELOAD", "true").lower() == "true"
+CONFIG_POLL_INTERVAL = float(os.environ.get("CONFIG_POLL_INTERVAL", "10"))
+
 SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
 SERVER_PORT = int(os.environ.get("SERVER_PORT", "8080"))
 
+# Reconnect and stall detection settings (seconds)
+RECONNECT_MIN_DELAY = float(os.environ.get("RECONNECT_MIN_DELAY", "0.5"))
+RECONNECT_MAX_DELAY = float(os.environ.get("RECONNECT_MAX_DELAY", "30"))
+STALL_TIMEOUT = float(os.environ.get("STALL_TIMEOUT", "5"))
+
+# What POST /stream starts: "mjpeg" decodes with OpenCV and re-encodes JPEG for /stream;
+# "passthrough" remuxes the camera's H.264 without decoding for /stream.mp4, /stream/ws and /hls/;
+# "both" runs the two captures side by side
+STREAM_MODE = os.environ.get("STREAM_MODE", "mjpeg").lower()
+# LL-HLS packaging of the passthrough stream: part and segment targets, and how many segments stay in memory
+HLS_PART_SECONDS = float(os.environ.get("HLS_PART_SECONDS", "0.2"))
+HLS_SEGMENT_SECONDS = float(os.environ.get("HLS_SEGMENT_SECONDS", "2"))
+HLS_SEGMENTS = int(os.environ.get("HLS_SEGMENTS", "6"))
+
+# Motion gate for /stream: frames whose downsampled grayscale copy differs from both the previous frame
+# and the last frame sent in fewer than MOTION_THRESHOLD of its pixels (by more than MOTION_PIXEL_DELTA
+# levels) are not encoded or sent, except one every MOTION_KEEPALIVE_SECONDS; MOTION_DOWNSAMPLE is the
+# sampling stride
+MOTION_GATE = os.environ.get("MOTION_GATE", "false").lower() == "true"
+MOTION_THRESHOLD = float(os.environ.get("MOTION_THRESHOLD", "0.002"))
+MOTION_PIXEL_DELTA = int(os.environ.get("MOTION_PIXEL_DELTA", "12"))
+MOTION_KEEPALIVE_SECONDS = float(os.environ.get("MOTION_KEEPALIVE_SECONDS", "1"))
+MOTION_DOWNSAMPLE = int(os.environ.get("MOTION_DOWNSAMPLE", "8"))
+
+# Multi-process deployment: WORKERS HTTP server processes share the port via SO_REUSEPORT while this
+# process captures and encodes once, handing frames over in a FRAME_BUS_SLOTS-slot shared memory ring;
+# a frame larger than FRAME_BUS_SLOT_BYTES is dropped. MJPEG only: passthrough runs with WORKERS=1
+WORKERS = int(os.environ.get("WORKERS", "1"))
+FRAME_BUS_NAME = os.environ.get("FRAME_BUS_NAME", "")
+FRAME_BUS_SLOTS = int(os.environ.get("FRAME_BUS_SLOTS", "4"))
+FRAME_BUS_SLOT_BYTES = int(os.environ.get("FRAME_BUS_SLOT_BYTES", str(2 * 1024 * 1024)))
+
+# /mosaic composites several cameras into one MJPEG grid. "local" is this driver's /stream capture, which runs
+# while a mosaic shows it as well as between POST and DELETE /stream; MOSAIC_CAMERAS adds other MJPEG streams as
+# name=url pairs, e.g. "dock=http://10.0.0.7:8080/cam,gate=http://10.0.0.8:8080/stream". Grids are MOSAIC_WIDTH x
+# MOSAIC_HEIGHT with at most MOSAIC_MAX_TILES tiles and MOSAIC_MAX_FPS updates a second; each is encoded once per
+# tick for every client asking for the same cameras, layout and fps. With WORKERS > 1 each worker composites its
+# own grids and opens its own connection to each MOSAIC_CAMERAS stream they show
+MOSAIC_CAMERAS = os.environ.get("MOSAIC_CAMERAS", "")
+MOSAIC_WIDTH = int(os.environ.get("MOSAIC_WIDTH", "1280"))
+MOSAIC_HEIGHT = int(os.environ.get("MOSAIC_HEIGHT", "720"))
+MOSAIC_MAX_TILES = int(os.environ.get("MOSAIC_MAX_TILES", "36"))
+MOSAIC_DEFAULT_FPS = float(os.environ.get("MOSAIC_DEFAULT_FPS", "5"))
+MOSAIC_MAX_FPS = float(os.environ.get("MOSAIC_MAX_FPS", "15"))
+MOSAIC_JPEG_QUALITY = int(os.environ.get("MOSAIC_JPEG_QUALITY", "80"))
+
+# How long POST /stream waits for OpenCV to finish importing before answering 503
+DEPENDENCY_TIMEOUT = float(os.environ.get("DEPENDENCY_TIMEOUT", "30"))
+
+# Prometheus /metrics; per-client byte counters stop adding new client labels past METRICS_MAX_CLIENTS
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MAX_CLIENTS = int(os.environ.get("METRICS_MAX_CLIENTS", "100"))
+
+# /debug/profile and /debug/tasks are compiled in but answer 404 unless DEBUG_ENDPOINTS=true;
+# with DEBUG_TOKEN set, callers must also send it in the X-Debug-Token header
+DEBUG_ENDPOINTS = os.environ.get("DEBUG_ENDPOINTS", "false").lower() == "true"
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+DEBUG_PROFILE_MAX_SECONDS = float(os.environ.get("DEBUG_PROFILE_MAX_SECONDS", "60"))
+DEBUG_PROFILE_HZ = float(os.environ.get("DEBUG_PROFILE_HZ", "100"))
+DEBUG_STUCK_SECONDS = float(os.environ.get("DEBUG_STUCK_SECONDS", "10"))
+
+# --- Deferred Imports ---
+
+class DependencyLoader:
+    """
+    Imports heavy modules once, in a background thread, into this module's globals.
+    Loading starts after the HTTP listener is bound, so the driver accepts
+    connections straight away and /readyz answers 503 until every module imported.
+    """
+    def __init__(self, names):
+        self.names = names
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.started = False
+        self.error = None
+        self.seconds = None
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._load, name="dependency-loader", daemon=True).start()
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            for name in self.names:
+                globals()[name] = importlib.import_module(name)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        self.seconds = round(time.perf_counter() - started, 3)
+        self.done.set()
+
+    def ready(self):
+        return self.done.is_set() and self.error is None
+
+    def wait(self, timeout=None):
+        """Starts loading if it has not begun and waits up to DEPENDENCY_TIMEOUT; True once ready."""
+        self.start()
+        self.done.wait(DEPENDENCY_TIMEOUT if timeout is None else timeout)
+        return self.ready()
+
+    def status(self):
+        if self.error:
+            state = "failed"
+        elif self.done.is_set():
+            state = "ready"
+        else:
+            state = "loading" if self.started else "pending"
+        return {"ready": self.ready(), "state": state, "modules": self.names,
+                "import_seconds": self.seconds, "error": self.error}
+
+# OpenCV (and numpy under it) dominates start-up time; set by the loader once imported
+cv2 = None
+numpy = None
+dependencies = DependencyLoader(["cv2", "numpy"])
+
+# --- Metrics ---
+
+METRIC_HELP = {
+    "driver_http_request_duration_seconds": "Time from request arrival until the response headers were sent.",
+    "driver_upstream_request_duration_seconds": "RTSP open latency, by outcome.",
+    "driver_frame_encode_duration_seconds": "JPEG encode time per captured frame.",
+    "driver_frames_total": "Frames by stage: captured, suppressed by the motion gate, encoded, remuxed, composited into a mosaic grid, sent to a viewer, or dropped.",
+    "driver_client_bytes_sent_total": "Response body bytes sent, by client address.",
+    "driver_stream_active": "1 while the capture session is active.",
+    "driver_passthrough_viewers": "Viewers attached to the fMP4 streams of the passthrough session.",
+    "driver_motion_suppressed_ratio": "Share of captured frames the motion gate kept from being encoded and sent, by stream.",
+    "driver_motion_score": "Share of pixels that changed in the latest frame, against the previous frame or else the last frame sent, by stream.",
+    "driver_mosaic_compose_duration_seconds": "Time to update the changed tiles of a mosaic grid and encode it.",
+    "driver_mosaic_viewers": "Clients attached to /mosaic grids.",
+}
+
+metrics = Metrics(METRICS_MAX_CLIENTS, METRIC_HELP, enabled=METRICS_ENABLED)
+
+# --- Debug Endpoints ---
+
+profiler = SamplingProfiler(DEBUG_PROFILE_HZ)
+stack_watch = StackWatch(DEBUG_STUCK_SECONDS)
+
+def debug_watchdog():
+    while True:
+        stack_watch.update(poll_threads())
+        time.sleep(1.0)
+
+if DEBUG_ENDPOINTS:
+    threading.Thread(target=debug_watchdog, name="debug-watchdog", daemon=True).start()
+
 # --- Video Stream Session Management ---
 class StreamSession:
     def __init__(self):
         self.active = False
         self.lock = threading.Lock()
         self.frame = None
+        self.seq = 0
         self.thread = None
         self.stop_event = threading.Event()
+        self.reconnect_event = threading.Event()  # Set by reconnect() and stop()
+        self.state = "idle"
+        self.stats = RecoveryStats()
+        self.motion = MotionGate(MOTION_THRESHOLD, MOTION_PIXEL_DELTA, MOTION_KEEPALIVE_SECONDS) if MOTION_GATE else None
+        self.bus = None  # Set in the capture process when WORKERS > 1
 
     def start(self):
         with self.lock:
             if not self.active:
                 self.stop_event.clear()
+                if self.motion is not None:
+                    self.motion.reset()
                 self.thread = threading.Thread(target=self._capture_thread, daemon=True)
                 self.active = True
                 self.thread.start()
@@ -41,6 +224,7 @@ class StreamSession:
         with self.lock:
             self.active = False
             self.stop_event.set()
+            self.reconnect_event.set()  # Ends a backoff wait at once
             if self.thread is not None:
                 self.thread.join(timeout=3)
                 self.thread = None
@@ -49,36 +233,1297 @@ class StreamSession:
         with self.lock:
             return self.active
 
+    def reconnect(self):
+        """Reopens the capture with the current RTSP settings; viewers keep the last frame meanwhile."""
+        self.reconnect_event.set()
+
     def get_frame(self):
         return self.frame
 
+    def send_frame(self, sock, frame):
+        sock.sendall(frame)
+        return True
+
+    def _open_capture(self, rtsp_url):
+        # Bound open/read so a dead RTSP peer cannot block cap.read() forever
+        if hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC") and hasattr(cv2, "CAP_PROP_READ_TIMEOUT_MSEC"):
+            timeout_ms = int(STALL_TIMEOUT * 1000)
+            return cv2.VideoCapture(rtsp_url, cv2.CAP_FFMPEG, [
+                cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+                cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms,
+            ])
+        return cv2.VideoCapture(rtsp_url)
+
     def _capture_thread(self):
-        rtsp_url = f"rtsp://{RTSP_USER}:{RTSP_PASSWORD}@{DEVICE_IP}:{RTSP_PORT}/{RTSP_PATH}"
-        cap = cv2.VideoCapture(rtsp_url)
-        if not cap.isOpened():
-            self.active = False
-            return
+        backoff = Backoff(RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY)
+        connected_once = False
         while not self.stop_event.is_set():
-            ret, frame = cap.read()
-            if not ret:
-                time.sleep(0.2)
+            self.reconnect_event.clear()
+            rtsp_url = f"rtsp://{RTSP_USER}:{RTSP_PASSWORD}@{DEVICE_IP}:{RTSP_PORT}/{RTSP_PATH}"
+            self.state = "reconnecting" if connected_once else "connecting"
+            started = time.perf_counter()
+            cap = self._open_capture(rtsp_url)
+            opened = cap.isOpened()
+            metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                            upstream="rtsp", outcome="ok" if opened else "error")
+            if not opened:
+                cap.release()
+                self.stats.record_open_failure()
+                self.stats.mark_down()
+                self.reconnect_event.wait(backoff.next_delay())
                 continue
-            # Encode frame as JPEG
-            ret, jpeg = cv2.imencode('.jpg', frame)
-            if ret:
-                self.frame = jpeg.tobytes()
-            time.sleep(0.03)  # ~30 FPS
-        cap.release()
+            if connected_once:
+                self.stats.record_reconnect()
+            connected_once = True
+            self.state = "streaming"
+            last_frame_at = time.monotonic()
+            while not self.stop_event.is_set() and not self.reconnect_event.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    # Watchdog: no decodable frame within STALL_TIMEOUT means the source is stalled
+                    if time.monotonic() - last_frame_at > STALL_TIMEOUT:
+                        self.stats.record_stall()
+                        break
+                    time.sleep(0.05)
+                    continue
+                last_frame_at = time.monotonic()
+                metrics.inc("driver_frames_total", stage="captured")
+                if self.motion is not None and not self.motion.admit(motion_thumbnail(frame, MOTION_DOWNSAMPLE)):
+                    # Static scene: skip the encode; viewers keep the last frame until something moves
+                    metrics.inc("driver_frames_total", stage="suppressed")
+                    time.sleep(0.03)
+                    continue
+                # Encode frame as JPEG
+                started = time.perf_counter()
+                ret, jpeg = cv2.imencode('.jpg', frame)
+                metrics.observe("driver_frame_encode_duration_seconds", time.perf_counter() - started)
+                if ret and self.bus is not None and not self.bus.publish(jpeg):
+                    ret = False  # Larger than a bus slot; raise FRAME_BUS_SLOT_BYTES
+                if ret:
+                    if self.bus is None:
+                        self.frame = jpeg.tobytes()
+                    self.seq += 1
+                    metrics.inc("driver_frames_total", stage="encoded")
+                    self.stats.mark_up()
+                    backoff.reset()
+                else:
+                    metrics.inc("driver_frames_total", stage="dropped")
+                time.sleep(0.03)  # ~30 FPS
+            cap.release()
+            if self.reconnect_event.is_set():
+                connected_once = False  # Settings were reloaded: a new camera, not a recovery
+                backoff.reset()
+            elif not self.stop_event.is_set():
+                # Viewers stay attached and keep the last frame while we reconnect
+                self.stats.mark_down()
+                self.state = "reconnecting"
+                self.reconnect_event.wait(backoff.next_delay())
+        self.state = "idle"
         self.active = False
 
+    def status(self):
+        status = {"active": self.is_active(), "state": self.state}
+        status.update(self.stats.snapshot())
+        if self.motion is not None:
+            status["motion"] = self.motion.status()
+        return status
+
 stream_session = StreamSession()
+metrics.gauge("driver_stream_active", lambda: int(stream_session.active))
+if stream_session.motion is not None:
+    metrics.gauge("driver_motion_suppressed_ratio", lambda: stream_session.motion.suppression_ratio(), stream="/stream")
+    metrics.gauge("driver_motion_score", lambda: stream_session.motion.score or 0.0, stream="/stream")
+
+# --- Frame Bus ---
+class FrameBus:
+    """
+    Hands encoded frames from the capture process to the HTTP worker processes
+    through one shared memory segment. Frames go round a ring of slots, each
+    guarded by a seqlock: the writer marks a slot odd (2*seq - 1) while it copies
+    a frame in and even (2*seq) once it is whole, then publishes seq as the latest.
+    Readers take the latest slot as a memoryview and confirm afterwards that its
+    lock did not move, so a frame lapped by the writer mid-read is never trusted.
+    The header also carries the start/stop request from the workers and the
+    capture process's status as JSON, under a seqlock of its own.
+    """
+    MAGIC = b"FBUS"
+    HEADER = struct.Struct("<4sII")  # magic, slots, slot bytes
+    U64 = struct.Struct("<Q")
+    U32 = struct.Struct("<I")
+    LATEST, STATUS_LOCK, REQUESTED, ACTIVE, STATUS_LENGTH = 16, 24, 32, 36, 40
+    STATUS_OFFSET = 48
+    STATUS_BYTES = 8192
+    SLOT_HEADER = 16  # lock, length
+    SLOTS_OFFSET = 8256  # STATUS_OFFSET + STATUS_BYTES, rounded up to 64
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.buf = shm.buf
+        self.owner = owner
+        magic, self.slots, self.slot_bytes = self.HEADER.unpack_from(self.buf, 0)
+        if magic != self.MAGIC:
+            raise RuntimeError(f"{shm.name} is not a frame bus segment")
+        self.stride = (self.SLOT_HEADER + self.slot_bytes + 63) // 64 * 64
+        self.latest = self.U64.unpack_from(self.buf, self.LATEST)[0]
+        self.status_seq = 0
+        # Frames handed out as views into the segment; it cannot be closed while one is exported
+        self.frames = weakref.WeakSet()
+
+    @classmethod
+    def create(cls, name, slots, slot_bytes):
+        from multiprocessing import shared_memory
+        stride = (cls.SLOT_HEADER + slot_bytes + 63) // 64 * 64
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls.SLOTS_OFFSET + slots * stride)
+        cls.HEADER.pack_into(shm.buf, 0, cls.MAGIC, slots, slot_bytes)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        # The capture process owns the segment; a worker exiting must not have it unlinked
+        from multiprocessing import resource_tracker, shared_memory
+        if sys.version_info >= (3, 13):
+            return cls(shared_memory.SharedMemory(name=name, track=False), owner=False)
+        # A spawned worker reports to the capture process's tracker, which holds each name once however
+        # often it is registered; unregistering there would drop the owner's entry, so only a worker
+        # running a tracker of its own takes the segment back off it
+        shared_tracker = resource_tracker._resource_tracker._fd is not None
+        shm = shared_memory.SharedMemory(name=name)
+        if not shared_tracker:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    def _slot(self, seq):
+        return self.SLOTS_OFFSET + seq % self.slots * self.stride
+
+    # Capture process side
+
+    def publish(self, data):
+        """Copies one encoded frame into the next slot; False if it does not fit in a slot."""
+        data = memoryview(data).cast("B")
+        if len(data) > self.slot_bytes:
+            return False
+        seq = self.latest + 1
+        offset = self._slot(seq)
+        self.U64.pack_into(self.buf, offset, 2 * seq - 1)
+        self.U32.pack_into(self.buf, offset + 8, len(data))
+        start = offset + self.SLOT_HEADER
+        self.buf[start:start + len(data)] = data
+        self.U64.pack_into(self.buf, offset, 2 * seq)
+        self.U64.pack_into(self.buf, self.LATEST, seq)
+        self.latest = seq
+        return True
+
+    def set_active(self, active):
+        self.U32.pack_into(self.buf, self.ACTIVE, int(active))
+
+    def requested(self):
+        return bool(self.U32.unpack_from(self.buf, self.REQUESTED)[0])
+
+    def publish_status(self, status):
+        body = json.dumps(status).encode()[:self.STATUS_BYTES]
+        self.status_seq += 1
+        self.U64.pack_into(self.buf, self.STATUS_LOCK, 2 * self.status_seq - 1)
+        self.U32.pack_into(self.buf, self.STATUS_LENGTH, len(body))
+        self.buf[self.STATUS_OFFSET:self.STATUS_OFFSET + len(body)] = body
+        self.U64.pack_into(self.buf, self.STATUS_LOCK, 2 * self.status_seq)
+
+    # Worker side
+
+    def latest_seq(self):
+        return self.U64.unpack_from(self.buf, self.LATEST)[0]
+
+    def active(self):
+        return bool(self.U32.unpack_from(self.buf, self.ACTIVE)[0])
+
+    def request(self, active):
+        self.U32.pack_into(self.buf, self.REQUESTED, int(active))
+
+    def frame(self):
+        """The latest frame as a view into the segment, or None before the first one."""
+        seq = self.latest_seq()
+        if not seq:
+            return None
+        offset = self._slot(seq)
+        lock = self.U64.unpack_from(self.buf, offset)[0]
+        size = self.U32.unpack_from(self.buf, offset + 8)[0]
+        if lock != 2 * seq:
+            return None  # Lapped already; the caller polls again
+        start = offset + self.SLOT_HEADER
+        frame = BusFrame(seq, offset, self.buf[start:start + size])
+        self.frames.add(frame)
+        return frame
+
+    def intact(self, frame):
+        return self.U64.unpack_from(self.buf, frame.offset)[0] == 2 * frame.seq
+
+    def send(self, sock, frame):
+        """
+        Sends a frame without copying it in this process: whatever the kernel takes
+        straight away comes from shared memory, and only a remainder a slow socket
+        could not take yet is copied out. False if the slot was overwritten before
+        the bytes were safely out of it, in which case what was sent is unusable.
+        """
+        view = frame.view
+        try:
+            sent = sock.send(view, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            sent = 0
+        rest = bytes(view[sent:]) if sent < len(view) else None
+        if not self.intact(frame):
+            return False
+        if rest is not None:
+            sock.sendall(rest)
+        return True
+
+    def status(self):
+        for _ in range(100):
+            lock = self.U64.unpack_from(self.buf, self.STATUS_LOCK)[0]
+            if lock % 2:
+                continue
+            size = self.U32.unpack_from(self.buf, self.STATUS_LENGTH)[0]
+            body = bytes(self.buf[self.STATUS_OFFSET:self.STATUS_OFFSET + size])
+            if self.U64.unpack_from(self.buf, self.STATUS_LOCK)[0] == lock:
+                return json.loads(body) if body else {}
+        return {}
+
+    def close(self):
+        """Unmaps the segment in this process, releasing any frame still held; the owner also unlinks it."""
+        for frame in list(self.frames):
+            frame.view.release()
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+class BusFrame:
+    __slots__ = ("seq", "offset", "view", "__weakref__")
+
+    def __init__(self, seq, offset, view):
+        self.seq = seq
+        self.offset = offset
+        self.view = view
+
+    def __len__(self):
+        return len(self.view)
+
+class BusMotionGate:
+    """The capture process's motion gate figures, as a worker sees them."""
+    def __init__(self, session):
+        self.session = session
+
+    @property
+    def score(self):
+        return self.session.status().get("motion", {}).get("score")
+
+    def suppression_ratio(self):
+        return self.session.status().get("motion", {}).get("suppressed_ratio", 0.0)
+
+class BusStreamSession:
+    """
+    Stands in for StreamSession in an HTTP worker process: start and stop become
+    requests to the capture process, and frames are read from the frame bus.
+    """
+    def __init__(self, bus):
+        self.bus = bus
+        self.motion = BusMotionGate(self) if MOTION_GATE else None
+
+    @property
+    def active(self):
+        return self.bus.active()
+
+    @property
+    def seq(self):
+        return self.bus.latest_seq()
+
+    def start(self):
+        self.bus.request(True)
+
+    def stop(self):
+        self.bus.request(False)
+
+    def is_active(self):
+        return self.bus.active()
+
+    def get_frame(self):
+        return self.bus.frame()
+
+    def send_frame(self, sock, frame):
+        return self.bus.send(sock, frame)
+
+    def status(self):
+        status = dict(self.bus.status().get("stream", {}))
+        status["frame_bus"] = {"worker_pid": os.getpid(), "slots": self.bus.slots,
+                               "slot_bytes": self.bus.slot_bytes, "latest": self.bus.latest_seq()}
+        return status
+
+class BusDependencies:
+    """The capture process's OpenCV import, as a worker sees it; workers only import OpenCV for /mosaic."""
+    def __init__(self, bus):
+        self.bus = bus
+
+    def ready(self):
+        return self.status().get("ready", False)
+
+    def wait(self, timeout=None):
+        deadline = time.monotonic() + (DEPENDENCY_TIMEOUT if timeout is None else timeout)
+        while not self.ready() and self.status().get("state") != "failed" and time.monotonic() < deadline:
+            time.sleep(0.1)
+        return self.ready()
+
+    def status(self):
+        return self.bus.status().get("dependencies", {"ready": False, "state": "pending"})
+
+# --- RTSP Client ---
+class RtspError(Exception):
+    pass
+
+def parse_challenge(values):
+    """(scheme, params) of the strongest WWW-Authenticate challenge offered, Digest over Basic."""
+    challenges = {}
+    for value in values:
+        scheme, _, rest = value.strip().partition(" ")
+        challenges[scheme.lower()] = dict(re.findall(r'(\w+)="?([^",]*)"?', rest))
+    for scheme in ("digest", "basic"):
+        if scheme in challenges:
+            return scheme, challenges[scheme]
+    return None
+
+class RtspClient:
+    """
+    Minimal RTSP/1.0 client for the camera's H.264 video track. RTP comes
+    interleaved on the TCP control connection, so no UDP ports are needed and
+    packets are never reordered. Authenticates with Digest or Basic as the
+    camera asks, and sends GET_PARAMETER keepalives while reading.
+    """
+    def __init__(self, host, port, path, user, password, timeout):
+        self.host = host
+        self.port = port
+        self.url = f"rtsp://{host}:{port}/{path.lstrip('/')}"
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.sock = None
+        self.rfile = None
+        self.cseq = 0
+        self.auth = None
+        self.nonce_count = 0
+        self.session = None
+        self.session_timeout = 60.0
+        self.last_keepalive = 0.0
+        self.channel = 0
+        self.sps = None
+        self.pps = None
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile("rb")
+        self.request("OPTIONS", self.url)
+        headers, body = self.request("DESCRIBE", self.url, {"Accept": "application/sdp"})
+        base = headers.get("content-base") or headers.get("content-location") or self.url
+        control = self.parse_sdp(body.decode("latin-1"))
+        if control.startswith("rtsp://"):
+            track = control
+        elif control in ("", "*"):
+            track = base
+        else:
+            track = base.rstrip("/") + "/" + control
+        headers, _ = self.request("SETUP", track, {"Transport": "RTP/AVP/TCP;unicast;interleaved=0-1"})
+        session, _, params = headers.get("session", "").partition(";")
+        if not session:
+            raise RtspError("SETUP answer has no session")
+        self.session = session.strip()
+        match = re.search(r"timeout=(\d+)", params)
+        if match:
+            self.session_timeout = float(match.group(1))
+        match = re.search(r"interleaved=(\d+)", headers.get("transport", ""))
+        if match:
+            self.channel = int(match.group(1))
+        self.request("PLAY", base, {"Range": "npt=0.000-"})
+        self.last_keepalive = time.monotonic()
+
+    def parse_sdp(self, sdp):
+        """Reads the H.264 parameter sets from the video media section; returns its control attribute."""
+        control = ""
+        in_video = False
+        for line in sdp.splitlines():
+            if line.startswith("m="):
+                in_video = line.startswith("m=video")
+            elif in_video and line.startswith("a=control:"):
+                control = line[len("a=control:"):].strip()
+            elif in_video and line.startswith("a=fmtp:"):
+                match = re.search(r"sprop-parameter-sets=([^;\s]+)", line)
+                if match:
+                    for nal in (base64.b64decode(part) for part in match.group(1).split(",") if part):
+                        if nal and nal[0] & 0x1F == 7:
+                            self.sps = nal
+                        elif nal and nal[0] & 0x1F == 8:
+                            self.pps = nal
+        return control
+
+    def authorization(self, method, url):
+        scheme, params = self.auth
+        if scheme == "basic":
+            return "Basic " + base64.b64encode(f"{self.user}:{self.password}".encode()).decode()
+        realm, nonce = params.get("realm", ""), params.get("nonce", "")
+        ha1 = hashlib.md5(f"{self.user}:{realm}:{self.password}".encode()).hexdigest()
+        ha2 = hashlib.md5(f"{method}:{url}".encode()).hexdigest()
+        header = f'Digest username="{self.user}", realm="{realm}", nonce="{nonce}", uri="{url}"'
+        if "auth" in params.get("qop", "").split(","):
+            self.nonce_count += 1
+            nc = f"{self.nonce_count:08x}"
+            cnonce = f"{random.getrandbits(64):016x}"
+            response = hashlib.md5(f"{ha1}:{nonce}:{nc}:{cnonce}:auth:{ha2}".encode()).hexdigest()
+            return header + f', qop=auth, nc={nc}, cnonce="{cnonce}", response="{response}"'
+        response = hashlib.md5(f"{ha1}:{nonce}:{ha2}".encode()).hexdigest()
+        return header + f', response="{response}"'
+
+    def send_request(self, method, url, headers=None):
+        self.cseq += 1
+        lines = [f"{method} {url} RTSP/1.0", f"CSeq: {self.cseq}", "User-Agent: hikvision-driver"]
+        if self.session:
+            lines.append(f"Session: {self.session}")
+        if self.auth:
+            lines.append(f"Authorization: {self.authorization(method, url)}")
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        self.sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+    def request(self, method, url, headers=None):
+        """Sends a request and returns (headers, body) of its 200 answer, retrying once with credentials."""
+        for attempt in range(2):
+            self.send_request(method, url, headers)
+            status, response_headers, challenges, body = self.read_reply(self.rfile.readline())
+            if status == 401 and attempt == 0 and self.user:
+                self.auth = parse_challenge(challenges)
+                if self.auth is not None:
+                    continue
+            if status != 200:
+                raise RtspError(f"{method} answered RTSP {status}")
+            return response_headers, body
+        raise RtspError(f"{method} was refused with the configured credentials")
+
+    def read_reply(self, status_line):
+        parts = status_line.decode("latin-1").split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith("RTSP/"):
+            raise RtspError(f"unexpected RTSP reply: {status_line[:80]!r}")
+        headers = {}
+        challenges = []
+        while True:
+            line = self.rfile.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            headers[name] = value.strip()
+            if name == "www-authenticate":
+                challenges.append(value.strip())
+        length = int(headers.get("content-length", 0) or 0)
+        body = self.rfile.read(length) if length else b""
+        return int(parts[1]), headers, challenges, body
+
+    def read_packet(self):
+        """The next RTP packet of the video channel; RTCP and replies to keepalives are skipped."""
+        while True:
+            first = self.rfile.read(1)
+            if not first:
+                raise ConnectionError("camera closed the RTSP connection")
+            if first == b"$":
+                header = self.rfile.read(3)
+                data = self.rfile.read(struct.unpack("!H", header[1:3])[0]) if len(header) == 3 else b""
+                if len(header) < 3 or len(data) < struct.unpack("!H", header[1:3])[0]:
+                    raise ConnectionError("camera closed the RTSP connection mid-packet")
+                if header[0] == self.channel:
+                    return data
+            elif first == b"R":
+                self.read_reply(first + self.rfile.readline())
+
+    def keepalive(self):
+        if time.monotonic() - self.last_keepalive >= self.session_timeout / 2:
+            self.last_keepalive = time.monotonic()
+            self.send_request("GET_PARAMETER", self.url)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                if self.session:
+                    self.send_request("TEARDOWN", self.url)
+            except OSError:
+                pass
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+
+# --- H.264 Depacketizer ---
+NAL_IDR, NAL_SEI, NAL_SPS, NAL_PPS, NAL_AUD = 5, 6, 7, 8, 9
+H264_CLOCK = 90000
+
+class H264Depacketizer:
+    """
+    RTP payloads to access units per RFC 6184: single NAL units, STAP-A and
+    FU-A. An access unit ends on the marker bit or when the RTP timestamp
+    changes; one that lost packets is flagged as damaged rather than repaired.
+    """
+    def __init__(self):
+        self.nals = []
+        self.timestamp = None
+        self.fragment = None
+        self.expected_seq = None
+        self.damaged = False
+        self.lost = 0
+
+    def push(self, packet):
+        """Returns the access units this packet completed, as (timestamp, nals, damaged)."""
+        if len(packet) < 12 or packet[0] >> 6 != 2:
+            return []
+        offset = 12 + 4 * (packet[0] & 0x0F)
+        if packet[0] & 0x10:
+            offset += 4 + 4 * int.from_bytes(packet[offset + 2:offset + 4], "big")
+        end = len(packet) - (packet[-1] if packet[0] & 0x20 else 0)
+        seq, timestamp = struct.unpack_from("!HI", packet, 2)
+        done = []
+        if self.expected_seq is not None and seq != self.expected_seq:
+            self.lost += (seq - self.expected_seq) & 0xFFFF
+            self.damaged = True
+            self.fragment = None
+        self.expected_seq = (seq + 1) & 0xFFFF
+        if self.timestamp is not None and timestamp != self.timestamp and self.nals:
+            done.append(self.flush())
+        self.timestamp = timestamp
+        payload = packet[offset:end]
+        if payload:
+            nal_type = payload[0] & 0x1F
+            if nal_type <= 23:
+                self.nals.append(payload)
+            elif nal_type == 24:  # STAP-A: 16-bit size before each NAL unit
+                pos = 1
+                while pos + 2 <= len(payload):
+                    size = int.from_bytes(payload[pos:pos + 2], "big")
+                    self.nals.append(payload[pos + 2:pos + 2 + size])
+                    pos += 2 + size
+            elif nal_type == 28 and len(payload) > 2:  # FU-A
+                header = payload[1]
+                if header & 0x80:
+                    self.fragment = bytearray(((payload[0] & 0xE0) | (header & 0x1F),))
+                if self.fragment is not None:
+                    self.fragment += payload[2:]
+                    if header & 0x40:
+                        self.nals.append(bytes(self.fragment))
+                        self.fragment = None
+        if packet[1] & 0x80 and self.nals:
+            done.append(self.flush())
+        return done
+
+    def flush(self):
+        unit = (self.timestamp, self.nals, self.damaged)
+        self.nals = []
+        self.damaged = False
+        return unit
+
+class BitReader:
+    """MSB-first reader over an RBSP, with the Exp-Golomb codes SPS fields use."""
+    def __init__(self, data):
+        self.value = int.from_bytes(data, "big")
+        self.size = len(data) * 8
+        self.pos = 0
+
+    def u(self, bits):
+        self.pos += bits
+        if self.pos > self.size:
+            raise ValueError("SPS is truncated")
+        return (self.value >> (self.size - self.pos)) & ((1 << bits) - 1)
+
+    def ue(self):
+        zeros = 0
+        while not self.u(1):
+            zeros += 1
+        return (1 << zeros) - 1 + self.u(zeros)
+
+    def se(self):
+        value = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+def parse_sps(sps):
+    """Picture size and the chroma/bit-depth fields avcC needs for High profiles."""
+    reader = BitReader(re.sub(b"\x00\x00\x03", b"\x00\x00", sps[1:]))
+    profile = reader.u(8)
+    reader.u(16)  # constraint flags, level
+    reader.ue()  # seq_parameter_set_id
+    chroma_format, bit_depth_luma, bit_depth_chroma = 1, 8, 8
+    if profile in (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135):
+        chroma_format = reader.ue()
+        if chroma_format == 3:
+            reader.u(1)  # separate_colour_plane_flag
+        bit_depth_luma = reader.ue() + 8
+        bit_depth_chroma = reader.ue() + 8
+        reader.u(1)  # qpprime_y_zero_transform_bypass_flag
+        if reader.u(1):  # seq_scaling_matrix_present_flag
+            for index in range(8 if chroma_format != 3 else 12):
+                if reader.u(1):
+                    last = following = 8
+                    for _ in range(16 if index < 6 else 64):
+                        if following:
+                            following = (last + reader.se()) % 256
+                        last = following or last
+    reader.ue()  # log2_max_frame_num_minus4
+    poc_type = reader.ue()
+    if poc_type == 0:
+        reader.ue()
+    elif poc_type == 1:
+        reader.u(1)
+        reader.se()
+        reader.se()
+        for _ in range(reader.ue()):
+            reader.se()
+    reader.ue()  # max_num_ref_frames
+    reader.u(1)
+    width_mbs = reader.ue() + 1
+    height_units = reader.ue() + 1
+    frame_mbs_only = reader.u(1)
+    if not frame_mbs_only:
+        reader.u(1)
+    reader.u(1)
+    crop = [reader.ue() for _ in range(4)] if reader.u(1) else [0, 0, 0, 0]
+    crop_x = 1 if chroma_format in (0, 3) else 2
+    crop_y = (2 - frame_mbs_only) * (2 if chroma_format == 1 else 1)
+    return {
+        "width": width_mbs * 16 - crop_x * (crop[0] + crop[1]),
+        "height": (2 - frame_mbs_only) * height_units * 16 - crop_y * (crop[2] + crop[3]),
+        "chroma_format": chroma_format,
+        "bit_depth_luma": bit_depth_luma,
+        "bit_depth_chroma": bit_depth_chroma,
+    }
+
+# --- Fragmented MP4 ---
+MP4_MATRIX = struct.pack(">9I", 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+# trun sample flags: sync samples depend on nothing, the rest are non-sync and depend on others
+SAMPLE_SYNC = 0x02000000
+SAMPLE_NON_SYNC = 0x01010000
+
+def box(kind, *payload):
+    data = b"".join(payload)
+    return struct.pack(">I4s", 8 + len(data), kind) + data
+
+def full_box(kind, version, flags, *payload):
+    return box(kind, struct.pack(">I", version << 24 | flags), *payload)
+
+def init_segment(sps, pps, info):
+    """ftyp + moov for one H.264 track with a 90 kHz timescale and no samples, as fMP4 and CMAF expect."""
+    width, height = info["width"], info["height"]
+    avcc = bytes((1, sps[1], sps[2], sps[3], 0xFF, 0xE1)) + struct.pack(">H", len(sps)) + sps
+    avcc += b"\x01" + struct.pack(">H", len(pps)) + pps
+    if sps[1] in (100, 110, 122, 144):
+        avcc += bytes((0xFC | info["chroma_format"], 0xF8 | (info["bit_depth_luma"] - 8),
+                       0xF8 | (info["bit_depth_chroma"] - 8), 0))
+    avc1 = box(b"avc1", bytes(6), struct.pack(">H", 1), bytes(16), struct.pack(">HH", width, height),
+               struct.pack(">II", 0x480000, 0x480000), bytes(4), struct.pack(">H", 1), bytes(32),
+               struct.pack(">Hh", 0x18, -1), box(b"avcC", avcc))
+    empty = struct.pack(">I", 0)
+    stbl = box(b"stbl", full_box(b"stsd", 0, 0, struct.pack(">I", 1), avc1), full_box(b"stts", 0, 0, empty),
+               full_box(b"stsc", 0, 0, empty), full_box(b"stsz", 0, 0, empty, empty), full_box(b"stco", 0, 0, empty))
+    minf = box(b"minf", full_box(b"vmhd", 0, 1, bytes(8)),
+               box(b"dinf", full_box(b"dref", 0, 0, struct.pack(">I", 1), full_box(b"url ", 0, 1))), stbl)
+    mdia = box(b"mdia", full_box(b"mdhd", 0, 0, struct.pack(">IIIIHH", 0, 0, H264_CLOCK, 0, 0x55C4, 0)),
+               full_box(b"hdlr", 0, 0, bytes(4), b"vide", bytes(12), b"VideoHandler\x00"), minf)
+    tkhd = full_box(b"tkhd", 0, 3, struct.pack(">IIIII", 0, 0, 1, 0, 0), bytes(8), struct.pack(">hhhH", 0, 0, 0, 0),
+                    MP4_MATRIX, struct.pack(">II", width << 16, height << 16))
+    mvhd = full_box(b"mvhd", 0, 0, struct.pack(">IIIIIH", 0, 0, 1000, 0, 0x10000, 0x100), bytes(10), MP4_MATRIX,
+                    bytes(24), struct.pack(">I", 2))
+    mvex = box(b"mvex", full_box(b"trex", 0, 0, struct.pack(">IIIII", 1, 1, 0, 0, 0)))
+    ftyp = box(b"ftyp", b"iso6", struct.pack(">I", 0), b"iso6", b"cmfc", b"mp41", b"avc1")
+    return ftyp + box(b"moov", mvhd, box(b"trak", tkhd, mdia), mvex)
+
+def media_fragment(sequence, decode_time, samples):
+    """One moof + mdat for samples of (avcc_bytes, duration, keyframe)."""
+    # moof is 88 bytes plus 12 per sample; the sample data starts after it and the mdat header
+    data_offset = 88 + 12 * len(samples) + 8
+    entries = b"".join(struct.pack(">III", duration, len(data), SAMPLE_SYNC if keyframe else SAMPLE_NON_SYNC)
+                       for data, duration, keyframe in samples)
+    traf = box(b"traf", full_box(b"tfhd", 0, 0x020000, struct.pack(">I", 1)),
+               full_box(b"tfdt", 1, 0, struct.pack(">Q", decode_time)),
+               full_box(b"trun", 0, 0x000701, struct.pack(">Ii", len(samples), data_offset), entries))
+    moof = box(b"moof", full_box(b"mfhd", 0, 0, struct.pack(">I", sequence)), traf)
+    size = sum(len(data) for data, _, _ in samples)
+    return b"".join([moof, struct.pack(">I4s", 8 + size, b"mdat")] + [data for data, _, _ in samples])
+
+# --- LL-HLS Packager ---
+class Part:
+    __slots__ = ("number", "msn", "index", "data", "duration", "frames", "independent", "init")
+
+    def __init__(self, number, msn, index, data, duration, frames, independent, init):
+        self.number = number
+        self.msn = msn
+        self.index = index
+        self.data = data
+        self.duration = duration
+        self.frames = frames
+        self.independent = independent
+        self.init = init
+
+class Segment:
+    __slots__ = ("msn", "parts", "duration", "complete", "init", "discontinuity")
+
+    def __init__(self, msn, init, discontinuity):
+        self.msn = msn
+        self.parts = []
+        self.duration = 0.0
+        self.complete = False
+        self.init = init
+        self.discontinuity = discontinuity
+
+class LivePackager:
+    """
+    Remuxes access units into CMAF fragments without decoding them. Each part
+    is one moof + mdat of up to HLS_PART_SECONDS; a segment is the run of parts
+    from one keyframe to the first keyframe after HLS_SEGMENT_SECONDS. Every
+    part is built once and the same bytes go to all viewers: the fMP4 streams
+    send parts as they complete, and HLS serves them as LL-HLS parts and
+    segments from the last HLS_SEGMENTS held in memory.
+    """
+    def __init__(self, part_seconds, segment_seconds, window):
+        self.cond = threading.Condition()
+        self.part_ticks = int(part_seconds * H264_CLOCK)
+        self.segment_ticks = int(segment_seconds * H264_CLOCK)
+        self.window = max(2, window)
+        self.inits = {}  # version -> init segment; kept while a retained segment refers to it
+        self.init = None
+        self.codec = None
+        self.info = None
+        self.sps = None
+        self.pps = None
+        self.segments = deque()
+        self.parts = deque()  # every retained part, oldest first, for the fMP4 followers
+        self.current = None
+        self.samples = []
+        self.part_duration = 0
+        self.pending = None  # (timestamp, avcc bytes, keyframe) until the next unit gives its duration
+        self.last_duration = H264_CLOCK // 25
+        self.need_keyframe = True
+        self.discontinuity = False
+        self.decode_time = 0
+        self.part_start = 0
+        self.sequence = 1
+        self.next_msn = 0
+        self.next_part = 0
+        self.max_segment = segment_seconds
+        self.remuxed = 0
+        self.dropped = 0
+
+    def restart(self, sps, pps):
+        """A new RTSP session: finish what was buffered and wait for its first keyframe."""
+        with self.cond:
+            self.flush_pending()
+            self.close_part()
+            if sps and pps:
+                self.configure(sps, pps)
+            self.need_keyframe = True
+
+    def configure(self, sps, pps):
+        if (sps, pps) == (self.sps, self.pps):
+            return
+        try:
+            info = parse_sps(sps)
+        except (ValueError, IndexError):
+            return
+        if self.init is not None:
+            # New parameter sets: close the segment so the next one starts with the new init
+            self.flush_pending()
+            self.close_part()
+            self.close_segment()
+            self.discontinuity = True
+        self.sps, self.pps, self.info = sps, pps, info
+        self.init = 0 if self.init is None else self.init + 1
+        self.inits[self.init] = init_segment(sps, pps, info)
+        self.codec = f"avc1.{sps[1]:02x}{sps[2]:02x}{sps[3]:02x}"
+        self.need_keyframe = True
+
+    def push(self, timestamp, nals, damaged):
+        """Adds one access unit; returns True when it was kept."""
+        with self.cond:
+            sps, pps = self.sps, self.pps
+            samples = []
+            keyframe = False
+            for nal in nals:
+                nal_type = nal[0] & 0x1F
+                if nal_type == NAL_SPS:
+                    sps = nal
+                elif nal_type == NAL_PPS:
+                    pps = nal
+                elif nal_type != NAL_AUD:
+                    keyframe = keyframe or nal_type == NAL_IDR
+                    samples.append(struct.pack(">I", len(nal)))
+                    samples.append(nal)
+            if sps and pps:
+                self.configure(sps, pps)
+            if damaged or not samples:
+                # A damaged picture would corrupt everything predicted from it, so skip to the next keyframe
+                self.need_keyframe = self.need_keyframe or damaged
+                self.dropped += 1
+                return False
+            if self.init is None or (self.need_keyframe and not keyframe):
+                self.dropped += 1
+                return False
+            self.need_keyframe = False
+            if self.pending is not None:
+                duration = (timestamp - self.pending[0]) & 0xFFFFFFFF
+                if not 0 < duration < 2 * H264_CLOCK:
+                    duration = self.last_duration
+                self.last_duration = duration
+                self.add_sample(self.pending[1], duration, self.pending[2])
+            self.pending = (timestamp, b"".join(samples), keyframe)
+            self.remuxed += 1
+            return True
+
+    def flush_pending(self):
+        if self.pending is not None:
+            self.add_sample(self.pending[1], self.last_duration, self.pending[2])
+            self.pending = None
+
+    def add_sample(self, data, duration, keyframe):
+        segment = self.current
+        if segment is None or (keyframe and segment.duration * H264_CLOCK + self.part_duration >= self.segment_ticks):
+            self.close_part()
+            self.close_segment()
+            segment = self.current = Segment(self.next_msn, self.init, self.discontinuity)
+            self.next_msn += 1
+            self.discontinuity = False
+        self.samples.append((data, duration, keyframe))
+        self.part_duration += duration
+        # Close the part now if one more frame would take it past the part target
+        if self.part_duration + self.last_duration > self.part_ticks:
+            self.close_part()
+
+    def close_part(self):
+        if not self.samples:
+            return
+        segment = self.current
+        data = media_fragment(self.sequence, self.part_start, self.samples)
+        part = Part(self.next_part, segment.msn, len(segment.parts), data, self.part_duration / H264_CLOCK,
+                    len(self.samples), self.samples[0][2], segment.init)
+        self.sequence += 1
+        self.next_part += 1
+        self.part_start += self.part_duration
+        segment.parts.append(part)
+        segment.duration += part.duration
+        self.parts.append(part)
+        self.samples = []
+        self.part_duration = 0
+        self.cond.notify_all()
+
+    def close_segment(self):
+        segment = self.current
+        if segment is None or not segment.parts:
+            return
+        segment.complete = True
+        self.max_segment = max(self.max_segment, segment.duration)
+        self.segments.append(segment)
+        self.current = None
+        while len(self.segments) > self.window:
+            dropped = self.segments.popleft()
+            for _ in dropped.parts:
+                self.parts.popleft()
+            live = {s.init for s in self.segments}
+            for version in [v for v in self.inits if v not in live and v != self.init]:
+                del self.inits[version]
+        self.cond.notify_all()
+
+    def playlist_segments(self):
+        segments = list(self.segments)
+        if self.current is not None and self.current.parts:
+            segments.append(self.current)
+        return segments
+
+    def has_segment(self, msn):
+        return bool(self.segments) and self.segments[-1].msn >= msn
+
+    def find_part(self, msn, index):
+        for segment in reversed(self.playlist_segments()):
+            if segment.msn == msn:
+                return segment.parts[index] if index < len(segment.parts) else None
+            if segment.msn < msn:
+                return None
+        return None
+
+    def next_part_name(self):
+        """(msn, index) of the part that will be published next."""
+        if self.current is not None:
+            return self.current.msn, len(self.current.parts)
+        return self.next_msn, 0
+
+    def wait_part(self, msn, index, timeout):
+        """The part, blocking for it if it is the next one due; None when it is gone or too far ahead."""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                part = self.find_part(msn, index)
+                if part is not None:
+                    return part
+                expected = self.next_part_name()
+                if (msn, index) not in (expected, (expected[0] + 1, 0)):
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.cond.wait(remaining):
+                    return None
+
+    def wait_playlist(self, msn, index, timeout):
+        """
+        Blocks until segment msn (or its part index) is published; False on timeout.
+        Raises ValueError for a segment more than two past the last complete one.
+        """
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            if msn > self.next_msn + 1:
+                raise ValueError(f"_HLS_msn={msn} is too far ahead of the live edge")
+            while not (self.has_segment(msn) if index is None else self.find_part(msn, index) or self.has_segment(msn)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.cond.wait(remaining):
+                    return False
+            return True
+
+    def playlist(self):
+        part_target = self.part_ticks / H264_CLOCK
+        with self.cond:
+            segments = self.playlist_segments()
+            lines = [
+                "#EXTM3U",
+                "#EXT-X-VERSION:9",
+                f"#EXT-X-TARGETDURATION:{math.ceil(self.max_segment)}",
+                f"#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK={3 * part_target:.3f}",
+                f"#EXT-X-PART-INF:PART-TARGET={part_target:.3f}",
+                f"#EXT-X-MEDIA-SEQUENCE:{segments[0].msn if segments else self.next_msn}",
+            ]
+            init = None
+            for position, segment in enumerate(segments):
+                if segment.discontinuity and position:
+                    lines.append("#EXT-X-DISCONTINUITY")
+                if segment.init != init:
+                    init = segment.init
+                    lines.append(f'#EXT-X-MAP:URI="init{init}.mp4"')
+                # Parts are only listed for the newest segments, where low-latency clients play
+                if position >= len(segments) - 3:
+                    for part in segment.parts:
+                        lines.append(f'#EXT-X-PART:DURATION={part.duration:.5f},URI="part{part.msn}.{part.index}.m4s"'
+                                     + (",INDEPENDENT=YES" if part.independent else ""))
+                if segment.complete:
+                    lines.append(f"#EXTINF:{segment.duration:.5f},")
+                    lines.append(f"seg{segment.msn}.m4s")
+            msn, index = self.next_part_name()
+            lines.append(f'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="part{msn}.{index}.m4s"')
+        return "\n".join(lines) + "\n"
+
+    def init_data(self, version):
+        with self.cond:
+            return self.inits.get(version)
+
+    def segment(self, msn):
+        with self.cond:
+            for segment in self.segments:
+                if segment.msn == msn:
+                    return segment
+        return None
+
+    def follow(self, stop, timeout=1.0):
+        """
+        Yields (init, part) for an fMP4 viewer: starting at the newest independent
+        part, then every part as it is published. A viewer that falls behind
+        the retained window jumps to the newest independent part again.
+        """
+        number = None
+        while not stop():
+            with self.cond:
+                if number is None or (self.parts and number < self.parts[0].number):
+                    number = next((p.number for p in reversed(self.parts) if p.independent), None)
+                    if number is None:
+                        self.cond.wait(timeout)
+                        continue
+                if not self.parts or number > self.parts[-1].number:
+                    self.cond.wait(timeout)
+                    continue
+                part = self.parts[number - self.parts[0].number]
+                init = self.inits.get(part.init)
+            number += 1
+            yield init, part
+
+    def status(self):
+        with self.cond:
+            return {
+                "codec": self.codec,
+                "width": self.info["width"] if self.info else None,
+                "height": self.info["height"] if self.info else None,
+                "remuxed_frames": self.remuxed,
+                "dropped_frames": self.dropped,
+                "segments": len(self.segments),
+                "parts": len(self.parts),
+                "next_msn": self.next_msn,
+                "buffered_bytes": sum(len(p.data) for p in self.parts),
+            }
+
+# --- Passthrough Session ---
+class PassthroughSession:
+    """
+    Capture path that never decodes: RTP/H.264 from the camera is depacketized
+    and remuxed by one LivePackager, which every /stream.mp4, /stream/ws and
+    /hls/ viewer reads from. Reconnects like StreamSession.
+    """
+    def __init__(self):
+        self.active = False
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.reconnect_event = threading.Event()  # Set by reconnect() and stop()
+        self.state = "idle"
+        self.stats = RecoveryStats()
+        self.packager = LivePackager(HLS_PART_SECONDS, HLS_SEGMENT_SECONDS, HLS_SEGMENTS)
+        self.client = None
+        self.viewers = 0
+        self.lost_packets = 0
+
+    def start(self):
+        with self.lock:
+            if not self.active:
+                self.stop_event.clear()
+                self.thread = threading.Thread(target=self._capture_thread, name="passthrough", daemon=True)
+                self.active = True
+                self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            self.active = False
+            self.stop_event.set()
+            self.reconnect_event.set()  # Ends a backoff wait at once
+            self._interrupt()
+            if self.thread is not None:
+                self.thread.join(timeout=3)
+                self.thread = None
+
+    def reconnect(self):
+        """Reconnects with the current RTSP settings; the packager marks the switch as a discontinuity."""
+        self.reconnect_event.set()
+        self._interrupt()
+
+    def _interrupt(self):
+        client = self.client
+        if client is not None and client.sock is not None:
+            try:
+                client.sock.shutdown(socket.SHUT_RDWR)  # Unblocks the reader
+            except OSError:
+                pass
+
+    def is_active(self):
+        with self.lock:
+            return self.active
+
+    def attach(self, delta):
+        with self.lock:
+            self.viewers += delta
+
+    def _capture_thread(self):
+        backoff = Backoff(RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY)
+        connected_once = False
+        while not self.stop_event.is_set():
+            self.reconnect_event.clear()
+            self.state = "reconnecting" if connected_once else "connecting"
+            client = RtspClient(DEVICE_IP, RTSP_PORT, RTSP_PATH, RTSP_USER, RTSP_PASSWORD, STALL_TIMEOUT)
+            started = time.perf_counter()
+            try:
+                client.connect()
+            except (OSError, RtspError, ValueError):
+                metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                                upstream="rtsp_passthrough", outcome="error")
+                client.close()
+                self.stats.record_open_failure()
+                self.stats.mark_down()
+                self.reconnect_event.wait(backoff.next_delay())
+                continue
+            metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                            upstream="rtsp_passthrough", outcome="ok")
+            if connected_once:
+                self.stats.record_reconnect()
+            connected_once = True
+            self.client = client
+            self.state = "streaming"
+            self.packager.restart(client.sps, client.pps)
+            depacketizer = H264Depacketizer()
+            try:
+                while not self.stop_event.is_set() and not self.reconnect_event.is_set():
+                    packet = client.read_packet()
+                    for timestamp, nals, damaged in depacketizer.push(packet):
+                        if self.packager.push(timestamp, nals, damaged):
+                            metrics.inc("driver_frames_total", stage="remuxed")
+                            self.stats.mark_up()
+                            backoff.reset()
+                        else:
+                            metrics.inc("driver_frames_total", stage="dropped")
+                    client.keepalive()
+            except socket.timeout:
+                # Watchdog: nothing from the camera within STALL_TIMEOUT
+                self.stats.record_stall()
+            except (OSError, RtspError, ValueError):
+                pass
+            finally:
+                self.lost_packets += depacketizer.lost
+                self.client = None
+                client.close()
+            if self.reconnect_event.is_set():
+                connected_once = False
+                backoff.reset()
+            elif not self.stop_event.is_set():
+                self.stats.mark_down()
+                self.state = "reconnecting"
+                self.reconnect_event.wait(backoff.next_delay())
+        self.state = "idle"
+        self.active = False
+
+    def status(self):
+        status = {"active": self.is_active(), "state": self.state, "viewers": self.viewers,
+                  "lost_packets": self.lost_packets}
+        status.update(self.packager.status())
+        status.update(self.stats.snapshot())
+        return status
+
+passthrough_session = PassthroughSession()
+metrics.gauge("driver_passthrough_viewers", lambda: passthrough_session.viewers)
+
+# --- Config Reload ---
+RELOADABLE_SETTINGS = {"DEVICE_IP": str, "RTSP_PORT": int, "RTSP_USER": str, "RTSP_PASSWORD": str, "RTSP_PATH": str}
+STARTUP_SETTINGS = {name: globals()[name] for name in RELOADABLE_SETTINGS}
+
+def on_config_change(changed, values):
+    # Both captures read these when they connect, so a running one only has to reconnect
+    if apply_settings(values, RELOADABLE_SETTINGS, STARTUP_SETTINGS, globals()):
+        stream_session.reconnect()
+        passthrough_session.reconnect()
+
+def config_status():
+    settings = {name: globals()[name] for name in RELOADABLE_SETTINGS}
+    settings["RTSP_PASSWORD"] = "***"
+    return {"reload": config_watcher.status() if CONFIG_RELOAD else None, "settings": settings}
+
+# Started by the process that runs the capture; with WORKERS > 1 the workers read its state off the frame bus
+config_watcher = ConfigWatcher(CONFIG_MOUNT_PATH, on_config_change, CONFIG_POLL_INTERVAL)
+
+def start_config_watcher():
+    if CONFIG_RELOAD:
+        config_watcher.load()
+        config_watcher.start()
+
+# --- Mosaic ---
+class LocalCamera:
+    """
+    This driver's /stream capture as a mosaic source. It is counted like any other
+    viewer: the first mosaic showing it starts the capture unless POST /stream
+    already did, and the last one to close stops it unless POST /stream asked for
+    it meanwhile. With WORKERS > 1 starting and stopping are requests to the
+    capture process over the frame bus, and each worker counts only its own
+    mosaics and POSTs; a worker whose mosaics lose the capture to another
+    worker's DELETE /stream asks for it again on its next tick.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+        self.started = False  # Whether the mosaics, not POST /stream, are what keeps the capture running
+        self.last = (0, None)
+
+    def attach(self):
+        with self.lock:
+            self.users += 1
+            if not stream_session.is_active():
+                stream_session.start()
+                self.started = True
+
+    def detach(self):
+        with self.lock:
+            self.users = max(0, self.users - 1)
+            if self.users == 0 and self.started:
+                self.started = False
+                stream_session.stop()
+
+    def stream_requested(self, requested):
+        """
+        Records POST (True) or DELETE (False) /stream. True while a mosaic is showing
+        the capture, in which case DELETE leaves it running until the last one closes.
+        """
+        with self.lock:
+            self.started = not requested
+            return self.users > 0
+
+    def latest(self):
+        if not stream_session.is_active():
+            # DELETE /stream in another worker stopped the capture under this one's mosaics; ask for it again
+            with self.lock:
+                if self.users:
+                    stream_session.start()
+                    self.started = True
+        seq, frame = stream_session.seq, stream_session.get_frame()
+        if isinstance(frame, BusFrame):
+            data = bytes(frame.view)
+            if not stream_session.bus.intact(frame):
+                return self.last  # Lapped while copying; the next tick takes a newer frame
+            seq, frame = frame.seq, data
+        self.last = (seq, frame)
+        return self.last
+
+# Composites with OpenCV; in a frame bus worker this is the only thing that imports it
+mosaic_dependencies = DependencyLoader(["cv2", "numpy"])
+local_camera = LocalCamera()
+mosaic_settings = MosaicSettings(MOSAIC_WIDTH, MOSAIC_HEIGHT, MOSAIC_MAX_TILES, MOSAIC_DEFAULT_FPS, MOSAIC_MAX_FPS,
+                                 MOSAIC_JPEG_QUALITY)
+mosaic_hub = MosaicHub(
+    dict({name: RemoteCamera(url, STALL_TIMEOUT, RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY)
+          for name, url in parse_cameras(MOSAIC_CAMERAS).items()}, local=local_camera),
+    mosaic_settings, metrics)
+metrics.gauge("driver_mosaic_viewers", mosaic_hub.viewers)
 
 # --- HTTP Server and Handlers ---
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     daemon_threads = True
 
+# Boundary, part header and trailing CRLF written around every JPEG
+MJPEG_PART_OVERHEAD = len(b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' b'\r\n')
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+HLS_PLAYLIST_TYPE = "application/vnd.apple.mpegurl"
+
+def websocket_frame(payload):
+    """One unmasked binary frame, as a server sends them."""
+    size = len(payload)
+    if size < 126:
+        return bytes((0x82, size)) + payload
+    if size < 1 << 16:
+        return struct.pack("!BBH", 0x82, 126, size) + payload
+    return struct.pack("!BBQ", 0x82, 127, size) + payload
+
 class CameraRequestHandler(BaseHTTPRequestHandler):
     protocol_version = "HTTP/1.1"
+    routes = ("/stream", "/stream/stats", "/stream.mp4", "/stream/ws", "/mosaic", "/mosaic/stats", "/config",
+              "/readyz", "/metrics", "/debug/profile", "/debug/tasks")
+
+    def parse_request(self):
+        self.started = time.perf_counter()
+        return super().parse_request()
+
+    def send_response(self, code, message=None):
+        super().send_response(code, message)
+        if METRICS_ENABLED and self.command:
+            path = self.path.split("?", 1)[0]
+            if path.startswith("/hls/"):
+                path = "/hls/"  # One label for the playlist and every part and segment
+            metrics.observe("driver_http_request_duration_seconds", time.perf_counter() - self.started,
+                            route=path if path in self.routes or path == "/hls/" else "unmatched",
+                            method=self.command, status=str(code))
+
+    def _write_body(self, body):
+        self.wfile.write(body)
+        metrics.inc("driver_client_bytes_sent_total", len(body), client=metrics.client_label(self.client_address[0]))
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self._write_body(body)
 
     def do_POST(self):
         if self.path == "/stream":
@@ -89,6 +1534,28 @@ class CameraRequestHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         if self.path == "/stream":
             self._handle_get_stream()
+        elif self.path == "/stream/stats":
+            self._handle_stream_stats()
+        elif self.path == "/stream.mp4":
+            self._handle_get_mp4()
+        elif self.path == "/stream/ws":
+            self._handle_websocket()
+        elif self.path.startswith("/hls/"):
+            self._handle_hls()
+        elif self.path.split("?", 1)[0] == "/mosaic":
+            self._handle_mosaic()
+        elif self.path == "/mosaic/stats":
+            self._send_json(200, mosaic_hub.status())
+        elif self.path == "/config":
+            self._send_json(200, stream_session.bus.status().get("config", {}) if WORKERS > 1 else config_status())
+        elif self.path == "/readyz":
+            # Passthrough never imports OpenCV, so it is ready as soon as it listens
+            ready = STREAM_MODE == "passthrough" or dependencies.ready()
+            self._send_json(200 if ready else 503, dependencies.status())
+        elif self.path == "/metrics":
+            self._handle_metrics()
+        elif self.path.startswith("/debug/"):
+            self._handle_debug()
         else:
             self.send_error(404, "Not Found")
 
@@ -99,27 +1566,92 @@ class CameraRequestHandler(BaseHTTPRequestHandler):
             self.send_error(404, "Not Found")
 
     def _handle_activate_stream(self):
-        if not stream_session.is_active():
-            stream_session.start()
+        started = False
+        if STREAM_MODE != "passthrough":
+            if not dependencies.wait():
+                self._send_json(503, {"error": "OpenCV is not available yet", "dependencies": dependencies.status()})
+                return
+            local_camera.stream_requested(True)
+            if not stream_session.is_active():
+                stream_session.start()
+                started = True
+        if STREAM_MODE != "mjpeg" and not passthrough_session.is_active():
+            passthrough_session.start()
+            started = True
+        if started:
             time.sleep(0.5)
         self.send_response(200)
         self.send_header("Content-Type", "application/json")
         self.end_headers()
-        self.wfile.write(b'{"status":"streaming","message":"Stream activated"}')
+        self._write_body(b'{"status":"streaming","message":"Stream activated"}')
 
     def _handle_deactivate_stream(self):
-        stream_session.stop()
+        if not local_camera.stream_requested(False):
+            stream_session.stop()
+        passthrough_session.stop()
         self.send_response(200)
         self.send_header("Content-Type", "application/json")
         self.end_headers()
-        self.wfile.write(b'{"status":"stopped","message":"Stream stopped"}')
+        self._write_body(b'{"status":"stopped","message":"Stream stopped"}')
+
+    def _handle_stream_stats(self):
+        status = stream_session.status()
+        if STREAM_MODE != "mjpeg":
+            status["passthrough"] = passthrough_session.status()
+        body = json.dumps(status).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self._write_body(body)
+
+    def _handle_metrics(self):
+        if not METRICS_ENABLED:
+            self.send_error(404, "Metrics are disabled")
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self._write_body(body)
+
+    def _handle_debug(self):
+        url = urlparse(self.path)
+        denied = debug_denied(self.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+        if denied:
+            self._send_json(denied[0], {"error": denied[1]})
+            return
+        if url.path == "/debug/tasks":
+            self._send_json(200, {"stuck_after_seconds": DEBUG_STUCK_SECONDS, "threads": stack_watch.snapshot()})
+            return
+        if url.path != "/debug/profile":
+            self.send_error(404, "Not Found")
+            return
+        query = parse_qs(url.query)
+        try:
+            seconds = profile_seconds(query.get("seconds", [None])[0], DEBUG_PROFILE_MAX_SECONDS)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        stacks = profiler.profile(seconds, cpu_only=query.get("mode", ["cpu"])[0] != "wall")
+        if stacks is None:
+            self._send_json(409, {"error": "A profile is already running"})
+            return
+        body = stacks.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Disposition", "attachment; filename=profile.collapsed")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self._write_body(body)
 
     def _handle_get_stream(self):
         if not stream_session.is_active():
             self.send_response(409)
             self.send_header("Content-Type", "application/json")
             self.end_headers()
-            self.wfile.write(b'{"error":"Stream not active. POST /stream to activate."}')
+            self._write_body(b'{"error":"Stream not active. POST /stream to activate."}')
             return
 
         self.send_response(200)
@@ -129,33 +1661,300 @@ class CameraRequestHandler(BaseHTTPRequestHandler):
         self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
         self.end_headers()
 
+        client = metrics.client_label(self.client_address[0])
+        last_seq = 0
         try:
             while stream_session.is_active():
+                seq = stream_session.seq
                 frame = stream_session.get_frame()
                 if frame is None:
                     time.sleep(0.1)
                     continue
+                if seq == last_seq:
+                    # Nothing new encoded, e.g. the motion gate is holding a static scene back
+                    time.sleep(0.01)
+                    continue
                 self.wfile.write(b'--frame\r\n')
                 self.wfile.write(b'Content-Type: image/jpeg\r\n\r\n')
-                self.wfile.write(frame)
+                if not stream_session.send_frame(self.connection, frame):
+                    break  # Overwritten in the frame bus mid-send; the part is corrupt, so end the stream
                 self.wfile.write(b'\r\n')
                 self.wfile.flush()
+                if last_seq and seq - last_seq > 1:
+                    # Encoded frames this viewer never saw because it polls slower than the capture rate
+                    metrics.inc("driver_frames_total", seq - last_seq - 1, stage="dropped")
+                last_seq = seq
+                metrics.inc("driver_frames_total", stage="sent")
+                metrics.inc("driver_client_bytes_sent_total", len(frame) + MJPEG_PART_OVERHEAD, client=client)
                 time.sleep(0.03)
         except (BrokenPipeError, ConnectionResetError):
             pass
 
+    def _handle_mosaic(self):
+        query = parse_qs(urlparse(self.path).query)
+        try:
+            grid = mosaic_hub.parse(*(query.get(name, [None])[0] for name in ("cameras", "layout", "fps")))
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        if not mosaic_dependencies.wait():
+            self._send_json(503, {"error": "OpenCV is not available yet", "dependencies": mosaic_dependencies.status()})
+            return
+
+        self.send_response(200)
+        self.send_header("Age", "0")
+        self.send_header("Cache-Control", "no-cache, private")
+        self.send_header("Pragma", "no-cache")
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        self.end_headers()
+
+        client = metrics.client_label(self.client_address[0])
+        mosaic = mosaic_hub.open(*grid)
+        seq = 0
+        try:
+            while True:
+                # A grid nobody changed is sent again every second so dead wall clients are noticed
+                seq, frame = mosaic.wait_frame(seq, 1.0)
+                if frame is None:
+                    continue
+                self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+                self.wfile.flush()
+                metrics.inc("driver_frames_total", stage="sent")
+                metrics.inc("driver_client_bytes_sent_total", len(frame) + MJPEG_PART_OVERHEAD, client=client)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            mosaic_hub.close(mosaic)
+
+    def _passthrough_inactive(self):
+        if passthrough_session.is_active():
+            return False
+        self._send_json(409, {"error": "Passthrough stream not active. Set STREAM_MODE=passthrough or both "
+                                       "and POST /stream to activate."})
+        return True
+
+    def _send_parts(self, write):
+        """Writes the init segment and then every fMP4 part as it is published, until the viewer leaves."""
+        client = metrics.client_label(self.client_address[0])
+        sent_init = None
+        passthrough_session.attach(1)
+        try:
+            for init, part in passthrough_session.packager.follow(lambda: not passthrough_session.is_active()):
+                if part.init != sent_init:
+                    if init is None:
+                        break
+                    # First part, or the camera changed its parameter sets: the player needs the new init first
+                    write(init)
+                    metrics.inc("driver_client_bytes_sent_total", len(init), client=client)
+                    sent_init = part.init
+                write(part.data)
+                metrics.inc("driver_frames_total", part.frames, stage="sent")
+                metrics.inc("driver_client_bytes_sent_total", len(part.data), client=client)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            passthrough_session.attach(-1)
+
+    def _handle_get_mp4(self):
+        if self._passthrough_inactive():
+            return
+        self.send_response(200)
+        self.send_header("Cache-Control", "no-cache, private")
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def write(data):
+            self.wfile.write(data)
+            self.wfile.flush()
+
+        self._send_parts(write)
+
+    def _handle_websocket(self):
+        key = self.headers.get("Sec-WebSocket-Key")
+        if self.headers.get("Upgrade", "").lower() != "websocket" or not key:
+            self._send_json(400, {"error": "Expected a websocket upgrade"})
+            return
+        if self._passthrough_inactive():
+            return
+        accept = base64.b64encode(hashlib.sha1((key.strip() + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.close_connection = True
+
+        def write(data):
+            # One message per init segment or part, ready for SourceBuffer.appendBuffer
+            self.wfile.write(websocket_frame(data))
+            self.wfile.flush()
+
+        self._send_parts(write)
+
+    def _handle_hls(self):
+        url = urlparse(self.path)
+        name = url.path[len("/hls/"):]
+        if self._passthrough_inactive():
+            return
+        packager = passthrough_session.packager
+        part_target = packager.part_ticks / H264_CLOCK
+        content_type = "video/mp4"
+        if name == "stream.m3u8":
+            query = parse_qs(url.query)
+            try:
+                msn = int(query["_HLS_msn"][0]) if "_HLS_msn" in query else None
+                part = int(query["_HLS_part"][0]) if "_HLS_part" in query else None
+                if part is not None and msn is None:
+                    raise ValueError("_HLS_part needs _HLS_msn")
+                if msn is not None and not packager.wait_playlist(msn, part, 3 * packager.max_segment):
+                    self._send_json(503, {"error": "Timed out waiting for the requested segment"})
+                    return
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            body = packager.playlist().encode()
+            content_type = HLS_PLAYLIST_TYPE
+        elif re.fullmatch(r"init\d+\.mp4", name):
+            body = packager.init_data(int(name[4:-4]))
+        elif re.fullmatch(r"seg\d+\.m4s", name):
+            segment = packager.segment(int(name[3:-4]))
+            body = b"".join(part.data for part in segment.parts) if segment is not None else None
+        elif re.fullmatch(r"part\d+\.\d+\.m4s", name):
+            msn, index = name[4:-4].split(".")
+            # A request for the preload-hinted part blocks until the part is published
+            part = packager.wait_part(int(msn), int(index), 3 * part_target)
+            body = part.data if part is not None else None
+        else:
+            body = None
+        if body is None:
+            self.send_error(404, "Not Found")
+            return
+        self.send_response(200)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        # Parts and segments never change once published; the playlist does on every part
+        self.send_header("Cache-Control", "no-cache" if content_type == HLS_PLAYLIST_TYPE else "max-age=60")
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self._write_body(body)
+
     def log_message(self, format, *args):
         return
 
+# --- Worker Processes ---
+class ReusePortHTTPServer(ThreadedHTTPServer):
+    # Every worker binds its own listener; the kernel balances connections between them
+    allow_reuse_port = True
+
+def serve_worker(ready):
+    global stream_session, dependencies
+    bus = FrameBus.attach(FRAME_BUS_NAME)
+    stream_session = BusStreamSession(bus)
+    dependencies = BusDependencies(bus)
+    server = ReusePortHTTPServer((SERVER_HOST, SERVER_PORT), CameraRequestHandler)
+    ready.set()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        bus.close()
+
+class CaptureSupervisor:
+    """
+    Runs WORKERS HTTP server processes on one SO_REUSEPORT port and keeps the one
+    capture in this process. It starts and stops the capture as the workers ask
+    through the frame bus, publishes its status there for /stream/stats and
+    /readyz, and respawns any worker that dies.
+    """
+    def __init__(self, count, bus):
+        self.count = count
+        self.bus = bus
+        self.ctx = multiprocessing.get_context("spawn")
+        self.workers = []
+        self.stopping = False
+
+    def _spawn(self):
+        ready = self.ctx.Event()
+        proc = self.ctx.Process(target=serve_worker, args=(ready,))
+        proc.start()
+        ready.wait(30)
+        return proc
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def sync(self):
+        requested = self.bus.requested()
+        if requested and not stream_session.is_active():
+            stream_session.start()
+        elif not requested and stream_session.is_active():
+            stream_session.stop()
+        self.bus.set_active(stream_session.is_active())
+        self.bus.publish_status({"stream": stream_session.status(), "dependencies": dependencies.status(),
+                                 "config": config_status()})
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        self.sync()
+        self.workers = [self._spawn() for _ in range(self.count)]
+        print(f"HTTP server running at http://{SERVER_HOST}:{SERVER_PORT}/stream with {self.count} workers")
+        try:
+            while not self.stopping:
+                time.sleep(0.1)
+                self.sync()
+                for i, proc in enumerate(self.workers):
+                    if not proc.is_alive() and not self.stopping:
+                        self.workers[i] = self._spawn()
+        finally:
+            for proc in self.workers:
+                proc.terminate()
+            for proc in self.workers:
+                proc.join(5)
+            stream_session.stop()
+            self.bus.close()
+
+def run_workers():
+    global FRAME_BUS_NAME
+    if STREAM_MODE != "mjpeg":
+        raise SystemExit("WORKERS > 1 needs STREAM_MODE=mjpeg; the passthrough session runs with WORKERS=1")
+    if not FRAME_BUS_NAME:
+        # Spawned workers inherit this and attach the same segment
+        FRAME_BUS_NAME = f"hikvision-frames-{os.getpid()}"
+        os.environ["FRAME_BUS_NAME"] = FRAME_BUS_NAME
+    try:
+        bus = FrameBus.create(FRAME_BUS_NAME, FRAME_BUS_SLOTS, FRAME_BUS_SLOT_BYTES)
+    except FileExistsError:
+        # Left behind by a capture process that was killed; nothing else owns the name
+        from multiprocessing import shared_memory
+        shared_memory.SharedMemory(name=FRAME_BUS_NAME).unlink()
+        bus = FrameBus.create(FRAME_BUS_NAME, FRAME_BUS_SLOTS, FRAME_BUS_SLOT_BYTES)
+    stream_session.bus = bus
+    start_config_watcher()
+    dependencies.start()
+    CaptureSupervisor(WORKERS, bus).run()
+
 def run():
+    if WORKERS > 1:
+        run_workers()
+        return
+    start_config_watcher()
     server = ThreadedHTTPServer((SERVER_HOST, SERVER_PORT), CameraRequestHandler)
     print(f"HTTP server running at http://{SERVER_HOST}:{SERVER_PORT}/stream")
+    # The socket is listening; import OpenCV while the first requests are served
+    if STREAM_MODE != "passthrough":
+        dependencies.start()
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         pass
     finally:
         stream_session.stop()
+        passthrough_session.stop()
         server.server_close()
 
 if __name__ == "__main__":
@@ -1,9 +1,16 @@
 import os
+import sys
 import io
 import threading
 import requests
 import time
-from flask import Flask, Response, request, jsonify, stream_with_context
+from flask import Flask, Response, request, jsonify, stream_with_context, g
+
+# Helpers shared by every driver live in iot_driver_copilot/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import METRICS_CONTENT_TYPE, Metrics
+from common.debug import SamplingProfiler, StackWatch, debug_denied, poll_threads, profile_seconds
+from common.config import ConfigWatcher, apply_settings, interrupt_response
 
 # Environment Variables (Required)
 DEVICE_IP = os.getenv("DEVICE_IP", "192.168.1.64")
@@ -18,22 +25,169 @@ INFO_PATH = os.getenv("INFO_PATH", "/ISAPI/System/deviceInfo")
 RECORD_START_PATH = os.getenv("RECORD_START_PATH", "/ISAPI/ContentMgmt/record/control/manual/start")
 RECORD_STOP_PATH = os.getenv("RECORD_STOP_PATH", "/ISAPI/ContentMgmt/record/control/manual/stop")
 
+# Keys of the mounted ConfigMap named like the device and ISAPI path settings above override them
+# and are applied while running; CONFIG_POLL_INTERVAL is the rescan period behind inotify
+CONFIG_MOUNT_PATH = os.getenv("CONFIG_MOUNT_PATH", "/etc/edgedevice/config")
+CONFIG_RELOAD = os.getenv("CONFIG_RELOAD", "true").lower() == "true"
+CONFIG_POLL_INTERVAL = float(os.getenv("CONFIG_POLL_INTERVAL", "10"))
+
+# Prometheus /metrics; per-client byte counters stop adding new client labels past METRICS_MAX_CLIENTS
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MAX_CLIENTS = int(os.getenv("METRICS_MAX_CLIENTS", "100"))
+
+# /debug/profile and /debug/tasks are compiled in but answer 404 unless DEBUG_ENDPOINTS=true;
+# with DEBUG_TOKEN set, callers must also send it in the X-Debug-Token header
+DEBUG_ENDPOINTS = os.getenv("DEBUG_ENDPOINTS", "false").lower() == "true"
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+DEBUG_PROFILE_MAX_SECONDS = float(os.getenv("DEBUG_PROFILE_MAX_SECONDS", "60"))
+DEBUG_PROFILE_HZ = float(os.getenv("DEBUG_PROFILE_HZ", "100"))
+DEBUG_STUCK_SECONDS = float(os.getenv("DEBUG_STUCK_SECONDS", "10"))
+
 app = Flask(__name__)
 
 def get_device_url(path):
     return f"http://{DEVICE_IP}:{DEVICE_PORT}{path}"
 
-def isapi_get(path, stream=False, timeout=10):
+def isapi_request(method, path, **kwargs):
     url = get_device_url(path)
-    resp = requests.get(url, auth=(DEVICE_USER, DEVICE_PASS), stream=stream, timeout=timeout)
+    started = time.perf_counter()
+    try:
+        resp = requests.request(method, url, auth=(DEVICE_USER, DEVICE_PASS), **kwargs)
+    except requests.RequestException:
+        metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                        upstream="isapi", outcome="error")
+        raise
+    metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                    upstream="isapi", outcome="ok" if resp.status_code < 500 else "5xx")
     resp.raise_for_status()
     return resp
 
+def isapi_get(path, stream=False, timeout=10):
+    return isapi_request("GET", path, stream=stream, timeout=timeout)
+
 def isapi_post(path, data=None, headers=None):
-    url = get_device_url(path)
-    resp = requests.post(url, auth=(DEVICE_USER, DEVICE_PASS), data=data, headers=headers)
-    resp.raise_for_status()
-    return resp
+    return isapi_request("POST", path, data=data, headers=headers)
+
+# --- Metrics ---
+
+METRIC_HELP = {
+    "driver_http_request_duration_seconds": "Time from request arrival until the response headers were ready.",
+    "driver_upstream_request_duration_seconds": "ISAPI call latency to response headers, by outcome.",
+    "driver_client_bytes_sent_total": "Response body bytes sent, by client address.",
+}
+
+metrics = Metrics(METRICS_MAX_CLIENTS, METRIC_HELP, enabled=METRICS_ENABLED)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    started = g.pop("request_started", None)
+    if started is None or not METRICS_ENABLED:
+        return response
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.observe("driver_http_request_duration_seconds", time.perf_counter() - started,
+                    route=route, method=request.method, status=str(response.status_code))
+    client = metrics.client_label(request.remote_addr or "unknown")
+    if response.is_streamed:
+        response.response = metrics.count_bytes(response.response, client)
+    else:
+        metrics.inc("driver_client_bytes_sent_total", response.content_length or 0, client=client)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics_view():
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+# --- Debug Endpoints ---
+
+profiler = SamplingProfiler(DEBUG_PROFILE_HZ)
+stack_watch = StackWatch(DEBUG_STUCK_SECONDS)
+
+def debug_watchdog():
+    while True:
+        stack_watch.update(poll_threads())
+        time.sleep(1.0)
+
+if DEBUG_ENDPOINTS:
+    threading.Thread(target=debug_watchdog, name="debug-watchdog", daemon=True).start()
+
+@app.route("/debug/profile", methods=["GET"])
+def debug_profile():
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return jsonify({"error": denied[1]}), denied[0]
+    try:
+        seconds = profile_seconds(request.args.get("seconds"), DEBUG_PROFILE_MAX_SECONDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    stacks = profiler.profile(seconds, cpu_only=request.args.get("mode", "cpu") != "wall")
+    if stacks is None:
+        return jsonify({"error": "A profile is already running"}), 409
+    return Response(stacks, content_type="text/plain; charset=utf-8",
+                    headers={"Content-Disposition": "attachment; filename=profile.collapsed"})
+
+@app.route("/debug/tasks", methods=["GET"])
+def debug_tasks():
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return jsonify({"error": denied[1]}), denied[0]
+    return jsonify({"stuck_after_seconds": DEBUG_STUCK_SECONDS, "threads": stack_watch.snapshot()})
+
+# --- Config Reload ---
+
+RELOADABLE_SETTINGS = {
+    "DEVICE_IP": str, "DEVICE_PORT": int, "DEVICE_USER": str, "DEVICE_PASS": str,
+    "SNAPSHOT_PATH": str, "STREAM_PATH": str, "INFO_PATH": str,
+    "RECORD_START_PATH": str, "RECORD_STOP_PATH": str,
+}
+STARTUP_SETTINGS = {name: globals()[name] for name in RELOADABLE_SETTINGS}
+
+# Settings a running /feed upstream depends on; the others are read afresh by every request
+FEED_SETTINGS = {"DEVICE_IP", "DEVICE_PORT", "DEVICE_USER", "DEVICE_PASS", "STREAM_PATH"}
+
+# Bumped when a FEED_SETTINGS value changes; open feeds compare it between chunks
+feed_generation = 0
+# Upstream responses of the open /feed viewers, with the generation each was opened under
+open_feeds = {}
+feed_lock = threading.Lock()
+
+def track_feed(upstream, generation):
+    """Registers an open /feed upstream; one opened under settings already replaced is interrupted at once."""
+    with feed_lock:
+        open_feeds[upstream] = generation
+        stale = generation != feed_generation
+    if stale:
+        interrupt_response(upstream)
+
+def untrack_feed(upstream):
+    with feed_lock:
+        open_feeds.pop(upstream, None)
+    upstream.close()
+
+def on_config_change(changed, values):
+    global feed_generation
+    if apply_settings(values, RELOADABLE_SETTINGS, STARTUP_SETTINGS, globals()) & FEED_SETTINGS:
+        with feed_lock:
+            feed_generation += 1
+            stale = list(open_feeds)
+        for upstream in stale:
+            interrupt_response(upstream)
+
+config_watcher = ConfigWatcher(CONFIG_MOUNT_PATH, on_config_change, CONFIG_POLL_INTERVAL)
+if CONFIG_RELOAD:
+    config_watcher.load()
+    config_watcher.start()
+
+@app.route("/config", methods=["GET"])
+def config_status():
+    settings = {name: globals()[name] for name in RELOADABLE_SETTINGS}
+    settings["DEVICE_PASS"] = "***"
+    return jsonify({"reload": config_watcher.status() if CONFIG_RELOAD else None, "settings": settings})
 
 # /info : Device info and status
 @app.route('/info', methods=['GET'])
@@ -59,13 +213,36 @@ def snapshot():
 def live_feed():
     try:
         # Try HTTP preview (MJPEG or multipart JPEG via ISAPI)
+        opened = feed_generation
         resp = isapi_get(STREAM_PATH, stream=True, timeout=30)
-        def generate():
-            for chunk in resp.iter_content(chunk_size=4096):
-                if not chunk:
-                    break
-                yield chunk
         content_type = resp.headers.get('Content-Type', 'multipart/x-mixed-replace;boundary=--boundary')
+        def generate():
+            upstream, generation = resp, opened
+            track_feed(upstream, generation)
+            try:
+                while True:
+                    try:
+                        for chunk in upstream.iter_content(chunk_size=4096):
+                            if not chunk:
+                                break
+                            yield chunk
+                            if generation != feed_generation:
+                                break
+                    except requests.RequestException:
+                        # interrupt_response() cuts the old upstream off mid-frame; anything else is a real failure
+                        if generation == feed_generation:
+                            raise
+                    if generation == feed_generation:
+                        return
+                    # The device or STREAM_PATH was reloaded: move this viewer onto a new upstream
+                    untrack_feed(upstream)
+                    generation = feed_generation
+                    upstream = isapi_get(STREAM_PATH, stream=True, timeout=30)
+                    track_feed(upstream, generation)
+                    if upstream.headers.get('Content-Type', 'multipart/x-mixed-replace;boundary=--boundary') != content_type:
+                        return  # A different multipart boundary cannot continue this response
+            finally:
+                untrack_feed(upstream)
         return Response(stream_with_context(generate()), content_type=content_type)
     except Exception as e:
         return jsonify({'error': str(e)}), 502
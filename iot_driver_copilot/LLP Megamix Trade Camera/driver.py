@@ -1,7 +1,17 @@
 import os
+import sys
 import threading
+import time
 import requests
-from flask import Flask, Response, stream_with_context
+from flask import Flask, Response, request, jsonify, stream_with_context, g
+
+# Helpers shared by every driver live in iot_driver_copilot/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import METRICS_CONTENT_TYPE, Metrics
+from common.debug import SamplingProfiler, StackWatch, debug_denied, poll_threads, profile_seconds
+from common.config import ConfigWatcher, apply_settings, interrupt_response
+from common.resilience import Backoff, RecoveryStats
+from common.mosaic import MosaicHub, MosaicSettings, RemoteCamera, extract_jpegs, opencv_available, parse_cameras
 
 app = Flask(__name__)
 
@@ -15,38 +25,321 @@ CAMERA_CHANNEL = os.environ.get("CAMERA_CHANNEL", "1")
 SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
 SERVER_PORT = int(os.environ.get("SERVER_PORT", "8080"))
 
+# Keys of the mounted ConfigMap named like the CAMERA_* settings above override them while running:
+# the shared capture reconnects to the new camera and viewers stay attached; CONFIG_POLL_INTERVAL is
+# the rescan period behind inotify
+CONFIG_MOUNT_PATH = os.environ.get("CONFIG_MOUNT_PATH", "/etc/edgedevice/config")
+CONFIG_RELOAD = os.environ.get("CONFIG_RELOAD", "true").lower() == "true"
+CONFIG_POLL_INTERVAL = float(os.environ.get("CONFIG_POLL_INTERVAL", "10"))
+
+# Reconnect and stall detection settings (seconds)
+RECONNECT_MIN_DELAY = float(os.environ.get("RECONNECT_MIN_DELAY", "0.5"))
+RECONNECT_MAX_DELAY = float(os.environ.get("RECONNECT_MAX_DELAY", "30"))
+STALL_TIMEOUT = float(os.environ.get("STALL_TIMEOUT", "5"))
+
+# Prometheus /metrics; per-client byte counters stop adding new client labels past METRICS_MAX_CLIENTS
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MAX_CLIENTS = int(os.environ.get("METRICS_MAX_CLIENTS", "100"))
+
+# /debug/profile and /debug/tasks are compiled in but answer 404 unless DEBUG_ENDPOINTS=true;
+# with DEBUG_TOKEN set, callers must also send it in the X-Debug-Token header
+DEBUG_ENDPOINTS = os.environ.get("DEBUG_ENDPOINTS", "false").lower() == "true"
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+DEBUG_PROFILE_MAX_SECONDS = float(os.environ.get("DEBUG_PROFILE_MAX_SECONDS", "60"))
+DEBUG_PROFILE_HZ = float(os.environ.get("DEBUG_PROFILE_HZ", "100"))
+DEBUG_STUCK_SECONDS = float(os.environ.get("DEBUG_STUCK_SECONDS", "10"))
+
+# /mosaic composites several cameras into one MJPEG grid. "local" is this driver's shared capture; MOSAIC_CAMERAS
+# adds other MJPEG streams as name=url pairs, e.g. "dock=http://10.0.0.7:8080/cam,gate=http://10.0.0.8:8080/stream".
+# Grids are MOSAIC_WIDTH x MOSAIC_HEIGHT with at most MOSAIC_MAX_TILES tiles and MOSAIC_MAX_FPS updates a second;
+# each is encoded once per tick for every client asking for the same cameras, layout and fps
+MOSAIC_CAMERAS = os.environ.get("MOSAIC_CAMERAS", "")
+MOSAIC_WIDTH = int(os.environ.get("MOSAIC_WIDTH", "1280"))
+MOSAIC_HEIGHT = int(os.environ.get("MOSAIC_HEIGHT", "720"))
+MOSAIC_MAX_TILES = int(os.environ.get("MOSAIC_MAX_TILES", "36"))
+MOSAIC_DEFAULT_FPS = float(os.environ.get("MOSAIC_DEFAULT_FPS", "5"))
+MOSAIC_MAX_FPS = float(os.environ.get("MOSAIC_MAX_FPS", "15"))
+MOSAIC_JPEG_QUALITY = int(os.environ.get("MOSAIC_JPEG_QUALITY", "80"))
+
 # Dahua MJPEG HTTP stream URL (supported by most Dahua cameras)
 # Example: http://<CAMERA_IP>/cgi-bin/mjpg/video.cgi?channel=1&subtype=0
 # subtype=0: main stream, subtype=1: sub stream
-CAMERA_MJPEG_URL = (
-    f"http://{CAMERA_IP}:{CAMERA_HTTP_PORT}/cgi-bin/mjpg/video.cgi"
-    f"?channel={CAMERA_CHANNEL}&subtype=1"
-)
+def camera_mjpeg_url():
+    return (
+        f"http://{CAMERA_IP}:{CAMERA_HTTP_PORT}/cgi-bin/mjpg/video.cgi"
+        f"?channel={CAMERA_CHANNEL}&subtype=1"
+    )
+
+# Frames are re-framed with our own boundary so a reconnect never corrupts a viewer's stream
+BOUNDARY = "--myboundary"
+VIEWER_KEEPALIVE = 1.0
+
+# --- Metrics ---
+
+METRIC_HELP = {
+    "driver_http_request_duration_seconds": "Time from request arrival until the response headers were ready.",
+    "driver_upstream_request_duration_seconds": "Camera MJPEG connect latency to response headers, by outcome.",
+    "driver_frames_total": "Frames by stage: captured from the camera, composited into a mosaic grid, sent to a viewer, or dropped for a viewer that fell behind.",
+    "driver_client_bytes_sent_total": "Response body bytes sent, by client address.",
+    "driver_viewers": "Clients attached to the shared capture.",
+    "driver_mosaic_compose_duration_seconds": "Time to update the changed tiles of a mosaic grid and encode it.",
+    "driver_mosaic_viewers": "Clients attached to /mosaic grids.",
+}
+
+metrics = Metrics(METRICS_MAX_CLIENTS, METRIC_HELP, enabled=METRICS_ENABLED)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    started = g.pop("request_started", None)
+    if started is None or not METRICS_ENABLED:
+        return response
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.observe("driver_http_request_duration_seconds", time.perf_counter() - started,
+                    route=route, method=request.method, status=str(response.status_code))
+    client = metrics.client_label(request.remote_addr or "unknown")
+    if response.is_streamed:
+        response.response = metrics.count_bytes(response.response, client)
+    else:
+        metrics.inc("driver_client_bytes_sent_total", response.content_length or 0, client=client)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics_view():
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+# --- Debug Endpoints ---
+
+profiler = SamplingProfiler(DEBUG_PROFILE_HZ)
+stack_watch = StackWatch(DEBUG_STUCK_SECONDS)
+
+def debug_watchdog():
+    while True:
+        stack_watch.update(poll_threads())
+        time.sleep(1.0)
+
+if DEBUG_ENDPOINTS:
+    threading.Thread(target=debug_watchdog, name="debug-watchdog", daemon=True).start()
+
+@app.route("/debug/profile", methods=["GET"])
+def debug_profile():
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return jsonify({"error": denied[1]}), denied[0]
+    try:
+        seconds = profile_seconds(request.args.get("seconds"), DEBUG_PROFILE_MAX_SECONDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    stacks = profiler.profile(seconds, cpu_only=request.args.get("mode", "cpu") != "wall")
+    if stacks is None:
+        return jsonify({"error": "A profile is already running"}), 409
+    return Response(stacks, content_type="text/plain; charset=utf-8",
+                    headers={"Content-Disposition": "attachment; filename=profile.collapsed"})
+
+@app.route("/debug/tasks", methods=["GET"])
+def debug_tasks():
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return jsonify({"error": denied[1]}), denied[0]
+    return jsonify({"stuck_after_seconds": DEBUG_STUCK_SECONDS, "threads": stack_watch.snapshot()})
+
+# --- Shared Capture ---
+class CaptureSupervisor:
+    """
+    Reads the camera's MJPEG stream once for all viewers and reconnects transparently.
+    """
+    def __init__(self, url):
+        self.url = url
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.frame = None
+        self.seq = 0
+        self.viewers = 0
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.state = "idle"
+        self.connected_once = False
+        self.stats = RecoveryStats()
+        self.response = None
+
+    def attach(self):
+        with self.lock:
+            self.viewers += 1
+            self.stop_event.clear()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def detach(self):
+        with self.lock:
+            self.viewers = max(0, self.viewers - 1)
+            if self.viewers == 0:
+                self.stop_event.set()
+
+    def reconnect(self, url):
+        """
+        Moves the capture to url. The running read is cut off at once, through the
+        same stop_event a last detach uses, and viewers keep the last frame meanwhile.
+        """
+        with self.lock:
+            self.url = url
+            self.connected_once = False  # A new camera, not a recovery
+            self.stop_event.set()
+            response = self.response
+        if response is not None:
+            interrupt_response(response)
+
+    def wait_frame(self, last_seq, timeout):
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != last_seq, timeout)
+            return self.seq, self.frame
+
+    def _publish(self, jpeg):
+        with self.cond:
+            self.frame = jpeg
+            self.seq += 1
+            self.cond.notify_all()
+        self.stats.mark_up()
+        metrics.inc("driver_frames_total", stage="captured")
+
+    def _should_exit(self):
+        with self.lock:
+            if self.viewers == 0:
+                self.thread = None
+                self.state = "idle"
+                self.connected_once = False
+                return True
+            self.stop_event.clear()
+            return False
+
+    def _read_stream(self, backoff):
+        started = time.perf_counter()
+        try:
+            r = requests.get(
+                self.url,
+                auth=(CAMERA_USER, CAMERA_PASS),
+                stream=True,
+                timeout=(10, STALL_TIMEOUT),
+                headers={"User-Agent": "Mozilla/5.0"},
+            )
+        except requests.RequestException:
+            metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                            upstream="camera", outcome="error")
+            raise
+        metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                        upstream="camera", outcome="ok" if r.status_code < 500 else "5xx")
+        with self.lock:
+            self.response = r
+            stale = self.stop_event.is_set()
+        if stale:
+            interrupt_response(r)  # reconnect() ran while this request was being opened
+        try:
+            self._read_frames(r, backoff)
+        finally:
+            with self.lock:
+                self.response = None
+
+    def _read_frames(self, r, backoff):
+        with r:
+            r.raise_for_status()
+            if self.connected_once:
+                self.stats.record_reconnect()
+            self.connected_once = True
+            self.state = "streaming"
+            buf = bytearray()
+            last_frame_at = time.monotonic()
+            for chunk in r.iter_content(chunk_size=4096):
+                if self.stop_event.is_set():
+                    return
+                if chunk:
+                    buf.extend(chunk)
+                    for jpeg in extract_jpegs(buf):
+                        self._publish(jpeg)
+                        last_frame_at = time.monotonic()
+                        backoff.reset()
+                # Watchdog: bytes may still trickle in while no frame completes
+                if time.monotonic() - last_frame_at > STALL_TIMEOUT:
+                    self.stats.record_stall()
+                    return
+
+    def _run(self):
+        backoff = Backoff(RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY)
+        while True:
+            if self.stop_event.is_set() and self._should_exit():
+                return
+            self.state = "reconnecting" if self.connected_once else "connecting"
+            try:
+                self._read_stream(backoff)
+            except Exception:
+                if not self.stop_event.is_set():
+                    self.stats.record_open_failure()
+            if self.stop_event.is_set():
+                backoff.reset()
+                continue
+            self.stats.mark_down()
+            self.state = "reconnecting"
+            self.stop_event.wait(backoff.next_delay())
+
+    def status(self):
+        with self.lock:
+            status = {"state": self.state, "viewers": self.viewers}
+        status.update(self.stats.snapshot())
+        return status
+
+capture = CaptureSupervisor(camera_mjpeg_url())
+metrics.gauge("driver_viewers", lambda: capture.viewers)
+
+# --- Config Reload ---
+RELOADABLE_SETTINGS = {
+    "CAMERA_IP": str, "CAMERA_HTTP_PORT": str, "CAMERA_USER": str, "CAMERA_PASS": str, "CAMERA_CHANNEL": str,
+}
+STARTUP_SETTINGS = {name: globals()[name] for name in RELOADABLE_SETTINGS}
+
+def on_config_change(changed, values):
+    if apply_settings(values, RELOADABLE_SETTINGS, STARTUP_SETTINGS, globals()):
+        capture.reconnect(camera_mjpeg_url())
+
+config_watcher = ConfigWatcher(CONFIG_MOUNT_PATH, on_config_change, CONFIG_POLL_INTERVAL)
+if CONFIG_RELOAD:
+    config_watcher.load()
+    config_watcher.start()
+
+@app.route("/config", methods=["GET"])
+def config_status():
+    settings = {name: globals()[name] for name in RELOADABLE_SETTINGS}
+    settings["CAMERA_PASS"] = "***"
+    return jsonify({"reload": config_watcher.status() if CONFIG_RELOAD else None, "settings": settings})
 
 def mjpeg_proxy():
     """
-    Generator that proxies MJPEG stream from camera to HTTP client.
+    Generator that serves the shared camera capture to one HTTP client as MJPEG.
+    The connection stays open across upstream reconnects; the last frame is
+    repeated as a keepalive while the camera is unavailable.
     """
-    with requests.get(
-        CAMERA_MJPEG_URL,
-        auth=(CAMERA_USER, CAMERA_PASS),
-        stream=True,
-        timeout=10,
-        headers={"User-Agent": "Mozilla/5.0"},
-    ) as r:
-        r.raise_for_status()
-        boundary = None
-        content_type = r.headers.get("Content-Type", "")
-        if "boundary=" in content_type:
-            boundary = content_type.split("boundary=")[-1]
-        else:
-            boundary = "--myboundary"
-        boundary = boundary.strip()
-        yield f"--{boundary}\r\n".encode()
-
-        for chunk in r.iter_content(chunk_size=4096):
-            if chunk:
-                yield chunk
+    capture.attach()
+    try:
+        seq = 0
+        while True:
+            last_seq = seq
+            seq, frame = capture.wait_frame(seq, VIEWER_KEEPALIVE)
+            if frame is None:
+                continue
+            if last_seq and seq - last_seq > 1:
+                # Frames published while this viewer was still writing the previous one
+                metrics.inc("driver_frames_total", seq - last_seq - 1, stage="dropped")
+            metrics.inc("driver_frames_total", stage="sent")
+            yield (
+                f"--{BOUNDARY}\r\n"
+                "Content-Type: image/jpeg\r\n"
+                f"Content-Length: {len(frame)}\r\n\r\n"
+            ).encode() + frame + b"\r\n"
+    finally:
+        capture.detach()
 
 @app.route("/stream", methods=["GET"])
 def stream():
@@ -54,13 +347,12 @@ def stream():
     Access a live video stream from the IP camera.
     Returns MJPEG stream for browser consumption.
     """
-    # We'll forward all headers and content-type as received from camera
     def generate():
         try:
             for chunk in mjpeg_proxy():
                 yield chunk
         except Exception:
-            # Camera connection lost or client disconnected
+            # Client disconnected
             pass
 
     # A proper 'multipart/x-mixed-replace' MJPEG stream
@@ -71,10 +363,78 @@ def stream():
     }
     resp = Response(
         stream_with_context(generate()),
-        mimetype="multipart/x-mixed-replace; boundary=--myboundary",
+        mimetype=f"multipart/x-mixed-replace; boundary={BOUNDARY}",
         headers=resp_headers
     )
     return resp
 
+@app.route("/stream/stats", methods=["GET"])
+def stream_stats():
+    """
+    Capture state, reconnect counts and time-to-recover for the camera.
+    """
+    return jsonify(capture.status())
+
+# --- Mosaic ---
+class LocalCamera:
+    """This driver's shared capture as a mosaic source; it runs while a mosaic shows it."""
+    def attach(self):
+        capture.attach()
+
+    def detach(self):
+        capture.detach()
+
+    def latest(self):
+        return capture.seq, capture.frame
+
+mosaic_settings = MosaicSettings(MOSAIC_WIDTH, MOSAIC_HEIGHT, MOSAIC_MAX_TILES, MOSAIC_DEFAULT_FPS, MOSAIC_MAX_FPS,
+                                 MOSAIC_JPEG_QUALITY)
+mosaic_hub = MosaicHub(
+    dict({name: RemoteCamera(url, STALL_TIMEOUT, RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY)
+          for name, url in parse_cameras(MOSAIC_CAMERAS).items()}, local=LocalCamera()),
+    mosaic_settings, metrics)
+metrics.gauge("driver_mosaic_viewers", mosaic_hub.viewers)
+
+@app.route("/mosaic", methods=["GET"])
+def mosaic_stream():
+    """
+    Several cameras composited into one MJPEG grid:
+    /mosaic?cameras=local,dock&layout=2x1&fps=5
+    """
+    try:
+        grid = mosaic_hub.parse(request.args.get("cameras"), request.args.get("layout"), request.args.get("fps"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not opencv_available():
+        return jsonify({"error": "/mosaic needs OpenCV and numpy"}), 503
+
+    def generate():
+        mosaic = mosaic_hub.open(*grid)
+        try:
+            seq = 0
+            while True:
+                # A grid nobody changed is sent again every VIEWER_KEEPALIVE so dead wall clients are noticed
+                seq, frame = mosaic.wait_frame(seq, VIEWER_KEEPALIVE)
+                if frame is None:
+                    continue
+                metrics.inc("driver_frames_total", stage="sent")
+                yield (
+                    f"--{BOUNDARY}\r\n"
+                    "Content-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(frame)}\r\n\r\n"
+                ).encode() + frame + b"\r\n"
+        finally:
+            mosaic_hub.close(mosaic)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=f"multipart/x-mixed-replace; boundary={BOUNDARY}",
+        headers={"Cache-Control": "no-cache, private", "Pragma": "no-cache", "Connection": "close"},
+    )
+
+@app.route("/mosaic/stats", methods=["GET"])
+def mosaic_stats():
+    return jsonify(mosaic_hub.status())
+
 if __name__ == "__main__":
-    app.run(host=SERVER_HOST, port=SERVER_PORT, threaded=True)
\ No newline at end of file
+    app.run(host=SERVER_HOST, port=SERVER_PORT, threaded=True)
@@ -0,0 +1,538 @@
+import os
+import sys
+import time
+import asyncio
+import contextlib
+from datetime import datetime
+
+import yaml
+from aiohttp import web
+from asyncua import Client, ua
+
+# Helpers shared by every driver live in iot_driver_copilot/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.jsoncodec import json_dumps
+from common.metrics import METRICS_CONTENT_TYPE, Metrics
+from common.debug import SamplingProfiler, StackWatch, debug_denied, poll_tasks, profile_seconds
+from common.config import ConfigWatcher, apply_settings
+
+# Environment variables
+CONFIG_MOUNT_PATH = os.environ.get("CONFIG_MOUNT_PATH", "/etc/edgedevice/config")
+OPCUA_ENDPOINT = os.environ.get("OPCUA_ENDPOINT", "opc.tcp://localhost:4840")
+HTTP_SERVER_HOST = os.environ.get("HTTP_SERVER_HOST", "0.0.0.0")
+HTTP_SERVER_PORT = int(os.environ.get("HTTP_SERVER_PORT", "8080"))
+
+# OPC UA session: per-request timeout, pause after a failed connect, and the most nodes sent in one Read
+OPCUA_TIMEOUT = float(os.environ.get("OPCUA_TIMEOUT", "5"))
+OPCUA_RECONNECT_DELAY = float(os.environ.get("OPCUA_RECONNECT_DELAY", "2"))
+OPCUA_MAX_NODES_PER_READ = int(os.environ.get("OPCUA_MAX_NODES_PER_READ", "500"))
+
+# The mounted ConfigMap is watched and instructions, telemetries or an OPCUA_ENDPOINT key are
+# applied while running; CONFIG_POLL_INTERVAL is the rescan period behind inotify
+CONFIG_RELOAD = os.environ.get("CONFIG_RELOAD", "true").lower() == "true"
+CONFIG_POLL_INTERVAL = float(os.environ.get("CONFIG_POLL_INTERVAL", "10"))
+
+# Interval for instructions polled without a telemetry entry, when telemetrySettings does not set one
+TELEMETRY_DEFAULT_INTERVAL_MS = int(os.environ.get("TELEMETRY_DEFAULT_INTERVAL_MS", "1000"))
+
+# Prometheus /metrics; per-client byte counters stop adding new client labels past METRICS_MAX_CLIENTS
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MAX_CLIENTS = int(os.environ.get("METRICS_MAX_CLIENTS", "100"))
+
+# /debug/profile and /debug/tasks are compiled in but answer 404 unless DEBUG_ENDPOINTS=true;
+# with DEBUG_TOKEN set, callers must also send it in the X-Debug-Token header
+DEBUG_ENDPOINTS = os.environ.get("DEBUG_ENDPOINTS", "false").lower() == "true"
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+DEBUG_PROFILE_MAX_SECONDS = float(os.environ.get("DEBUG_PROFILE_MAX_SECONDS", "60"))
+DEBUG_PROFILE_HZ = float(os.environ.get("DEBUG_PROFILE_HZ", "100"))
+DEBUG_STUCK_SECONDS = float(os.environ.get("DEBUG_STUCK_SECONDS", "10"))
+
+# --- JSON Codec ---
+
+def json_response(data, status=200):
+    return web.Response(status=status, body=json_dumps(data), content_type="application/json")
+
+# --- Metrics ---
+
+METRIC_HELP = {
+    "driver_http_request_duration_seconds": "Time from request arrival until the response headers were sent.",
+    "driver_upstream_request_duration_seconds": "OPC UA session connect and Read service latency, by outcome.",
+    "driver_telemetry_polls_total": "Scheduled telemetry reads, by polling interval and outcome.",
+    "driver_telemetry_ticks_skipped_total": "Polling ticks skipped because the previous read overran its interval.",
+    "driver_client_bytes_sent_total": "Response body bytes sent, by client address.",
+    "driver_telemetries": "Telemetries on the polling schedule.",
+}
+
+metrics = Metrics(METRICS_MAX_CLIENTS, METRIC_HELP, enabled=METRICS_ENABLED)
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    # Latency is taken when the response is prepared (see record_latency)
+    request["metrics_started"] = time.perf_counter()
+    response = await handler(request)
+    if METRICS_ENABLED:
+        metrics.inc("driver_client_bytes_sent_total", response.content_length or 0,
+                    client=metrics.client_label(request.remote or "unknown"))
+    return response
+
+async def record_latency(request, response):
+    # on_response_prepare: fires as the headers go out
+    started = request.get("metrics_started")
+    if started is None or not METRICS_ENABLED:
+        return
+    resource = request.match_info.route.resource
+    metrics.observe("driver_http_request_duration_seconds", time.perf_counter() - started,
+                    route=resource.canonical if resource is not None else "unmatched",
+                    method=request.method, status=str(response.status))
+
+async def metrics_view(request):
+    if not METRICS_ENABLED:
+        return json_response({"error": "Metrics are disabled"}, status=404)
+    return web.Response(body=metrics.render().encode(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+# --- Debug Endpoints ---
+
+profiler = SamplingProfiler(DEBUG_PROFILE_HZ)
+stack_watch = StackWatch(DEBUG_STUCK_SECONDS)
+
+# Event loop lag seen by the watchdog: how late its one-second sleep woke up
+loop_lag = {"last_seconds": 0.0, "max_seconds": 0.0}
+
+async def debug_watchdog():
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(1.0)
+        lag = time.monotonic() - started - 1.0
+        loop_lag["last_seconds"] = round(lag, 4)
+        loop_lag["max_seconds"] = round(max(loop_lag["max_seconds"], lag), 4)
+        stack_watch.update(poll_tasks())
+
+async def debug_watchdog_ctx(app):
+    task = asyncio.create_task(debug_watchdog()) if DEBUG_ENDPOINTS else None
+    yield
+    if task is not None:
+        task.cancel()
+
+async def debug_profile(request):
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return json_response({"error": denied[1]}, status=denied[0])
+    try:
+        seconds = profile_seconds(request.query.get("seconds"), DEBUG_PROFILE_MAX_SECONDS)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    # Sampled from an executor thread so the event loop keeps serving (and shows up in the profile)
+    stacks = await asyncio.get_running_loop().run_in_executor(
+        None, profiler.profile, seconds, request.query.get("mode", "cpu") != "wall")
+    if stacks is None:
+        return json_response({"error": "A profile is already running"}, status=409)
+    return web.Response(text=stacks, content_type="text/plain",
+                        headers={"Content-Disposition": "attachment; filename=profile.collapsed"})
+
+async def debug_tasks(request):
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return json_response({"error": denied[1]}, status=denied[0])
+    return json_response({"stuck_after_seconds": DEBUG_STUCK_SECONDS, "loop_lag": loop_lag, "tasks": stack_watch.snapshot()})
+
+# --- Device Configuration ---
+
+def read_config_key(name):
+    """Parsed YAML of one ConfigMap key mounted as a file under CONFIG_MOUNT_PATH; None if missing or empty."""
+    try:
+        with open(os.path.join(CONFIG_MOUNT_PATH, name)) as f:
+            return yaml.safe_load(f)
+    except FileNotFoundError:
+        return None
+
+def load_device_config():
+    """
+    Instructions and the telemetries to poll, from the deviceshifu ConfigMap keys
+    `instructions` and `telemetries`. Each telemetry names an instruction and polls
+    its OPCUANodeID every intervalMs. When no telemetries are declared, every
+    instruction is polled at the default interval. Raises ValueError on a config
+    that cannot be polled, so a bad mount fails at startup and not mid-stream.
+    """
+    instructions = {}
+    declared = (read_config_key("instructions") or {}).get("instructions") or {}
+    for name, spec in declared.items():
+        node = ((spec or {}).get("protocolPropertyList") or {}).get("OPCUANodeID")
+        if not node:
+            raise ValueError(f"instruction {name!r} has no protocolPropertyList.OPCUANodeID")
+        try:
+            ua.NodeId.from_string(node)
+        except Exception as e:
+            raise ValueError(f"instruction {name!r} has an invalid OPCUANodeID {node!r}: {e}") from e
+        instructions[name] = node
+
+    data = read_config_key("telemetries") or {}
+    # The workspace manifests nest the key's content under its own name once more
+    if set(data) == {"telemetries"} and isinstance(data["telemetries"], dict) \
+            and ({"telemetries", "telemetrySettings"} & set(data["telemetries"])):
+        data = data["telemetries"]
+    settings = data.get("telemetrySettings") or {}
+    default_interval = int(settings.get("telemetryUpdateIntervalInMilliseconds") or TELEMETRY_DEFAULT_INTERVAL_MS)
+
+    telemetries = []
+    for name, spec in (data.get("telemetries") or {}).items():
+        properties = (spec or {}).get("properties") or {}
+        instruction = properties.get("instruction", name)
+        if instruction not in instructions:
+            raise ValueError(f"telemetry {name!r} polls unknown instruction {instruction!r}")
+        telemetries.append({
+            "name": name,
+            "instruction": instruction,
+            "node": instructions[instruction],
+            "interval_ms": int(properties.get("intervalMs") or default_interval),
+            "initial_delay_ms": int(properties.get("initialDelayMs") or 0),
+        })
+    if not telemetries:
+        telemetries = [
+            {"name": name, "instruction": name, "node": node, "interval_ms": default_interval, "initial_delay_ms": 0}
+            for name, node in instructions.items()
+        ]
+    for telemetry in telemetries:
+        if telemetry["interval_ms"] <= 0:
+            raise ValueError(f"telemetry {telemetry['name']!r} needs a positive intervalMs")
+    return {"instructions": instructions, "telemetries": telemetries}
+
+# --- OPC UA Session ---
+
+class OpcuaDevice:
+    """
+    The one OPC UA session the driver keeps to the device. read() sends every
+    requested node in a single Read service call, split only at
+    OPCUA_MAX_NODES_PER_READ. A transport failure drops the session and the next
+    read reconnects, no sooner than OPCUA_RECONNECT_DELAY after the failure.
+    """
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.client = None
+        self.lock = asyncio.Lock()
+        self.retry_at = 0.0
+        self.read_calls = 0
+        self.nodes_read = 0
+
+    async def _session(self):
+        async with self.lock:
+            if self.client is not None:
+                return self.client
+            if time.monotonic() < self.retry_at:
+                raise ConnectionError(f"OPC UA server {self.endpoint} is unreachable, retrying shortly")
+            client = Client(url=self.endpoint, timeout=OPCUA_TIMEOUT)
+            started = time.perf_counter()
+            try:
+                await client.connect()
+            except Exception:
+                self.retry_at = time.monotonic() + OPCUA_RECONNECT_DELAY
+                metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                                upstream="opcua-connect", outcome="error")
+                raise
+            metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                            upstream="opcua-connect", outcome="ok")
+            self.client = client
+            return client
+
+    async def _drop(self, client):
+        if self.client is client:
+            self.client = None
+            self.retry_at = time.monotonic() + OPCUA_RECONNECT_DELAY
+        with contextlib.suppress(Exception):
+            await client.disconnect()
+
+    async def read(self, nodes):
+        """DataValues for the node id strings, in order."""
+        client = await self._session()
+        values = []
+        for start in range(0, len(nodes), OPCUA_MAX_NODES_PER_READ):
+            chunk = [client.get_node(node) for node in nodes[start:start + OPCUA_MAX_NODES_PER_READ]]
+            started = time.perf_counter()
+            try:
+                values.extend(await asyncio.wait_for(client.read_attributes(chunk), OPCUA_TIMEOUT))
+            except ua.UaStatusCodeError:
+                # The server answered but refused the Read; the session itself is fine
+                metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                                upstream="opcua", outcome="5xx")
+                raise
+            except Exception:
+                metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                                upstream="opcua", outcome="error")
+                await self._drop(client)
+                raise
+            metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                            upstream="opcua", outcome="ok")
+            self.read_calls += 1
+            self.nodes_read += len(chunk)
+        return values
+
+    async def close(self):
+        if self.client is not None:
+            await self._drop(self.client)
+
+    async def reset(self, endpoint):
+        """Points the session at another endpoint; the next read connects there without the retry pause."""
+        client, self.client = self.client, None
+        self.endpoint = endpoint
+        self.retry_at = 0.0
+        if client is not None:
+            with contextlib.suppress(Exception):
+                await client.disconnect()
+
+# --- Telemetry Store ---
+
+def plain_value(value):
+    """An OPC UA variant value as something JSON can carry."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [plain_value(item) for item in value]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return str(value)
+
+class TelemetryStore:
+    """
+    Latest polled value of every telemetry. A failed or bad-status poll records
+    the error but keeps the last good value, so readers can judge it by its age.
+    Only the event loop touches it, so there is no lock.
+    """
+    def __init__(self):
+        self.entries = {}
+
+    def sync(self, telemetries):
+        """Follows a new telemetry list; entries whose node and interval are unchanged keep their values."""
+        entries = {}
+        for t in telemetries:
+            entry = self.entries.get(t["name"])
+            if entry is None or (entry["instruction"], entry["node"], entry["interval_ms"]) != \
+                    (t["instruction"], t["node"], t["interval_ms"]):
+                entry = {"instruction": t["instruction"], "node": t["node"], "interval_ms": t["interval_ms"],
+                         "value": None, "status": None, "source_timestamp": None,
+                         "updated_at": None, "polled_at": None, "error": None}
+            entries[t["name"]] = entry
+        self.entries = entries
+
+    def update(self, name, data_value, polled_at):
+        entry = self.entries[name]
+        entry["polled_at"] = polled_at
+        status = data_value.StatusCode
+        entry["status"] = status.name if status is not None else "Good"
+        if status is not None and not status.is_good():
+            entry["error"] = entry["status"]
+            return
+        entry["value"] = plain_value(data_value.Value.Value if data_value.Value is not None else None)
+        entry["source_timestamp"] = plain_value(data_value.SourceTimestamp)
+        entry["updated_at"] = polled_at
+        entry["error"] = None
+
+    def fail(self, name, error, polled_at):
+        entry = self.entries[name]
+        entry["polled_at"] = polled_at
+        entry["error"] = error
+
+    def view(self, name):
+        entry = dict(self.entries[name])
+        entry["age_seconds"] = round(time.time() - entry["updated_at"], 3) if entry["updated_at"] else None
+        return entry
+
+    def by_instruction(self, instruction):
+        """The most frequently polled telemetry of an instruction, or None if it is not polled."""
+        names = [name for name, entry in self.entries.items() if entry["instruction"] == instruction]
+        return min(names, key=lambda name: self.entries[name]["interval_ms"]) if names else None
+
+# --- Telemetry Scheduler ---
+
+class TelemetryScheduler:
+    """
+    Polls the device on the telemetry schedule, independent of HTTP traffic: one
+    task per distinct interval, and each tick reads every node of that interval
+    with one device round trip. Device load therefore follows the number of
+    telemetries and their intervals, however many clients read the store.
+    A tick that overruns its interval skips the missed ticks rather than bursting.
+    """
+    def __init__(self, device, store):
+        self.device = device
+        self.store = store
+        self.groups = {}
+        self.tasks = {}
+
+    def apply(self, telemetries):
+        """
+        Moves the schedule to telemetries. Only interval groups whose members changed
+        are restarted; the others keep polling on their running schedule. Returns the
+        intervals that were started, restarted or stopped.
+        """
+        groups = {}
+        for telemetry in telemetries:
+            groups.setdefault(telemetry["interval_ms"], []).append(telemetry)
+        changed = []
+        for interval_ms in sorted(set(self.groups) | set(groups)):
+            members = groups.get(interval_ms)
+            if members == self.groups.get(interval_ms):
+                continue
+            task = self.tasks.pop(interval_ms, None)
+            if task is not None:
+                task.cancel()
+            if members:
+                self.tasks[interval_ms] = asyncio.create_task(
+                    self._poll(interval_ms, members), name=f"telemetry-{interval_ms}ms")
+            changed.append(interval_ms)
+        self.groups = groups
+        self.store.sync(telemetries)
+        return changed
+
+    async def stop(self):
+        tasks = list(self.tasks.values())
+        self.tasks = {}
+        self.groups = {}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _poll(self, interval_ms, members):
+        loop = asyncio.get_running_loop()
+        interval = interval_ms / 1000.0
+        label = str(interval_ms)
+        # Several telemetries may poll the same node; it is read once per tick
+        nodes = list(dict.fromkeys(t["node"] for t in members))
+        # A group shares one schedule, so it starts after the shortest initialDelayMs among its members
+        await asyncio.sleep(min(t["initial_delay_ms"] for t in members) / 1000.0)
+        next_at = loop.time()
+        while True:
+            polled_at = time.time()
+            try:
+                values = await self.device.read(nodes)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                for telemetry in members:
+                    self.store.fail(telemetry["name"], error, polled_at)
+                metrics.inc("driver_telemetry_polls_total", interval_ms=label, outcome="error")
+            else:
+                by_node = dict(zip(nodes, values))
+                for telemetry in members:
+                    self.store.update(telemetry["name"], by_node[telemetry["node"]], polled_at)
+                metrics.inc("driver_telemetry_polls_total", interval_ms=label, outcome="ok")
+            next_at += interval
+            late = loop.time() - next_at
+            if late > 0:
+                skipped = int(late // interval) + 1
+                metrics.inc("driver_telemetry_ticks_skipped_total", skipped, interval_ms=label)
+                next_at += skipped * interval
+            await asyncio.sleep(next_at - loop.time())
+
+device = OpcuaDevice(OPCUA_ENDPOINT)
+store = TelemetryStore()
+scheduler = TelemetryScheduler(device, store)
+# Instructions and telemetries currently applied; replaced as a whole on reload
+device_config = {"instructions": {}, "telemetries": []}
+
+# --- Config Reload ---
+
+RELOADABLE_SETTINGS = {"OPCUA_ENDPOINT": str}
+STARTUP_SETTINGS = {name: globals()[name] for name in RELOADABLE_SETTINGS}
+
+# The ConfigMap keys load_device_config() reads
+DEVICE_CONFIG_KEYS = {"instructions", "telemetries"}
+
+# The app's event loop, set once the schedule is running; the watcher thread hands changes to it
+config_loop = None
+rescheduled_intervals_ms = []
+
+async def reconfigure(changed, values):
+    global device_config, rescheduled_intervals_ms
+    # Everything is parsed before anything is applied, so a bad edit leaves the running schedule alone
+    config = load_device_config() if DEVICE_CONFIG_KEYS & set(changed) else None
+    if apply_settings(values, RELOADABLE_SETTINGS, STARTUP_SETTINGS, globals()):
+        await device.reset(OPCUA_ENDPOINT)
+    if config is not None:
+        device_config = config
+        rescheduled_intervals_ms = scheduler.apply(config["telemetries"])
+
+def on_config_change(changed, values):
+    if config_loop is None:
+        apply_settings(values, RELOADABLE_SETTINGS, STARTUP_SETTINGS, globals())  # Startup: the device config itself is loaded by telemetry_ctx
+    else:
+        asyncio.run_coroutine_threadsafe(reconfigure(changed, values), config_loop).result(timeout=30)
+
+config_watcher = ConfigWatcher(CONFIG_MOUNT_PATH, on_config_change, CONFIG_POLL_INTERVAL)
+
+async def config_status(request):
+    return json_response({"reload": config_watcher.status() if CONFIG_RELOAD else None,
+                          "endpoint": OPCUA_ENDPOINT,
+                          "intervals_ms": sorted(scheduler.tasks),
+                          "rescheduled_intervals_ms": rescheduled_intervals_ms})
+
+# --- HTTP Endpoints ---
+
+async def list_telemetry(request):
+    return json_response({"endpoint": OPCUA_ENDPOINT,
+                          "telemetries": {name: store.view(name) for name in store.entries}})
+
+async def get_telemetry(request):
+    name = request.match_info["name"]
+    if name not in store.entries:
+        return json_response({"error": f"Unknown telemetry {name!r}"}, status=404)
+    return json_response(store.view(name))
+
+async def get_instruction(request):
+    # deviceshifu-style /<instruction>: served from the store when polled, else one live read
+    instruction = request.match_info["instruction"]
+    name = store.by_instruction(instruction)
+    if name is not None:
+        return json_response(store.view(name))
+    node = device_config["instructions"].get(instruction)
+    if node is None:
+        return json_response({"error": f"Unknown instruction {instruction!r}"}, status=404)
+    try:
+        data_value = (await device.read([node]))[0]
+    except Exception as e:
+        return json_response({"error": f"OPC UA read failed: {type(e).__name__}: {e}"}, status=502)
+    status = data_value.StatusCode
+    if status is not None and not status.is_good():
+        return json_response({"instruction": instruction, "node": node, "status": status.name,
+                              "error": status.name}, status=502)
+    return json_response({"instruction": instruction, "node": node, "status": "Good",
+                          "value": plain_value(data_value.Value.Value if data_value.Value is not None else None),
+                          "source_timestamp": plain_value(data_value.SourceTimestamp)})
+
+async def device_stats(request):
+    return json_response({"read_calls": device.read_calls, "nodes_read": device.nodes_read,
+                          "connected": device.client is not None,
+                          "intervals_ms": sorted(scheduler.tasks)})
+
+# --- App Setup ---
+
+async def telemetry_ctx(app):
+    global config_loop, device_config
+    if CONFIG_RELOAD:
+        config_watcher.load()
+        device.endpoint = OPCUA_ENDPOINT
+    device_config = load_device_config()
+    scheduler.apply(device_config["telemetries"])
+    if CONFIG_RELOAD:
+        config_loop = asyncio.get_running_loop()
+        config_watcher.start()
+    yield
+    await scheduler.stop()
+    await device.close()
+
+metrics.gauge("driver_telemetries", lambda: len(store.entries))
+
+app = web.Application(middlewares=[metrics_middleware])
+app.on_response_prepare.append(record_latency)
+app.router.add_get('/telemetry', list_telemetry)
+app.router.add_get('/telemetry/{name}', get_telemetry)
+app.router.add_get('/device/stats', device_stats)
+app.router.add_get('/config', config_status)
+app.router.add_get('/metrics', metrics_view)
+app.router.add_get('/debug/profile', debug_profile)
+app.router.add_get('/debug/tasks', debug_tasks)
+# Registered last so the fixed routes above take precedence
+app.router.add_get('/{instruction}', get_instruction)
+app.cleanup_ctx.append(telemetry_ctx)
+app.cleanup_ctx.append(debug_watchdog_ctx)
+
+if __name__ == '__main__':
+    web.run_app(app, host=HTTP_SERVER_HOST, port=HTTP_SERVER_PORT)
@@ -1,10 +1,21 @@
 import os
+import sys
+import importlib
+import time
 import asyncio
 import base64
 import json
-import aiohttp
-from aiohttp import web
-import websockets
+import socket
+import threading
+
+# Helpers shared by every driver live in iot_driver_copilot/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.jsoncodec import json_dumps, json_loads
+from common.metrics import METRICS_CONTENT_TYPE, Metrics
+from common.debug import SamplingProfiler, StackWatch, debug_denied, poll_tasks, profile_seconds
+from common.config import ConfigWatcher, apply_settings
+from common.motion import MotionGate, jpeg_thumbnail
+from common.mosaic import MosaicSettings, extract_jpegs, parse_cameras
 
 # Environment variables
 ROSBRIDGE_WS_URL = os.getenv("ROSBRIDGE_WS_URL", "ws://localhost:9090")
@@ -12,15 +23,229 @@ ROSBRIDGE_CAMERA_TOPIC = os.getenv("ROSBRIDGE_CAMERA_TOPIC", "/camera/image/comp
 HTTP_SERVER_HOST = os.getenv("HTTP_SERVER_HOST", "0.0.0.0")
 HTTP_SERVER_PORT = int(os.getenv("HTTP_SERVER_PORT", "8080"))
 
+# Keys of the mounted ConfigMap named ROSBRIDGE_WS_URL or ROSBRIDGE_CAMERA_TOPIC override those settings
+# and are applied to the running stream; CONFIG_POLL_INTERVAL is the rescan period behind inotify
+CONFIG_MOUNT_PATH = os.getenv("CONFIG_MOUNT_PATH", "/etc/edgedevice/config")
+CONFIG_RELOAD = os.getenv("CONFIG_RELOAD", "true").lower() == "true"
+CONFIG_POLL_INTERVAL = float(os.getenv("CONFIG_POLL_INTERVAL", "10"))
+
+# Motion gate for /cam: images whose 1/8-scale grayscale decode differs from both the previous image and the
+# last image sent in fewer than MOTION_THRESHOLD of its pixels (by more than MOTION_PIXEL_DELTA levels) are
+# held back, except one every MOTION_KEEPALIVE_SECONDS. Needs numpy and OpenCV; MOTION_THRESHOLD is also a
+# reloadable ConfigMap key
+MOTION_GATE = os.getenv("MOTION_GATE", "false").lower() == "true"
+MOTION_THRESHOLD = float(os.getenv("MOTION_THRESHOLD", "0.002"))
+MOTION_PIXEL_DELTA = int(os.getenv("MOTION_PIXEL_DELTA", "12"))
+MOTION_KEEPALIVE_SECONDS = float(os.getenv("MOTION_KEEPALIVE_SECONDS", "1"))
+
+# /mosaic composites several cameras into one MJPEG grid. "local" is this driver's camera topic; MOSAIC_CAMERAS
+# adds other MJPEG streams as name=url pairs, e.g. "lobby=http://10.0.0.7:8080/stream,gate=http://10.0.0.8:8080/stream".
+# Grids are MOSAIC_WIDTH x MOSAIC_HEIGHT with at most MOSAIC_MAX_TILES tiles and MOSAIC_MAX_FPS updates a second;
+# each is encoded once per tick for every client asking for the same cameras, layout and fps. Needs numpy and OpenCV
+MOSAIC_CAMERAS = os.getenv("MOSAIC_CAMERAS", "")
+MOSAIC_WIDTH = int(os.getenv("MOSAIC_WIDTH", "1280"))
+MOSAIC_HEIGHT = int(os.getenv("MOSAIC_HEIGHT", "720"))
+MOSAIC_MAX_TILES = int(os.getenv("MOSAIC_MAX_TILES", "36"))
+MOSAIC_DEFAULT_FPS = float(os.getenv("MOSAIC_DEFAULT_FPS", "5"))
+MOSAIC_MAX_FPS = float(os.getenv("MOSAIC_MAX_FPS", "15"))
+MOSAIC_JPEG_QUALITY = int(os.getenv("MOSAIC_JPEG_QUALITY", "80"))
+
+# How long the rosbridge listener waits for websockets to finish importing before retrying
+DEPENDENCY_TIMEOUT = float(os.getenv("DEPENDENCY_TIMEOUT", "30"))
+
+# Prometheus /metrics; per-client byte counters stop adding new client labels past METRICS_MAX_CLIENTS
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MAX_CLIENTS = int(os.getenv("METRICS_MAX_CLIENTS", "100"))
+
+# /debug/profile and /debug/tasks are compiled in but answer 404 unless DEBUG_ENDPOINTS=true;
+# with DEBUG_TOKEN set, callers must also send it in the X-Debug-Token header
+DEBUG_ENDPOINTS = os.getenv("DEBUG_ENDPOINTS", "false").lower() == "true"
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+DEBUG_PROFILE_MAX_SECONDS = float(os.getenv("DEBUG_PROFILE_MAX_SECONDS", "60"))
+DEBUG_PROFILE_HZ = float(os.getenv("DEBUG_PROFILE_HZ", "100"))
+DEBUG_STUCK_SECONDS = float(os.getenv("DEBUG_STUCK_SECONDS", "10"))
+
+# --- Listener ---
+
+# Importing aiohttp takes about 220 ms (its package __init__ loads the whole client along with
+# aiohttp.web), so when run as a script the listening socket is bound first: connections that
+# arrive meanwhile wait in the backlog instead of being refused, and are served once the loop runs
+listener = socket.create_server((HTTP_SERVER_HOST, HTTP_SERVER_PORT), backlog=1024) if __name__ == "__main__" else None
+
+import aiohttp
+from aiohttp import web
+
+# --- JSON Codec ---
+
+def json_response(data, status=200):
+    return web.Response(status=status, body=json_dumps(data), content_type="application/json")
+
+# --- Deferred Imports ---
+
+class DependencyLoader:
+    """
+    Imports heavy modules once, in a background thread, into this module's globals.
+    Loading starts with the app, off the event loop, so the listener comes up
+    without waiting for it and /readyz answers 503 until every module imported.
+    """
+    def __init__(self, names):
+        self.names = names
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.started = False
+        self.error = None
+        self.seconds = None
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._load, name="dependency-loader", daemon=True).start()
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            for name in self.names:
+                globals()[name] = importlib.import_module(name)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        self.seconds = round(time.perf_counter() - started, 3)
+        self.done.set()
+
+    def ready(self):
+        return self.done.is_set() and self.error is None
+
+    def wait(self, timeout=None):
+        """Starts loading if it has not begun and waits up to DEPENDENCY_TIMEOUT; True once ready."""
+        self.start()
+        self.done.wait(DEPENDENCY_TIMEOUT if timeout is None else timeout)
+        return self.ready()
+
+    def status(self):
+        if self.error:
+            state = "failed"
+        elif self.done.is_set():
+            state = "ready"
+        else:
+            state = "loading" if self.started else "pending"
+        return {"ready": self.ready(), "state": state, "modules": self.names,
+                "import_seconds": self.seconds, "error": self.error}
+
+# The rosbridge client library is only needed once a viewer opens /cam
+websockets = None
+dependencies = DependencyLoader(["websockets"])
+# The motion gate and /mosaic decode with OpenCV; until it has loaded, images pass ungated and /mosaic answers 503
+numpy = None
+cv2 = None
+motion_dependencies = DependencyLoader(["numpy", "cv2"])
+
+async def start_dependency_loader(app):
+    dependencies.start()
+    if MOTION_GATE:
+        motion_dependencies.start()
+
+async def readyz(request):
+    return json_response(dependencies.status(), status=200 if dependencies.ready() else 503)
+
+# --- Metrics ---
+
+METRIC_HELP = {
+    "driver_http_request_duration_seconds": "Time from request arrival until the response headers were sent.",
+    "driver_upstream_request_duration_seconds": "rosbridge websocket connect latency, by outcome.",
+    "driver_frames_total": "Frames by stage: captured from the camera topic, suppressed by the motion gate, composited into a mosaic grid, sent to a viewer, or dropped for a viewer that fell behind.",
+    "driver_client_bytes_sent_total": "Response body bytes sent, by client address.",
+    "driver_viewers": "Clients attached to the camera stream.",
+    "driver_motion_suppressed_ratio": "Share of captured images the motion gate held back from viewers, by stream.",
+    "driver_motion_score": "Share of pixels that changed in the latest image, against the previous image or else the last image sent, by stream.",
+    "driver_mosaic_compose_duration_seconds": "Time to update the changed tiles of a mosaic grid and encode it.",
+    "driver_mosaic_viewers": "Clients attached to /mosaic grids.",
+}
+
+metrics = Metrics(METRICS_MAX_CLIENTS, METRIC_HELP, enabled=METRICS_ENABLED)
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    # Latency is taken when the response is prepared (see record_latency); /cam counts its own bytes per frame
+    request["metrics_started"] = time.perf_counter()
+    response = await handler(request)
+    if METRICS_ENABLED and not response.prepared:
+        metrics.inc("driver_client_bytes_sent_total", response.content_length or 0,
+                    client=metrics.client_label(request.remote or "unknown"))
+    return response
+
+async def record_latency(request, response):
+    # on_response_prepare: fires as headers go out, so the MJPEG stream is timed to its first byte
+    started = request.get("metrics_started")
+    if started is None or not METRICS_ENABLED:
+        return
+    resource = request.match_info.route.resource
+    metrics.observe("driver_http_request_duration_seconds", time.perf_counter() - started,
+                    route=resource.canonical if resource is not None else "unmatched",
+                    method=request.method, status=str(response.status))
+
+async def metrics_view(request):
+    if not METRICS_ENABLED:
+        return json_response({"error": "Metrics are disabled"}, status=404)
+    return web.Response(body=metrics.render().encode(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+# --- Debug Endpoints ---
+
+profiler = SamplingProfiler(DEBUG_PROFILE_HZ)
+stack_watch = StackWatch(DEBUG_STUCK_SECONDS)
+
+# Event loop lag seen by the watchdog: how late its one-second sleep woke up
+loop_lag = {"last_seconds": 0.0, "max_seconds": 0.0}
+
+async def debug_watchdog():
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(1.0)
+        lag = time.monotonic() - started - 1.0
+        loop_lag["last_seconds"] = round(lag, 4)
+        loop_lag["max_seconds"] = round(max(loop_lag["max_seconds"], lag), 4)
+        stack_watch.update(poll_tasks())
+
+async def debug_watchdog_ctx(app):
+    task = asyncio.create_task(debug_watchdog()) if DEBUG_ENDPOINTS else None
+    yield
+    if task is not None:
+        task.cancel()
+
+async def debug_profile(request):
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return json_response({"error": denied[1]}, status=denied[0])
+    try:
+        seconds = profile_seconds(request.query.get("seconds"), DEBUG_PROFILE_MAX_SECONDS)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    # Sampled from an executor thread so the event loop keeps serving (and shows up in the profile)
+    stacks = await asyncio.get_running_loop().run_in_executor(
+        None, profiler.profile, seconds, request.query.get("mode", "cpu") != "wall")
+    if stacks is None:
+        return json_response({"error": "A profile is already running"}, status=409)
+    return web.Response(text=stacks, content_type="text/plain",
+                        headers={"Content-Disposition": "attachment; filename=profile.collapsed"})
+
+async def debug_tasks(request):
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return json_response({"error": denied[1]}, status=denied[0])
+    return json_response({"stuck_after_seconds": DEBUG_STUCK_SECONDS, "loop_lag": loop_lag, "tasks": stack_watch.snapshot()})
+
 # Global: single camera stream for all clients
 class CameraStreamManager:
     def __init__(self):
         self.clients = set()
         self.latest_image = None
+        self.seq = 0
         self.ros_task = None
         self.ros_ws = None
+        self.topic = None
         self.lock = asyncio.Lock()
         self.running = False
+        self.motion = MotionGate(MOTION_THRESHOLD, MOTION_PIXEL_DELTA, MOTION_KEEPALIVE_SECONDS) if MOTION_GATE else None
 
     async def start_stream(self):
         async with self.lock:
@@ -40,6 +265,32 @@ class CameraStreamManager:
                     self.ros_ws = None
                 self.running = False
 
+    async def reconfigure(self, updated):
+        """Applies reloaded settings to a running stream; viewers stay attached throughout."""
+        if self.motion is not None:
+            self.motion.threshold = MOTION_THRESHOLD
+        async with self.lock:
+            if not self.running:
+                return
+            if "ROSBRIDGE_WS_URL" in updated:
+                # A different rosbridge needs a new connection; the listener reads the new URL
+                if self.ros_task:
+                    self.ros_task.cancel()
+                self.ros_ws = None
+                self.ros_task = asyncio.create_task(self._ros_listener())
+            elif "ROSBRIDGE_CAMERA_TOPIC" in updated and self.ros_ws is not None:
+                # Same rosbridge: move the subscription over the open websocket
+                await self.ros_ws.send(json.dumps({"op": "unsubscribe", "topic": self.topic}))
+                await self.ros_ws.send(json.dumps(self._subscribe_msg()))
+
+    def _subscribe_msg(self):
+        self.topic = ROSBRIDGE_CAMERA_TOPIC
+        return {
+            "op": "subscribe",
+            "topic": self.topic,
+            "type": "sensor_msgs/CompressedImage"
+        }
+
     async def add_client(self, ws_response):
         self.clients.add(ws_response)
         await self.start_stream()
@@ -51,23 +302,237 @@ class CameraStreamManager:
 
     async def _ros_listener(self):
         while True:
+            if not dependencies.ready() and not await asyncio.get_running_loop().run_in_executor(None, dependencies.wait):
+                await asyncio.sleep(1)  # Import failed or is still running; /readyz has the details
+                continue
+            started = time.perf_counter()
             try:
                 async with websockets.connect(ROSBRIDGE_WS_URL) as ws:
+                    metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                                    upstream="rosbridge", outcome="ok")
+                    started = None
                     self.ros_ws = ws
-                    subscribe_msg = {
-                        "op": "subscribe",
-                        "topic": ROSBRIDGE_CAMERA_TOPIC,
-                        "type": "sensor_msgs/CompressedImage"
-                    }
-                    await ws.send(json.dumps(subscribe_msg))
+                    await ws.send(json.dumps(self._subscribe_msg()))
+                    if self.motion is not None:
+                        self.motion.reset()
                     async for msg in ws:
-                        data = json.loads(msg)
+                        data = json_loads(msg)
+                        if data.get("topic", self.topic) != self.topic:
+                            continue  # Still in flight from a topic that was just unsubscribed
                         if data.get("msg") and "data" in data["msg"]:
+                            metrics.inc("driver_frames_total", stage="captured")
+                            if not await self._motion_admits(data["msg"]["data"]):
+                                metrics.inc("driver_frames_total", stage="suppressed")
+                                continue
                             self.latest_image = data["msg"]["data"]
+                            self.seq += 1
             except Exception:
+                if started is not None:
+                    metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                                    upstream="rosbridge", outcome="error")
                 await asyncio.sleep(1)  # Retry on connection failure
 
+    async def _motion_admits(self, data_b64):
+        if self.motion is None or not motion_dependencies.ready():
+            return True
+        # The decode releases the GIL; keep it off the event loop
+        gray = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: jpeg_thumbnail(base64.b64decode(data_b64)))
+        return gray is None or self.motion.admit(gray)
+
 camera_manager = CameraStreamManager()
+metrics.gauge("driver_viewers", lambda: len(camera_manager.clients))
+if camera_manager.motion is not None:
+    metrics.gauge("driver_motion_suppressed_ratio", camera_manager.motion.suppression_ratio, stream="/cam")
+    metrics.gauge("driver_motion_score", lambda: camera_manager.motion.score or 0.0, stream="/cam")
+
+# --- Mosaic ---
+class LocalCamera:
+    """This driver's camera topic as a mosaic source; the rosbridge subscription runs while a mosaic shows it."""
+    def __init__(self):
+        self.users = 0
+        self.last = (0, None)
+
+    async def attach(self):
+        self.users += 1
+        if self.users == 1:
+            await camera_manager.add_client(self)
+
+    async def detach(self):
+        self.users = max(0, self.users - 1)
+        if self.users == 0:
+            await camera_manager.remove_client(self)
+
+    def latest(self):
+        seq = camera_manager.seq
+        if seq != self.last[0]:
+            data_b64 = camera_manager.latest_image
+            self.last = (seq, base64.b64decode(data_b64) if data_b64 else None)
+        return self.last
+
+class RemoteCamera:
+    """
+    Another camera's MJPEG stream, such as a second driver's /stream or /cam. It
+    is read once for every mosaic showing it and closed when the last one goes.
+    """
+    def __init__(self, url):
+        self.url = url
+        self.users = 0
+        self.frame = None
+        self.seq = 0
+        self.task = None
+
+    async def attach(self):
+        self.users += 1
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def detach(self):
+        self.users = max(0, self.users - 1)
+        if self.users == 0 and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def latest(self):
+        return self.seq, self.frame
+
+    async def _run(self):
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=10)
+        while True:
+            try:
+                async with aiohttp.ClientSession(timeout=timeout) as session:
+                    async with session.get(self.url) as response:
+                        response.raise_for_status()
+                        buf = bytearray()
+                        async for chunk in response.content.iter_any():
+                            buf.extend(chunk)
+                            for jpeg in extract_jpegs(buf):
+                                self.frame = jpeg
+                                self.seq += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            await asyncio.sleep(1)  # Retry on connection failure
+
+class Mosaic:
+    """
+    One grid of cameras and the task that composites it, shared by every client
+    asking for the same cameras, layout and fps.
+    """
+    def __init__(self, key, sources, cols, rows, fps):
+        self.key = key
+        self.sources = sources
+        self.cols = cols
+        self.rows = rows
+        self.interval = 1.0 / fps
+        self.cond = asyncio.Condition()
+        self.frame = None
+        self.seq = 0
+        self.viewers = 0
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+        for source in self.sources:
+            await source.attach()
+
+    async def stop(self):
+        self.task.cancel()
+        for source in self.sources:
+            await source.detach()
+
+    async def wait_frame(self, last_seq, timeout):
+        async with self.cond:
+            try:
+                await asyncio.wait_for(self.cond.wait_for(lambda: self.seq != last_seq), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return self.seq, self.frame
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        canvas = mosaic_settings.canvas(self.cols, self.rows)
+        tick = loop.time()
+        while True:
+            started = time.perf_counter()
+            # Decoding, resizing and encoding release the GIL; keep them off the event loop
+            jpeg = await loop.run_in_executor(None, canvas.compose, [source.latest() for source in self.sources])
+            if jpeg is not None:
+                metrics.observe("driver_mosaic_compose_duration_seconds", time.perf_counter() - started)
+                metrics.inc("driver_frames_total", stage="mosaic")
+                async with self.cond:
+                    self.frame = jpeg
+                    self.seq += 1
+                    self.cond.notify_all()
+            tick = max(tick + self.interval, loop.time())
+            await asyncio.sleep(tick - loop.time())
+
+class MosaicHub:
+    """The cameras a mosaic can show, by name, and the grids currently being served."""
+    def __init__(self, local, remotes):
+        self.sources = dict(remotes, local=local)
+        self.mosaics = {}
+
+    @classmethod
+    def from_env(cls, local, spec):
+        return cls(local, {name: RemoteCamera(url) for name, url in parse_cameras(spec).items()})
+
+    def parse(self, cameras, layout, fps):
+        return mosaic_settings.grid(self.sources, cameras, layout, fps)
+
+    async def open(self, names, cols, rows, fps):
+        key = (names, cols, rows, fps)
+        mosaic = self.mosaics.get(key)
+        if mosaic is None:
+            mosaic = self.mosaics[key] = Mosaic(key, [self.sources[name] for name in names], cols, rows, fps)
+            await mosaic.start()
+        mosaic.viewers += 1
+        return mosaic
+
+    async def close(self, mosaic):
+        mosaic.viewers -= 1
+        if mosaic.viewers == 0:
+            del self.mosaics[mosaic.key]
+            await mosaic.stop()
+
+    def viewers(self):
+        return sum(mosaic.viewers for mosaic in self.mosaics.values())
+
+    def status(self):
+        return mosaic_settings.status(self.sources, self.mosaics)
+
+mosaic_settings = MosaicSettings(MOSAIC_WIDTH, MOSAIC_HEIGHT, MOSAIC_MAX_TILES, MOSAIC_DEFAULT_FPS, MOSAIC_MAX_FPS,
+                                 MOSAIC_JPEG_QUALITY)
+mosaic_hub = MosaicHub.from_env(LocalCamera(), MOSAIC_CAMERAS)
+metrics.gauge("driver_mosaic_viewers", mosaic_hub.viewers)
+
+# --- Config Reload ---
+
+RELOADABLE_SETTINGS = {"ROSBRIDGE_WS_URL": str, "ROSBRIDGE_CAMERA_TOPIC": str, "MOTION_THRESHOLD": float}
+STARTUP_SETTINGS = {name: globals()[name] for name in RELOADABLE_SETTINGS}
+
+# The app's event loop, set once the mounted settings are loaded; the watcher thread hands changes to it
+config_loop = None
+
+def on_config_change(changed, values):
+    updated = apply_settings(values, RELOADABLE_SETTINGS, STARTUP_SETTINGS, globals())
+    if updated and config_loop is not None:
+        asyncio.run_coroutine_threadsafe(camera_manager.reconfigure(updated), config_loop).result(timeout=10)
+
+config_watcher = ConfigWatcher(CONFIG_MOUNT_PATH, on_config_change, CONFIG_POLL_INTERVAL)
+
+async def config_reload_ctx(app):
+    global config_loop
+    if CONFIG_RELOAD:
+        config_watcher.load()
+        config_loop = asyncio.get_running_loop()
+        config_watcher.start()
+    yield
+
+async def config_status(request):
+    return json_response({"reload": config_watcher.status() if CONFIG_RELOAD else None,
+                          "settings": {name: globals()[name] for name in RELOADABLE_SETTINGS}})
 
 async def camera_stream(request):
     boundary = "frame"
@@ -82,14 +547,21 @@ async def camera_stream(request):
     )
     await response.prepare(request)
     await camera_manager.add_client(response)
+    client = metrics.client_label(request.remote or "unknown")
 
     try:
         last_sent = None
+        last_seq = 0
         while True:
             await asyncio.sleep(0.05)
+            seq = camera_manager.seq
             img_data_b64 = camera_manager.latest_image
             if img_data_b64 and img_data_b64 != last_sent:
                 last_sent = img_data_b64
+                if last_seq and seq - last_seq > 1:
+                    # Images that arrived between two polls of this viewer were never sent to it
+                    metrics.inc("driver_frames_total", seq - last_seq - 1, stage="dropped")
+                last_seq = seq
                 img_bytes = base64.b64decode(img_data_b64)
                 part = (
                     f"\r\n--{boundary}\r\n"
@@ -97,6 +569,8 @@ async def camera_stream(request):
                     f"Content-Length: {len(img_bytes)}\r\n\r\n"
                 ).encode('utf-8') + img_bytes
                 await response.write(part)
+                metrics.inc("driver_frames_total", stage="sent")
+                metrics.inc("driver_client_bytes_sent_total", len(part), client=client)
     except asyncio.CancelledError:
         pass
     except Exception:
@@ -109,8 +583,71 @@ async def camera_stream(request):
             pass
     return response
 
-app = web.Application()
+async def mosaic_stream(request):
+    try:
+        grid = mosaic_hub.parse(request.query.get("cameras"), request.query.get("layout"), request.query.get("fps"))
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    if not await asyncio.get_running_loop().run_in_executor(None, motion_dependencies.wait):
+        return json_response({"error": "OpenCV is not available yet", "dependencies": motion_dependencies.status()},
+                             status=503)
+    boundary = "frame"
+    response = web.StreamResponse(
+        status=200,
+        reason='OK',
+        headers={
+            'Content-Type': f'multipart/x-mixed-replace; boundary={boundary}',
+            'Cache-Control': 'no-cache',
+            'Pragma': 'no-cache',
+        }
+    )
+    await response.prepare(request)
+    mosaic = await mosaic_hub.open(*grid)
+    client = metrics.client_label(request.remote or "unknown")
+
+    try:
+        seq = 0
+        while True:
+            # A grid nobody changed is sent again every second so dead wall clients are noticed
+            seq, frame = await mosaic.wait_frame(seq, 1.0)
+            if frame is None:
+                continue
+            part = (
+                f"\r\n--{boundary}\r\n"
+                "Content-Type: image/jpeg\r\n"
+                f"Content-Length: {len(frame)}\r\n\r\n"
+            ).encode('utf-8') + frame
+            await response.write(part)
+            metrics.inc("driver_frames_total", stage="sent")
+            metrics.inc("driver_client_bytes_sent_total", len(part), client=client)
+    except asyncio.CancelledError:
+        pass
+    except Exception:
+        pass
+    finally:
+        await mosaic_hub.close(mosaic)
+        try:
+            await response.write_eof()
+        except Exception:
+            pass
+    return response
+
+async def mosaic_stats(request):
+    return json_response(mosaic_hub.status())
+
+app = web.Application(middlewares=[metrics_middleware])
+app.on_response_prepare.append(record_latency)
 app.router.add_get('/cam', camera_stream)
+app.router.add_get('/mosaic', mosaic_stream)
+app.router.add_get('/mosaic/stats', mosaic_stats)
+app.router.add_get('/readyz', readyz)
+app.router.add_get('/metrics', metrics_view)
+app.router.add_get('/config', config_status)
+app.router.add_get('/debug/profile', debug_profile)
+app.router.add_get('/debug/tasks', debug_tasks)
+app.cleanup_ctx.append(debug_watchdog_ctx)
+app.cleanup_ctx.append(config_reload_ctx)
+app.on_startup.append(start_dependency_loader)
 
 if __name__ == '__main__':
-    web.run_app(app, host=HTTP_SERVER_HOST, port=HTTP_SERVER_PORT)
\ No newline at end of file
+    web.run_app(app, sock=listener)
\ No newline at end of file
@@ -0,0 +1,428 @@
+import os
+import sys
+import time
+import asyncio
+from collections import Counter, deque
+
+import aiomqtt
+from aiohttp import web
+
+# Helpers shared by every driver live in iot_driver_copilot/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.jsoncodec import json_dumps, json_loads
+from common.metrics import METRICS_CONTENT_TYPE, Metrics
+from common.debug import SamplingProfiler, StackWatch, debug_denied, poll_tasks, profile_seconds
+
+# Environment variables
+EDGEDEVICE_NAME = os.environ.get("EDGEDEVICE_NAME", "edgedevice-robot-dog")
+# host, host:port or tcp://host:port; the deployment leaves it empty when no broker is configured
+MQTT_BROKER_ADDRESS = os.environ.get("MQTT_BROKER_ADDRESS") or "localhost:1883"
+MQTT_USERNAME = os.environ.get("MQTT_USERNAME", "")
+MQTT_PASSWORD = os.environ.get("MQTT_PASSWORD", "")
+MQTT_CLIENT_ID = os.environ.get("MQTT_CLIENT_ID") or EDGEDEVICE_NAME
+MQTT_KEEPALIVE = int(os.environ.get("MQTT_KEEPALIVE", "30"))
+MQTT_RECONNECT_DELAY = float(os.environ.get("MQTT_RECONNECT_DELAY", "2"))
+MQTT_COMMAND_TOPIC_PREFIX = os.environ.get("MQTT_COMMAND_TOPIC_PREFIX", "robotdog/cmd")
+MQTT_COMMAND_QOS = int(os.environ.get("MQTT_COMMAND_QOS", "0"))
+MQTT_STATE_TOPICS = [t.strip() for t in os.environ.get("MQTT_STATE_TOPICS", "robotdog/state/#").split(",") if t.strip()]
+HTTP_SERVER_HOST = os.environ.get("HTTP_SERVER_HOST", "0.0.0.0")
+HTTP_SERVER_PORT = int(os.environ.get("HTTP_SERVER_PORT", "8080"))
+
+# Motion channels: only the newest command is kept, published at most MQTT_COMMAND_RATE_HZ times a second
+MQTT_COALESCED_CHANNELS = [c.strip() for c in os.environ.get("MQTT_COALESCED_CHANNELS", "velocity,body,head").split(",") if c.strip()]
+MQTT_COMMAND_RATE_HZ = float(os.environ.get("MQTT_COMMAND_RATE_HZ", "20"))
+# Discrete commands (stand, sit, gait) are each published once, in order, up to MQTT_COMMAND_QUEUE waiting
+MQTT_QUEUED_CHANNELS = [c.strip() for c in os.environ.get("MQTT_QUEUED_CHANNELS", "action,mode").split(",") if c.strip()]
+MQTT_COMMAND_QUEUE = int(os.environ.get("MQTT_COMMAND_QUEUE", "32"))
+# A command still unpublished this many seconds after it arrived (broker stalled) is dropped, not sent late
+MQTT_COMMAND_TTL = float(os.environ.get("MQTT_COMMAND_TTL", "0.5"))
+
+WS_HEARTBEAT = float(os.environ.get("WS_HEARTBEAT", "30"))
+WS_MAX_MSG_SIZE = int(os.environ.get("WS_MAX_MSG_SIZE", str(64 * 1024)))
+
+# Prometheus /metrics; per-client byte counters stop adding new client labels past METRICS_MAX_CLIENTS
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MAX_CLIENTS = int(os.environ.get("METRICS_MAX_CLIENTS", "100"))
+
+# /debug/profile and /debug/tasks are compiled in but answer 404 unless DEBUG_ENDPOINTS=true;
+# with DEBUG_TOKEN set, callers must also send it in the X-Debug-Token header
+DEBUG_ENDPOINTS = os.environ.get("DEBUG_ENDPOINTS", "false").lower() == "true"
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+DEBUG_PROFILE_MAX_SECONDS = float(os.environ.get("DEBUG_PROFILE_MAX_SECONDS", "60"))
+DEBUG_PROFILE_HZ = float(os.environ.get("DEBUG_PROFILE_HZ", "100"))
+DEBUG_STUCK_SECONDS = float(os.environ.get("DEBUG_STUCK_SECONDS", "10"))
+
+# --- JSON Codec ---
+
+def json_response(data, status=200):
+    return web.Response(status=status, body=json_dumps(data), content_type="application/json")
+
+# --- Metrics ---
+
+METRIC_HELP = {
+    "driver_http_request_duration_seconds": "Time from request arrival until the response headers were sent.",
+    "driver_upstream_request_duration_seconds": "MQTT broker connect latency, by outcome.",
+    "driver_mqtt_commands_total": "Commands by channel and outcome: received, published, coalesced (replaced by a newer one before its publish slot), dropped (queue full), expired (older than MQTT_COMMAND_TTL) or failed.",
+    "driver_mqtt_command_latency_seconds": "Time from a command's arrival until it was published on the broker connection.",
+    "driver_mqtt_state_messages_total": "State messages received from the broker.",
+    "driver_mqtt_connected": "1 while the broker connection is up.",
+    "driver_websocket_clients": "Open /ws control sockets.",
+    "driver_client_bytes_sent_total": "Response body bytes sent, by client address.",
+}
+
+metrics = Metrics(METRICS_MAX_CLIENTS, METRIC_HELP, enabled=METRICS_ENABLED)
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    # Latency is taken when the response is prepared (see record_latency)
+    request["metrics_started"] = time.perf_counter()
+    response = await handler(request)
+    if METRICS_ENABLED:
+        metrics.inc("driver_client_bytes_sent_total", response.content_length or 0,
+                    client=metrics.client_label(request.remote or "unknown"))
+    return response
+
+async def record_latency(request, response):
+    # on_response_prepare: fires as the headers go out
+    started = request.get("metrics_started")
+    if started is None or not METRICS_ENABLED:
+        return
+    resource = request.match_info.route.resource
+    metrics.observe("driver_http_request_duration_seconds", time.perf_counter() - started,
+                    route=resource.canonical if resource is not None else "unmatched",
+                    method=request.method, status=str(response.status))
+
+async def metrics_view(request):
+    if not METRICS_ENABLED:
+        return json_response({"error": "Metrics are disabled"}, status=404)
+    return web.Response(body=metrics.render().encode(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+# --- Debug Endpoints ---
+
+profiler = SamplingProfiler(DEBUG_PROFILE_HZ)
+stack_watch = StackWatch(DEBUG_STUCK_SECONDS)
+
+# Event loop lag seen by the watchdog: how late its one-second sleep woke up
+loop_lag = {"last_seconds": 0.0, "max_seconds": 0.0}
+
+async def debug_watchdog():
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(1.0)
+        lag = time.monotonic() - started - 1.0
+        loop_lag["last_seconds"] = round(lag, 4)
+        loop_lag["max_seconds"] = round(max(loop_lag["max_seconds"], lag), 4)
+        stack_watch.update(poll_tasks())
+
+async def debug_watchdog_ctx(app):
+    task = asyncio.create_task(debug_watchdog()) if DEBUG_ENDPOINTS else None
+    yield
+    if task is not None:
+        task.cancel()
+
+async def debug_profile(request):
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return json_response({"error": denied[1]}, status=denied[0])
+    try:
+        seconds = profile_seconds(request.query.get("seconds"), DEBUG_PROFILE_MAX_SECONDS)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    # Sampled from an executor thread so the event loop keeps serving (and shows up in the profile)
+    stacks = await asyncio.get_running_loop().run_in_executor(
+        None, profiler.profile, seconds, request.query.get("mode", "cpu") != "wall")
+    if stacks is None:
+        return json_response({"error": "A profile is already running"}, status=409)
+    return web.Response(text=stacks, content_type="text/plain",
+                        headers={"Content-Disposition": "attachment; filename=profile.collapsed"})
+
+async def debug_tasks(request):
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return json_response({"error": denied[1]}, status=denied[0])
+    return json_response({"stuck_after_seconds": DEBUG_STUCK_SECONDS, "loop_lag": loop_lag, "tasks": stack_watch.snapshot()})
+
+# --- MQTT Bridge ---
+
+# Topic prefix of each state filter, so /state/battery finds robotdog/state/battery
+STATE_PREFIXES = [topic.split("#")[0].split("+")[0] for topic in MQTT_STATE_TOPICS]
+
+def broker_host_port(address):
+    """(host, port) from "host", "host:port" or "tcp://host:port"."""
+    address = address.split("://", 1)[-1].rstrip("/")
+    host, sep, port = address.rpartition(":")
+    if not sep or not port.isdigit():
+        return address, 1883
+    return host, int(port)
+
+def decode_payload(payload):
+    """JSON payloads as values, anything else as text."""
+    try:
+        return json_loads(payload)
+    except ValueError:
+        return bytes(payload).decode("utf-8", "replace")
+
+class CommandChannel:
+    """
+    One control channel, published to MQTT_COMMAND_TOPIC_PREFIX/<name>. A coalesced
+    channel holds only its newest command: one that arrives while the previous is
+    still waiting for its publish slot replaces it. A queued channel publishes every
+    command once, in order.
+    """
+    def __init__(self, name, coalesce):
+        self.name = name
+        self.topic = f"{MQTT_COMMAND_TOPIC_PREFIX}/{name}"
+        self.coalesce = coalesce
+        self.interval = 1.0 / MQTT_COMMAND_RATE_HZ if coalesce and MQTT_COMMAND_RATE_HZ > 0 else 0.0
+        self.pending = deque()  # (payload, arrived)
+        self.ready = asyncio.Event()
+        self.last_published = 0.0
+        self.counts = Counter()
+
+    def count(self, outcome):
+        self.counts[outcome] += 1
+        metrics.inc("driver_mqtt_commands_total", channel=self.name, outcome=outcome)
+
+    def submit(self, payload):
+        """Queues a command; True when it displaced one that was never published."""
+        self.count("received")
+        replaced = False
+        if self.coalesce and self.pending:
+            self.pending.clear()
+            self.count("coalesced")
+            replaced = True
+        elif len(self.pending) >= MQTT_COMMAND_QUEUE:
+            self.pending.popleft()
+            self.count("dropped")
+            replaced = True
+        self.pending.append((payload, time.monotonic()))
+        self.ready.set()
+        return replaced
+
+    def as_dict(self):
+        return {"topic": self.topic, "coalesce": self.coalesce, "pending": len(self.pending), **self.counts}
+
+class StateFeed:
+    """
+    Outbox of one /ws client: the newest value of each changed topic. A client that
+    reads slowly skips intermediate values instead of growing a queue.
+    """
+    def __init__(self, entries):
+        self.pending = dict(entries)
+        self.ready = asyncio.Event()
+        if self.pending:
+            self.ready.set()
+
+    def push(self, topic, entry):
+        self.pending[topic] = entry
+        self.ready.set()
+
+    def take(self):
+        pending, self.pending = self.pending, {}
+        self.ready.clear()
+        return pending
+
+class StateCache:
+    """Latest message of every state topic, so HTTP reads never wait on the broker."""
+    def __init__(self):
+        self.entries = {}
+        self.feeds = set()
+        self.messages = 0
+        self._rendered = None
+
+    def update(self, topic, payload):
+        entry = {"topic": topic, "value": decode_payload(payload), "received_at": time.time()}
+        self.entries[topic] = entry
+        self.messages += 1
+        self._rendered = None
+        metrics.inc("driver_mqtt_state_messages_total")
+        for feed in self.feeds:
+            feed.push(topic, entry)
+
+    def lookup(self, name):
+        entry = self.entries.get(name)
+        for prefix in STATE_PREFIXES:
+            if entry is not None:
+                break
+            entry = self.entries.get(prefix + name)
+        return entry
+
+    def rendered(self):
+        # Encoded once per change, not once per read
+        if self._rendered is None:
+            self._rendered = json_dumps(self.entries)
+        return self._rendered
+
+class MqttBridge:
+    """
+    One broker connection for the whole driver, reconnected after
+    MQTT_RECONNECT_DELAY. It subscribes to MQTT_STATE_TOPICS into the state cache,
+    and one task per control channel publishes that channel's pending commands.
+    """
+    def __init__(self):
+        self.host, self.port = broker_host_port(MQTT_BROKER_ADDRESS)
+        self.client = None
+        self.connected = asyncio.Event()
+        self.connects = 0
+        self.error = None
+        self.channels = {name: CommandChannel(name, True) for name in MQTT_COALESCED_CHANNELS}
+        self.channels.update((name, CommandChannel(name, False)) for name in MQTT_QUEUED_CHANNELS)
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            session = False
+            try:
+                async with aiomqtt.Client(
+                    self.host, self.port, identifier=MQTT_CLIENT_ID, keepalive=MQTT_KEEPALIVE,
+                    username=MQTT_USERNAME or None, password=MQTT_PASSWORD or None,
+                ) as client:
+                    session = True
+                    metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                                    upstream="mqtt", outcome="ok")
+                    for topic in MQTT_STATE_TOPICS:
+                        await client.subscribe(topic)
+                    self.client = client
+                    self.connects += 1
+                    self.error = None
+                    self.connected.set()
+                    async for message in client.messages:
+                        state.update(message.topic.value, message.payload)
+            except aiomqtt.MqttError as e:
+                if not session:
+                    metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                                    upstream="mqtt", outcome="error")
+                self.error = str(e)
+            finally:
+                self.connected.clear()
+                self.client = None
+            await asyncio.sleep(MQTT_RECONNECT_DELAY)
+
+    async def drain(self, channel):
+        while True:
+            await channel.ready.wait()
+            # Sit out the rest of the publish slot; commands arriving meanwhile replace the pending one
+            wait = channel.last_published + channel.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self.connected.wait()
+            if not channel.pending:
+                channel.ready.clear()
+                continue
+            payload, arrived = channel.pending.popleft()
+            if not channel.pending:
+                channel.ready.clear()
+            if time.monotonic() - arrived > MQTT_COMMAND_TTL:
+                channel.count("expired")
+                continue
+            try:
+                await self.client.publish(channel.topic, payload, qos=MQTT_COMMAND_QOS)
+            except aiomqtt.MqttError:
+                channel.count("failed")
+                continue
+            channel.last_published = time.monotonic()
+            channel.count("published")
+            metrics.observe("driver_mqtt_command_latency_seconds", channel.last_published - arrived,
+                            channel=channel.name)
+
+    def submit(self, channel_name, payload):
+        """(status, body) for one command; payload is the JSON to publish, as bytes."""
+        channel = self.channels.get(channel_name)
+        if channel is None:
+            return 404, {"error": f"Unknown channel '{channel_name}'", "channels": sorted(self.channels)}
+        if not self.connected.is_set():
+            return 503, {"error": "MQTT broker not connected"}
+        return 202, {"channel": channel.name, "replaced": channel.submit(payload)}
+
+state = StateCache()
+bridge = MqttBridge()
+
+# --- HTTP Endpoints ---
+
+async def post_command(request):
+    payload = await request.read()
+    try:
+        json_loads(payload)
+    except ValueError:
+        return json_response({"error": "Command must be a JSON document"}, status=400)
+    status, result = bridge.submit(request.match_info["channel"], payload)
+    return json_response(result, status=status)
+
+async def get_state(request):
+    return web.Response(body=state.rendered(), content_type="application/json")
+
+async def get_state_topic(request):
+    entry = state.lookup(request.match_info["name"])
+    if entry is None:
+        return json_response({"error": "No message received on this topic yet"}, status=404)
+    return json_response(entry)
+
+async def push_state(ws, feed):
+    while True:
+        await feed.ready.wait()
+        await ws.send_str(json_dumps({"type": "state", "topics": feed.take()}).decode())
+
+async def control_socket(request):
+    """
+    Joystick socket: clients send {"channel": ..., "command": {...}} and get every
+    state change back as {"type": "state", "topics": {...}}. Accepted commands are
+    not acknowledged; rejected ones answer {"type": "error", ...}.
+    """
+    ws = web.WebSocketResponse(heartbeat=WS_HEARTBEAT, max_msg_size=WS_MAX_MSG_SIZE, compress=False)
+    await ws.prepare(request)
+    feed = StateFeed(state.entries)
+    state.feeds.add(feed)
+    sender = asyncio.create_task(push_state(ws, feed))
+    try:
+        async for msg in ws:
+            if msg.type != web.WSMsgType.TEXT:
+                continue
+            try:
+                message = json_loads(msg.data)
+                status, result = bridge.submit(message["channel"], json_dumps(message["command"]))
+            except (ValueError, KeyError, TypeError):
+                status, result = 400, {"error": "Expected {\"channel\": ..., \"command\": ...}"}
+            if status != 202:
+                await ws.send_str(json_dumps(dict(result, type="error", status=status)).decode())
+    finally:
+        state.feeds.discard(feed)
+        sender.cancel()
+    return ws
+
+async def bridge_stats(request):
+    return json_response({
+        "broker": {"address": f"{bridge.host}:{bridge.port}", "connected": bridge.connected.is_set(),
+                   "connects": bridge.connects, "error": bridge.error},
+        "channels": {name: channel.as_dict() for name, channel in bridge.channels.items()},
+        "state": {"topics": len(state.entries), "messages": state.messages, "websockets": len(state.feeds)},
+    })
+
+# --- App Setup ---
+
+async def bridge_ctx(app):
+    tasks = [asyncio.create_task(bridge.run(), name="mqtt-connection")]
+    tasks.extend(asyncio.create_task(bridge.drain(channel), name=f"mqtt-publish-{name}")
+                 for name, channel in bridge.channels.items())
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+metrics.gauge("driver_mqtt_connected", lambda: int(bridge.connected.is_set()))
+metrics.gauge("driver_websocket_clients", lambda: len(state.feeds))
+
+app = web.Application(middlewares=[metrics_middleware])
+app.on_response_prepare.append(record_latency)
+app.router.add_post('/command/{channel}', post_command)
+app.router.add_get('/state', get_state)
+app.router.add_get('/state/{name:.+}', get_state_topic)
+app.router.add_get('/ws', control_socket)
+app.router.add_get('/stats', bridge_stats)
+app.router.add_get('/metrics', metrics_view)
+app.router.add_get('/debug/profile', debug_profile)
+app.router.add_get('/debug/tasks', debug_tasks)
+app.cleanup_ctx.append(bridge_ctx)
+app.cleanup_ctx.append(debug_watchdog_ctx)
+
+if __name__ == '__main__':
+    web.run_app(app, host=HTTP_SERVER_HOST, port=HTTP_SERVER_PORT)
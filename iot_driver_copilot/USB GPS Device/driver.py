@@ -0,0 +1,492 @@
+import os
+import sys
+import time
+import asyncio
+import termios
+from collections import deque
+
+import nats
+from aiohttp import web
+
+# Helpers shared by every driver live in iot_driver_copilot/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.jsoncodec import json_dumps
+from common.metrics import METRICS_CONTENT_TYPE, Metrics
+from common.debug import SamplingProfiler, StackWatch, debug_denied, poll_tasks, profile_seconds
+
+# Environment variables
+SERIAL_PORT = os.environ.get("SERIAL_PORT", "/dev/ttyACM0")
+BAUDRATE = int(os.environ.get("BAUDRATE", "9600"))
+NATS_SERVER_URL = os.environ.get("NATS_SERVER_URL", "nats://localhost:4222")
+NATS_TOPIC = os.environ.get("NATS_TOPIC", "gps.data")
+NATS_PUBLISH_INTERVAL = float(os.environ.get("NATS_PUBLISH_INTERVAL", "1"))
+EDGEDEVICE_NAME = os.environ.get("EDGEDEVICE_NAME", "edgedevice-usb-gps")
+HTTP_SERVER_HOST = os.environ.get("HTTP_SERVER_HOST", "0.0.0.0")
+HTTP_SERVER_PORT = int(os.environ.get("HTTP_SERVER_PORT", "8080"))
+
+# Sentence types kept by the parser; everything else the receiver sends is skipped unparsed
+NMEA_SENTENCES = [t.strip().upper() for t in os.environ.get("NMEA_SENTENCES", "GGA,RMC").split(",") if t.strip()]
+SERIAL_RECONNECT_DELAY = float(os.environ.get("SERIAL_RECONNECT_DELAY", "2"))
+
+# "latest" publishes the newest fix once per interval; "batch" publishes every fix of the interval in one message
+NATS_PUBLISH_MODE = os.environ.get("NATS_PUBLISH_MODE", "latest").lower()
+NATS_MAX_BATCH = int(os.environ.get("NATS_MAX_BATCH", "600"))
+# Messages kept while NATS is unreachable, oldest dropped first, and sent in order on reconnect
+NATS_BUFFER_MESSAGES = int(os.environ.get("NATS_BUFFER_MESSAGES", "3600"))
+NATS_RECONNECT_DELAY = float(os.environ.get("NATS_RECONNECT_DELAY", "2"))
+
+# Prometheus /metrics; per-client byte counters stop adding new client labels past METRICS_MAX_CLIENTS
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MAX_CLIENTS = int(os.environ.get("METRICS_MAX_CLIENTS", "100"))
+
+# /debug/profile and /debug/tasks are compiled in but answer 404 unless DEBUG_ENDPOINTS=true;
+# with DEBUG_TOKEN set, callers must also send it in the X-Debug-Token header
+DEBUG_ENDPOINTS = os.environ.get("DEBUG_ENDPOINTS", "false").lower() == "true"
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+DEBUG_PROFILE_MAX_SECONDS = float(os.environ.get("DEBUG_PROFILE_MAX_SECONDS", "60"))
+DEBUG_PROFILE_HZ = float(os.environ.get("DEBUG_PROFILE_HZ", "100"))
+DEBUG_STUCK_SECONDS = float(os.environ.get("DEBUG_STUCK_SECONDS", "10"))
+
+# --- JSON Codec ---
+
+def json_response(data, status=200):
+    return web.Response(status=status, body=json_dumps(data), content_type="application/json")
+
+# --- Metrics ---
+
+METRIC_HELP = {
+    "driver_http_request_duration_seconds": "Time from request arrival until the response headers were sent.",
+    "driver_upstream_request_duration_seconds": "NATS connect latency, by outcome.",
+    "driver_nmea_sentences_total": "NMEA sentences read from the receiver: kept, skipped by type, or bad (checksum, truncated, unparsable).",
+    "driver_nats_messages_total": "Messages published to NATS, or dropped from a full offline buffer.",
+    "driver_nats_buffered_messages": "Messages waiting for NATS to come back.",
+    "driver_serial_open": "1 while the serial port is open.",
+    "driver_client_bytes_sent_total": "Response body bytes sent, by client address.",
+}
+
+metrics = Metrics(METRICS_MAX_CLIENTS, METRIC_HELP, enabled=METRICS_ENABLED)
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    # Latency is taken when the response is prepared (see record_latency)
+    request["metrics_started"] = time.perf_counter()
+    response = await handler(request)
+    if METRICS_ENABLED:
+        metrics.inc("driver_client_bytes_sent_total", response.content_length or 0,
+                    client=metrics.client_label(request.remote or "unknown"))
+    return response
+
+async def record_latency(request, response):
+    # on_response_prepare: fires as the headers go out
+    started = request.get("metrics_started")
+    if started is None or not METRICS_ENABLED:
+        return
+    resource = request.match_info.route.resource
+    metrics.observe("driver_http_request_duration_seconds", time.perf_counter() - started,
+                    route=resource.canonical if resource is not None else "unmatched",
+                    method=request.method, status=str(response.status))
+
+async def metrics_view(request):
+    if not METRICS_ENABLED:
+        return json_response({"error": "Metrics are disabled"}, status=404)
+    return web.Response(body=metrics.render().encode(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+# --- Debug Endpoints ---
+
+profiler = SamplingProfiler(DEBUG_PROFILE_HZ)
+stack_watch = StackWatch(DEBUG_STUCK_SECONDS)
+
+# Event loop lag seen by the watchdog: how late its one-second sleep woke up
+loop_lag = {"last_seconds": 0.0, "max_seconds": 0.0}
+
+async def debug_watchdog():
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(1.0)
+        lag = time.monotonic() - started - 1.0
+        loop_lag["last_seconds"] = round(lag, 4)
+        loop_lag["max_seconds"] = round(max(loop_lag["max_seconds"], lag), 4)
+        stack_watch.update(poll_tasks())
+
+async def debug_watchdog_ctx(app):
+    task = asyncio.create_task(debug_watchdog()) if DEBUG_ENDPOINTS else None
+    yield
+    if task is not None:
+        task.cancel()
+
+async def debug_profile(request):
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return json_response({"error": denied[1]}, status=denied[0])
+    try:
+        seconds = profile_seconds(request.query.get("seconds"), DEBUG_PROFILE_MAX_SECONDS)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    # Sampled from an executor thread so the event loop keeps serving (and shows up in the profile)
+    stacks = await asyncio.get_running_loop().run_in_executor(
+        None, profiler.profile, seconds, request.query.get("mode", "cpu") != "wall")
+    if stacks is None:
+        return json_response({"error": "A profile is already running"}, status=409)
+    return web.Response(text=stacks, content_type="text/plain",
+                        headers={"Content-Disposition": "attachment; filename=profile.collapsed"})
+
+async def debug_tasks(request):
+    denied = debug_denied(request.headers.get("X-Debug-Token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return json_response({"error": denied[1]}, status=denied[0])
+    return json_response({"stuck_after_seconds": DEBUG_STUCK_SECONDS, "loop_lag": loop_lag, "tasks": stack_watch.snapshot()})
+
+# --- NMEA Parsing ---
+
+# Longest sentence NMEA 0183 allows is 82 bytes; anything far past that without a newline is line noise
+NMEA_MAX_PENDING = 1024
+KNOTS_TO_MPS = 0.514444
+
+def nmea_number(field):
+    return float(field) if field else None
+
+def nmea_degrees(field, hemisphere):
+    """ddmm.mmmm or dddmm.mmmm plus N/S/E/W as signed decimal degrees; None when empty."""
+    if not field:
+        return None
+    raw = float(field)
+    degrees = int(raw // 100)
+    value = degrees + (raw - degrees * 100) / 60.0
+    return -value if hemisphere in (b"S", b"W") else value
+
+def nmea_checksum(body):
+    """XOR of all bytes, folded as one integer so it costs a few big-int operations instead of a loop per byte."""
+    value = int.from_bytes(body, "little")
+    size = len(body)
+    while size > 1:
+        half = (size + 1) // 2
+        value = (value >> (half * 8)) ^ (value & ((1 << (half * 8)) - 1))
+        size = half
+    return value
+
+def parse_gga(f):
+    return {"utc": f[0], "lat": nmea_degrees(f[1], f[2]), "lon": nmea_degrees(f[3], f[4]),
+            "fix_quality": int(f[5] or 0), "satellites": int(f[6] or 0),
+            "hdop": nmea_number(f[7]), "altitude_m": nmea_number(f[8])}
+
+def parse_rmc(f):
+    speed = nmea_number(f[6])
+    return {"utc": f[0], "valid": f[1] == b"A", "lat": nmea_degrees(f[2], f[3]), "lon": nmea_degrees(f[4], f[5]),
+            "speed_mps": speed * KNOTS_TO_MPS if speed is not None else None,
+            "course_deg": nmea_number(f[7]), "date": f[8]}
+
+def parse_gll(f):
+    return {"lat": nmea_degrees(f[0], f[1]), "lon": nmea_degrees(f[2], f[3]), "utc": f[4], "valid": f[5] == b"A"}
+
+def parse_vtg(f):
+    speed = nmea_number(f[6])
+    return {"course_deg": nmea_number(f[0]), "speed_mps": speed / 3.6 if speed is not None else None}
+
+SENTENCE_PARSERS = {b"GGA": parse_gga, b"RMC": parse_rmc, b"GLL": parse_gll, b"VTG": parse_vtg}
+
+class NmeaParser:
+    """
+    Incremental NMEA 0183 parser over one bytearray. feed() appends raw serial bytes
+    and returns (type, fields) for each complete sentence of a kept type; a partial
+    sentence stays buffered for the next chunk. Unkept types (GSV, GSA, ... most of a
+    receiver's output) are skipped on their three-letter code before any checksum,
+    copy or split. A sentence cut short runs into the next one, so each line is read
+    from its last '$'.
+    """
+    def __init__(self, types):
+        unknown = [t for t in types if t.encode() not in SENTENCE_PARSERS]
+        if unknown:
+            raise ValueError(f"unsupported NMEA sentence types: {', '.join(unknown)}")
+        self.parsers = {t.encode(): SENTENCE_PARSERS[t.encode()] for t in types}
+        self.buffer = bytearray()
+        self.kept = 0
+        self.skipped = 0
+        self.bad = 0
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        sentences = []
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            dollar = buffer.rfind(b"$", start, end)
+            line_start, start = dollar, end + 1
+            if dollar < 0 or end - dollar < 10:
+                self.bad += 1
+                continue
+            parse = self.parsers.get(bytes(buffer[line_start + 3:line_start + 6]))
+            if parse is None:
+                self.skipped += 1
+                continue
+            line = bytes(buffer[line_start + 1:end]).rstrip(b"\r")
+            star = line.rfind(b"*")
+            try:
+                if star < 0 or int(line[star + 1:star + 3], 16) != nmea_checksum(line[:star]):
+                    self.bad += 1
+                    continue
+                sentences.append((line[2:5], parse(line[:star].split(b",")[1:])))
+            except (ValueError, IndexError):
+                self.bad += 1
+                continue
+            self.kept += 1
+        del buffer[:start]
+        if len(buffer) > NMEA_MAX_PENDING:
+            self.bad += 1
+            del buffer[:]
+        return sentences
+
+class FixAssembler:
+    """
+    Merges the kept sentences of one receiver epoch, those stamped with the same UTC
+    time, into one fix. The first sentence of the next epoch completes the previous
+    fix, which add() returns. Only RMC carries the date; it is remembered across epochs.
+    """
+    def __init__(self):
+        self.epoch = None
+        self.current = None
+        self.date = None
+        self.latest = None
+        self.fixes = 0
+
+    def add(self, fields):
+        completed = None
+        utc = fields.pop("utc", None)
+        date = fields.pop("date", None)
+        if date:
+            self.date = date
+        if utc and utc != self.epoch:
+            if self.current:
+                completed = self._finish()
+            self.epoch = utc
+            self.current = {}
+        if self.current is not None:
+            self.current.update((name, value) for name, value in fields.items() if value is not None)
+        return completed
+
+    def _finish(self):
+        fix = self.current
+        utc = self.epoch.decode()
+        stamp = f"{utc[0:2]}:{utc[2:4]}:{utc[4:]}"
+        if self.date and len(self.date) == 6:
+            day = self.date.decode()
+            stamp = f"20{day[4:6]}-{day[2:4]}-{day[0:2]}T{stamp}Z"
+        fix["time"] = stamp
+        self.latest = fix
+        self.fixes += 1
+        return fix
+
+# --- Serial Port ---
+
+def open_serial(path, baudrate):
+    """The serial device as a non-blocking, raw 8N1 descriptor at baudrate (termios, no pyserial)."""
+    speed = getattr(termios, f"B{baudrate}", None)
+    if speed is None:
+        raise ValueError(f"unsupported BAUDRATE {baudrate}")
+    fd = os.open(path, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+    try:
+        attrs = termios.tcgetattr(fd)
+        attrs[0] = termios.IGNPAR  # iflag: no CR/LF translation or flow control
+        attrs[1] = 0  # oflag
+        attrs[2] = termios.CS8 | termios.CREAD | termios.CLOCAL  # cflag
+        attrs[3] = 0  # lflag: not canonical, no echo
+        attrs[4] = attrs[5] = speed
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    except termios.error as e:
+        os.close(fd)
+        raise OSError(f"cannot configure {path}: {e}") from e
+    return fd
+
+class GpsReader:
+    """
+    Reads the receiver from the event loop (add_reader, no thread): each chunk goes
+    through the parser and assembler, and completed fixes queue for the next publish.
+    A read error or EOF (receiver unplugged) closes the port, which is reopened every
+    SERIAL_RECONNECT_DELAY seconds.
+    """
+    def __init__(self):
+        self.parser = NmeaParser(NMEA_SENTENCES)
+        self.assembler = FixAssembler()
+        self.pending = deque(maxlen=NATS_MAX_BATCH)
+        self.fd = None
+        self.lost = None
+        self.error = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self.fd = open_serial(SERIAL_PORT, BAUDRATE)
+            except OSError as e:
+                self.error = f"{type(e).__name__}: {e}"
+                await asyncio.sleep(SERIAL_RECONNECT_DELAY)
+                continue
+            self.error = None
+            self.lost = loop.create_future()
+            loop.add_reader(self.fd, self._on_readable)
+            try:
+                await self.lost
+            finally:
+                loop.remove_reader(self.fd)
+                os.close(self.fd)
+                self.fd = None
+            await asyncio.sleep(SERIAL_RECONNECT_DELAY)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            data = b""
+            self.error = f"{type(e).__name__}: {e}"
+        if not data:
+            if not self.lost.done():
+                self.lost.set_result(None)
+            return
+        parser = self.parser
+        kept, skipped, bad = parser.kept, parser.skipped, parser.bad
+        for _, fields in parser.feed(data):
+            fix = self.assembler.add(fields)
+            if fix is not None:
+                self.pending.append(fix)
+        metrics.inc("driver_nmea_sentences_total", parser.kept - kept, outcome="kept")
+        metrics.inc("driver_nmea_sentences_total", parser.skipped - skipped, outcome="skipped")
+        metrics.inc("driver_nmea_sentences_total", parser.bad - bad, outcome="bad")
+
+    def take(self):
+        """The fixes completed since the last call, oldest first."""
+        fixes = list(self.pending)
+        self.pending.clear()
+        return fixes
+
+# --- NATS Publishing ---
+
+class NatsPublisher:
+    """
+    One NATS connection; nats-py reconnects it. While it is down, messages go to a
+    bounded buffer (oldest dropped once NATS_BUFFER_MESSAGES is reached) and are
+    sent in order when it comes back, before anything newer.
+    """
+    def __init__(self):
+        self.nc = None
+        self.buffer = deque()
+        self.flush_lock = asyncio.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def connected(self):
+        return self.nc is not None and self.nc.is_connected
+
+    async def run(self):
+        while self.nc is None:
+            started = time.perf_counter()
+            try:
+                self.nc = await nats.connect(
+                    servers=[NATS_SERVER_URL], name=EDGEDEVICE_NAME,
+                    max_reconnect_attempts=-1, reconnect_time_wait=NATS_RECONNECT_DELAY,
+                    reconnected_cb=self.flush, error_cb=self._on_error,
+                )
+            except Exception:
+                metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                                upstream="nats", outcome="error")
+                await asyncio.sleep(NATS_RECONNECT_DELAY)
+                continue
+            metrics.observe("driver_upstream_request_duration_seconds", time.perf_counter() - started,
+                            upstream="nats", outcome="ok")
+        await self.flush()
+
+    async def _on_error(self, e):
+        pass  # Disconnects are retried by nats-py; messages meanwhile are buffered here
+
+    async def send(self, payload):
+        self.buffer.append(payload)
+        while len(self.buffer) > NATS_BUFFER_MESSAGES:
+            self.buffer.popleft()
+            self.dropped += 1
+            metrics.inc("driver_nats_messages_total", outcome="dropped")
+        await self.flush()
+
+    async def flush(self):
+        async with self.flush_lock:
+            while self.buffer and self.connected():
+                try:
+                    await self.nc.publish(NATS_TOPIC, self.buffer[0])
+                except Exception:
+                    return
+                self.buffer.popleft()
+                self.published += 1
+                metrics.inc("driver_nats_messages_total", outcome="published")
+
+    async def close(self):
+        if self.nc is not None:
+            try:
+                await self.nc.drain()
+            except Exception:
+                pass
+
+gps = GpsReader()
+publisher = NatsPublisher()
+
+async def publish_loop():
+    """Every NATS_PUBLISH_INTERVAL: the newest fix, or all fixes since the last tick, as one message."""
+    last_sent = None
+    while True:
+        await asyncio.sleep(NATS_PUBLISH_INTERVAL)
+        fixes = gps.take()
+        if NATS_PUBLISH_MODE == "batch":
+            if fixes:
+                await publisher.send(json_dumps({"device": EDGEDEVICE_NAME, "fixes": fixes}))
+        else:
+            fix = gps.assembler.latest
+            if fix is not None and fix is not last_sent:
+                last_sent = fix
+                await publisher.send(json_dumps(dict(fix, device=EDGEDEVICE_NAME)))
+
+# --- HTTP Endpoints ---
+
+async def latest_fix(request):
+    fix = gps.assembler.latest
+    if fix is None:
+        return json_response({"error": "No fix received yet"}, status=503)
+    return json_response(fix)
+
+async def gps_stats(request):
+    parser = gps.parser
+    return json_response({
+        "serial": {"port": SERIAL_PORT, "baudrate": BAUDRATE, "open": gps.fd is not None, "error": gps.error},
+        "nmea": {"kept": parser.kept, "skipped": parser.skipped, "bad": parser.bad, "fixes": gps.assembler.fixes},
+        "nats": {"server": NATS_SERVER_URL, "topic": NATS_TOPIC, "connected": publisher.connected(),
+                 "mode": NATS_PUBLISH_MODE, "published": publisher.published,
+                 "buffered": len(publisher.buffer), "dropped": publisher.dropped},
+    })
+
+# --- App Setup ---
+
+async def gps_ctx(app):
+    tasks = [asyncio.create_task(gps.run(), name="serial-reader"),
+             asyncio.create_task(publisher.run(), name="nats-connect"),
+             asyncio.create_task(publish_loop(), name="nats-publish")]
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await publisher.close()
+
+metrics.gauge("driver_nats_buffered_messages", lambda: len(publisher.buffer))
+metrics.gauge("driver_serial_open", lambda: int(gps.fd is not None))
+
+app = web.Application(middlewares=[metrics_middleware])
+app.on_response_prepare.append(record_latency)
+app.router.add_get('/gps/latest', latest_fix)
+app.router.add_get('/stats', gps_stats)
+app.router.add_get('/metrics', metrics_view)
+app.router.add_get('/debug/profile', debug_profile)
+app.router.add_get('/debug/tasks', debug_tasks)
+app.cleanup_ctx.append(gps_ctx)
+app.cleanup_ctx.append(debug_watchdog_ctx)
+
+if __name__ == '__main__':
+    web.run_app(app, host=HTTP_SERVER_HOST, port=HTTP_SERVER_PORT)
@@ -0,0 +1,6 @@
+"""
+Helpers shared by the drivers under iot_driver_copilot. Each driver is still run
+as a standalone script, so it puts iot_driver_copilot on sys.path before importing
+from here. Modules import only the standard library at import time; anything heavier
+(numpy, OpenCV) is loaded on first use so a driver's cold start does not pay for it.
+"""
@@ -0,0 +1,145 @@
+"""
+Hot reload of a driver's settings from its mounted ConfigMap.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import socket
+import threading
+import time
+
+# inotify event bits from <sys/inotify.h>
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+CONFIG_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+def inotify_watch(path):
+    """An inotify descriptor watching the directory path, or None where inotify is unavailable."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(path), CONFIG_WATCH_MASK) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+class ConfigWatcher:
+    """
+    Watches the ConfigMap volume mounted at path and, from its own thread, calls
+    on_change(changed, values) with the keys whose content changed and the content
+    of every key. Kubernetes updates such a volume by writing a new timestamped
+    directory and renaming the ..data symlink onto it; each key is a symlink through
+    ..data. So the watch is on the mount directory, where the swap shows up as one
+    IN_MOVED_TO, and keys are re-read through their symlinks once the burst of events
+    settles. The directory is also rescanned every poll_interval seconds,
+    which is all that happens where inotify is unavailable.
+    """
+    def __init__(self, path, on_change, poll_interval=10.0):
+        self.path = path
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.values = {}
+        self.mode = None
+        self.reloads = 0
+        self.last_reload = None
+        self.last_changed = []
+        self.error = None
+
+    def read(self):
+        values = {}
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return values
+        for name in names:
+            if name.startswith("."):
+                continue  # ..data and the timestamped directories behind it
+            try:
+                with open(os.path.join(self.path, name), "rb") as f:
+                    values[name] = f.read().decode("utf-8", "replace")
+            except OSError:
+                continue
+        return values
+
+    def load(self):
+        """Applies the keys mounted at startup; errors propagate so a bad mount stops the driver."""
+        self.values = self.read()
+        self.on_change(sorted(self.values), self.values)
+
+    def start(self):
+        threading.Thread(target=self._run, name="config-watcher", daemon=True).start()
+
+    def _run(self):
+        fd = inotify_watch(self.path)
+        self.mode = "poll" if fd is None else "inotify"
+        while True:
+            if fd is None:
+                time.sleep(self.poll_interval)
+            elif select.select([fd], [], [], self.poll_interval)[0]:
+                while select.select([fd], [], [], 0.1)[0]:
+                    try:
+                        os.read(fd, 65536)
+                    except BlockingIOError:
+                        pass
+            self.check()
+
+    def check(self):
+        values = self.read()
+        changed = sorted(name for name in set(values) | set(self.values) if values.get(name) != self.values.get(name))
+        if not changed:
+            return
+        self.values = values
+        try:
+            self.on_change(changed, values)
+            self.error = None
+        except Exception as e:
+            # The running configuration stays in place; the next change is tried afresh
+            self.error = f"{type(e).__name__}: {e}"
+        self.reloads += 1
+        self.last_reload = time.time()
+        self.last_changed = changed
+
+    def status(self):
+        return {"path": self.path, "mode": self.mode, "reloads": self.reloads, "last_reload": self.last_reload,
+                "last_changed": self.last_changed, "error": self.error}
+
+def apply_settings(values, reloadable, startup, namespace):
+    """
+    Sets each setting named in reloadable (name -> parser) in namespace, a driver's
+    globals(), from the mounted key of the same name, or back to its startup value
+    in startup when the key is absent. Every value is parsed before any is assigned,
+    so a bad value changes nothing. Returns the names changed.
+    """
+    updates = {}
+    for name, parse in reloadable.items():
+        raw = values.get(name)
+        value = startup[name] if raw is None else parse(raw.strip())
+        if value != namespace[name]:
+            updates[name] = value
+    namespace.update(updates)
+    return set(updates)
+
+def interrupt_response(response):
+    """
+    Ends a read blocked on a streaming requests response from another thread, so
+    a reader of a device that stopped sending moves to reloaded settings at once
+    rather than after its read timeout. shutdown() wakes the thread parked in
+    recv(); close() from another thread would not.
+    """
+    sock = getattr(response.raw.connection, "sock", None)
+    if sock is None:
+        # http.client detaches the socket from the connection when the body runs until close
+        sock = getattr(getattr(getattr(response.raw._fp, "fp", None), "raw", None), "_sock", None)
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except (AttributeError, OSError):
+        response.close()
@@ -0,0 +1,140 @@
+"""
+The sampling profiler and stuck-stack watch behind the drivers' opt-in
+/debug/profile and /debug/tasks endpoints.
+"""
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+def debug_denied(token, enabled, expected):
+    """(status, message) when a /debug request must be refused, else None; expected is the DEBUG_TOKEN, if any."""
+    if not enabled:
+        return 404, "Not found"
+    if expected and not hmac.compare_digest(token or "", expected):
+        return 403, "Invalid debug token"
+    return None
+
+def profile_seconds(value, max_seconds):
+    seconds = float(value or "5")
+    if not 0 < seconds <= max_seconds:
+        raise ValueError(f"seconds must be in (0, {max_seconds:g}]")
+    return seconds
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def frame_position(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def thread_cpu_ticks(native_id):
+    """utime + stime of one thread in clock ticks, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/self/task/{native_id}/stat", "rb") as f:
+            fields = f.read().rsplit(b")", 1)[1].split()
+        return int(fields[11]) + int(fields[12])
+    except (OSError, IndexError, ValueError):
+        return None
+
+class SamplingProfiler:
+    """
+    Samples every thread's Python stack hz times a second through
+    sys._current_frames() and folds the samples into collapsed stacks
+    ("thread;outer;inner count" lines, the input of flamegraph.pl and speedscope).
+    In cpu mode a thread is only sampled while its CPU time advances, so idle
+    threads parked in waits do not drown out the busy ones. Nothing runs
+    between profiles and only one profile runs at a time.
+    """
+    def __init__(self, hz):
+        self.hz = hz
+        self.lock = threading.Lock()
+
+    def profile(self, seconds, cpu_only=True):
+        """Blocks for seconds; returns the collapsed stacks, or None if a profile is already running."""
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            me = threading.get_ident()
+            interval = 1.0 / self.hz
+            ticks = {}
+            stacks = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                threads = {t.ident: t for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    thread = threads.get(ident)
+                    if ident == me or thread is None:
+                        continue
+                    if cpu_only:
+                        used = thread_cpu_ticks(thread.native_id)
+                        if used is not None:
+                            last = ticks.get(ident)
+                            ticks[ident] = used
+                            if last is None or used == last:
+                                continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(thread.name)
+                    stacks[";".join(reversed(labels))] += 1
+                time.sleep(interval)
+        finally:
+            self.lock.release()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+class StackWatch:
+    """
+    Polled once a second while debug endpoints are on: remembers when each
+    thread or task was first seen and how long its innermost frame has stayed on
+    the same line; past stuck_seconds /debug/tasks reports it as stuck.
+    """
+    def __init__(self, stuck_seconds):
+        self.stuck_seconds = stuck_seconds
+        self.lock = threading.Lock()
+        self.entries = {}  # key -> [name, first_seen, position, position_since]
+
+    def update(self, current):
+        """current maps key -> (name, position); keys that disappeared are forgotten."""
+        now = time.monotonic()
+        with self.lock:
+            entries = {}
+            for key, (name, position) in current.items():
+                entry = self.entries.get(key)
+                if entry is None:
+                    entry = [name, now, position, now]
+                elif entry[2] != position:
+                    entry[2] = position
+                    entry[3] = now
+                entries[key] = entry
+            self.entries = entries
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            rows = [
+                {"name": name, "where": position, "age_seconds": round(now - first_seen, 3),
+                 "same_line_seconds": round(now - since, 3), "stuck": now - since >= self.stuck_seconds}
+                for name, first_seen, position, since in self.entries.values()
+            ]
+        rows.sort(key=lambda row: row["same_line_seconds"], reverse=True)
+        return rows
+
+def poll_threads():
+    """StackWatch input for every thread of the process."""
+    names = {t.ident: t.name for t in threading.enumerate()}
+    return {ident: (names.get(ident, f"thread-{ident}"), frame_position(frame))
+            for ident, frame in sys._current_frames().items()}
+
+def poll_tasks():
+    """StackWatch input for the asyncio tasks of the running loop."""
+    import asyncio  # Only the asyncio drivers poll tasks; the threaded ones never load it
+    current = {}
+    for task in asyncio.all_tasks():
+        stack = task.get_stack()
+        current[id(task)] = (task.get_name(), frame_position(stack[-1]) if stack else "not started")
+    return current
@@ -0,0 +1,36 @@
+"""
+Fastest available codec: orjson, then msgspec, then the standard library. json_dumps
+always returns UTF-8 bytes so bodies go to the framework without an intermediate str;
+json_loads accepts str or bytes and raises ValueError on bad input like json.loads.
+"""
+import json
+
+try:
+    import orjson
+
+    def json_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    json_loads = orjson.loads
+    JSON_CODEC = "orjson"
+except ImportError:
+    try:
+        import msgspec
+
+        _json_encoder = msgspec.json.Encoder()
+        _json_decoder = msgspec.json.Decoder()
+        json_dumps = _json_encoder.encode
+
+        def json_loads(data):
+            try:
+                return _json_decoder.decode(data)
+            except msgspec.DecodeError as e:
+                raise ValueError(str(e)) from e
+
+        JSON_CODEC = "msgspec"
+    except ImportError:
+        def json_dumps(obj):
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+        json_loads = json.loads
+        JSON_CODEC = "json"
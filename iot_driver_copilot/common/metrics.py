@@ -0,0 +1,107 @@
+"""
+Prometheus metrics for the drivers' /metrics endpoints.
+"""
+import bisect
+import threading
+
+# Histogram bounds in seconds, shared by every latency series
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class Metrics:
+    """
+    Counters, scrape-time gauges and fixed-bucket histograms in the Prometheus text
+    format. Recording is a dict lookup and a bisect under one lock; all formatting
+    is deferred to render(), so the hot path never builds strings. help_text maps
+    metric names to their # HELP line; with enabled false, inc() and observe() do nothing.
+    """
+    def __init__(self, max_clients, help_text=None, enabled=True):
+        self.lock = threading.Lock()
+        self.max_clients = max_clients
+        self.help_text = help_text or {}
+        self.enabled = enabled
+        self.clients = set()
+        self.counters = {}
+        self.histograms = {}  # key -> per-bucket counts, +Inf count, then the sum
+        self.gauges = {}
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(labels.items()))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(labels.items()))
+        with self.lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            series[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            series[-1] += seconds
+
+    def gauge(self, name, fn, **labels):
+        """Registers fn() to be sampled when /metrics is scraped."""
+        self.gauges[(name, tuple(labels.items()))] = fn
+
+    def count_bytes(self, chunks, client):
+        """Wraps a streamed body so bytes sent are counted as they leave, not when the stream ends."""
+        try:
+            for chunk in chunks:
+                self.inc("driver_client_bytes_sent_total", len(chunk), client=client)
+                yield chunk
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    def client_label(self, client):
+        """Client address as a label value; past max_clients distinct clients the rest share "other"."""
+        with self.lock:
+            if client in self.clients or len(self.clients) < self.max_clients:
+                self.clients.add(client)
+                return client
+        return "other"
+
+    @staticmethod
+    def _labels(pairs):
+        if not pairs:
+            return ""
+        return "{" + ",".join(f"{name}=\"{escape_label(value)}\"" for name, value in pairs) + "}"
+
+    def _header(self, lines, name, kind):
+        if name in self.help_text:
+            lines.append(f"# HELP {name} {self.help_text[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def render(self):
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, list(series)) for key, series in self.histograms.items())
+        gauges = sorted((key, fn()) for key, fn in list(self.gauges.items()))
+        lines = []
+        for kind, samples in (("counter", counters), ("gauge", gauges)):
+            last = None
+            for (name, labels), value in samples:
+                if name != last:
+                    self._header(lines, name, kind)
+                    last = name
+                lines.append(f"{name}{self._labels(labels)} {value}")
+        last = None
+        for (name, labels), series in histograms:
+            if name != last:
+                self._header(lines, name, "histogram")
+                last = name
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{name}_bucket{self._labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{self._labels(labels)} {series[-1]}")
+            lines.append(f"{name}_count{self._labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,331 @@
+"""
+/mosaic: several MJPEG cameras composited into one grid, encoded once per tick
+and shared by every client asking for the same cameras, layout and fps.
+
+OpenCV and numpy are imported on first use, so a driver whose clients never ask
+for a mosaic never loads them. Mosaic, MosaicHub and RemoteCamera run on
+threads; an asyncio driver builds its own around MosaicSettings and MosaicCanvas.
+"""
+import math
+import re
+import threading
+import time
+import urllib.request
+
+from .resilience import Backoff
+
+MAX_FRAME_BYTES = 8 * 1024 * 1024
+
+def extract_jpegs(buf):
+    """
+    Pop complete JPEG images (SOI..EOI) out of buf, leaving any partial frame in place.
+    """
+    frames = []
+    while True:
+        start = buf.find(b"\xff\xd8")
+        if start < 0:
+            # Keep a trailing 0xff in case it is the first half of the next SOI marker
+            del buf[:max(0, len(buf) - 1)]
+            return frames
+        end = buf.find(b"\xff\xd9", start + 2)
+        if end < 0:
+            if start:
+                del buf[:start]
+            if len(buf) > MAX_FRAME_BYTES:
+                buf.clear()
+            return frames
+        frames.append(bytes(buf[start:end + 2]))
+        del buf[:end + 2]
+
+def opencv_available():
+    """Imports OpenCV and numpy if that has not happened yet; False when either is not installed."""
+    try:
+        import cv2
+        import numpy
+    except ImportError:
+        return False
+    return cv2 is not None and numpy is not None
+
+def parse_cameras(spec):
+    """MOSAIC_CAMERAS ("name=url,name=url") as {name: url}; malformed entries are skipped."""
+    cameras = {}
+    for entry in spec.split(","):
+        name, sep, url = entry.strip().partition("=")
+        if sep and name.strip() and url.strip():
+            cameras[name.strip()] = url.strip()
+    return cameras
+
+class MosaicSettings:
+    """A driver's MOSAIC_* settings, and the checks /mosaic's query parameters get against them."""
+    def __init__(self, width, height, max_tiles, default_fps, max_fps, quality):
+        self.width = width
+        self.height = height
+        self.max_tiles = max_tiles
+        self.default_fps = default_fps
+        self.max_fps = max_fps
+        self.quality = quality
+
+    def layout(self, value):
+        """"COLSxROWS", e.g. "4x4", as (cols, rows)."""
+        match = re.fullmatch(r"([1-9]\d*)x([1-9]\d*)", value)
+        if match is None:
+            raise ValueError("layout must be COLSxROWS, e.g. 4x4")
+        cols, rows = int(match.group(1)), int(match.group(2))
+        if cols * rows > self.max_tiles:
+            raise ValueError(f"layout has more than {self.max_tiles} tiles")
+        if self.width // cols < 8 or self.height // rows < 8:
+            raise ValueError(f"layout leaves tiles under 8 pixels in a {self.width}x{self.height} grid")
+        return cols, rows
+
+    def grid(self, known, cameras, layout, fps):
+        """(cameras, cols, rows, fps) for /mosaic's query parameters; ValueError says what is wrong."""
+        names = tuple(name.strip() for name in (cameras or "local").split(",") if name.strip())
+        if not names:
+            raise ValueError("cameras is empty")
+        unknown = sorted(set(names) - set(known))
+        if unknown:
+            raise ValueError(f"Unknown camera: {', '.join(unknown)}; known: {', '.join(sorted(known))}")
+        if layout:
+            cols, rows = self.layout(layout)
+        else:
+            cols = math.ceil(math.sqrt(len(names)))
+            cols, rows = self.layout(f"{cols}x{math.ceil(len(names) / cols)}")
+        if len(names) > cols * rows:
+            raise ValueError(f"{len(names)} cameras do not fit a {cols}x{rows} layout")
+        fps = float(fps) if fps else self.default_fps
+        if not fps > 0:
+            raise ValueError("fps must be positive")
+        return names, cols, rows, min(fps, self.max_fps)
+
+    def canvas(self, cols, rows):
+        return MosaicCanvas(cols, rows, self.width, self.height, self.quality)
+
+    def status(self, known, mosaics):
+        """/mosaic/stats for the known camera names and the grids being served, by (cameras, cols, rows, fps)."""
+        grids = [{"cameras": list(names), "layout": f"{cols}x{rows}", "fps": fps,
+                  "viewers": mosaic.viewers, "frames": mosaic.seq}
+                 for (names, cols, rows, fps), mosaic in mosaics.items()]
+        return {"cameras": sorted(known), "size": f"{self.width}x{self.height}", "grids": grids}
+
+class MosaicCanvas:
+    """
+    A preallocated BGR canvas cut into a grid of equal tiles. On each tick only
+    the tiles whose camera has a new frame are decoded, shrunk to fit and copied
+    in, then the whole grid is encoded once. libjpeg decodes at 1/2, 1/4 or 1/8
+    scale when the tile is that much smaller than the camera's picture, and tiles
+    are written by slice assignment through a (rows, cols, height, width) view of
+    the canvas, so the grid is never rebuilt or concatenated.
+    """
+    def __init__(self, cols, rows, width, height, quality):
+        import cv2
+        import numpy
+        self.cols = cols
+        self.tile_w = width // cols
+        self.tile_h = height // rows
+        self.canvas = numpy.zeros((rows * self.tile_h, cols * self.tile_w, 3), numpy.uint8)
+        # tiles[r, c] is the tile at row r, column c; it shares memory with the canvas
+        self.tiles = self.canvas.reshape(rows, self.tile_h, cols, self.tile_w, 3).swapaxes(1, 2)
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        count = cols * rows
+        self.seqs = [None] * count
+        self.scales = [1] * count
+        self.placement = [None] * count
+
+    def _paste(self, index, jpeg):
+        import cv2
+        import numpy
+        tile = self.tiles[divmod(index, self.cols)]
+        scale = self.scales[index]
+        flag = getattr(cv2, f"IMREAD_REDUCED_COLOR_{scale}") if scale > 1 else cv2.IMREAD_COLOR
+        image = cv2.imdecode(numpy.frombuffer(jpeg, numpy.uint8), flag)
+        if image is None:
+            return False
+        height, width = image.shape[:2]
+        # The next frame from this camera decodes at the smallest scale that still covers the tile
+        full_w, full_h = width * scale, height * scale
+        scale = 8
+        while scale > 1 and (full_w // scale < self.tile_w or full_h // scale < self.tile_h):
+            scale //= 2
+        self.scales[index] = scale
+        fit = min(self.tile_w / width, self.tile_h / height)
+        size = (min(self.tile_w, max(1, round(width * fit))), min(self.tile_h, max(1, round(height * fit))))
+        x, y = (self.tile_w - size[0]) // 2, (self.tile_h - size[1]) // 2
+        if self.placement[index] != (x, y, size):
+            tile[:] = 0  # Letterbox bars for a picture whose aspect differs from the tile's
+            self.placement[index] = (x, y, size)
+        tile[y:y + size[1], x:x + size[0]] = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return True
+
+    def compose(self, frames):
+        """
+        frames holds (seq, jpeg) per tile in grid order, jpeg None while a camera has
+        no picture yet. Returns the encoded grid, or None when no tile changed.
+        """
+        import cv2
+        changed = False
+        for index, (seq, jpeg) in enumerate(frames):
+            if seq == self.seqs[index]:
+                continue
+            self.seqs[index] = seq
+            if jpeg is None:
+                self.tiles[divmod(index, self.cols)][:] = 0
+                self.placement[index] = None
+            elif not self._paste(index, jpeg):
+                continue
+            changed = True
+        if not changed:
+            return None
+        ok, jpeg = cv2.imencode(".jpg", self.canvas, self.params)
+        return jpeg.tobytes() if ok else None
+
+class RemoteCamera:
+    """
+    Another camera's MJPEG stream, such as a second driver's /stream or /cam. A
+    process reads it once for every mosaic it serves showing it, and closes it
+    when the last one goes; in a driver running several worker processes, each
+    worker serving such a mosaic opens a connection of its own. Reconnects back
+    off between min_delay and max_delay seconds.
+    """
+    def __init__(self, url, stall_timeout, min_delay, max_delay):
+        self.url = url
+        self.stall_timeout = stall_timeout
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.users = 0
+        self.frame = None
+        self.seq = 0
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def attach(self):
+        with self.lock:
+            self.users += 1
+            self.stop_event.clear()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="mosaic-source", daemon=True)
+                self.thread.start()
+
+    def detach(self):
+        with self.lock:
+            self.users = max(0, self.users - 1)
+            if self.users == 0:
+                self.stop_event.set()
+
+    def latest(self):
+        return self.seq, self.frame
+
+    def _read(self, backoff):
+        with urllib.request.urlopen(self.url, timeout=self.stall_timeout) as response:
+            buf = bytearray()
+            while not self.stop_event.is_set():
+                chunk = response.read1(65536)
+                if not chunk:
+                    return
+                buf.extend(chunk)
+                for jpeg in extract_jpegs(buf):
+                    self.frame = jpeg
+                    self.seq += 1
+                    backoff.reset()
+
+    def _run(self):
+        backoff = Backoff(self.min_delay, self.max_delay)
+        while True:
+            with self.lock:
+                if self.users == 0:
+                    self.thread = None
+                    return
+            try:
+                self._read(backoff)
+            except Exception:
+                pass
+            if not self.stop_event.is_set():
+                self.stop_event.wait(backoff.next_delay())
+
+class Mosaic:
+    """
+    One grid of cameras and the thread that composites it, shared by every client
+    asking for the same cameras, layout and fps.
+    """
+    def __init__(self, key, sources, cols, rows, fps, settings, metrics):
+        self.key = key
+        self.sources = sources
+        self.cols = cols
+        self.rows = rows
+        self.interval = 1.0 / fps
+        self.settings = settings
+        self.metrics = metrics
+        self.cond = threading.Condition()
+        self.frame = None
+        self.seq = 0
+        self.viewers = 0
+        self.stop_event = threading.Event()
+
+    def start(self):
+        for source in self.sources:
+            source.attach()
+        threading.Thread(target=self._run, name="mosaic", daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+        for source in self.sources:
+            source.detach()
+
+    def wait_frame(self, last_seq, timeout):
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != last_seq, timeout)
+            return self.seq, self.frame
+
+    def _run(self):
+        canvas = self.settings.canvas(self.cols, self.rows)
+        tick = time.monotonic()
+        while not self.stop_event.is_set():
+            started = time.perf_counter()
+            jpeg = canvas.compose([source.latest() for source in self.sources])
+            if jpeg is not None:
+                self.metrics.observe("driver_mosaic_compose_duration_seconds", time.perf_counter() - started)
+                self.metrics.inc("driver_frames_total", stage="mosaic")
+                with self.cond:
+                    self.frame = jpeg
+                    self.seq += 1
+                    self.cond.notify_all()
+            tick = max(tick + self.interval, time.monotonic())
+            self.stop_event.wait(tick - time.monotonic())
+
+class MosaicHub:
+    """The cameras a mosaic can show, by name, and the grids currently being served."""
+    def __init__(self, sources, settings, metrics):
+        self.sources = sources
+        self.settings = settings
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.mosaics = {}
+
+    def parse(self, cameras, layout, fps):
+        return self.settings.grid(self.sources, cameras, layout, fps)
+
+    def open(self, names, cols, rows, fps):
+        key = (names, cols, rows, fps)
+        with self.lock:
+            mosaic = self.mosaics.get(key)
+            if mosaic is None:
+                mosaic = self.mosaics[key] = Mosaic(key, [self.sources[name] for name in names], cols, rows, fps,
+                                                    self.settings, self.metrics)
+                mosaic.start()
+            mosaic.viewers += 1
+        return mosaic
+
+    def close(self, mosaic):
+        with self.lock:
+            mosaic.viewers -= 1
+            if mosaic.viewers == 0:
+                del self.mosaics[mosaic.key]
+                mosaic.stop()
+
+    def viewers(self):
+        with self.lock:
+            return sum(mosaic.viewers for mosaic in self.mosaics.values())
+
+    def status(self):
+        with self.lock:
+            return self.settings.status(self.sources, self.mosaics)
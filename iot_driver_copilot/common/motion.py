@@ -0,0 +1,85 @@
+"""
+Motion gate for camera streams: holds back frames in which nothing moved.
+
+numpy and OpenCV are imported on first use, so a driver that leaves the gate
+off never loads them.
+"""
+import time
+
+# BT.601 luma weights scaled by 256, so a BGR pixel's gray level is a dot product and a shift
+LUMA_WEIGHTS = (29, 150, 77)
+
+class MotionGate:
+    """
+    Decides which frames of a stream are worth sending. A frame's downsampled
+    grayscale copy is compared, in one vectorized pass, with the frame captured
+    just before it, and if that falls short, with the last frame sent; the share
+    of pixels that moved by more than pixel_delta is its motion score. The first
+    comparison passes every frame of an object in motion, the second lets slow
+    change add up until it passes. Frames scoring under threshold are suppressed,
+    except that one goes out every keepalive seconds so viewers can tell a static
+    scene from a dead stream.
+    """
+    def __init__(self, threshold, pixel_delta, keepalive):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.keepalive = keepalive
+        self.previous = None
+        self.reference = None
+        self.last_sent = 0.0
+        self.score = None
+        self.passed = 0
+        self.suppressed = 0
+
+    def reset(self):
+        self.previous = None
+        self.reference = None
+
+    def _changed(self, gray, other):
+        import numpy
+        if other is None or other.shape != gray.shape:
+            return 1.0
+        return numpy.count_nonzero(numpy.abs(gray - other) > self.pixel_delta) / gray.size
+
+    def admit(self, gray):
+        """True when the frame behind this thumbnail should be sent."""
+        import numpy
+        now = time.monotonic()
+        gray = gray.astype(numpy.int16)
+        first = self.reference is None
+        score = self._changed(gray, self.previous)
+        if score < self.threshold:
+            score = max(score, self._changed(gray, self.reference))
+        self.previous = gray
+        if not first:
+            self.score = score
+            if score < self.threshold and now - self.last_sent < self.keepalive:
+                self.suppressed += 1
+                return False
+        self.reference = gray
+        self.last_sent = now
+        self.passed += 1
+        return True
+
+    def suppression_ratio(self):
+        total = self.passed + self.suppressed
+        return self.suppressed / total if total else 0.0
+
+    def status(self):
+        return {"threshold": self.threshold, "score": self.score, "passed": self.passed,
+                "suppressed": self.suppressed, "suppressed_ratio": round(self.suppression_ratio(), 4)}
+
+def motion_thumbnail(frame, step):
+    """Grayscale copy of a decoded BGR frame at 1/step scale, by strided sampling."""
+    import numpy
+    small = frame[::step, ::step]
+    return numpy.dot(small, numpy.array(LUMA_WEIGHTS, dtype=numpy.uint16)) >> 8
+
+def jpeg_thumbnail(jpeg):
+    """
+    1/8-scale grayscale decode of a JPEG. libjpeg scales while it decodes, so this
+    skips most of the work of a full decode; None if the image is unreadable.
+    """
+    import cv2
+    import numpy
+    return cv2.imdecode(numpy.frombuffer(jpeg, dtype=numpy.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
@@ -0,0 +1,216 @@
+"""
+Backend protection shared by the proxy drivers: a failure-rate circuit breaker
+that fails fast while the backend is down, and a cap on requests in flight.
+The camera drivers share the reconnect backoff and recovery counters.
+"""
+import math
+import random
+import threading
+import time
+from collections import deque
+
+class BreakerOpen(Exception):
+    def __init__(self, upstream, retry_after):
+        super().__init__(f"Upstream {upstream} is unavailable (circuit open)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Closed: calls flow; once the last window seconds hold at least
+    min_requests calls and the share that failed (error, 5xx or slower
+    than slow_ms) reaches error_rate, the breaker opens.
+    Open: calls are rejected without touching the upstream for open_seconds.
+    Half-open: up to half_open_probes trial calls; all succeeding closes
+    the breaker, any failure opens it again.
+    """
+    def __init__(self, name, window=10, min_requests=20, error_rate=0.5, slow_ms=2000.0,
+                 open_seconds=5.0, half_open_probes=3, enabled=True):
+        self.name = name
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_ms = slow_ms
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.buckets = deque()  # [second, calls, failures]
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.counters = {"calls": 0, "failures": 0, "slow": 0, "rejected": 0, "opened": 0}
+
+    def admit(self):
+        """Returns (allowed, probe, retry_after)."""
+        if not self.enabled:
+            return True, False, 0.0
+        with self.lock:
+            if self.state == "open":
+                waited = time.monotonic() - self.opened_at
+                if waited < self.open_seconds:
+                    self.counters["rejected"] += 1
+                    return False, False, self.open_seconds - waited
+                self.state = "half_open"
+                self.probes_in_flight = 0
+                self.probe_successes = 0
+            if self.state == "half_open":
+                if self.probes_in_flight >= self.half_open_probes:
+                    self.counters["rejected"] += 1
+                    return False, False, 1.0
+                self.probes_in_flight += 1
+                return True, True, 0.0
+            return True, False, 0.0
+
+    def record(self, ok, elapsed, probe=False):
+        if not self.enabled:
+            return
+        slow = elapsed * 1000.0 > self.slow_ms
+        failed = not ok or slow
+        now = time.monotonic()
+        with self.lock:
+            self.counters["calls"] += 1
+            self.counters["failures"] += not ok
+            self.counters["slow"] += slow
+            if probe:
+                if self.state != "half_open":
+                    return
+                self.probes_in_flight -= 1
+                if failed:
+                    self._open(now)
+                else:
+                    self.probe_successes += 1
+                    if self.probe_successes >= self.half_open_probes:
+                        self.state = "closed"
+                        self.buckets.clear()
+                return
+            if self.state != "closed":
+                return
+            second = int(now)
+            if not self.buckets or self.buckets[-1][0] != second:
+                self.buckets.append([second, 0, 0])
+            self.buckets[-1][1] += 1
+            self.buckets[-1][2] += failed
+            while self.buckets and self.buckets[0][0] <= second - self.window:
+                self.buckets.popleft()
+            calls = sum(bucket[1] for bucket in self.buckets)
+            failures = sum(bucket[2] for bucket in self.buckets)
+            if calls >= self.min_requests and failures / calls >= self.error_rate:
+                self._open(now)
+
+    def _open(self, now):
+        self.state = "open"
+        self.opened_at = now
+        self.buckets.clear()
+        self.counters["opened"] += 1
+
+    def snapshot(self):
+        with self.lock:
+            calls = sum(bucket[1] for bucket in self.buckets)
+            failures = sum(bucket[2] for bucket in self.buckets)
+            return dict(
+                self.counters,
+                state=self.state,
+                window_calls=calls,
+                window_failure_rate=failures / calls if calls else 0.0,
+                open_for=max(0.0, self.open_seconds - (time.monotonic() - self.opened_at)) if self.state == "open" else 0.0,
+            )
+
+class AdmissionControl:
+    """Caps requests in flight at limit (0 for no cap); anything over it is shed with 503 rather than queued."""
+    def __init__(self, limit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.peak = 0
+        self.shed = 0
+
+    def try_enter(self):
+        with self.lock:
+            if self.limit > 0 and self.inflight >= self.limit:
+                self.shed += 1
+                return False
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def snapshot(self):
+        with self.lock:
+            return {"max_inflight": self.limit, "inflight": self.inflight, "peak_inflight": self.peak, "shed": self.shed}
+
+class Backoff:
+    """Exponential backoff with jitter between reconnect attempts."""
+    def __init__(self, min_delay, max_delay):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.attempt = 0
+
+    def next_delay(self):
+        ceiling = min(self.max_delay, self.min_delay * (2 ** min(self.attempt, 16)))
+        self.attempt += 1
+        return random.uniform(self.min_delay, max(self.min_delay, ceiling))
+
+    def reset(self):
+        self.attempt = 0
+
+class RecoveryStats:
+    """Reconnect counters and time-to-recover for a capture source."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reconnects = 0
+        self.open_failures = 0
+        self.stalls = 0
+        self.recoveries = 0
+        self.down_since = None
+        self.last_recover_seconds = None
+        self.max_recover_seconds = 0.0
+        self.total_recover_seconds = 0.0
+
+    def record_reconnect(self):
+        with self.lock:
+            self.reconnects += 1
+
+    def record_open_failure(self):
+        with self.lock:
+            self.open_failures += 1
+
+    def record_stall(self):
+        with self.lock:
+            self.stalls += 1
+
+    def mark_down(self):
+        with self.lock:
+            if self.down_since is None:
+                self.down_since = time.monotonic()
+
+    def mark_up(self):
+        with self.lock:
+            if self.down_since is None:
+                return
+            elapsed = time.monotonic() - self.down_since
+            self.down_since = None
+            self.recoveries += 1
+            self.last_recover_seconds = elapsed
+            self.max_recover_seconds = max(self.max_recover_seconds, elapsed)
+            self.total_recover_seconds += elapsed
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "reconnects": self.reconnects,
+                "open_failures": self.open_failures,
+                "stalls": self.stalls,
+                "recoveries": self.recoveries,
+                "down_seconds": (time.monotonic() - self.down_since) if self.down_since is not None else 0.0,
+                "last_recover_seconds": self.last_recover_seconds,
+                "max_recover_seconds": self.max_recover_seconds,
+                "avg_recover_seconds": (self.total_recover_seconds / self.recoveries) if self.recoveries else None,
+            }
+
+def retry_after_header(seconds):
+    return str(max(1, int(math.ceil(seconds))))
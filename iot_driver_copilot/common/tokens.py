@@ -0,0 +1,125 @@
+"""
+Edge token validation for the proxy drivers: tokens seen in login responses are
+remembered until they expire or are logged out, so requests carrying unknown
+tokens are refused without a backend round trip.
+"""
+import fcntl
+import hashlib
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+class TokenCache:
+    """Bounded LRU of issued tokens, each with its own expiry."""
+    def __init__(self, max_size, default_ttl):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def add(self, token, ttl=None):
+        with self.lock:
+            self.entries[token] = time.monotonic() + (ttl or self.default_ttl)
+            self.entries.move_to_end(token)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def valid(self, token):
+        with self.lock:
+            expires = self.entries.get(token)
+            if expires is None:
+                return False
+            if expires <= time.monotonic():
+                del self.entries[token]
+                return False
+            self.entries.move_to_end(token)
+            return True
+
+    def discard(self, token):
+        with self.lock:
+            self.entries.pop(token, None)
+
+def attach_segment(name, size):
+    """The named shared memory segment, created at size bytes by whichever process gets there first."""
+    from multiprocessing import shared_memory
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        try:
+            # The segment outlives whichever worker happened to create it
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+    except FileExistsError:
+        return shared_memory.SharedMemory(name=name)
+
+class SharedTokenCache:
+    """
+    Open-addressing table in a named shared memory segment so every worker process
+    on the host sees the same tokens. Slots hold a 16-byte token digest and a
+    wall-clock expiry; writers serialize on a lock file, readers are lock-free.
+    When a probe window is full the entry closest to expiry is evicted. add and
+    discard block on the lock file, so async callers run them in an executor.
+    """
+    SLOT = struct.Struct("16sd")
+    MAX_PROBE = 32
+
+    def __init__(self, name, max_size, default_ttl):
+        self.default_ttl = default_ttl
+        self.shm = attach_segment(name, max(self.MAX_PROBE, max_size * 2) * self.SLOT.size)
+        self.buf = self.shm.buf
+        self.slots = len(self.buf) // self.SLOT.size
+        self.lock_file = open(f"/tmp/{name}.lock", "a+")
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def _probe(self, digest):
+        start = int.from_bytes(digest[:8], "little") % self.slots
+        for i in range(min(self.MAX_PROBE, self.slots)):
+            yield (start + i) % self.slots * self.SLOT.size
+
+    def add(self, token, ttl=None):
+        digest = self._digest(token)
+        now = time.time()
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            victim, victim_expiry = None, None
+            for offset in self._probe(digest):
+                slot_digest, expiry = self.SLOT.unpack_from(self.buf, offset)
+                if slot_digest == digest or expiry <= now:
+                    victim = offset
+                    break
+                if victim is None or expiry < victim_expiry:
+                    victim, victim_expiry = offset, expiry
+            self.SLOT.pack_into(self.buf, victim, digest, now + (ttl or self.default_ttl))
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _find(self, digest):
+        for offset in self._probe(digest):
+            slot_digest, expiry = self.SLOT.unpack_from(self.buf, offset)
+            if slot_digest == digest:
+                return offset, expiry
+            if expiry == 0.0 and slot_digest == bytes(16):
+                break
+        return None, None
+
+    def valid(self, token):
+        _, expiry = self._find(self._digest(token))
+        return expiry is not None and expiry > time.time()
+
+    def discard(self, token):
+        digest = self._digest(token)
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            offset, _ = self._find(digest)
+            if offset is not None:
+                # Keep the digest as a tombstone so later probe chains stay intact
+                self.SLOT.pack_into(self.buf, offset, digest, -1.0)
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
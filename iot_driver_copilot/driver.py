@@ -1,10 +1,34 @@
 import os
+import sys
+import re
 import uvicorn
-import json
+import time
+import asyncio
+import zlib
+import fcntl
+import signal
+import socket
+import struct
+import hashlib
+import contextvars
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from fastapi import FastAPI, Request, HTTPException, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+
+# Helpers shared by every driver live in iot_driver_copilot/common
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common.jsoncodec import json_dumps, json_loads
+from common.tokens import SharedTokenCache, TokenCache, attach_segment
+from common.resilience import AdmissionControl, BreakerOpen, CircuitBreaker, retry_after_header
+from common.metrics import METRICS_CONTENT_TYPE, Metrics
+from common.debug import SamplingProfiler, StackWatch, debug_denied, poll_tasks, profile_seconds
 
 # Configuration from environment variables
 DEVICE_HOST = os.environ.get("DEVICE_HOST", "localhost")
@@ -14,6 +38,65 @@ SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
 SERVER_PORT = int(os.environ.get("SERVER_PORT", 8080))
 SERVER_USE_HTTPS = os.environ.get("SERVER_USE_HTTPS", "false").lower() == "true"
 
+# Multi-process deployment: WORKERS uvicorn processes share the port via SO_REUSEPORT
+WORKERS = int(os.environ.get("WORKERS", "1"))
+GRACEFUL_TIMEOUT = float(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+
+# Edge token validation and per-client rate limiting. With WORKERS > 1 both are kept in
+# shared memory segments (SHARED_STATE_NAME prefix) so every worker sees the same state.
+TOKEN_CACHE_ENABLED = os.environ.get("TOKEN_CACHE_ENABLED", "true").lower() == "true"
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_TTL = float(os.environ.get("TOKEN_TTL", "3600"))
+RATE_LIMIT_RPS = float(os.environ.get("RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", str(max(1.0, RATE_LIMIT_RPS * 2))))
+RATE_LIMIT_CLIENTS = int(os.environ.get("RATE_LIMIT_CLIENTS", "10000"))
+SHARED_STATE_NAME = os.environ.get("SHARED_STATE_NAME", "")
+
+# Response compression: codings in server preference order and the smallest body worth compressing
+COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_ALGORITHMS = [c.strip() for c in os.environ.get("COMPRESSION_ALGORITHMS", "zstd,br,gzip").split(",") if c.strip()]
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL = int(os.environ.get("COMPRESSION_ZSTD_LEVEL", "3"))
+
+# ?stream=ndjson listings: the backend's cursor paging fields and a cap on pages walked per request
+PAGE_ITEMS_FIELD = os.environ.get("PAGE_ITEMS_FIELD", "items")
+PAGE_CURSOR_FIELD = os.environ.get("PAGE_CURSOR_FIELD", "next_cursor")
+PAGE_CURSOR_PARAM = os.environ.get("PAGE_CURSOR_PARAM", "cursor")
+STREAM_MAX_PAGES = int(os.environ.get("STREAM_MAX_PAGES", "10000"))
+STREAM_PAGE_TIMEOUT = float(os.environ.get("STREAM_PAGE_TIMEOUT", "30"))
+
+# Upstream protection: per-upstream circuit breaker (error rate and slow calls) and an in-flight cap
+UPSTREAM_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", "10"))
+BREAKER_ENABLED = os.environ.get("BREAKER_ENABLED", "true").lower() == "true"
+BREAKER_WINDOW = int(os.environ.get("BREAKER_WINDOW", "10"))
+BREAKER_MIN_REQUESTS = int(os.environ.get("BREAKER_MIN_REQUESTS", "20"))
+BREAKER_ERROR_RATE = float(os.environ.get("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_MS = float(os.environ.get("BREAKER_SLOW_MS", "2000"))
+BREAKER_OPEN_SECONDS = float(os.environ.get("BREAKER_OPEN_SECONDS", "5"))
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get("BREAKER_HALF_OPEN_PROBES", "3"))
+MAX_INFLIGHT = int(os.environ.get("MAX_INFLIGHT", "256"))
+
+# Prometheus /metrics; per-client byte counters stop adding new client labels past METRICS_MAX_CLIENTS.
+# Series are per worker process, so with WORKERS > 1 a scrape reports whichever worker accepted it.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MAX_CLIENTS = int(os.environ.get("METRICS_MAX_CLIENTS", "100"))
+
+# /debug/profile and /debug/tasks are compiled in but answer 404 unless DEBUG_ENDPOINTS=true;
+# with DEBUG_TOKEN set, callers must also send it in the X-Debug-Token header
+DEBUG_ENDPOINTS = os.environ.get("DEBUG_ENDPOINTS", "false").lower() == "true"
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+DEBUG_PROFILE_MAX_SECONDS = float(os.environ.get("DEBUG_PROFILE_MAX_SECONDS", "60"))
+DEBUG_PROFILE_HZ = float(os.environ.get("DEBUG_PROFILE_HZ", "100"))
+DEBUG_STUCK_SECONDS = float(os.environ.get("DEBUG_STUCK_SECONDS", "10"))
+
+# /batch: sub-requests per call, how many run at once per batch, and the shared worker pool size
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "100"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "32"))
+BATCH_ITEM_TIMEOUT = float(os.environ.get("BATCH_ITEM_TIMEOUT", "30"))
+
 # Construct base URL for device
 if DEVICE_PROTOCOL == "http":
     BASE_URL = f"http://{DEVICE_HOST}:{DEVICE_PORT}"
@@ -22,7 +105,15 @@ elif DEVICE_PROTOCOL == "https":
 else:
     raise RuntimeError("Unsupported DEVICE_PROTOCOL. Only http and https are supported.")
 
+# --- JSON Codec ---
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by the fast codec; the default response class for this app."""
+    def render(self, content) -> bytes:
+        return json_dumps(content)
+
 app = FastAPI(
+    default_response_class=FastJSONResponse,
     title="GoSchedule/ChatToChat/Bustub HTTP Proxy Driver",
     description="HTTP driver to proxy backend software service APIs for GoSchedule, ChatToChat, Bustub.",
     version="1.0.0",
@@ -37,39 +128,489 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Token Cache and Rate Limiting ---
+
+class RateLimiter:
+    """Per-client token bucket kept in process memory, bounded to max_clients."""
+    def __init__(self, rate, burst, max_clients):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+    def acquire(self, key):
+        """Take one token; returns 0 when allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0.0
+            if tokens >= 1.0:
+                tokens -= 1.0
+            else:
+                wait = (1.0 - tokens) / self.rate
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+            return wait
+
+class SharedRateLimiter:
+    """
+    Token buckets in a shared memory open-addressing table, so the limit holds
+    across all worker processes rather than per worker. Slots hold a client-key
+    digest, the bucket level and the last refill time; updates take a flock.
+    """
+    SLOT = struct.Struct("16sdd")
+    MAX_PROBE = 32
+
+    def __init__(self, name, rate, burst, max_clients):
+        self.rate = rate
+        self.burst = burst
+        self.shm = attach_segment(name, max(self.MAX_PROBE, max_clients * 2) * self.SLOT.size)
+        self.buf = self.shm.buf
+        self.slots = len(self.buf) // self.SLOT.size
+        self.lock_file = open(f"/tmp/{name}.lock", "a+")
+
+    def acquire(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        now = time.time()
+        start = int.from_bytes(digest[:8], "little") % self.slots
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            target, oldest, oldest_at = None, None, None
+            for i in range(min(self.MAX_PROBE, self.slots)):
+                offset = (start + i) % self.slots * self.SLOT.size
+                slot_digest, tokens, last = self.SLOT.unpack_from(self.buf, offset)
+                if slot_digest == digest:
+                    target = offset
+                    break
+                if slot_digest == bytes(16):
+                    target, tokens, last = offset, self.burst, now
+                    break
+                if oldest is None or last < oldest_at:
+                    oldest, oldest_at = offset, last
+            if target is None:
+                # Probe window full: recycle the least recently seen client's bucket
+                target, tokens, last = oldest, self.burst, now
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0.0
+            if tokens >= 1.0:
+                tokens -= 1.0
+            else:
+                wait = (1.0 - tokens) / self.rate
+            self.SLOT.pack_into(self.buf, target, digest, tokens, now)
+            return wait
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+if not TOKEN_CACHE_ENABLED:
+    token_cache = None
+elif SHARED_STATE_NAME:
+    token_cache = SharedTokenCache(f"{SHARED_STATE_NAME}-tokens", TOKEN_CACHE_SIZE, TOKEN_TTL)
+else:
+    token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_TTL)
+
+if RATE_LIMIT_RPS <= 0:
+    rate_limiter = None
+elif SHARED_STATE_NAME:
+    rate_limiter = SharedRateLimiter(f"{SHARED_STATE_NAME}-ratelimit", RATE_LIMIT_RPS, RATE_LIMIT_BURST, RATE_LIMIT_CLIENTS)
+else:
+    rate_limiter = RateLimiter(RATE_LIMIT_RPS, RATE_LIMIT_BURST, RATE_LIMIT_CLIENTS)
+
+# Routes that need a token the proxy has seen issued
+PROTECTED_PATHS = ("/session/logout", "/schedules", "/posts", "/search", "/chats/", "/batch")
+
+def _bearer_token(authorization: str):
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return authorization.strip()
+
+@app.middleware("http")
+async def edge_guard(request: Request, call_next):
+    authorization = request.headers.get("authorization")
+    if rate_limiter is not None:
+        key = authorization or (request.client.host if request.client else "unknown")
+        wait = rate_limiter.acquire(key)
+        if wait > 0:
+            return FastJSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded"},
+                headers={"Retry-After": str(max(1, int(wait + 0.999)))},
+            )
+    if token_cache is not None and request.url.path.startswith(PROTECTED_PATHS):
+        # Unknown or expired tokens are rejected here without a backend round trip
+        if not authorization or not token_cache.valid(_bearer_token(authorization)):
+            return FastJSONResponse(status_code=401, content={"detail": "Invalid or expired token"})
+    return await call_next(request)
+
+# --- Response Compression ---
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODINGS = [c for c in COMPRESSION_ALGORITHMS
+           if c == "gzip" or (c == "br" and brotli is not None) or (c == "zstd" and zstandard is not None)]
+
+def parse_accept_encoding(header):
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+def accepts_encoding(header, coding):
+    accepted = parse_accept_encoding(header)
+    return accepted.get(coding, accepted.get("*", 0.0)) > 0
+
+def negotiate_encoding(header):
+    # Highest client q-value wins; server preference order breaks ties
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for coding in CODINGS:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+def is_compressible(content_type):
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    return (content_type.startswith("text/") or content_type.endswith(("+json", "+xml"))
+            or content_type in ("application/json", "application/x-ndjson", "application/javascript", "application/xml"))
+
+class StreamCompressor:
+    """Incremental encoder for one response body; flush=True emits everything fed so far."""
+    def __init__(self, coding):
+        self.coding = coding
+        if coding == "gzip":
+            self.obj = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif coding == "br":
+            self.obj = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self.obj = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data, flush=False):
+        if self.coding == "gzip":
+            out = self.obj.compress(data)
+            return out + self.obj.flush(zlib.Z_SYNC_FLUSH) if flush else out
+        if self.coding == "br":
+            out = self.obj.process(data)
+            return out + self.obj.flush() if flush else out
+        out = self.obj.compress(data)
+        return out + self.obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else out
+
+    def finish(self):
+        if self.coding == "br":
+            return self.obj.finish()
+        return self.obj.flush()
+
+class CompressionStats:
+    """Per-route response counters, bytes before/after compression and CPU spent compressing."""
+    FIELDS = ("responses", "compressed", "passthrough", "below_threshold", "bytes_in", "bytes_out", "cpu_seconds")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def add(self, route, **counts):
+        with self.lock:
+            entry = self.routes.get(route)
+            if entry is None:
+                entry = self.routes[route] = dict.fromkeys(self.FIELDS, 0)
+            for name, value in counts.items():
+                entry[name] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                route: dict(entry, bytes_saved=entry["bytes_in"] - entry["bytes_out"])
+                for route, entry in self.routes.items()
+            }
+
+compression_stats = CompressionStats()
+
+def compress_body(route, data, coding):
+    started = time.thread_time()
+    compressor = StreamCompressor(coding)
+    out = compressor.compress(data) + compressor.finish()
+    compression_stats.add(route, responses=1, compressed=1, bytes_in=len(data), bytes_out=len(out),
+                          cpu_seconds=time.thread_time() - started)
+    return out
+
+async def compress_body_iterator(route, body_iterator, coding, buffered):
+    if buffered:
+        # Whole body known up front: one pass off the event loop gives the best ratio
+        data = b"".join([chunk async for chunk in body_iterator])
+        yield await run_in_threadpool(compress_body, route, data, coding)
+        return
+    # Streamed body: each chunk is flushed so items reach the client as soon as they are produced
+    compressor = StreamCompressor(coding)
+    bytes_in = bytes_out = 0
+    cpu = 0.0
+    try:
+        async for chunk in body_iterator:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            started = time.thread_time()
+            out = compressor.compress(chunk, flush=True)
+            cpu += time.thread_time() - started
+            bytes_in += len(chunk)
+            bytes_out += len(out)
+            if out:
+                yield out
+        out = compressor.finish()
+        bytes_out += len(out)
+        yield out
+    finally:
+        compression_stats.add(route, responses=1, compressed=1, bytes_in=bytes_in, bytes_out=bytes_out, cpu_seconds=cpu)
+
+# Client Accept-Encoding for the request being handled, so backend calls can ask for the same codings
+_client_encoding = contextvars.ContextVar("client_encoding", default="")
+
+@app.middleware("http")
+async def compress_response(request: Request, call_next):
+    client_encoding = request.headers.get("accept-encoding", "")
+    _client_encoding.set(client_encoding)
+    response = await call_next(request)
+    if not COMPRESSION_ENABLED:
+        return response
+    route = getattr(request.scope.get("route"), "path", request.url.path)
+    length = response.headers.get("content-length")
+    if "content-encoding" in response.headers:
+        compression_stats.add(route, responses=1, passthrough=1, bytes_out=int(length or 0))
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304) or not is_compressible(response.headers.get("content-type")):
+        return response
+    coding = negotiate_encoding(client_encoding)
+    if coding is None:
+        return response
+    if length is not None and int(length) < COMPRESSION_MIN_BYTES:
+        compression_stats.add(route, responses=1, below_threshold=1, bytes_in=int(length), bytes_out=int(length))
+        return response
+    response.body_iterator = compress_body_iterator(route, response.body_iterator, coding, length is not None)
+    if length is not None:
+        del response.headers["content-length"]
+    response.headers["Content-Encoding"] = coding
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+@app.get("/compression/stats")
+async def compression_stats_view():
+    return {"enabled": COMPRESSION_ENABLED, "codings": CODINGS, "min_bytes": COMPRESSION_MIN_BYTES,
+            "routes": compression_stats.snapshot()}
+
+# --- Circuit Breaker and Admission Control ---
+
+backend_breaker = CircuitBreaker(
+    "backend", window=BREAKER_WINDOW, min_requests=BREAKER_MIN_REQUESTS, error_rate=BREAKER_ERROR_RATE,
+    slow_ms=BREAKER_SLOW_MS, open_seconds=BREAKER_OPEN_SECONDS, half_open_probes=BREAKER_HALF_OPEN_PROBES,
+    enabled=BREAKER_ENABLED)
+# Per worker process: each uvicorn worker caps its own in-flight requests
+admission = AdmissionControl(MAX_INFLIGHT)
+# Operator endpoints stay reachable while the driver is shedding load
+ADMISSION_EXEMPT = ("/upstream/status", "/compression/stats", "/metrics", "/debug/profile", "/debug/tasks")
+
+def _backend_request(method, url, session=None, **kwargs):
+    """requests.request() behind the backend breaker; raises BreakerOpen instead of calling a failing backend."""
+    allowed, probe, retry_after = backend_breaker.admit()
+    if not allowed:
+        raise BreakerOpen(backend_breaker.name, retry_after)
+    kwargs.setdefault("timeout", UPSTREAM_TIMEOUT)
+    started = time.monotonic()
+    try:
+        resp = (session or requests).request(method, url, **kwargs)
+    except requests.RequestException:
+        elapsed = time.monotonic() - started
+        backend_breaker.record(False, elapsed, probe)
+        metrics.observe("driver_upstream_request_duration_seconds", elapsed, upstream=backend_breaker.name, outcome="error")
+        raise
+    elapsed = time.monotonic() - started
+    backend_breaker.record(resp.status_code < 500, elapsed, probe)
+    metrics.observe("driver_upstream_request_duration_seconds", elapsed, upstream=backend_breaker.name,
+                    outcome="ok" if resp.status_code < 500 else "5xx")
+    return resp
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    if request.url.path in ADMISSION_EXEMPT:
+        return await call_next(request)
+    if not admission.try_enter():
+        return FastJSONResponse(status_code=503, content={"detail": "Server overloaded"}, headers={"Retry-After": "1"})
+    try:
+        return await call_next(request)
+    finally:
+        admission.leave()
+
+@app.exception_handler(BreakerOpen)
+async def breaker_open(request: Request, exc: BreakerOpen):
+    return FastJSONResponse(status_code=503, content={"detail": str(exc)},
+                            headers={"Retry-After": retry_after_header(exc.retry_after)})
+
+@app.get("/upstream/status")
+async def upstream_status():
+    return {"admission": admission.snapshot(), "breakers": {backend_breaker.name: backend_breaker.snapshot()}}
+
+# --- Metrics ---
+
+METRIC_HELP = {
+    "driver_http_request_duration_seconds": "Time from request arrival until the response headers were ready.",
+    "driver_upstream_request_duration_seconds": "Backend call latency to response headers, by outcome.",
+    "driver_client_bytes_sent_total": "Response body bytes sent, by client address.",
+    "driver_inflight_requests": "Requests currently admitted by this worker.",
+}
+
+metrics = Metrics(METRICS_MAX_CLIENTS, METRIC_HELP, enabled=METRICS_ENABLED)
+metrics.gauge("driver_inflight_requests", lambda: admission.inflight)
+
+async def _count_bytes(body_iterator, client):
+    async for chunk in body_iterator:
+        metrics.inc("driver_client_bytes_sent_total", len(chunk), client=client)
+        yield chunk
+
+# Defined after every other middleware so it is the outermost one and times the whole stack
+@app.middleware("http")
+async def record_request(request: Request, call_next):
+    if not METRICS_ENABLED:
+        return await call_next(request)
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.observe("driver_http_request_duration_seconds", time.perf_counter() - started,
+                    route=route, method=request.method, status=str(response.status_code))
+    client = metrics.client_label(request.client.host if request.client else "unknown")
+    response.body_iterator = _count_bytes(response.body_iterator, client)
+    return response
+
+@app.get("/metrics")
+async def metrics_view():
+    if not METRICS_ENABLED:
+        return FastJSONResponse(status_code=404, content={"detail": "Metrics are disabled"})
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+# --- Debug Endpoints ---
+
+profiler = SamplingProfiler(DEBUG_PROFILE_HZ)
+stack_watch = StackWatch(DEBUG_STUCK_SECONDS)
+
+# Event loop lag seen by the watchdog: how late its one-second sleep woke up
+loop_lag = {"last_seconds": 0.0, "max_seconds": 0.0}
+
+async def debug_watchdog():
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(1.0)
+        lag = time.monotonic() - started - 1.0
+        loop_lag["last_seconds"] = round(lag, 4)
+        loop_lag["max_seconds"] = round(max(loop_lag["max_seconds"], lag), 4)
+        stack_watch.update(poll_tasks())
+
+@app.on_event("startup")
+async def start_debug_watchdog():
+    if DEBUG_ENDPOINTS:
+        app.state.debug_watchdog = asyncio.create_task(debug_watchdog())
+
+@app.get("/debug/profile")
+async def debug_profile(request: Request, seconds: str = None, mode: str = "cpu"):
+    denied = debug_denied(request.headers.get("x-debug-token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return FastJSONResponse(status_code=denied[0], content={"detail": denied[1]})
+    try:
+        duration = profile_seconds(seconds, DEBUG_PROFILE_MAX_SECONDS)
+    except ValueError as e:
+        return FastJSONResponse(status_code=400, content={"detail": str(e)})
+    # Sampled from a pool thread so the event loop keeps serving (and shows up in the profile)
+    stacks = await run_in_threadpool(profiler.profile, duration, mode != "wall")
+    if stacks is None:
+        return FastJSONResponse(status_code=409, content={"detail": "A profile is already running"})
+    return Response(stacks, media_type="text/plain; charset=utf-8",
+                    headers={"Content-Disposition": "attachment; filename=profile.collapsed"})
+
+@app.get("/debug/tasks")
+async def debug_tasks(request: Request):
+    denied = debug_denied(request.headers.get("x-debug-token"), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+    if denied:
+        return FastJSONResponse(status_code=denied[0], content={"detail": denied[1]})
+    return {"stuck_after_seconds": DEBUG_STUCK_SECONDS, "loop_lag": loop_lag, "tasks": stack_watch.snapshot()}
+
+# --- REST API Proxy Endpoints ---
+
 def _api_headers(token: str = None, extra: dict = None):
-    headers = {"Content-Type": "application/json"}
+    headers = {"Content-Type": "application/json", "Accept-Encoding": _client_encoding.get() or "identity"}
     if token:
         headers["Authorization"] = f"Bearer {token}"
     if extra:
         headers.update(extra)
     return headers
 
-def _handle_response(resp):
+def _handle_response(resp, passthrough=True):
+    encoding = resp.headers.get("Content-Encoding", "identity").lower()
+    if passthrough and encoding != "identity" and accepts_encoding(_client_encoding.get(), encoding):
+        # Compressed by the backend in a coding the client accepts: relay the bytes untouched
+        return Response(
+            content=resp.raw.read(decode_content=False),
+            status_code=resp.status_code,
+            media_type=resp.headers.get("Content-Type"),
+            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+        )
+    body = resp.content
+    if "json" in resp.headers.get("Content-Type", ""):
+        # Already JSON: hand the backend's bytes straight through instead of parsing and re-encoding
+        return Response(content=body, status_code=resp.status_code, media_type="application/json")
     try:
-        content = resp.json()
-    except Exception:
+        content = json_loads(body)
+    except ValueError:
         content = resp.text
-    return JSONResponse(status_code=resp.status_code, content=content)
+    return FastJSONResponse(status_code=resp.status_code, content=content)
 
 @app.post("/session/login")
 async def session_login(request: Request):
-    data = await request.json()
+    data = await request.body()
     url = f"{BASE_URL}/session/login"
     try:
-        resp = requests.post(url, json=data, timeout=10)
-        return _handle_response(resp)
-    except Exception as e:
+        resp = _backend_request("POST", url, data=data, headers={"Content-Type": "application/json"})
+    except requests.RequestException as e:
         raise HTTPException(status_code=502, detail=str(e))
+    if token_cache is not None and resp.status_code == 200:
+        _remember_login(resp)
+    return _handle_response(resp, passthrough=False)
+
+def _remember_login(resp):
+    try:
+        data = json_loads(resp.content)
+    except ValueError:
+        return
+    token = data.get("token") or data.get("session_token") if isinstance(data, dict) else None
+    if token:
+        ttl = data.get("expires_in")
+        token_cache.add(token, float(ttl) if isinstance(ttl, (int, float)) and ttl > 0 else None)
 
 @app.post("/session/logout")
 async def session_logout(authorization: str = Header(None)):
     url = f"{BASE_URL}/session/logout"
     headers = _api_headers(token=authorization.replace("Bearer ", "") if authorization else None)
+    if token_cache is not None and authorization:
+        token_cache.discard(_bearer_token(authorization))
     try:
-        resp = requests.post(url, headers=headers, timeout=10)
+        resp = _backend_request("POST", url, headers=headers, stream=True)
         return _handle_response(resp)
-    except Exception as e:
+    except requests.RequestException as e:
         raise HTTPException(status_code=502, detail=str(e))
 
 @app.get("/schedules")
@@ -77,57 +618,61 @@ async def get_schedules(authorization: str = Header(None)):
     url = f"{BASE_URL}/schedules"
     headers = _api_headers(token=authorization.replace("Bearer ", "") if authorization else None)
     try:
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = _backend_request("GET", url, headers=headers, stream=True)
         return _handle_response(resp)
-    except Exception as e:
+    except requests.RequestException as e:
         raise HTTPException(status_code=502, detail=str(e))
 
 @app.post("/schedules")
 async def create_schedule(request: Request, authorization: str = Header(None)):
-    data = await request.json()
+    data = await request.body()
     url = f"{BASE_URL}/schedules"
     headers = _api_headers(token=authorization.replace("Bearer ", "") if authorization else None)
     try:
-        resp = requests.post(url, headers=headers, json=data, timeout=10)
+        resp = _backend_request("POST", url, headers=headers, data=data, stream=True)
         return _handle_response(resp)
-    except Exception as e:
+    except requests.RequestException as e:
         raise HTTPException(status_code=502, detail=str(e))
 
 @app.get("/posts")
 async def get_posts(request: Request, authorization: str = Header(None)):
+    if request.query_params.get("stream") == "ndjson":
+        return await _stream_listing("/posts", request, authorization)
     query_string = request.url.query
     url = f"{BASE_URL}/posts"
     if query_string:
         url += f"?{query_string}"
     headers = _api_headers(token=authorization.replace("Bearer ", "") if authorization else None)
     try:
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = _backend_request("GET", url, headers=headers, stream=True)
         return _handle_response(resp)
-    except Exception as e:
+    except requests.RequestException as e:
         raise HTTPException(status_code=502, detail=str(e))
 
 @app.post("/posts")
 async def create_post(request: Request, authorization: str = Header(None)):
-    data = await request.json()
+    data = await request.body()
     url = f"{BASE_URL}/posts"
     headers = _api_headers(token=authorization.replace("Bearer ", "") if authorization else None)
     try:
-        resp = requests.post(url, headers=headers, json=data, timeout=10)
+        resp = _backend_request("POST", url, headers=headers, data=data, stream=True)
         return _handle_response(resp)
-    except Exception as e:
+    except requests.RequestException as e:
         raise HTTPException(status_code=502, detail=str(e))
 
 @app.get("/search")
 async def search(request: Request, authorization: str = Header(None)):
+    if request.query_params.get("stream") == "ndjson":
+        return await _stream_listing("/search", request, authorization)
     query_string = request.url.query
     url = f"{BASE_URL}/search"
     if query_string:
         url += f"?{query_string}"
     headers = _api_headers(token=authorization.replace("Bearer ", "") if authorization else None)
     try:
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = _backend_request("GET", url, headers=headers, stream=True)
         return _handle_response(resp)
-    except Exception as e:
+    except requests.RequestException as e:
         raise HTTPException(status_code=502, detail=str(e))
 
 @app.get("/chats/{chat_id}/messages")
@@ -135,28 +680,247 @@ async def get_chat_messages(chat_id: str, authorization: str = Header(None)):
     url = f"{BASE_URL}/chats/{chat_id}/messages"
     headers = _api_headers(token=authorization.replace("Bearer ", "") if authorization else None)
     try:
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = _backend_request("GET", url, headers=headers, stream=True)
         return _handle_response(resp)
-    except Exception as e:
+    except requests.RequestException as e:
         raise HTTPException(status_code=502, detail=str(e))
 
 @app.post("/chats/{chat_id}/messages")
 async def post_chat_message(chat_id: str, request: Request, authorization: str = Header(None)):
-    data = await request.json()
+    data = await request.body()
     url = f"{BASE_URL}/chats/{chat_id}/messages"
     headers = _api_headers(token=authorization.replace("Bearer ", "") if authorization else None)
     try:
-        resp = requests.post(url, headers=headers, json=data, timeout=10)
+        resp = _backend_request("POST", url, headers=headers, data=data, stream=True)
         return _handle_response(resp)
-    except Exception as e:
+    except requests.RequestException as e:
         raise HTTPException(status_code=502, detail=str(e))
 
-if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
+# --- Request Batching ---
+
+# Sub-request targets /batch accepts: the proxied REST API and nothing else
+BATCH_PATH = re.compile(r"^/(schedules|posts|search|chats/[\w-]+/messages)(\?[^#]*)?$")
+
+# Keep-alive connections to the backend shared by /batch and streamed listings
+batch_session = requests.Session()
+batch_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=BATCH_WORKERS))
+batch_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=BATCH_WORKERS))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+
+def _batch_items(payload):
+    items = payload.get("requests") if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError("Expected a list of {method, path, body} objects")
+    return items
+
+def _run_batch_item(item, authorization):
+    method = str(item.get("method", "GET")).upper()
+    path = item.get("path")
+    if method not in ("GET", "POST") or not isinstance(path, str) or not BATCH_PATH.match(path):
+        return 400, {"detail": "Unsupported sub-request"}
+    try:
+        resp = _backend_request(
+            method,
+            f"{BASE_URL}{path}",
+            session=batch_session,
+            headers=_api_headers(token=_bearer_token(authorization), extra={"Accept-Encoding": "gzip, deflate"}),
+            data=json_dumps(item.get("body")) if method == "POST" else None,
+            timeout=BATCH_ITEM_TIMEOUT,
+        )
+    except BreakerOpen as e:
+        return 503, {"detail": str(e)}
+    except requests.RequestException as e:
+        return 502, {"detail": str(e)}
+    try:
+        return resp.status_code, json_loads(resp.content)
+    except ValueError:
+        return resp.status_code, resp.text
+
+def _stream_batch(items, authorization):
+    # At most BATCH_CONCURRENCY items of this batch in flight; results leave in request order
+    pending = deque()
+    next_index = 0
+    while pending or next_index < len(items):
+        while next_index < len(items) and len(pending) < BATCH_CONCURRENCY:
+            pending.append(batch_executor.submit(_run_batch_item, items[next_index], authorization))
+            next_index += 1
+        index = next_index - len(pending)
+        status, body = pending.popleft().result()
+        yield json_dumps({"index": index, "status": status, "body": body}) + b"\n"
+
+@app.post("/batch")
+async def batch(request: Request, authorization: str = Header(None)):
+    try:
+        items = _batch_items(json_loads(await request.body()))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} sub-requests per batch")
+    # Starlette iterates the sync generator in its threadpool, so waiting on results never blocks the loop
+    return StreamingResponse(_stream_batch(items, authorization or ""), media_type="application/x-ndjson")
+
+# --- NDJSON Streaming Pagination ---
+
+def _fetch_page(path, params, authorization):
+    """GET one backend page; returns (status, items, next_cursor), or (status, error_detail, None) on failure."""
+    try:
+        resp = _backend_request(
+            "GET",
+            f"{BASE_URL}{path}",
+            session=batch_session,
+            params=params,
+            headers=_api_headers(token=_bearer_token(authorization), extra={"Accept-Encoding": "gzip, deflate"}),
+            timeout=STREAM_PAGE_TIMEOUT,
+        )
+    except BreakerOpen as e:
+        return 503, str(e), None
+    except requests.RequestException as e:
+        return 502, str(e), None
+    try:
+        page = json_loads(resp.content)
+    except ValueError:
+        page = resp.text
+    if resp.status_code != 200:
+        return resp.status_code, page, None
+    if not isinstance(page, dict) or not isinstance(page.get(PAGE_ITEMS_FIELD), list):
+        return 502, f"Backend page has no '{PAGE_ITEMS_FIELD}' list", None
+    return 200, page[PAGE_ITEMS_FIELD], page.get(PAGE_CURSOR_FIELD)
+
+def _stream_pages(path, params, authorization, items, cursor):
+    # Page N+1 is fetched on the pool while page N's items are written out, so at most two pages are held
+    pages = 1
+    while True:
+        future = None
+        if cursor is not None and pages < STREAM_MAX_PAGES:
+            future = batch_executor.submit(_fetch_page, path, dict(params, **{PAGE_CURSOR_PARAM: cursor}), authorization)
+        if items:
+            yield b"".join(json_dumps(item) + b"\n" for item in items)
+        if future is None:
+            return
+        status, items, cursor = future.result()
+        pages += 1
+        if status != 200:
+            # Headers are long gone; report the failure in-band as the last line
+            yield json_dumps({"detail": "Backend page request failed", "status": status}) + b"\n"
+            return
+
+async def _stream_listing(path, request: Request, authorization: str):
+    params = {name: value for name, value in request.query_params.items() if name != "stream"}
+    status, items, cursor = await run_in_threadpool(_fetch_page, path, params, authorization or "")
+    if status != 200:
+        raise HTTPException(status_code=status, detail=items)
+    return StreamingResponse(_stream_pages(path, params, authorization or "", items, cursor),
+                             media_type="application/x-ndjson")
+
+# --- Server Launch ---
+
+def _reuseport_socket(host, port):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Every worker binds its own listener; the kernel balances connections between them
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def _uvicorn_config():
+    return uvicorn.Config(
+        app,
         host=SERVER_HOST,
         port=SERVER_PORT,
         reload=False,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
         ssl_keyfile=os.environ.get("SSL_KEYFILE") if SERVER_USE_HTTPS else None,
         ssl_certfile=os.environ.get("SSL_CERTFILE") if SERVER_USE_HTTPS else None,
-    )
\ No newline at end of file
+    )
+
+def serve_worker(ready):
+    # SIGHUP is for the supervisor's rolling restart, not for workers
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    sock = _reuseport_socket(SERVER_HOST, SERVER_PORT)
+    ready.set()
+    uvicorn.Server(_uvicorn_config()).run(sockets=[sock])
+
+class WorkerSupervisor:
+    """
+    Runs WORKERS uvicorn processes on one SO_REUSEPORT port, respawns any that die
+    and does a rolling restart on SIGHUP: each replacement worker is listening
+    before its predecessor gets SIGTERM and drains in-flight requests, so the
+    port never stops accepting. Workers are spawned fresh, so a rolling restart
+    also picks up code and environment changes.
+    """
+    def __init__(self, count):
+        self.count = count
+        self.ctx = multiprocessing.get_context("spawn")
+        self.workers = []
+        self.stopping = False
+        self.restart_requested = False
+
+    def _spawn(self):
+        ready = self.ctx.Event()
+        proc = self.ctx.Process(target=serve_worker, args=(ready,))
+        proc.start()
+        ready.wait(30)
+        return proc
+
+    def _retire(self, proc):
+        proc.terminate()
+        proc.join(GRACEFUL_TIMEOUT + 5)
+        if proc.is_alive():
+            proc.kill()
+            proc.join()
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_hup(self, signum, frame):
+        self.restart_requested = True
+
+    def rolling_restart(self):
+        for i, old in enumerate(list(self.workers)):
+            self.workers[i] = self._spawn()
+            self._retire(old)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_hup)
+        self.workers = [self._spawn() for _ in range(self.count)]
+        print(f"Serving on {SERVER_HOST}:{SERVER_PORT} with {self.count} workers (SIGHUP for rolling restart)")
+        try:
+            while not self.stopping:
+                time.sleep(0.5)
+                if self.restart_requested:
+                    self.restart_requested = False
+                    self.rolling_restart()
+                for i, proc in enumerate(self.workers):
+                    if not proc.is_alive() and not self.stopping:
+                        self.workers[i] = self._spawn()
+        finally:
+            for proc in self.workers:
+                proc.terminate()
+            for proc in self.workers:
+                self._retire(proc)
+            _unlink_shared_state()
+
+def _unlink_shared_state():
+    from multiprocessing import shared_memory
+    for suffix in ("tokens", "ratelimit"):
+        try:
+            shm = shared_memory.SharedMemory(name=f"{SHARED_STATE_NAME}-{suffix}")
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+if __name__ == "__main__":
+    if WORKERS > 1:
+        if not SHARED_STATE_NAME:
+            # Spawned workers inherit this and attach the same shared memory segments
+            SHARED_STATE_NAME = f"goschedule-proxy-{os.getpid()}"
+            os.environ["SHARED_STATE_NAME"] = SHARED_STATE_NAME
+        WorkerSupervisor(WORKERS).run()
+    else:
+        uvicorn.Server(_uvicorn_config()).run()
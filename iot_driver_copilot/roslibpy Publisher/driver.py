@@ -1,10 +1,18 @@
 import os
+import sys
+import importlib
+import time
 import base64
 import json
+import threading
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from urllib.parse import urlparse, parse_qs
 
-import roslibpy
+# Helpers shared by every driver live in iot_driver_copilot/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.jsoncodec import json_dumps, json_loads
+from common.metrics import METRICS_CONTENT_TYPE, Metrics
+from common.debug import SamplingProfiler, StackWatch, debug_denied, poll_threads, profile_seconds
 
 # Configuration from environment variables
 ROSBRIDGE_HOST = os.environ.get('ROSBRIDGE_HOST', 'localhost')
@@ -14,16 +22,122 @@ HTTP_SERVER_PORT = int(os.environ.get('HTTP_SERVER_PORT', '8080'))
 ROS_IMAGE_TOPIC = os.environ.get('ROS_IMAGE_TOPIC', '/david')
 ROS_IMAGE_TYPE = os.environ.get('ROS_IMAGE_TYPE', 'sensor_msgs/Image')
 
+# How long POST /pubimg waits for roslibpy to finish importing before answering 503
+DEPENDENCY_TIMEOUT = float(os.environ.get('DEPENDENCY_TIMEOUT', '30'))
+
+# Prometheus /metrics; per-client byte counters stop adding new client labels past METRICS_MAX_CLIENTS
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_MAX_CLIENTS = int(os.environ.get('METRICS_MAX_CLIENTS', '100'))
+
+# /debug/profile and /debug/tasks are compiled in but answer 404 unless DEBUG_ENDPOINTS=true;
+# with DEBUG_TOKEN set, callers must also send it in the X-Debug-Token header
+DEBUG_ENDPOINTS = os.environ.get('DEBUG_ENDPOINTS', 'false').lower() == 'true'
+DEBUG_TOKEN = os.environ.get('DEBUG_TOKEN', '')
+DEBUG_PROFILE_MAX_SECONDS = float(os.environ.get('DEBUG_PROFILE_MAX_SECONDS', '60'))
+DEBUG_PROFILE_HZ = float(os.environ.get('DEBUG_PROFILE_HZ', '100'))
+DEBUG_STUCK_SECONDS = float(os.environ.get('DEBUG_STUCK_SECONDS', '10'))
+
+# --- Deferred Imports ---
+
+
+class DependencyLoader:
+    """
+    Imports heavy modules once, in a background thread, into this module's globals.
+    Loading starts after the HTTP listener is bound, so the driver accepts
+    connections straight away and /readyz answers 503 until every module imported.
+    """
+    def __init__(self, names):
+        self.names = names
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.started = False
+        self.error = None
+        self.seconds = None
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._load, name='dependency-loader', daemon=True).start()
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            for name in self.names:
+                globals()[name] = importlib.import_module(name)
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+        self.seconds = round(time.perf_counter() - started, 3)
+        self.done.set()
+
+    def ready(self):
+        return self.done.is_set() and self.error is None
+
+    def wait(self, timeout=None):
+        """Starts loading if it has not begun and waits up to DEPENDENCY_TIMEOUT; True once ready."""
+        self.start()
+        self.done.wait(DEPENDENCY_TIMEOUT if timeout is None else timeout)
+        return self.ready()
+
+    def status(self):
+        if self.error:
+            state = 'failed'
+        elif self.done.is_set():
+            state = 'ready'
+        else:
+            state = 'loading' if self.started else 'pending'
+        return {'ready': self.ready(), 'state': state, 'modules': self.names,
+                'import_seconds': self.seconds, 'error': self.error}
+
+# roslibpy pulls in twisted and autobahn; set by the loader once imported
+roslibpy = None
+dependencies = DependencyLoader(['roslibpy'])
+
+
+# --- Metrics ---
+
+METRIC_HELP = {
+    'driver_http_request_duration_seconds': 'Time from request arrival until the response headers were sent.',
+    'driver_upstream_request_duration_seconds': 'rosbridge publish latency, including the first connect, by outcome.',
+    'driver_client_bytes_sent_total': 'Response body bytes sent, by client address.',
+}
+
+
+metrics = Metrics(METRICS_MAX_CLIENTS, METRIC_HELP, enabled=METRICS_ENABLED)
+
+
+# --- Debug Endpoints ---
+
+profiler = SamplingProfiler(DEBUG_PROFILE_HZ)
+stack_watch = StackWatch(DEBUG_STUCK_SECONDS)
+
+
+def debug_watchdog():
+    while True:
+        stack_watch.update(poll_threads())
+        time.sleep(1.0)
+
+
+if DEBUG_ENDPOINTS:
+    threading.Thread(target=debug_watchdog, name='debug-watchdog', daemon=True).start()
+
 
 class RosPublisher:
     def __init__(self, host, port, topic, msg_type):
-        self.client = roslibpy.Ros(host=host, port=port)
+        self.host = host
+        self.port = port
+        self.client = None
         self.topic_name = topic
         self.msg_type = msg_type
-        self.topic = roslibpy.Topic(self.client, self.topic_name, self.msg_type)
+        self.topic = None
         self._connected = False
 
     def connect(self):
+        if self.client is None:
+            # Built on first use: roslibpy is imported in the background after the listener is up
+            self.client = roslibpy.Ros(host=self.host, port=self.port)
+            self.topic = roslibpy.Topic(self.client, self.topic_name, self.msg_type)
         if not self._connected:
             self.client.run()
             self._connected = True
@@ -46,53 +160,126 @@ ros_publisher = RosPublisher(
 
 
 class Handler(BaseHTTPRequestHandler):
+    routes = ('/pubimg', '/readyz', '/metrics', '/debug/profile', '/debug/tasks')
+
+    def parse_request(self):
+        self.started = time.perf_counter()
+        return super().parse_request()
+
+    def send_response(self, code, message=None):
+        super().send_response(code, message)
+        if METRICS_ENABLED and self.command:
+            path = urlparse(self.path).path
+            metrics.observe('driver_http_request_duration_seconds', time.perf_counter() - self.started,
+                            route=path if path in self.routes else 'unmatched',
+                            method=self.command, status=str(code))
 
     def _set_headers(self, status_code=200, content_type='application/json'):
         self.send_response(status_code)
         self.send_header('Content-type', content_type)
         self.end_headers()
 
+    def _write(self, body):
+        self.wfile.write(body)
+        metrics.inc('driver_client_bytes_sent_total', len(body), client=metrics.client_label(self.client_address[0]))
+
     def do_POST(self):
         parsed_path = urlparse(self.path)
         if parsed_path.path == '/pubimg':
             content_length = int(self.headers.get('Content-Length', 0))
             if content_length == 0:
                 self._set_headers(400)
-                self.wfile.write(json.dumps({'error': 'Empty body.'}).encode())
+                self._write(json_dumps({'error': 'Empty body.'}))
                 return
 
             post_data = self.rfile.read(content_length)
             try:
                 # Accept both JSON and application/x-www-form-urlencoded
                 if self.headers.get('Content-Type', '').startswith('application/json'):
-                    msg = json.loads(post_data)
+                    msg = json_loads(post_data)
                 else:
                     # Assume form-data with 'msg' field as JSON string
                     fields = parse_qs(post_data.decode())
                     if 'msg' in fields:
-                        msg = json.loads(fields['msg'][0])
+                        msg = json_loads(fields['msg'][0])
                     else:
                         raise ValueError('No msg field found.')
             except Exception as e:
                 self._set_headers(400)
-                self.wfile.write(json.dumps({'error': f'Invalid JSON: {str(e)}'}).encode())
+                self._write(json_dumps({'error': f'Invalid JSON: {str(e)}'}))
+                return
+
+            if not dependencies.wait():
+                self._set_headers(503)
+                self._write(json_dumps({'error': 'roslibpy is not available yet', 'dependencies': dependencies.status()}))
                 return
 
+            started = time.perf_counter()
             try:
                 ros_publisher.publish(msg)
+                metrics.observe('driver_upstream_request_duration_seconds', time.perf_counter() - started,
+                                upstream='rosbridge', outcome='ok')
                 self._set_headers(200)
-                self.wfile.write(json.dumps({'status': 'success', 'message': 'Image published to /david'}).encode())
+                self._write(json_dumps({'status': 'success', 'message': 'Image published to /david'}))
             except Exception as e:
+                metrics.observe('driver_upstream_request_duration_seconds', time.perf_counter() - started,
+                                upstream='rosbridge', outcome='error')
                 self._set_headers(500)
-                self.wfile.write(json.dumps({'error': f'Failed to publish: {str(e)}'}).encode())
+                self._write(json_dumps({'error': f'Failed to publish: {str(e)}'}))
         else:
             self._set_headers(404)
-            self.wfile.write(json.dumps({'error': 'Not found'}).encode())
+            self._write(json_dumps({'error': 'Not found'}))
+
+    def _handle_debug(self, parsed_path):
+        # HTTPServer is single threaded: other requests wait while a profile runs
+        denied = debug_denied(self.headers.get('X-Debug-Token'), DEBUG_ENDPOINTS, DEBUG_TOKEN)
+        if denied:
+            self._set_headers(denied[0])
+            self._write(json_dumps({'error': denied[1]}))
+            return
+        if parsed_path.path == '/debug/tasks':
+            self._set_headers(200)
+            self._write(json_dumps({'stuck_after_seconds': DEBUG_STUCK_SECONDS, 'threads': stack_watch.snapshot()}))
+            return
+        if parsed_path.path != '/debug/profile':
+            self._set_headers(404)
+            self._write(json_dumps({'error': 'Not found'}))
+            return
+        query = parse_qs(parsed_path.query)
+        try:
+            seconds = profile_seconds(query.get('seconds', [None])[0], DEBUG_PROFILE_MAX_SECONDS)
+        except ValueError as e:
+            self._set_headers(400)
+            self._write(json_dumps({'error': str(e)}))
+            return
+        stacks = profiler.profile(seconds, cpu_only=query.get('mode', ['cpu'])[0] != 'wall')
+        if stacks is None:
+            self._set_headers(409)
+            self._write(json_dumps({'error': 'A profile is already running'}))
+            return
+        self._set_headers(200, 'text/plain; charset=utf-8')
+        self._write(stacks.encode())
 
     def do_GET(self):
+        parsed_path = urlparse(self.path)
+        if parsed_path.path.startswith('/debug/'):
+            self._handle_debug(parsed_path)
+            return
+        if parsed_path.path == '/readyz':
+            self._set_headers(200 if dependencies.ready() else 503)
+            self._write(json_dumps(dependencies.status()))
+            return
+        if parsed_path.path == '/metrics':
+            if not METRICS_ENABLED:
+                self._set_headers(404)
+                self._write(json_dumps({'error': 'Metrics are disabled'}))
+                return
+            self._set_headers(200, METRICS_CONTENT_TYPE)
+            self._write(metrics.render().encode())
+            return
         # Simple index/help
         self._set_headers(200)
-        self.wfile.write(json.dumps({
+        self._write(json.dumps({
             'endpoints': [
                 {
                     'method': 'POST',
@@ -110,6 +297,8 @@ class Handler(BaseHTTPRequestHandler):
 def run_server():
     server_address = (HTTP_SERVER_HOST, HTTP_SERVER_PORT)
     httpd = HTTPServer(server_address, Handler)
+    # The socket is listening; import roslibpy while the first requests are served
+    dependencies.start()
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
@@ -0,0 +1,47 @@
+import importlib.util
+import os
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("TOKEN_CACHE_ENABLED", "false")
+spec = importlib.util.spec_from_file_location("chat_flask_driver", os.path.join(ROOT, "driver.py"))
+driver = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(driver)
+
+AUTH = {"Authorization": "Bearer test"}
+
+class StreamedResponseAdmissionTest(unittest.TestCase):
+    """An NDJSON response keeps its admission slot until the client has read all of it."""
+    def setUp(self):
+        self.saved = driver.run_batch_item, driver.fetch_page
+        self.client = driver.app.test_client()
+
+    def tearDown(self):
+        driver.run_batch_item, driver.fetch_page = self.saved
+
+    def assert_slot_held_until_consumed(self, response, lines):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(driver.admission.inflight, 1)
+        chunks = iter(response.response)
+        next(chunks)
+        self.assertEqual(driver.admission.inflight, 1)
+        body = b"".join(chunks)
+        response.close()
+        self.assertEqual(body.count(b"\n"), lines - 1)
+        self.assertEqual(driver.admission.inflight, 0)
+
+    def test_batch(self):
+        driver.run_batch_item = lambda item, auth_header: (200, {"path": item["path"]})
+        response = self.client.post("/batch", json=[{"path": "/posts"}, {"path": "/schedules"}],
+                                    headers=AUTH, buffered=False)
+        self.assert_slot_held_until_consumed(response, 2)
+
+    def test_stream_listing(self):
+        pages = {None: (200, [{"id": 1}], "next"), "next": (200, [{"id": 2}], None)}
+        driver.fetch_page = lambda path, params, auth_header: pages[params.get(driver.PAGE_CURSOR_PARAM)]
+        response = self.client.get("/posts?stream=ndjson", headers=AUTH, buffered=False)
+        self.assert_slot_held_until_consumed(response, 2)
+
+if __name__ == "__main__":
+    unittest.main()
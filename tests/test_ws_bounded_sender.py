@@ -0,0 +1,80 @@
+import asyncio
+import importlib.util
+import os
+import unittest
+
+from aiohttp import WSMsgType
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DRIVER = os.path.join(ROOT, "iot_driver_copilot", "GoSchedule, ChatToChat, Bustub", "driver.py")
+
+spec = importlib.util.spec_from_file_location("chat_driver", DRIVER)
+driver = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(driver)
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    async def send_str(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self):
+        self.closed = True
+
+class BoundedSenderTest(unittest.TestCase):
+    def setUp(self):
+        self.limits = driver.WS_SEND_QUEUE_BYTES, driver.WS_SLOW_CONSUMER_POLICY
+        driver.WS_SEND_QUEUE_BYTES = 1024
+
+    def tearDown(self):
+        driver.WS_SEND_QUEUE_BYTES, driver.WS_SLOW_CONSUMER_POLICY = self.limits
+
+    def run_sender(self, messages):
+        async def scenario():
+            ws = FakeWebSocket()
+            sender = driver.BoundedSender(ws, driver.DirectionStats())
+            accepted = [sender.offer(msg_type, data) for msg_type, data in messages]
+            await sender.flush(1)
+            return ws, sender, accepted
+        return asyncio.run(scenario())
+
+    def test_oversized_message_is_sent_when_queue_is_empty(self):
+        big = b"x" * (driver.WS_SEND_QUEUE_BYTES * 4)
+        for policy in ("drop", "coalesce", "disconnect"):
+            with self.subTest(policy=policy):
+                driver.WS_SLOW_CONSUMER_POLICY = policy
+                ws, sender, accepted = self.run_sender([(WSMsgType.BINARY, big)])
+                self.assertEqual(accepted, [True])
+                self.assertEqual(ws.sent, [big])
+                self.assertEqual(sender.stats.dropped, 0)
+                self.assertEqual(sender.stats.bytes_out, len(big))
+                self.assertEqual(sender.queued_bytes, 0)
+
+    def test_oversized_message_behind_a_backlog_follows_policy(self):
+        driver.WS_SLOW_CONSUMER_POLICY = "drop"
+        big = b"x" * (driver.WS_SEND_QUEUE_BYTES * 4)
+        ws, sender, accepted = self.run_sender([(WSMsgType.BINARY, b"first"), (WSMsgType.BINARY, big)])
+        self.assertEqual(accepted, [True, True])
+        self.assertEqual(ws.sent, [b"first"])
+        self.assertEqual(sender.stats.dropped, 1)
+
+    def test_text_is_budgeted_in_encoded_bytes(self):
+        driver.WS_SLOW_CONSUMER_POLICY = "drop"
+        # 400 characters, 1200 bytes in UTF-8: over the budget once something is queued ahead of it
+        text = "€" * 400
+        ws, sender, accepted = self.run_sender([(WSMsgType.TEXT, "a"), (WSMsgType.TEXT, text)])
+        self.assertEqual(ws.sent, ["a"])
+        self.assertEqual(sender.stats.dropped, 1)
+
+        ws, sender, accepted = self.run_sender([(WSMsgType.TEXT, text)])
+        self.assertEqual(ws.sent, [text])
+        self.assertEqual(sender.stats.bytes_out, len(text.encode()))
+        self.assertEqual(sender.queued_bytes, 0)
+
+if __name__ == "__main__":
+    unittest.main()